@@ -237,6 +237,41 @@ def init_configs(args=None,redirect=True):
         'will be disabled when it is true . If args of ops before the '
         'checkpoint are changed, all ops will be rerun from the '
         'beginning.')
+    parser.add_argument(
+        '--use_op_cache',
+        type=bool,
+        default=False,
+        help='Whether to cache the result of each op in a shared op cache. '
+        'The results are addressed by the fingerprint of the input '
+        'contents and the op configs, so rerunning a recipe on the same '
+        'data skips the ops whose results are cached, even across jobs.')
+    parser.add_argument(
+        '--op_cache_dir',
+        type=str,
+        default=None,
+        help='Dir of the shared op cache. In default it\'s "op_results" '
+        'under the environment variable `DATA_JUICER_CACHE_HOME`.')
+    parser.add_argument(
+        '--op_cache_max_size',
+        type=str,
+        default='100GB',
+        help='Max total size of the shared op cache. The least recently '
+        'used results are evicted when it\'s exceeded.')
+    parser.add_argument(
+        '--incremental',
+        type=bool,
+        default=False,
+        help='Whether to process only the added or changed files of the '
+        'dataset branch. The results of the unchanged files are reused '
+        'from prior runs of the same recipe and merged with the new ones, '
+        'and the new rows are deduplicated against them.')
+    parser.add_argument(
+        '--incremental_dir',
+        type=str,
+        default=None,
+        help='Dir to store the file hashes and results of prior runs for '
+        'incremental processing. In default it\'s "incremental" under the '
+        'environment variable `DATA_JUICER_CACHE_HOME`.')
     parser.add_argument(
         '--temp_dir',
         type=str,
@@ -273,6 +308,14 @@ def init_configs(args=None,redirect=True):
         help='Whether to fuse operators that share the same intermediate '
         'variables automatically. Op fusion might reduce the memory '
         'requirements slightly but speed up the whole process.')
+    parser.add_argument(
+        '--op_streaming',
+        type=bool,
+        default=False,
+        help='Whether to chain consecutive mappers and filters into streaming '
+        'pipelines. Each batch flows through all ops of a pipeline in '
+        'memory and only the surviving samples are written once, which '
+        'saves a full dataset pass and cache file for every op in it.')
     parser.add_argument(
         '--process',
         type=List[Dict],
@@ -449,8 +492,9 @@ def init_setup_from_cfg(cfg,redirect=True):
             os.makedirs(cfg.temp_dir, exist_ok=True)
         tempfile.tempdir = cfg.temp_dir
 
-    # The checkpoint mode is not compatible with op fusion for now.
-    if cfg.op_fusion:
+    # The checkpoint mode is not compatible with op fusion and op streaming
+    # for now.
+    if cfg.op_fusion or cfg.op_streaming:
         cfg.use_checkpoint = False
 
     # update huggingface datasets cache directory only when ds_cache_dir is set
@@ -18,6 +18,7 @@ from data_engine.utils.compress import (CompressionOff,
                                         cleanup_compressed_cache_files,
                                         compress, decompress)
 from data_engine.utils.fingerprint_utils import generate_fingerprint
+from data_engine.utils.op_cache_utils import get_op_version
 from data_engine.utils.process_utils import setup_mp
 from .._telemetry import TRACE_HELPER, get_telemetry_envelope_metadata
 
@@ -166,7 +167,8 @@ class NestedDataset(Dataset, DJDataset):
                 *,
                 exporter=None,
                 checkpointer=None,
-                tracer=None):
+                tracer=None,
+                op_cache=None):
         if operators is None:
             return self
 
@@ -175,6 +177,7 @@ class NestedDataset(Dataset, DJDataset):
         unforkable_operators = set(UNFORKABLE.modules.keys())
 
         dataset = self
+        cache_key = op_cache.fingerprint(self) if op_cache else None
         try:
             for op in operators:
                 mp_context = ['forkserver', 'spawn'] if (
@@ -193,8 +196,35 @@ class NestedDataset(Dataset, DJDataset):
                     }
                 ):
                     start = time()
-                    # run single op
-                    dataset = op.run(dataset, exporter=exporter, tracer=tracer)
+                    cached_dataset = None
+                    if op_cache is not None:
+                        cache_key = op_cache.get_key(cache_key, op._op_cfg,
+                                                     get_op_version(op))
+                        cached_dataset = op_cache.load(cache_key)
+                    if cached_dataset is not None:
+                        msg = (f'Load result of OP [{op._name}] from '
+                               f'op cache [{cache_key}].')
+                        logger.info(msg)
+                        from data_server.log_tools.tools import (
+                            OperatorStatusEnum,
+                            insert_pipline_job_run_task_log_info,
+                            set_pipline_job_operator_status)
+                        insert_pipline_job_run_task_log_info(
+                            op.job_uid,
+                            msg,
+                            operator_name=op._name,
+                            operator_index=op.pipline_index)
+                        set_pipline_job_operator_status(
+                            op.job_uid, OperatorStatusEnum.SUCCESS, op._name,
+                            op.pipline_index)
+                        dataset = cached_dataset
+                    else:
+                        # run single op
+                        dataset = op.run(dataset,
+                                         exporter=exporter,
+                                         tracer=tracer)
+                        if op_cache is not None:
+                            op_cache.save(cache_key, dataset, op._op_cfg)
                     # record processed ops
                     if checkpointer is not None:
                         checkpointer.record(op._op_cfg)
@@ -7,9 +7,11 @@ from data_engine.core.data import Dataset
 from data_engine.format.load import load_formatter
 from data_engine.ingester.load import load_ingester
 from data_engine.format.mixture_formatter import MixtureFormatter
-from data_engine.ops import OPERATORS, load_ops
+from data_engine.ops import OPERATORS, Selector, load_ops
 from data_engine.utils import cache_utils
 from data_engine.utils.ckpt_utils import CheckpointManager
+from data_engine.utils.incremental_utils import IncrementalManager
+from data_engine.utils.op_cache_utils import OpCacheManager
 
 from ..ops.selector.frequency_specified_field_selector import \
     FrequencySpecifiedFieldSelector
@@ -112,6 +114,42 @@ class Executor:
                                                      'Found existed dataset checkpoint.')
                 self.cfg.process = self.ckpt_manager.get_left_process_list()
 
+        # whether to use the shared op cache. If it's true, the result of
+        # each op is cached and ops whose results are cached by any job
+        # before will be skipped.
+        self.op_cache = None
+        if self.cfg.use_op_cache:
+            self.op_cache = OpCacheManager(
+                self.cfg.op_cache_dir,
+                self.cfg.op_cache_max_size,
+                self.cfg.np,
+                work_dir=os.path.join(self.work_dir, 'op_cache'))
+            logger.info(f'Using op cache in [{self.op_cache.cache_dir}].')
+            insert_pipline_job_run_task_log_info(
+                self.job_uid,
+                f'Using op cache in [{self.op_cache.cache_dir}].')
+
+        # whether to process only the added or changed files of the dataset
+        # branch, and merge the results with those of prior runs.
+        self.incremental_manager = None
+        if getattr(self.cfg, 'incremental', False) and self.ingester:
+            op_names = [list(op_cfg.keys())[0] for op_cfg in self.cfg.process]
+            if any(
+                    issubclass(OPERATORS.modules[name], Selector)
+                    for name in op_names if name in OPERATORS.modules):
+                logger.warning('Incremental processing is disabled since '
+                               'selectors need the whole dataset.')
+            else:
+                state_dir = IncrementalManager.get_state_dir(
+                    self.cfg.incremental_dir,
+                    self.cfg.repo_id or self.cfg.dataset_path,
+                    self.cfg.branch, self.cfg.process)
+                logger.info(f'Using incremental state in [{state_dir}].')
+                insert_pipline_job_run_task_log_info(
+                    self.job_uid, f'Using incremental state in [{state_dir}].')
+                self.incremental_manager = IncrementalManager(
+                    state_dir, self.cfg.process, self.cfg.np)
+
         # prepare exporter and check export path suffix
         logger.info('Preparing exporter...')
         insert_pipline_job_run_task_log_info(self.job_uid,
@@ -230,11 +268,25 @@ class Executor:
                 "format",
                 parent=get_telemetry_envelope_metadata(),
             ):
+                format_path = self.src_path
+                if self.incremental_manager is not None:
+                    file_hashes = self.ingester.get_file_hashes()
+                    files_to_process = \
+                        self.incremental_manager.get_files_to_process(
+                            file_hashes)
+                    format_path = IncrementalManager.link_files(
+                        self.src_path, files_to_process,
+                        os.path.join(self.work_dir, 'incremental_src'))
+                    insert_pipline_job_run_task_log_info(
+                        self.job_uid,
+                        f'Process {len(files_to_process)} added or changed '
+                        f'files of {len(file_hashes)} files incrementally.')
+
                 logger.info('Setting up data formatter...')
                 insert_pipline_job_run_task_log_info(self.job_uid,
                                                      'Setting up data formatter...')
                 self.formatter = load_formatter(
-                    self.src_path,
+                    format_path,
                     self.cfg.generated_dataset_config,
                     self.cfg.text_keys, self.cfg.suffixes,
                     self.cfg.add_suffix
@@ -246,6 +298,10 @@ class Executor:
                     insert_pipline_job_run_task_log_info(self.job_uid,
                                                          'Loading dataset from checkpoint...')
                     dataset = self.ckpt_manager.load_ckpt()
+                elif self.incremental_manager is not None \
+                        and len(files_to_process) == 0:
+                    logger.info('No added or changed files to process.')
+                    dataset = None
                 else:
                     logger.info('Loading dataset from data formatter...')
                     insert_pipline_job_run_task_log_info(self.job_uid,
@@ -269,7 +325,8 @@ class Executor:
         insert_pipline_job_run_task_log_info(self.job_uid,
                                              'Preparing process operators...')
 
-        ops = load_ops(self.cfg.process, self.cfg.op_fusion,job_uid=self.job_uid)
+        ops = load_ops(self.cfg.process, self.cfg.op_fusion,job_uid=self.job_uid,
+                       op_streaming=self.cfg.op_streaming)
 
         # 4. data process
         # - If tracer is open, trace each op after it's processed
@@ -284,12 +341,17 @@ class Executor:
             insert_pipline_job_run_task_log_info(self.job_uid,
                                                  'Processing data...')
             tstart = time()
-            dataset = dataset.process(
-                ops,
-                exporter=self.exporter,
-                checkpointer=self.ckpt_manager,
-                tracer=self.tracer
-            )
+            if dataset is not None:
+                dataset = dataset.process(
+                    ops,
+                    exporter=self.exporter,
+                    checkpointer=self.ckpt_manager,
+                    tracer=self.tracer,
+                    op_cache=self.op_cache
+                )
+            if self.incremental_manager is not None:
+                dataset = self.incremental_manager.merge(
+                    dataset, file_hashes, files_to_process)
             tend = time()
             logger.info(f'All OPs are done in {tend - tstart:.3f}s.')
             insert_pipline_job_run_task_log_info(self.job_uid,
@@ -1,3 +1,4 @@
+import json
 import os
 
 import pyarrow as pa
@@ -6,13 +7,20 @@ from loguru import logger
 from data_engine import cuda_device_count
 from data_engine.core.data import DJDataset
 from data_engine.ops import Filter, Mapper, Deduplicator, Selector
+from data_engine.ops.base_op import (convert_dict_list_to_list_dict,
+                                     convert_list_dict_to_dict_list)
+from data_engine.ops.deduplicator import DocumentMinhashDeduplicator
 from data_engine.utils.availability_utils import AvailabilityChecking
 from data_engine.utils.constant import Fields
 from data_engine.utils.process_utils import calculate_np
 
 import datasets
+from datasets.table import InMemoryTable
 with AvailabilityChecking(['ray'], requires_type='dist'):
     from ray.data import Dataset
+    from ray.data.block import BlockAccessor
+    from ray.data.datasource import FilenameProvider
+    from ray.data.datasource.file_datasink import BlockBasedFileDatasink
     import ray
 
 
@@ -92,51 +100,165 @@ def reset_log(log_dir: str):
                 redirect=True)
 
 
-@ray.remote
-def ray_run_filter(op: filter, data: Dataset, num_gpus: int, concurrency: int, log_dir: str):
-    reset_log(log_dir)
-    data = data.map_batches(op.compute_stats,
-                            batch_size=1,
+_worker_log_dir = None
+
+
+def _reset_worker_log(log_dir: str):
+    # the logger of each worker process only needs to be set up once
+    global _worker_log_dir
+    if log_dir and _worker_log_dir != log_dir:
+        reset_log(log_dir)
+        _worker_log_dir = log_dir
+
+
+def get_batch_udf(op, method, log_dir: str = None):
+    """
+    Wrap an op method into a map_batches function on pyarrow batches.
+
+    Batched ops take the whole batch. Other ops are applied to the samples
+    of the batch one by one with their sample-level fault tolerance, and
+    the failed samples are dropped.
+
+    :param op: the op to run
+    :param method: the wrapped method of the op to apply
+    :param log_dir: log dir of the job, to which the worker logs go
+    :return: a function from a pyarrow batch to a batch
+    """
+
+    def process_batch(table: pa.Table):
+        _reset_worker_log(log_dir)
+        if op.is_batched_op():
+            res = method(table)
+        else:
+            res_samples = []
+            for sample in table.to_pylist():
+                if getattr(op, '_raise_on_exception', False):
+                    res = convert_list_dict_to_dict_list([method(sample)])
+                else:
+                    res = method(convert_list_dict_to_dict_list([sample]))
+                res_samples.extend(convert_dict_list_to_list_dict(res))
+            res = convert_list_dict_to_dict_list(
+                res_samples) if res_samples else None
+        if not res or len(next(iter(res.values()))) == 0:
+            # keep the schema of empty batches
+            return table.slice(0, 0)
+        return res
+
+    return process_batch
+
+
+def get_filter_udf(op, log_dir: str = None):
+    """
+    Compute the stats of a batch and filter it in the same pass.
+
+    :param op: the filter op to run
+    :param log_dir: log dir of the job, to which the worker logs go
+    :return: a function from a pyarrow batch to a batch
+    """
+    compute_stats = get_batch_udf(op, op.compute_stats, log_dir)
+
+    def filter_batch(table: pa.Table):
+        samples = compute_stats(table)
+        if isinstance(samples, pa.Table):
+            return samples
+        keep = [op.process(s) for s in convert_dict_list_to_list_dict(samples)]
+        return {
+            key: [val for val, k in zip(vals, keep) if k]
+            for key, vals in samples.items()
+        }
+
+    return filter_batch
+
+
+def ray_to_hf(data: Dataset) -> datasets.Dataset:
+    """Collect a ray dataset as a HF dataset through its arrow blocks."""
+    tables = [t for t in ray.get(data.to_arrow_refs()) if t.num_rows > 0]
+    if len(tables) == 0:
+        return None
+    table = pa.concat_tables(tables, promote=True)
+    return datasets.Dataset(InMemoryTable(table))
+
+
+def hf_to_ray(dataset: datasets.Dataset) -> Dataset:
+    return ray.data.from_arrow(dataset.with_format('arrow')[:])
+
+
+def ray_run_filter(op: Filter, data: Dataset, num_gpus: int, concurrency: int,
+                   log_dir: str) -> Dataset:
+    return data.map_batches(get_filter_udf(op, log_dir),
+                            batch_size=op.batch_size,
                             batch_format='pyarrow',
                             num_gpus=num_gpus,
                             num_cpus=1,
                             concurrency=concurrency)
 
-    data = data.filter(op.process, concurrency=concurrency)
-    return data.take_all()
 
-@ray.remote
-def ray_run_mapper(op: Mapper, data: Dataset, num_gpus: int,  concurrency: int, log_dir: str):
-    reset_log(log_dir)
-    data = data.map_batches(op.process,
-                            batch_size=1,
+def ray_run_mapper(op: Mapper, data: Dataset, num_gpus: int, concurrency: int,
+                   log_dir: str) -> Dataset:
+    return data.map_batches(get_batch_udf(op, op.process, log_dir),
+                            batch_size=op.batch_size,
                             batch_format='pyarrow',
                             num_gpus=num_gpus,
                             num_cpus=1,
                             concurrency=concurrency)
 
-    return data.take_all()
 
-@ray.remote
-def ray_run_deduplicator(op: Deduplicator, data: Dataset, num_gpus: int,  concurrency: int, log_dir: str):
-    reset_log(log_dir)
-    data = data.map_batches(op.compute_hash,
-                            batch_size=1,
+def ray_run_deduplicator(op: Deduplicator, data: Dataset, num_gpus: int,
+                         concurrency: int, log_dir: str):
+    data = data.map_batches(get_batch_udf(op, op.compute_hash, log_dir),
+                            batch_size=op.batch_size,
                             batch_format='pyarrow',
                             num_gpus=num_gpus,
                             num_cpus=1,
                             concurrency=concurrency)
-    
-    data = datasets.Dataset.from_list(data.take_all())
-    new_dataset, dup_pairs = op.process(data, 10)
-    return (new_dataset.to_list(), dup_pairs)
-
-@ray.remote
-def ray_run_selector(op: Selector, data: Dataset, num_gpus: int,  concurrency: int, log_dir: str):
-    reset_log(log_dir)
-    data = datasets.Dataset.from_list(data.take_all())
-    new_dataset = op.process(data)
-    return new_dataset.to_list()
+    # the generic deduplicators compare all the hashes globally
+    dataset = ray_to_hf(data)
+    if dataset is None:
+        return data, {}
+    new_dataset, dup_pairs = op.process(dataset, 10)
+    return hf_to_ray(new_dataset), dup_pairs
+
+
+def ray_run_selector(op: Selector, data: Dataset, num_gpus: int,
+                     concurrency: int, log_dir: str) -> Dataset:
+    dataset = ray_to_hf(data)
+    if dataset is None:
+        return data
+    return hf_to_ray(op.process(dataset))
+
+
+class ShardFilenameProvider(FilenameProvider):
+    """Name the shard files written by each write task and block."""
+
+    def __init__(self, basename: str, suffix: str):
+        self.basename = basename
+        self.suffix = suffix
+
+    def get_filename_for_block(self, block, task_index: int,
+                               block_index: int) -> str:
+        return f'{self.basename}-{task_index:06d}-{block_index:06d}' \
+               f'.{self.suffix}'
+
+
+class JsonDatasink(BlockBasedFileDatasink):
+    """
+    Write each block into a json/jsonl file with the standard json lib, to
+    keep non-ascii characters and avoid escaping / as \\/.
+    """
+
+    def __init__(self, path: str, suffix: str = 'jsonl', **kwargs):
+        super().__init__(path, file_format=suffix, **kwargs)
+        self.suffix = suffix
+
+    def write_block_to_file(self, block: BlockAccessor, file):
+        rows = block.to_arrow().to_pylist()
+        if self.suffix == 'json':
+            file.write(json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+        else:
+            file.write(''.join(
+                json.dumps(row, ensure_ascii=False) + '\n'
+                for row in rows).encode('utf-8'))
+
 
 class RayDataset(DJDataset):
 
@@ -164,6 +286,44 @@ class RayDataset(DJDataset):
             self._run_single_op(op, tracer)
         return self
 
+    def write(self,
+              export_dir: str,
+              suffix: str = 'jsonl',
+              basename: str = 'data',
+              columns_to_remove=None):
+        """
+        Execute the whole plan and write the result shards into a directory
+        from the workers directly.
+
+        :param export_dir: directory to write the shards into.
+        :param suffix: format of the shards, one of jsonl, json, parquet.
+        :param basename: prefix of the shard file names.
+        :param columns_to_remove: columns to drop before writing if they
+            exist.
+        """
+        data = self.data
+        if columns_to_remove:
+            # drop them batch by batch, since getting the schema of a lazy
+            # dataset executes part of the plan
+            def remove_columns(table: pa.Table) -> pa.Table:
+                return table.drop_columns([
+                    col for col in table.column_names
+                    if col in columns_to_remove
+                ])
+
+            data = data.map_batches(remove_columns,
+                                    batch_size=None,
+                                    batch_format='pyarrow')
+        filename_provider = ShardFilenameProvider(basename, suffix)
+        if suffix == 'parquet':
+            data.write_parquet(export_dir,
+                               filename_provider=filename_provider)
+        else:
+            data.write_datasink(
+                JsonDatasink(export_dir,
+                             suffix=suffix,
+                             filename_provider=filename_provider))
+
     def _run_single_op(self, op, tracer):
         op_proc = calculate_np(op._name, op.mem_required, op.cpu_required,
                                self.num_proc, op.use_cuda())
@@ -173,7 +333,8 @@ class RayDataset(DJDataset):
             if isinstance(op, Mapper):
                 origin_dataset = self.data
 
-                self.data = ray.get(ray_run_mapper.options(num_cpus=op_proc).remote(op, self.data, num_gpus, op_proc, log_dir))
+                self.data = ray_run_mapper(op, self.data, num_gpus, op_proc,
+                                           log_dir)
                 if tracer:
                     tracer.trace_mapper(op._name, origin_dataset, self.data,
                                         op.text_key)
@@ -181,21 +342,33 @@ class RayDataset(DJDataset):
             elif isinstance(op, Filter):
                 origin_dataset = self.data
 
-                self.data = ray.get(ray_run_filter.options(num_cpus=op_proc).remote(op, self.data, num_gpus, op_proc, log_dir))
+                self.data = ray_run_filter(op, self.data, num_gpus, op_proc,
+                                           log_dir)
                 if tracer:
                     tracer.trace_filter(op._name, origin_dataset, self.data)
 
+            elif isinstance(op, DocumentMinhashDeduplicator):
+                origin_dataset = self.data
+
+                from data_engine.core.ray_deduplicator import \
+                    ray_minhash_deduplicate
+                self.data = ray_minhash_deduplicate(op, self.data, op_proc)
+                if tracer:
+                    tracer.trace_deduplicator(op._name, origin_dataset, {})
+
             elif isinstance(op, Deduplicator):
                 origin_dataset = self.data
 
-                self.data, dup_pairs = ray.get(ray_run_deduplicator.options(num_cpus=op_proc).remote(op, self.data, num_gpus, op_proc, log_dir))
+                self.data, dup_pairs = ray_run_deduplicator(
+                    op, self.data, num_gpus, op_proc, log_dir)
                 if tracer:
                     tracer.trace_deduplicator(op._name, origin_dataset, dup_pairs)
 
             elif isinstance(op, Selector):
                 origin_dataset = self.data
 
-                self.data = ray.get(ray_run_selector.options(num_cpus=1).remote(op, self.data, num_gpus, op_proc, log_dir))
+                self.data = ray_run_selector(op, self.data, num_gpus, op_proc,
+                                             log_dir)
                 if tracer:
                     tracer.trace_filter(op._name, origin_dataset, self.data)
 
@@ -0,0 +1,173 @@
+import numpy as np
+import pyarrow as pa
+from loguru import logger
+
+from data_engine.ops.common.helper_func import ArrayUnionFind
+from data_engine.ops.common.lsh_bucket_store import hash_band_values
+from data_engine.utils.availability_utils import AvailabilityChecking
+from data_engine.utils.constant import HashKeys
+
+with AvailabilityChecking(['ray'], requires_type='dist'):
+    import ray
+    from ray.data import Dataset
+    from ray.data.block import BlockAccessor
+
+ROW_ID = '__dj__row_id'
+BAND = '__dj__band'
+BUCKET = '__dj__bucket'
+EDGE_SRC = '__dj__src'
+EDGE_DST = '__dj__dst'
+
+
+@ray.remote
+def _count_rows(block):
+    return BlockAccessor.for_block(block).num_rows()
+
+
+@ray.remote
+def _add_row_ids(block, offset):
+    table = BlockAccessor.for_block(block).to_arrow()
+    return table.append_column(
+        ROW_ID,
+        pa.array(np.arange(offset, offset + table.num_rows, dtype=np.int64)))
+
+
+def add_row_ids(data: Dataset) -> Dataset:
+    """
+    Add global row ids following the order of the dataset, so that the
+    first sample of a duplicate cluster is kept as in the standalone mode.
+
+    :param data: input ray dataset
+    :return: ray dataset with the row id column
+    """
+    block_refs = data.materialize().get_internal_block_refs()
+    counts = ray.get([_count_rows.remote(ref) for ref in block_refs])
+    offsets = np.cumsum([0] + counts[:-1]).tolist()
+    return ray.data.from_arrow_refs([
+        _add_row_ids.remote(ref, offset)
+        for ref, offset in zip(block_refs, offsets)
+    ])
+
+
+def _reduce_edges(src, dst):
+    """
+    Run union-find over the edges locally, and keep only one edge from
+    each non-root node to its root (the smallest row id).
+
+    :param src: row ids of one side of the edges
+    :param dst: row ids of the other side of the edges
+    :return: reduced edges
+    """
+    nodes = np.unique(np.concatenate([src, dst]))
+    union_find = ArrayUnionFind(len(nodes))
+    union_find.union(np.searchsorted(nodes, src),
+                     np.searchsorted(nodes, dst))
+    roots = nodes[union_find.find()]
+    non_roots = roots != nodes
+    return nodes[non_roots], roots[non_roots]
+
+
+def ray_minhash_deduplicate(op, data: Dataset, concurrency=None) -> Dataset:
+    """
+    Ray-native MinHash deduplication with a DocumentMinhashDeduplicator.
+
+    1. minhash signatures are computed in map_batches and exploded into
+       (band, bucket, row id) records.
+    2. records are sorted by (band, bucket) across workers, which puts
+       each bucket into a single block, and each block emits the edges of
+       its buckets, reduced by a local union-find.
+    3. the reduced edges, whose number is bounded by the number of
+       duplicate samples, are unioned into clusters on the driver.
+    4. only the ids of removed samples are broadcast back to filter the
+       dataset, which stays lazy.
+
+    :param op: a DocumentMinhashDeduplicator op
+    :param data: input ray dataset
+    :param concurrency: max number of workers of each map stage
+    :return: deduplicated ray dataset
+    """
+    data = add_row_ids(data)
+    total = data.count()
+    if total <= 1:
+        return data.drop_columns([ROW_ID])
+
+    def get_band_buckets(table: pa.Table) -> pa.Table:
+        samples = op.compute_hash(table)
+        if HashKeys.minhash not in samples:
+            # the whole batch failed
+            return pa.table({
+                BAND: pa.array([], type=pa.int32()),
+                BUCKET: pa.array([], type=pa.uint64()),
+                ROW_ID: pa.array([], type=pa.int64()),
+            })
+        minhashes = pa.chunked_array(
+            [pa.array(samples[HashKeys.minhash], type=pa.list_(pa.binary()))])
+        rows = np.asarray(samples[ROW_ID], dtype=np.int64)
+        bands, buckets = [], []
+        for band_idx in range(op.num_bands):
+            band_values = op._get_band_values(minhashes, band_idx)
+            buckets.append(hash_band_values(band_values))
+            bands.append(np.full(len(rows), band_idx, dtype=np.int32))
+        return pa.table({
+            BAND: np.concatenate(bands),
+            BUCKET: np.concatenate(buckets),
+            ROW_ID: np.tile(rows, op.num_bands),
+        })
+
+    def get_bucket_edges(table: pa.Table) -> pa.Table:
+        bands = table.column(BAND).to_numpy()
+        buckets = table.column(BUCKET).to_numpy()
+        rows = table.column(ROW_ID).to_numpy()
+        order = np.lexsort((rows, buckets, bands))
+        bands, buckets, rows = bands[order], buckets[order], rows[order]
+        is_start = np.ones(len(rows), dtype=bool)
+        is_start[1:] = (bands[1:] != bands[:-1]) | (buckets[1:] !=
+                                                    buckets[:-1])
+        firsts = rows[np.flatnonzero(is_start)][np.cumsum(is_start) - 1]
+        src, dst = rows[~is_start], firsts[~is_start]
+        if len(src) > 0:
+            src, dst = _reduce_edges(src, dst)
+        return pa.table({EDGE_SRC: src, EDGE_DST: dst})
+
+    buckets = data.select_columns([op.text_key, ROW_ID]).map_batches(
+        get_band_buckets,
+        batch_size=op.batch_size,
+        batch_format='pyarrow',
+        concurrency=concurrency)
+    # sort puts the records of the same key into the same block, which is
+    # what GroupedData.map_groups relies on as well
+    edges = buckets.sort([BAND, BUCKET]).map_batches(get_bucket_edges,
+                                                     batch_size=None,
+                                                     batch_format='pyarrow',
+                                                     concurrency=concurrency)
+
+    src, dst = [], []
+    for batch in edges.iter_batches(batch_size=None, batch_format='numpy'):
+        src.append(batch[EDGE_SRC])
+        dst.append(batch[EDGE_DST])
+    src = np.concatenate(src) if src else np.zeros(0, dtype=np.int64)
+    dst = np.concatenate(dst) if dst else np.zeros(0, dtype=np.int64)
+    removed_ids, roots = (_reduce_edges(src, dst) if len(src) > 0 else
+                          (src, dst))
+    num_clusters = len(np.unique(roots))
+    logger.info(f'There are {num_clusters} '
+                f'clusters that includes multiple near-duplicate samples.')
+    if getattr(op, 'enable_detailed_logging', False):
+        op._log_dedup_summary(total, total - len(removed_ids),
+                              len(removed_ids), num_clusters)
+
+    removed_ref = ray.put(np.sort(removed_ids))
+
+    def drop_duplicates(table: pa.Table) -> pa.Table:
+        removed = ray.get(removed_ref)
+        if len(removed) == 0:
+            return table.drop_columns([ROW_ID])
+        ids = table.column(ROW_ID).to_numpy()
+        pos = np.minimum(np.searchsorted(removed, ids), len(removed) - 1)
+        is_removed = removed[pos] == ids
+        return table.filter(pa.array(~is_removed)).drop_columns([ROW_ID])
+
+    return data.map_batches(drop_duplicates,
+                            batch_size=op.batch_size,
+                            batch_format='pyarrow',
+                            concurrency=concurrency)
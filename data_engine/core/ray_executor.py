@@ -6,6 +6,7 @@ from data_engine.config import init_configs
 from data_engine.core.ray_data import RayDataset
 from data_engine.ops import load_ops, OPERATORS
 from data_engine.utils.availability_utils import AvailabilityChecking
+from data_engine.utils.constant import Fields
 from data_engine.ingester.load import load_ingester
 from ..exporter.load import load_exporter
 from data_engine.format.load import load_formatter
@@ -18,30 +19,9 @@ import os
 with AvailabilityChecking(['ray'], requires_type='dist'):
     import ray
     import ray.data as rd
-    from ray.data.datasource import FilenameProvider
-    from ray.data.block import Block
     from dotenv import load_dotenv
 
 load_dotenv()
-# class FixedWithIndexFilenameProvider(FilenameProvider):
-#     def __init__(self, file_format: str):
-#         self.file_format = file_format
-#         self.fixed_filename = '_df_dataset'
-#         self.index = 0
-
-#     def get_filename_for_block(
-#         self, block: Block, task_index: int, block_index: int
-#     ) -> str:
-#         filename = f"{self.fixed_filename}_{self.index}.{self.file_format}"
-#         self.index += 1
-#         return filename
-
-#     def get_filename_for_row(
-#         self, row: Dict[str, Any], task_index: int, block_index: int, row_index: int
-#     ) -> str:
-#         filename = f"{self.fixed_filename}_{self.index}.{self.file_format}"
-#         self.index += 1
-#         return filename
 
 
 class RayExecutor:
@@ -124,7 +104,7 @@ class RayExecutor:
         Running the dataset process pipeline.
 
         :param load_data_np: number of workers when loading the dataset.
-        :return: processed dataset.
+        :return: processed ray dataset and the output branch name.
         """
         # 0. ingest data
         self.src_path = self.ingester.ingest()
@@ -168,13 +148,44 @@ class RayExecutor:
         tstart = time.time()
         dataset.process(ops, tracer=self.tracer)
         tend = time.time()
-        logger.info(f'All Ops are done in {tend - tstart:.3f}s.')
+        logger.info(f'All Ops are planned in {tend - tstart:.3f}s.')
 
         # 4. data export
         logger.info('Exporting dataset to somewhere...')
-        # TODO Add more exporter, for csghub, for local dist .etc
-        # output_branch_name = self.exporter.export_from_files(export_dir)
-        hf_dataset = datasets.Dataset.from_list(dataset.data)
-        output_branch_name = self.exporter.export(hf_dataset)
+        tstart = time.time()
+        output_branch_name = self._export(dataset)
+        tend = time.time()
+        logger.info(f'All Ops are executed and exported in '
+                    f'{tend - tstart:.3f}s.')
+
+        return dataset, output_branch_name
 
-        return hf_dataset, output_branch_name
+    def _export(self, dataset: RayDataset):
+        """
+        Execute the lazy plan of the dataset and write the result shards
+        from the workers, then upload them with the exporter.
+
+        :param dataset: the processed ray dataset.
+        :return: the output branch name.
+        """
+        exporter = self.exporter
+        export_path = os.path.abspath(exporter.export_path)
+        export_dir = os.path.join(os.path.dirname(export_path), '_data')
+        basename = os.path.basename(export_path).split('.')[0]
+        if exporter.export_stats:
+            # materialize once for both the stats and the dataset
+            dataset.data = dataset.data.materialize()
+            if Fields.stats in dataset.data.columns():
+                logger.info('Exporting computed stats...')
+                RayDataset(dataset=dataset.data.select_columns(
+                    [Fields.stats])).write(
+                        os.path.join(os.path.dirname(export_path),
+                                     f'{basename}_stats'),
+                        suffix='jsonl',
+                        basename=basename)
+        if exporter.export_ds:
+            dataset.write(export_dir,
+                          suffix=exporter.suffix,
+                          basename=basename,
+                          columns_to_remove=exporter.get_fields_to_remove())
+        return exporter.export_from_files(export_dir)
@@ -55,6 +55,8 @@ class Tracer:
                 args_list[2] = original_ds
             else:
                 original_count = len(args[2])
+            if len(args) > 3 and isinstance(args[3], ray.data.dataset.Dataset):
+                args_list[3] = ray.get(ray_ds_2_list.remote(args[3]))
 
             res_name = f'count-{op_name}.txt'
             try:
@@ -1,6 +1,6 @@
+import datetime
 import json
 import os
-import tempfile
 from multiprocessing import Pool
 
 from loguru import logger
@@ -8,6 +8,74 @@ from loguru import logger
 from data_engine.utils.constant import Fields, HashKeys
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# number of rows serialized at a time
+EXPORT_BATCH_SIZE = 10000
+
+# dataset to export in the workers of the export pool
+_export_dataset = None
+
+
+def _default(obj):
+    # the values orjson serializes natively are serialized the same way
+    # by json, e.g. datetimes in RFC 3339, and others as strings by both
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _dumps(row):
+    """Serialize a row to compact json bytes, with orjson if it's
+    available."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(row, default=_default)
+        except TypeError:
+            # e.g. ints out of 64 bits or non-str keys
+            pass
+    return json.dumps(row,
+                      ensure_ascii=False,
+                      separators=(',', ':'),
+                      default=_default).encode('utf-8')
+
+
+def _encode_rows(dataset, start, end, separator):
+    table = dataset.with_format('arrow')[start:end]
+    return b''.join(_dumps(row) + separator for row in table.to_pylist())
+
+
+def _init_export_worker(dataset):
+    global _export_dataset
+    _export_dataset = dataset
+
+
+def _encode_export_range(args):
+    start, end, separator = args
+    return _encode_rows(_export_dataset, start, end, separator)
+
+
+def _iter_encoded_chunks(dataset, num_proc, separator):
+    """
+    Serialize the rows of a dataset chunk by chunk in order, each row
+    followed by the separator. Chunks are serialized by a process pool
+    when num_proc > 1.
+    """
+    num_rows = len(dataset)
+    ranges = [(start, min(start + EXPORT_BATCH_SIZE, num_rows), separator)
+              for start in range(0, num_rows, EXPORT_BATCH_SIZE)]
+    if num_proc is None or num_proc <= 1 or len(ranges) <= 1:
+        for start, end, _ in ranges:
+            yield _encode_rows(dataset, start, end, separator)
+        return
+    with Pool(min(num_proc, len(ranges)),
+              initializer=_init_export_worker,
+              initargs=(dataset, )) as pool:
+        yield from pool.imap(_encode_export_range, ranges)
+
 
 class Exporter:
     """The Exporter class is used to export a dataset to files of specific
@@ -115,6 +183,43 @@ class Exporter:
                                       f'{list(support_dict.keys())}.')
         return suffix
 
+    def get_fields_to_remove(self, columns=None):
+        """
+        Get the internal fields to remove from the dataset before export.
+
+        :param columns: the columns of the dataset to export. If it's None,
+            all the fields to remove are returned.
+        :return: the set of existing columns to remove.
+        """
+        # Collect all internal fields to remove before export.
+        # intersection() ensures only existing columns are removed, no error if absent.
+        fields_to_remove = set()
+        if not self.keep_stats_in_res_ds:
+            fields_to_remove.add(Fields.stats)
+        if not self.keep_hashes_in_res_ds:
+            fields_to_remove.update({
+                HashKeys.hash,
+                HashKeys.minhash,
+                HashKeys.simhash,
+                HashKeys.imagehash,
+                HashKeys.videohash,
+            })
+        # Other internal __dj__ fields that should not appear in export
+        fields_to_remove.update({
+            Fields.suffix,
+            Fields.context,
+            Fields.meta,
+            Fields.source_file,
+            Fields.video_frame_tags,
+            Fields.video_audio_tags,
+            Fields.multimodal_data_output_dir,
+            HashKeys.is_duplicate,
+            HashKeys.similarity_hash,
+        })
+        if columns is None:
+            return fields_to_remove
+        return fields_to_remove.intersection(set(columns))
+
     def _export_impl(self, dataset, export_path, suffix, export_stats=True):
         """
         Export a dataset to specific path.
@@ -139,33 +244,7 @@ class Exporter:
                 num_proc=self.num_proc if self.export_in_parallel else 1)
 
         if self.export_ds:
-            # Collect all internal fields to remove before export.
-            # intersection() ensures only existing columns are removed, no error if absent.
-            fields_to_remove = set()
-            if not self.keep_stats_in_res_ds:
-                fields_to_remove.add(Fields.stats)
-            if not self.keep_hashes_in_res_ds:
-                fields_to_remove.update({
-                    HashKeys.hash,
-                    HashKeys.minhash,
-                    HashKeys.simhash,
-                    HashKeys.imagehash,
-                    HashKeys.videohash,
-                })
-            # Other internal __dj__ fields that should not appear in export
-            fields_to_remove.update({
-                Fields.suffix,
-                Fields.context,
-                Fields.meta,
-                Fields.source_file,
-                Fields.video_frame_tags,
-                Fields.video_audio_tags,
-                Fields.multimodal_data_output_dir,
-                HashKeys.is_duplicate,
-                HashKeys.similarity_hash,
-            })
-            feature_fields = set(dataset.features.keys())
-            removed_fields = fields_to_remove.intersection(feature_fields)
+            removed_fields = self.get_fields_to_remove(dataset.features.keys())
             if removed_fields:
                 dataset = dataset.remove_columns(removed_fields)
             export_method = Exporter._router()[suffix]
@@ -215,15 +294,18 @@ class Exporter:
 
                 # export dataset into multiple shards using multiprocessing
                 logger.info(f'Start to exporting to {num_shards} shards.')
-                pool = Pool(self.num_proc)
-                for i in range(num_shards):
-                    pool.apply_async(export_method,
-                                     args=(
-                                         shards[i],
-                                         filenames[i],
-                                     ))
-                pool.close()
-                pool.join()
+                with Pool(self.num_proc) as pool:
+                    results = [
+                        pool.apply_async(export_method,
+                                         args=(
+                                             shards[i],
+                                             filenames[i],
+                                         )) for i in range(num_shards)
+                    ]
+                    # raise the errors of the workers rather than leaving
+                    # the shards missing
+                    for result in results:
+                        result.get()
 
     def export_from_files(self, upload_path: Path):
         pass
@@ -257,7 +339,8 @@ class Exporter:
     def to_jsonl(dataset, export_path, num_proc=1, **kwargs):
         """
         Export method for jsonl target files.
-        Use standard json re-serialization to avoid HuggingFace/ujson escaping / as \\/.
+        Rows are serialized from Arrow record batches once, without escaping
+        / as \\/ like HuggingFace/ujson does.
 
         :param dataset: the dataset to export.
         :param export_path: the path to store the exported dataset.
@@ -265,25 +348,16 @@ class Exporter:
         :param kwargs: extra arguments.
         :return:
         """
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.jsonl')
-        os.close(tmp_fd)
-        try:
-            dataset.to_json(tmp_path, force_ascii=False, num_proc=num_proc)
-            with open(tmp_path, 'r', encoding='utf-8') as f_in, \
-                 open(export_path, 'w', encoding='utf-8') as f_out:
-                for line in f_in:
-                    if line.strip():
-                        data = json.loads(line.strip())
-                        f_out.write(json.dumps(data, ensure_ascii=False) + '\n')
-        finally:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+        with open(export_path, 'wb') as f_out:
+            for chunk in _iter_encoded_chunks(dataset, num_proc, b'\n'):
+                f_out.write(chunk)
 
     @staticmethod
     def to_json(dataset, export_path, num_proc=1, **kwargs):
         """
         Export method for json target files.
-        Use standard json re-serialization to avoid HuggingFace/ujson escaping / as \\/.
+        Rows are serialized from Arrow record batches once, without escaping
+        / as \\/ like HuggingFace/ujson does.
 
         :param dataset: the dataset to export.
         :param export_path: the path to store the exported dataset.
@@ -291,20 +365,13 @@ class Exporter:
         :param kwargs: extra arguments.
         :return:
         """
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.json')
-        os.close(tmp_fd)
-        try:
-            dataset.to_json(tmp_path,
-                            force_ascii=False,
-                            num_proc=num_proc,
-                            lines=False)
-            with open(tmp_path, 'r', encoding='utf-8') as f_in:
-                data = json.load(f_in)
-            with open(export_path, 'w', encoding='utf-8') as f_out:
-                json.dump(data, f_out, ensure_ascii=False)
-        finally:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+        with open(export_path, 'wb') as f_out:
+            f_out.write(b'[')
+            for i, chunk in enumerate(
+                    _iter_encoded_chunks(dataset, num_proc, b',')):
+                # each chunk ends with a separator, which is dropped at last
+                f_out.write(chunk[:-1] if i == 0 else b',' + chunk[:-1])
+            f_out.write(b']')
 
     @staticmethod
     def to_parquet(dataset, export_path, **kwargs):
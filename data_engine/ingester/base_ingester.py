@@ -5,6 +5,7 @@ from typing import Union
 import os
 import uuid
 from data_engine.utils.env import DEFAULT_SRC_PATH
+from data_engine.utils.incremental_utils import get_file_hashes
 
 class Ingester(ABC):
 
@@ -25,6 +26,13 @@ class Ingester(ABC):
         Ingest data from different source to DEFAULT_SRC_PATH
         """
 
+    def get_file_hashes(self) -> dict:
+        """
+        Get the content hashes of the ingested files, which are used to
+        find the added or changed files in incremental processing.
+        """
+        return get_file_hashes(self._src_path)
+
     @property
     def src_path(self):
         return self._src_path
\ No newline at end of file
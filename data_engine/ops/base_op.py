@@ -50,11 +50,40 @@ def convert_arrow_to_python(method):
     return wrapper
 
 
-def catch_map_batches_exception(method):
+def catch_map_batches_exception(method, fallback_to_single=False):
     """
     For batched-map sample-level fault tolerance.
+
+    :param method: the batched method to be wrapped.
+    :param fallback_to_single: whether to re-run a failed batch sample by
+        sample, so that only the samples that raise are dropped. Only safe
+        for idempotent methods such as computing stats or hashes.
     """
 
+    def run_single_samples(samples, *args, **kwargs):
+        res_samples = []
+        for sample in convert_dict_list_to_list_dict(samples):
+            try:
+                res_samples.append(
+                    method(convert_list_dict_to_dict_list([sample]), *args,
+                           **kwargs))
+            except Exception as e:
+                from loguru import logger
+                logger.error(
+                    f'An error occurred in mapper operation when processing '
+                    f'sample {sample}, {type(e)}: {e}')
+                traceback.print_exc()
+        res_samples = [
+            res for res in res_samples
+            if len(res) > 0 and len(next(iter(res.values()))) > 0
+        ]
+        if len(res_samples) == 0:
+            return None
+        return {
+            key: [val for res in res_samples for val in res[key]]
+            for key in res_samples[0].keys()
+        }
+
     @wraps(method)
     @convert_arrow_to_python
     def wrapper(samples, *args, **kwargs):
@@ -66,6 +95,13 @@ def catch_map_batches_exception(method):
                 f'An error occurred in mapper operation when processing '
                 f'samples {samples}, {type(e)}: {e}')
             traceback.print_exc()
+            if fallback_to_single and len(samples) > 0 and len(
+                    next(iter(samples.values()))) > 1:
+                logger.info('Falling back to single-sample mode for the '
+                            'failed batch.')
+                res_samples = run_single_samples(samples, *args, **kwargs)
+                if res_samples is not None:
+                    return res_samples
             ret = {key: [] for key in samples.keys()}
             ret[Fields.stats] = []
             ret[Fields.source_file] = []
@@ -119,6 +155,12 @@ class OP:
 
     _accelerator = 'cpu'
     _batched_op = False
+    # number of samples of a batch if it's not set in the op config
+    _default_batch_size = 1000
+    # whether an override of `run` only wraps the base one with the counters
+    # and the summary of detailed logging, which a streaming pipeline logs
+    # by itself
+    _detailed_logging_run = False
 
     def __init__(self, *args, **kwargs):
         """
@@ -132,12 +174,15 @@ class OP:
             to be processed
         :param video_key: the key name of field that stores sample video list
             to be processed
+        :param batch_size: the number of samples processed together by
+            batched ops
         """
         # init data keys
         self.text_key = kwargs.get('text_key', 'text')
         self.image_key = kwargs.get('image_key', 'images')
         self.audio_key = kwargs.get('audio_key', 'audios')
         self.video_key = kwargs.get('video_key', 'videos')
+        self.batch_size = kwargs.get('batch_size', self._default_batch_size)
 
         # whether the model can be accelerated using cuda
         _accelerator = kwargs.get('accelerator', None)
@@ -228,6 +273,10 @@ class OP:
 
 class Mapper(OP):
 
+    # batched mappers get a sample per batch unless they set their own
+    # batch size, as models and media of a batch might not fit in memory
+    _default_batch_size = 1
+
     def __init__(self, *args, **kwargs):
         """
         Base class that conducts data editing.
@@ -269,6 +318,7 @@ class Mapper(OP):
                 self.process,
                 num_proc=self.runtime_np(),
                 with_rank=self.use_cuda(),
+                batch_size=self.batch_size,
                 desc=self._name + '_process',
             )
             if tracer:
@@ -308,7 +358,7 @@ class Filter(OP):
         # runtime wrappers
         if self.is_batched_op():
             self.compute_stats = catch_map_batches_exception(
-                self.compute_stats)
+                self.compute_stats, fallback_to_single=True)
         else:
             self.compute_stats = catch_map_single_exception(self.compute_stats)
 
@@ -350,6 +400,7 @@ class Filter(OP):
             dataset = dataset.map(self.compute_stats,
                                   num_proc=self.runtime_np(),
                                   with_rank=self.use_cuda(),
+                                  batch_size=self.batch_size,
                                   desc=self._name + '_compute_stats')
             if self.stats_export_path is not None:
                 exporter.export_compute_stats(dataset, self.stats_export_path)
@@ -558,6 +609,8 @@ class Filter(OP):
         elif self._name == 'perplexity_filter':
             self._log_line(f"  - Language: {getattr(self, 'lang', 'N/A')}")
             self._log_line(f"  - Max perplexity: {getattr(self, 'max_ppl', 'N/A')}")
+            if getattr(self, 'response_cache', None) is not None:
+                self._log_line(f"  - {self.response_cache.summary()}")
         
         # special_characters_filter
         elif self._name == 'special_characters_filter':
@@ -662,7 +715,8 @@ class Deduplicator(OP):
 
         # runtime wrappers
         if self.is_batched_op():
-            self.compute_hash = catch_map_batches_exception(self.compute_hash)
+            self.compute_hash = catch_map_batches_exception(
+                self.compute_hash, fallback_to_single=True)
         else:
             self.compute_hash = catch_map_single_exception(self.compute_hash)
 
@@ -694,6 +748,7 @@ class Deduplicator(OP):
             dataset = dataset.map(self.compute_hash,
                                   num_proc=self.runtime_np(),
                                   with_rank=self.use_cuda(),
+                                  batch_size=self.batch_size,
                                   desc=self._name + '_compute_hash')
             show_num = tracer.show_num if tracer else 0
             new_dataset, dup_pairs = self.process(dataset, show_num)
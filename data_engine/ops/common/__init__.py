@@ -1,11 +1,17 @@
-from .helper_func import (get_sentences_from_document, get_words_from_document,
+from .helper_func import (count_chars_in_texts, get_keep_and_reason,
+                          get_sentences_from_document, get_text_lengths,
+                          get_words_from_document,
                           merge_on_whitespace_tab_newline,
                           split_on_newline_tab_whitespace, split_on_whitespace,
                           strip, words_augmentation, words_refinement)
 from .special_characters import SPECIAL_CHARACTERS
-from .llm_client import chat_with_model
+from .llm_client import (LLMRequestEngine, chat_with_model,
+                         chat_with_model_batch, get_llm_engine)
 
 __all__ = [
+    'count_chars_in_texts',
+    'get_keep_and_reason',
+    'get_text_lengths',
     'get_sentences_from_document',
     'get_words_from_document',
     'merge_on_whitespace_tab_newline',
@@ -15,4 +21,7 @@ __all__ = [
     'words_augmentation',
     'words_refinement',
     'chat_with_model',
+    'chat_with_model_batch',
+    'get_llm_engine',
+    'LLMRequestEngine',
 ]
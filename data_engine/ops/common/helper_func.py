@@ -3,6 +3,9 @@
 # --------------------------------------------------------
 from typing import Dict
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import regex as re
 
 
@@ -25,6 +28,100 @@ class UnionFind:
         self.parent[px] = self.parent[py] = min(px, py)
 
 
+class ArrayUnionFind:
+    """
+    Union-find over the integer ids [0, size) backed by a NumPy parent
+    array. Edges are unioned in vectorized rounds, and the root of each set
+    is always its smallest id, the same as UnionFind above.
+    """
+
+    def __init__(self, size):
+        """Initialization method."""
+        self.parent = np.arange(size, dtype=np.int64)
+
+    def _compress(self):
+        # pointer jumping until every id points to its root directly
+        while True:
+            grand_parent = self.parent[self.parent]
+            if np.array_equal(grand_parent, self.parent):
+                return
+            self.parent = grand_parent
+
+    def union(self, x, y):
+        """
+        Union the sets of ids x[i] and y[i] for each i.
+
+        :param x: ids of one side of the edges
+        :param y: ids of the other side of the edges
+        """
+        x = np.asarray(x, dtype=np.int64).ravel()
+        y = np.asarray(y, dtype=np.int64).ravel()
+        while len(x) > 0:
+            self._compress()
+            px, py = self.parent[x], self.parent[y]
+            diff = px != py
+            if not diff.any():
+                return
+            x, y, px, py = x[diff], y[diff], px[diff], py[diff]
+            # link the larger root to the smallest root it meets
+            np.minimum.at(self.parent, np.maximum(px, py),
+                          np.minimum(px, py))
+
+    def find(self, x=None):
+        """
+        Get the roots of ids.
+
+        :param x: ids to be found. All roots are returned if it's None.
+        :return: root ids
+        """
+        self._compress()
+        if x is None:
+            return self.parent
+        return self.parent[x]
+
+
+def group_exact_duplicates(hash_table, skip_empty=False):
+    """
+    Group the rows of a table by the values of all its columns, e.g. the
+    hash columns computed by exact deduplicators. Values are encoded to
+    integer codes by Arrow and grouped with a NumPy sort, so no Python set
+    of hashes is needed.
+
+    :param hash_table: a pyarrow table of hash columns
+    :param skip_empty: whether to leave out the rows whose values are all
+        null or empty, which are not regarded as duplicates of each other
+    :return: a tuple of three arrays, i.e. the group id of each row (-1 for
+        the skipped rows), and the index of the first row and the number of
+        rows of each group
+    """
+    num_rows = hash_table.num_rows
+    keys = np.zeros(num_rows, dtype=np.int64)
+    is_empty = np.ones(num_rows, dtype=bool)
+    for column in hash_table.columns:
+        column = column.combine_chunks() if isinstance(
+            column, pa.ChunkedArray) else column
+        encoded = pc.dictionary_encode(column)
+        # nulls are encoded as an extra code
+        codes = pc.fill_null(encoded.indices,
+                             len(encoded.dictionary)).to_numpy().astype(
+                                 np.int64)
+        keys = keys * (len(encoded.dictionary) + 1) + codes
+        if skip_empty:
+            is_empty &= ~pc.fill_null(pc.greater(pc.binary_length(column), 0),
+                                      False).to_numpy(zero_copy_only=False)
+    if not skip_empty:
+        is_empty[:] = False
+
+    rows = np.flatnonzero(~is_empty)
+    _, first_ids, inverse, sizes = np.unique(keys[rows],
+                                             return_index=True,
+                                             return_inverse=True,
+                                             return_counts=True)
+    group_ids = np.full(num_rows, -1, dtype=np.int64)
+    group_ids[rows] = inverse
+    return group_ids, rows[first_ids], sizes
+
+
 def strip(document, strip_characters):
     """
     Way faster than document.strip(strip_characters) since strip_characters is
@@ -198,3 +295,57 @@ def get_sentences_from_document(document, model_func=None):
     else:
         sentences = document.splitlines()
     return '\n'.join(sentences)
+
+
+def get_text_lengths(texts):
+    """
+    Get the character lengths of a batch of texts in one pass over an Arrow
+    array instead of calling len() sample by sample.
+
+    :param texts: list of texts
+    :return: an int64 NumPy array of text lengths
+    """
+    lengths = pc.utf8_length(pa.array(texts, type=pa.string()))
+    if lengths.null_count > 0:
+        raise ValueError('Text of None type cannot be processed.')
+    return lengths.to_numpy(zero_copy_only=False).astype(np.int64)
+
+
+def count_chars_in_texts(texts, chars):
+    """
+    Count the occurrences of the given characters in a batch of texts. Only
+    single characters in chars are considered, which keeps the behavior of
+    counting `c in chars` for each character c of a text.
+
+    :param texts: list of texts
+    :param chars: a collection of characters to be counted
+    :return: an int64 NumPy array of counts
+    """
+    single_chars = sorted(c for c in chars if len(c) == 1)
+    if len(single_chars) == 0:
+        return np.zeros(len(texts), dtype=np.int64)
+    pattern = '[' + ''.join('\\x{%x}' % ord(c) for c in single_chars) + ']'
+    counts = pc.count_substring_regex(pa.array(texts, type=pa.string()),
+                                      pattern)
+    if counts.null_count > 0:
+        raise ValueError('Text of None type cannot be processed.')
+    return counts.to_numpy(zero_copy_only=False).astype(np.int64)
+
+
+def get_keep_and_reason(values, min_val, max_val):
+    """
+    Decide for a batch of stats whether each sample is kept by a range
+    filter, and the reason for detailed logging.
+
+    :param values: stats values of the batch
+    :param min_val: the min value of the range
+    :param max_val: the max value of the range
+    :return: a list of keep flags and a list of reasons, one for each value
+    """
+    values = np.asarray(values)
+    below = values < min_val
+    above = values > max_val
+    keep = ~(below | above)
+    reasons = np.where(below, 'below_min', np.where(above, 'above_max',
+                                                    'kept'))
+    return keep.tolist(), reasons.tolist()
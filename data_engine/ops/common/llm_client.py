@@ -1,7 +1,19 @@
-import requests
+import asyncio
 import json
+import os
+import random
+import threading
+import time
 from typing import List, Dict, Any, Optional
 
+import httpx
+from loguru import logger
+
+from data_engine.utils.llm_cache_utils import LLMResponseCache
+
+# status codes worth retrying: rate limited, or temporary server errors
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
 
 def create_headers(auth_token: str) -> Dict[str, str]:
     """
@@ -13,10 +25,11 @@ def create_headers(auth_token: str) -> Dict[str, str]:
     Returns:
         Dict[str, str]: Request headers dictionary
     """
-    return {
-        'Authorization': f'Bearer {auth_token}',
-        'Content-Type': 'application/json'
-    }
+    headers = {'Content-Type': 'application/json'}
+    # an empty bearer token is an illegal header value for httpx
+    if auth_token:
+        headers['Authorization'] = f'Bearer {auth_token}'
+    return headers
 
 
 def create_chat_data(model: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
@@ -72,6 +85,292 @@ def parse_stream_response_line(line: bytes) -> Optional[str]:
     return None
 
 
+class TokenBucket:
+    """
+    Token bucket rate limiter for coroutines on one event loop.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialization method.
+
+        Args:
+            rate (float): Tokens added per second
+            capacity (Optional[float]): Max tokens to burst, same as rate
+                in default
+        """
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LLMRequestEngine:
+    """
+    Engine to send batches of json requests to LLM APIs concurrently.
+
+    Requests are sent by a pooled httpx client on a background event loop,
+    with a limit of requests in flight, an optional token bucket rate limit,
+    and retries with exponential backoff on network errors, rate limiting
+    and temporary server errors. The loop and client are created lazily in
+    each process, so the engine can be used after forking.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = 16,
+                 requests_per_second: Optional[float] = None,
+                 max_retries: int = 3,
+                 backoff_factor: float = 1.0,
+                 timeout: float = 60):
+        """
+        Initialization method.
+
+        Args:
+            max_concurrency (int): Max number of requests in flight
+            requests_per_second (Optional[float]): Max request rate, no
+                limit if it's None
+            max_retries (int): Max number of retries of each request
+            backoff_factor (float): Base seconds of the exponential backoff
+            timeout (float): Timeout in seconds of each request
+        """
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # the loop and client are created again in the unpickled engine
+        return {
+            key: getattr(self, key)
+            for key in [
+                'max_concurrency', 'requests_per_second', 'max_retries',
+                'backoff_factor', 'timeout'
+            ]
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever,
+                             daemon=True).start()
+            self._pid = os.getpid()
+
+            async def init():
+                self._client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_concurrency,
+                        max_keepalive_connections=self.max_concurrency))
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._bucket = TokenBucket(self.requests_per_second) \
+                    if self.requests_per_second else None
+
+            asyncio.run_coroutine_threadsafe(init(), self._loop).result()
+
+    def _get_backoff(self, attempt: int, response=None) -> float:
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return self.backoff_factor * (2**attempt) * (1 + random.random())
+
+    async def _post(self, url: str, payload: Dict[str, Any],
+                    headers: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            response = None
+            try:
+                async with self._semaphore:
+                    response = await self._client.post(url,
+                                                       json=payload,
+                                                       headers=headers)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                error = httpx.HTTPStatusError(
+                    f'Retryable status code {response.status_code}',
+                    request=response.request,
+                    response=response)
+            except (httpx.TimeoutException, httpx.NetworkError,
+                    httpx.RemoteProtocolError) as e:
+                error = e
+            if attempt < self.max_retries:
+                backoff = self._get_backoff(attempt, response)
+                logger.warning(f'Request to {url} failed: {error}, retry in '
+                               f'{backoff:.1f}s ({attempt + 1}/'
+                               f'{self.max_retries}).')
+                await asyncio.sleep(backoff)
+        if response is not None:
+            response.raise_for_status()
+        raise error
+
+    async def _post_all(self, url, payloads, headers):
+        return await asyncio.gather(
+            *[self._post(url, payload, headers) for payload in payloads],
+            return_exceptions=True)
+
+    def post_batch(self,
+                   url: str,
+                   payloads: List[Dict[str, Any]],
+                   headers: Optional[Dict[str, str]] = None,
+                   cache: Optional[LLMResponseCache] = None) -> List[Any]:
+        """
+        Send a batch of json requests concurrently and wait for all of them.
+
+        Args:
+            url (str): API address
+            payloads (List[Dict[str, Any]]): Json bodies of the requests
+            headers (Optional[Dict[str, str]]): Request headers
+            cache (Optional[LLMResponseCache]): Cache of the responses, the
+                cached requests are not sent again
+
+        Returns:
+            List[Any]: Json response of each request in order, or the
+            exception raised by it
+        """
+        if len(payloads) == 0:
+            return []
+        if cache is not None:
+            requests = [{
+                'url': url,
+                'payload': payload
+            } for payload in payloads]
+            results = cache.get_many(requests)
+        else:
+            results = [None] * len(payloads)
+        missed = [idx for idx, result in enumerate(results) if result is None]
+        if missed:
+            self._start()
+            responses = asyncio.run_coroutine_threadsafe(
+                self._post_all(url, [payloads[idx] for idx in missed],
+                               headers), self._loop).result()
+            for idx, response in zip(missed, responses):
+                results[idx] = response
+            if cache is not None:
+                cache.set_many([(requests[idx], results[idx])
+                                for idx in missed
+                                if not isinstance(results[idx], Exception)])
+        return results
+
+
+_ENGINES = {}
+
+
+def get_llm_engine(max_concurrency: int = 16,
+                   requests_per_second: Optional[float] = None,
+                   max_retries: int = 3,
+                   timeout: float = 60) -> LLMRequestEngine:
+    """
+    Get the engine shared by the ops with the same settings.
+
+    Args:
+        max_concurrency (int): Max number of requests in flight
+        requests_per_second (Optional[float]): Max request rate
+        max_retries (int): Max number of retries of each request
+        timeout (float): Timeout in seconds of each request
+
+    Returns:
+        LLMRequestEngine: the shared engine
+    """
+    key = (max_concurrency, requests_per_second, max_retries, timeout)
+    if key not in _ENGINES:
+        _ENGINES[key] = LLMRequestEngine(
+            max_concurrency=max_concurrency,
+            requests_per_second=requests_per_second,
+            max_retries=max_retries,
+            timeout=timeout)
+    return _ENGINES[key]
+
+
+def parse_chat_response(result: Any) -> str:
+    """
+    Get the message content from a chat completion response
+
+    Args:
+        result (Any): Json response, or the exception raised by the request
+
+    Returns:
+        str: Message content
+
+    Raises:
+        Exception: The exception raised by the request, or a KeyError /
+            IndexError if the response is malformed
+    """
+    if isinstance(result, Exception):
+        raise result
+    return result['choices'][0]['message']['content']
+
+
+def chat_with_model_batch(url: str,
+                          auth_token: str,
+                          model: str,
+                          messages_list: List[List[Dict[str, str]]],
+                          engine: Optional[LLMRequestEngine] = None,
+                          cache: Optional[LLMResponseCache] = None,
+                          **params) -> List[Any]:
+    """
+    Chat with model for a batch of conversations concurrently
+
+    Args:
+        url (str): API address
+        auth_token (str): Authentication token for API access
+        model (str): Model name
+        messages_list (List[List[Dict[str, str]]]): Messages list of each
+            conversation
+        engine (Optional[LLMRequestEngine]): Engine to send the requests,
+            the shared default one if it's None
+        cache (Optional[LLMResponseCache]): Cache of the responses
+        params: Extra request params that override the default ones
+
+    Returns:
+        List[Any]: Complete response of each conversation, or the exception
+        raised by it
+    """
+    headers = create_headers(auth_token)
+    payloads = []
+    for messages in messages_list:
+        data = create_chat_data(model, messages)
+        data['stream'] = False
+        data.update(params)
+        payloads.append(data)
+    engine = engine or get_llm_engine()
+    results = []
+    for result in engine.post_batch(url, payloads, headers, cache=cache):
+        try:
+            results.append(parse_chat_response(result))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
 def chat_with_model(url: str, auth_token: str, model: str, messages: List[Dict[str, str]]) -> str:
     """
     Chat with model
@@ -86,19 +385,9 @@ def chat_with_model(url: str, auth_token: str, model: str, messages: List[Dict[s
         str: Complete response returned by the model
 
     Raises:
-        requests.RequestException: Request exception
+        httpx.HTTPError: Request exception
     """
-    headers = create_headers(auth_token)
-    data = create_chat_data(model, messages)
-
-    response = requests.post(url=url, json=data, headers=headers, stream=True)
-    response.raise_for_status()
-
-    contents = []
-    for line in response.iter_lines():
-        if line:
-            content = parse_stream_response_line(line)
-            if content:
-                contents.append(content)
-
-    return ''.join(contents)
+    result = chat_with_model_batch(url, auth_token, model, [messages])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
@@ -0,0 +1,191 @@
+import os
+import tempfile
+
+import numpy as np
+from loguru import logger
+
+# each entry of the store is a (bucket hash, row id) pair of 16 bytes
+ENTRY_DTYPE = np.dtype([('bucket', '<u8'), ('row', '<i8')])
+
+# constants of the 64-bit bucket hash and the splitmix64 finalizer
+HASH_SEED = np.uint64(0x9e3779b97f4a7c15)
+HASH_PRIME = np.uint64(0x100000001b3)
+MIX_CONSTS = (np.uint64(0xbf58476d1ce4e5b9), np.uint64(0x94d049bb133111eb))
+
+
+def hash_band_values(band_values):
+    """
+    Hash the values of a band of each sample to a 64-bit bucket hash.
+
+    :param band_values: an unsigned int array of shape
+        (num_samples, num_rows_per_band)
+    :return: a uint64 array of bucket hashes
+    """
+    hashes = np.full(len(band_values), HASH_SEED, dtype=np.uint64)
+    for col in band_values.T:
+        hashes ^= col.astype(np.uint64)
+        hashes *= HASH_PRIME
+    hashes ^= hashes >> np.uint64(30)
+    hashes *= MIX_CONSTS[0]
+    hashes ^= hashes >> np.uint64(27)
+    hashes *= MIX_CONSTS[1]
+    hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+
+def _get_bucket_edges(entries):
+    """
+    Link every row to the smallest row of its bucket.
+
+    :param entries: entries sorted by bucket, holding complete buckets
+    :return: two arrays of row ids to be unioned
+    """
+    if len(entries) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    buckets, rows = entries['bucket'], entries['row']
+    is_start = np.ones(len(entries), dtype=bool)
+    is_start[1:] = buckets[1:] != buckets[:-1]
+    starts = np.flatnonzero(is_start)
+    firsts = np.minimum.reduceat(rows, starts)
+    return rows, firsts[np.cumsum(is_start) - 1]
+
+
+class LSHBucketStore:
+    """
+    Store of the LSH buckets of all bands with a bounded memory footprint.
+
+    (bucket hash, row id) pairs of each band are buffered in memory. Once
+    the buffers reach the memory budget, they are sorted by bucket and
+    spilled to disk as sorted runs. The runs of a band are merged block by
+    block afterwards to emit the samples sharing buckets, so the peak
+    memory is bounded by the budget rather than the dataset size.
+    """
+
+    def __init__(self, num_bands, memory_budget, spill_dir=None):
+        """
+        Initialization method.
+
+        :param num_bands: number of bands in LSH.
+        :param memory_budget: memory budget in bytes for the buffered and
+            merged entries.
+        :param spill_dir: directory to store the spilled runs. A temporary
+            directory is created if it's None.
+        """
+        self.num_bands = num_bands
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self._temp_dir = None
+        self.buffers = [[] for _ in range(num_bands)]
+        self.buffered_size = 0
+        self.runs = [[] for _ in range(num_bands)]
+
+    def add(self, band_idx, buckets, rows):
+        """
+        Add the buckets of samples in a band.
+
+        :param band_idx: index of the band
+        :param buckets: bucket hashes of the samples
+        :param rows: row ids of the samples
+        """
+        entries = np.empty(len(rows), dtype=ENTRY_DTYPE)
+        entries['bucket'] = buckets
+        entries['row'] = rows
+        self.buffers[band_idx].append(entries)
+        self.buffered_size += entries.nbytes
+        if self.buffered_size >= self.memory_budget:
+            self.spill()
+
+    def _get_spill_dir(self):
+        if self.spill_dir is None:
+            self._temp_dir = tempfile.TemporaryDirectory(prefix='lsh_')
+            self.spill_dir = self._temp_dir.name
+        os.makedirs(self.spill_dir, exist_ok=True)
+        return self.spill_dir
+
+    def _pop_sorted_buffer(self, band_idx):
+        if len(self.buffers[band_idx]) == 0:
+            return np.zeros(0, dtype=ENTRY_DTYPE)
+        entries = np.concatenate(self.buffers[band_idx])
+        self.buffers[band_idx] = []
+        self.buffered_size -= entries.nbytes
+        # stable sort keeps rows ascending within a bucket
+        return entries[np.argsort(entries['bucket'], kind='stable')]
+
+    def spill(self):
+        """Spill the buffered entries of all bands to sorted runs on disk."""
+        spill_dir = self._get_spill_dir()
+        logger.info(f'Spilling {self.buffered_size} bytes of LSH buckets '
+                    f'to [{spill_dir}]...')
+        for band_idx in range(self.num_bands):
+            entries = self._pop_sorted_buffer(band_idx)
+            if len(entries) == 0:
+                continue
+            run_path = os.path.join(
+                spill_dir, f'band_{band_idx}_run_{len(self.runs[band_idx])}.npy')
+            np.save(run_path, entries)
+            self.runs[band_idx].append(run_path)
+        self.buffered_size = 0
+
+    def iter_edges(self, band_idx):
+        """
+        Iterate over the samples sharing buckets in a band.
+
+        :param band_idx: index of the band
+        :return: generator of pairs of row id arrays to be unioned
+        """
+        if len(self.runs[band_idx]) == 0:
+            yield _get_bucket_edges(self._pop_sorted_buffer(band_idx))
+            return
+
+        runs = [np.load(path, mmap_mode='r') for path in self.runs[band_idx]]
+        # the buffered entries form the last run
+        if len(self.buffers[band_idx]) > 0:
+            runs.append(self._pop_sorted_buffer(band_idx))
+        block_size = max(
+            self.memory_budget // ENTRY_DTYPE.itemsize // (len(runs) + 1),
+            1024)
+        positions = [0] * len(runs)
+        pending = [np.zeros(0, dtype=ENTRY_DTYPE) for _ in runs]
+        while True:
+            # load the next block of runs whose pending entries are all in
+            # one bucket, which may continue in the next block
+            for i, run in enumerate(runs):
+                if positions[i] < len(run) and (
+                        len(pending[i]) == 0 or pending[i]['bucket'][0]
+                        == pending[i]['bucket'][-1]):
+                    block = np.asarray(run[positions[i]:positions[i] +
+                                           block_size])
+                    positions[i] += len(block)
+                    pending[i] = np.concatenate([pending[i], block])
+            unfinished = [
+                pending[i]['bucket'][-1] for i, run in enumerate(runs)
+                if positions[i] < len(run)
+            ]
+            if len(unfinished) == 0:
+                merged = np.concatenate(pending)
+                yield _get_bucket_edges(
+                    merged[np.argsort(merged['bucket'], kind='stable')])
+                return
+            # buckets below the bound are complete in the pending entries
+            bound = min(unfinished)
+            complete = []
+            for i in range(len(runs)):
+                split = np.searchsorted(pending[i]['bucket'], bound)
+                complete.append(pending[i][:split])
+                pending[i] = pending[i][split:]
+            merged = np.concatenate(complete)
+            yield _get_bucket_edges(
+                merged[np.argsort(merged['bucket'], kind='stable')])
+
+    def cleanup(self):
+        """Remove the spilled runs."""
+        for band_runs in self.runs:
+            for path in band_runs:
+                if os.path.exists(path):
+                    os.remove(path)
+        self.runs = [[] for _ in range(self.num_bands)]
+        if self._temp_dir is not None:
+            self._temp_dir.cleanup()
+            self._temp_dir = None
+            self.spill_dir = None
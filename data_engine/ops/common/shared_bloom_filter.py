@@ -0,0 +1,229 @@
+import fcntl
+import glob
+import math
+import os
+import tempfile
+import uuid
+import weakref
+
+import numpy as np
+
+# bits are stored in files under the shared memory dir if it's available,
+# so that the pages are shared by all processes that map the files
+SHARED_MEMORY_DIR = '/dev/shm'
+
+MIN_SLICE_BITS = 2**16
+
+BIT_MASKS = (np.uint8(1) << np.arange(8, dtype=np.uint8))
+
+
+def _remove_files(path):
+    # the header file and the files of its slices
+    for file_path in [path] + glob.glob(f'{glob.escape(path)}.*'):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+def _is_prime(num):
+    if num < 2:
+        return False
+    return all(num % i for i in range(2, math.isqrt(num) + 1))
+
+
+def _get_slice_params(capacity, error_rate):
+    # the positions of double hashing collide for about 1 / num_bits**2 of
+    # the items, which dominates the error of small slices, so they get more
+    # bits than the optimum, and a prime number of them to use all bits
+    num_bits = max(
+        math.ceil(-capacity * math.log(error_rate) / math.log(2)**2),
+        MIN_SLICE_BITS)
+    while not _is_prime(num_bits):
+        num_bits += 1
+    num_hashes = max(math.ceil(-math.log2(error_rate)), 1)
+    return num_bits, num_hashes
+
+
+class SharedBloomFilter:
+    """
+    Scalable Bloom filter whose bit arrays are shared by processes.
+
+    The bits live in memory-mapped files, which are attached lazily by each
+    process, e.g. the forked map workers of a dataset. Items are tested and
+    set batch by batch under an exclusive file lock, so an item is only
+    regarded as new by one of the processes.
+
+    When a slice of bits is full, a new one with twice the capacity and half
+    the error rate is added, so the overall error rate stays within the
+    expected one however many items are added. The number of slices and of
+    items in the last one are kept in a header file, from which the other
+    processes find the new slices. The files are removed when the filter in
+    the creating process is garbage collected.
+    """
+
+    def __init__(self, capacity, error_rate=1e-6, path=None):
+        """
+        Initialization method.
+
+        :param capacity: expected number of items. More items can be added,
+            at the cost of more slices to test.
+        :param error_rate: expected false positive rate
+        :param path: path of the header file, beside which the bits are
+            stored. In default, it's a temp file under /dev/shm, or the temp
+            dir if it's unavailable.
+        """
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        if path is None:
+            tmp_dir = SHARED_MEMORY_DIR if os.access(
+                SHARED_MEMORY_DIR, os.W_OK) else tempfile.gettempdir()
+            path = os.path.join(tmp_dir, f'dj_bloom_{uuid.uuid4().hex}.bin')
+        self.path = path
+        # number of slices, and number of items in the last slice
+        with open(self.path, 'wb') as fout:
+            fout.write(np.zeros(2, dtype=np.uint64).tobytes())
+        self._finalizer = weakref.finalize(self, _remove_files, self.path)
+
+        self._header = None
+        self._slices = []
+        self._lock_file = None
+        self._pid = None
+        self._add_slice()
+
+    def __getstate__(self):
+        # the mappings and the files are attached again in other processes,
+        # and only the creating process removes the files
+        state = self.__dict__.copy()
+        state['_header'] = None
+        state['_slices'] = []
+        state['_lock_file'] = None
+        state['_pid'] = None
+        state['_finalizer'] = None
+        return state
+
+    def _get_slice_capacity(self, slice_id):
+        return self.capacity * 2**slice_id
+
+    def _attach(self):
+        if self._pid != os.getpid():
+            self._header = np.memmap(self.path, dtype=np.uint64, mode='r+')
+            self._slices = []
+            self._lock_file = open(self.path, 'rb')
+            self._pid = os.getpid()
+        # attach the slices added by other processes
+        for slice_id in range(len(self._slices), int(self._header[0])):
+            num_bits, num_hashes = _get_slice_params(
+                self._get_slice_capacity(slice_id),
+                self.error_rate / 2**(slice_id + 1))
+            bits = np.memmap(f'{self.path}.{slice_id}',
+                             dtype=np.uint8,
+                             mode='r+')
+            self._slices.append((bits, num_bits, num_hashes))
+        return self._slices
+
+    def _add_slice(self):
+        # called in the creating process, or with the lock held
+        self._attach()
+        slice_id = int(self._header[0])
+        num_bits, _ = _get_slice_params(self._get_slice_capacity(slice_id),
+                                        self.error_rate / 2**(slice_id + 1))
+        with open(f'{self.path}.{slice_id}', 'wb') as fout:
+            fout.truncate((num_bits + 7) // 8)
+        self._header[:] = [slice_id + 1, 0]
+        self._attach()
+
+    @staticmethod
+    def _locate(hashes, num_bits, num_hashes):
+        # enhanced double hashing with two 64-bit values taken from each
+        # digest, which are reduced first so that the products don't
+        # overflow. The cubic term keeps the positions of items whose
+        # starts are shifted by their stride apart.
+        num_bits = np.uint64(num_bits)
+        starts = hashes[:, :1] % num_bits
+        strides = hashes[:, 1:] % (num_bits - np.uint64(1)) + np.uint64(1)
+        steps = np.arange(num_hashes, dtype=np.uint64)
+        offsets = (steps**3 - steps) // np.uint64(6) % num_bits
+        positions = (starts + steps * strides + offsets) % num_bits
+        byte_ids = (positions >> np.uint64(3)).astype(np.int64)
+        bit_masks = BIT_MASKS[(positions & np.uint64(7)).astype(np.int64)]
+        return byte_ids, bit_masks
+
+    @staticmethod
+    def _get_hashes(digests):
+        buffer = b''.join(digest[:16] for digest in digests)
+        return np.frombuffer(buffer, dtype='<u8').reshape(-1, 2)
+
+    def _test(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for bits, num_bits, num_hashes in self._slices:
+            byte_ids, bit_masks = self._locate(hashes, num_bits, num_hashes)
+            found |= np.all(bits[byte_ids] & bit_masks, axis=1)
+        return found
+
+    def add_many(self, digests):
+        """
+        Test and add items to the filter.
+
+        :param digests: list of digests of items, each of which should be
+            at least 16 bytes, e.g. md5, sha256 or xxh3_128 digests
+        :return: a bool array of whether each item was already in the
+            filter, including items seen earlier in the same batch
+        """
+        if len(digests) == 0:
+            return np.zeros(0, dtype=bool)
+        hashes = self._get_hashes(digests)
+
+        # repeated items of the batch are duplicates of their first ones
+        _, first_ids = np.unique(hashes, axis=0, return_index=True)
+        is_duplicate = np.ones(len(digests), dtype=bool)
+        is_duplicate[first_ids] = False
+
+        self._attach()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            self._attach()
+            is_duplicate |= self._test(hashes)
+            new_hashes = hashes[~is_duplicate]
+            while len(new_hashes) > 0:
+                num_items = int(self._header[1])
+                room = self._get_slice_capacity(len(self._slices) -
+                                                1) - num_items
+                if room <= 0:
+                    self._add_slice()
+                    continue
+                bits, num_bits, num_hashes = self._slices[-1]
+                byte_ids, bit_masks = self._locate(new_hashes[:room],
+                                                   num_bits, num_hashes)
+                np.bitwise_or.at(bits, byte_ids.ravel(), bit_masks.ravel())
+                self._header[1] = num_items + len(byte_ids)
+                new_hashes = new_hashes[room:]
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        return is_duplicate
+
+    def add(self, digest):
+        """
+        Test and add an item to the filter.
+
+        :param digest: digest of the item
+        :return: whether the item was already in the filter
+        """
+        return bool(self.add_many([digest])[0])
+
+    def __contains__(self, digest):
+        self._attach()
+        return bool(self._test(self._get_hashes([digest]))[0])
+
+    def close(self):
+        """Remove the files of the filter."""
+        self._header = None
+        self._slices = []
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._pid = None
+        if self._finalizer is not None:
+            self._finalizer()
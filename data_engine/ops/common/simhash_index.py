@@ -0,0 +1,109 @@
+from itertools import combinations
+
+import numpy as np
+
+# masks of the SWAR popcount of 64-bit integers
+POPCOUNT_MASKS = (np.uint64(0x5555555555555555),
+                  np.uint64(0x3333333333333333),
+                  np.uint64(0x0f0f0f0f0f0f0f0f))
+POPCOUNT_MULTIPLIER = np.uint64(0x0101010101010101)
+
+
+def popcount64(values):
+    """
+    Count the set bits of each value of a uint64 array.
+
+    :param values: a uint64 array
+    :return: an int64 array of the numbers of set bits
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    values = values - ((values >> np.uint64(1)) & POPCOUNT_MASKS[0])
+    values = (values & POPCOUNT_MASKS[1]) + (
+        (values >> np.uint64(2)) & POPCOUNT_MASKS[1])
+    values = (values + (values >> np.uint64(4))) & POPCOUNT_MASKS[2]
+    return ((values * POPCOUNT_MULTIPLIER) >> np.uint64(56)).astype(np.int64)
+
+
+def get_block_masks(num_blocks):
+    """
+    Split the 64 bits of fingerprints into blocks as even as possible.
+
+    :param num_blocks: number of blocks
+    :return: list of uint64 masks of the blocks
+    """
+    bounds = np.linspace(0, 64, num_blocks + 1).astype(int)
+    masks = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        width = int(end - start)
+        masks.append(np.uint64(((1 << width) - 1) << int(start)))
+    return masks
+
+
+def _get_candidate_pairs(keys):
+    """
+    Get all pairs of positions with the same key in a sorted key array.
+
+    :param keys: a sorted array
+    :return: two arrays of positions of the pairs
+    """
+    left, right = [], []
+    # positions that still have a successor with the same key at offset d
+    active = np.flatnonzero(keys[1:] == keys[:-1])
+    offset = 1
+    while len(active) > 0:
+        left.append(active)
+        right.append(active + offset)
+        offset += 1
+        active = active[active + offset < len(keys)]
+        active = active[keys[active] == keys[active + offset]]
+    if not left:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(left), np.concatenate(right)
+
+
+def find_simhash_matches(fingerprints, num_blocks, hamming_distance):
+    """
+    Find all pairs of distinct SimHash fingerprints within a Hamming
+    distance, with sorted permuted-block tables.
+
+    Fingerprints are split into `num_blocks` blocks. Two fingerprints within
+    the distance share at least `num_blocks - hamming_distance` identical
+    blocks, so they are adjacent in the table sorted by these blocks. Each
+    combination of blocks forms a table, and the candidate pairs of each
+    table are verified by their real Hamming distances.
+
+    :param fingerprints: a uint64 array of distinct fingerprints
+    :param num_blocks: number of blocks, which should be larger than
+        hamming_distance
+    :param hamming_distance: the max Hamming distance of matches
+    :return: an int64 array of shape (num_matches, 2), holding the
+        positions of the matched fingerprints, with the smaller one first
+    """
+    if num_blocks <= hamming_distance:
+        raise ValueError(f'num_blocks [{num_blocks}] should be larger than '
+                         f'hamming_distance [{hamming_distance}].')
+    fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+    block_masks = get_block_masks(num_blocks)
+    matches = []
+    for blocks in combinations(block_masks,
+                               num_blocks - hamming_distance):
+        mask = np.bitwise_or.reduce(np.array(blocks, dtype=np.uint64))
+        keys = fingerprints & mask
+        order = np.argsort(keys, kind='stable')
+        left, right = _get_candidate_pairs(keys[order])
+        if len(left) == 0:
+            continue
+        left, right = order[left], order[right]
+        distances = popcount64(fingerprints[left] ^ fingerprints[right])
+        is_match = distances <= hamming_distance
+        matches.append(
+            np.stack([
+                np.minimum(left[is_match], right[is_match]),
+                np.maximum(left[is_match], right[is_match])
+            ],
+                     axis=1))
+    if not matches:
+        return np.zeros((0, 2), dtype=np.int64)
+    # pairs sharing several combinations of blocks are found more than once
+    return np.unique(np.concatenate(matches).astype(np.int64), axis=0)
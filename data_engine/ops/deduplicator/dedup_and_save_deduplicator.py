@@ -1,13 +1,40 @@
-import networkx as nx
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from loguru import logger
 
 from data_engine.utils.constant import HashKeys, Fields, StatsKeys
 from ..base_op import OPERATORS, Deduplicator, Sample, Param, DataType
+from ..common.helper_func import ArrayUnionFind
 
 OP_NAME = 'dedup_and_save_deduplicator'
 
 
+def _flatten_neighbours(column):
+    """
+    Flatten a list column of neighbours into the row and the position in
+    the row of each neighbour. For nested lists like [[1, 2]], only the
+    first inner list of each row is used.
+
+    :param column: arrow list array of a batch
+    :return: arrays of rows, positions and values
+    """
+    rows = np.arange(len(column))
+    if pa.types.is_list(column.type.value_type):
+        inner = pc.list_flatten(column)
+        parents = pc.list_parent_indices(column).to_numpy()
+        first = np.ones(len(parents), dtype=bool)
+        first[1:] = parents[1:] != parents[:-1]
+        column = inner.filter(pa.array(first))
+        rows = parents[first]
+    values = pc.list_flatten(column).to_numpy(zero_copy_only=False)
+    parents = pc.list_parent_indices(column).to_numpy()
+    lengths = pc.list_value_length(column).fill_null(0).to_numpy()
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    positions = np.arange(len(values)) - starts[parents]
+    return rows[parents], positions, values
+
+
 @OPERATORS.register_module(OP_NAME)
 class DedupAndSaveDeduplicator(Deduplicator):
     """
@@ -54,41 +81,44 @@ class DedupAndSaveDeduplicator(Deduplicator):
                 self._log_dedup_summary(original_size, original_size, 0, 0)
             return dataset, {}
 
-        # Convert dataset to pandas DataFrame for easier graph processing
-        df = dataset.to_pandas()
         print(f"[dedup_and_save_deduplicator] Processing similarity graph with threshold: {self.similarity_threshold}")
 
-        # Create a graph and add all samples as nodes
-        G = nx.Graph()
-        G.add_nodes_from(df.index)
-
-        # Build the graph by adding edges between similar samples
-        for index, row in df.iterrows():
-            indices = row.get(self.nn_indices_key, [])
-            scores = row.get(self.nn_scores_key, [])
-
-            # ([[1, 2]] -> [1, 2])
-            # ([[1, 2][4, 5] -> [1,2])
-            if (hasattr(indices, 'size') and indices.size > 0 or isinstance(indices, list) and len(indices) > 0) and isinstance(indices[0], (list, np.ndarray)):
-                indices = indices[0]
-            if (hasattr(scores, 'size') and scores.size > 0 or isinstance(scores, list) and len(scores) > 0) and isinstance(scores[0], (list, np.ndarray)):
-                scores = scores[0]
+        # Collect the edges between similar samples batch by batch, with
+        # the neighbour columns read as arrow arrays
+        num_rows = len(dataset)
+        src_list, dst_list = [], []
+        offset = 0
+        columns = [self.nn_indices_key, self.nn_scores_key]
+        for table in dataset.select_columns(columns).with_format(
+                'arrow').iter(batch_size=self.batch_size):
+            idx_rows, idx_pos, indices = _flatten_neighbours(
+                table.column(self.nn_indices_key).combine_chunks())
+            score_rows, score_pos, scores = _flatten_neighbours(
+                table.column(self.nn_scores_key).combine_chunks())
+            # pair the indices and scores of each row like zip
+            num_pairs = np.minimum(
+                np.bincount(idx_rows, minlength=table.num_rows),
+                np.bincount(score_rows, minlength=table.num_rows))
+            idx_mask = idx_pos < num_pairs[idx_rows]
+            score_mask = score_pos < num_pairs[score_rows]
+            rows = idx_rows[idx_mask] + offset
+            indices = indices[idx_mask].astype(np.int64)
+            scores = scores[score_mask]
+            mask = (scores >= self.similarity_threshold) & (indices >= 0) & (
+                indices < num_rows)
+            src_list.append(rows[mask])
+            dst_list.append(indices[mask])
+            offset += table.num_rows
+        src = np.concatenate(src_list) if src_list else np.empty(0, np.int64)
+        dst = np.concatenate(dst_list) if dst_list else np.empty(0, np.int64)
 
-            for neighbor_idx, score in zip(indices, scores):
-                # Cast numpy numeric types to native python int to avoid hash errors
-                neighbor_idx = int(neighbor_idx)
-                if score >= self.similarity_threshold and neighbor_idx in df.index:
-                    G.add_edge(index, neighbor_idx)
-
-        # Find all connected components in the graph
-        connected_components = list(nx.connected_components(G))
-
-        # For each component, keep only the sample with the minimum index
-        to_keep_indices = {min(component) for component in connected_components}
-
-        # The indices in `to_keep_indices` are DataFrame indices, which are the original
-        # integer positions. We can use them directly with `dataset.select`.
-        indices_to_keep = sorted(list(to_keep_indices))
+        # For each connected component, keep only the sample with the
+        # minimum index, which is its root
+        union_find = ArrayUnionFind(num_rows)
+        union_find.union(src, dst)
+        labels = union_find.find()
+        indices_to_keep = np.flatnonzero(labels == np.arange(num_rows))
+        num_components = len(indices_to_keep)
 
         # Filter the original dataset to keep only the selected samples
         filtered_dataset = dataset.select(indices_to_keep)
@@ -97,33 +127,47 @@ class DedupAndSaveDeduplicator(Deduplicator):
         # For tracing, sample some duplicate pairs from components with more than one member
         dup_pairs = {}
         if show_num > 0:
-            processed_components = 0
-            for component in connected_components:
-                if len(component) > 1 and processed_components < show_num:
-                    sorted_component = sorted(list(component))
-                    group_key = f"group_{sorted_component[0]}"
-                    dup_pairs[group_key] = [dataset[i] for i in sorted_component[:2]]
-                    processed_components += 1
-
-        print(f"[dedup_and_save_deduplicator] Found {len(connected_components)} connected components")
-
-        # Unified processing of field filtering - Move the specified field to stats
-        def move_fields_to_stats(sample):
-            if Fields.stats not in sample:
-                sample[Fields.stats] = {}
-
-            # move_the_specified_field_to_stats
-            for field in self.fields_to_filter:
-                if field in sample:
-                    # Obtain the corresponding StatsKeys constant based on the field name
-                    stats_key = getattr(StatsKeys, field, field)
-                    sample[Fields.stats][stats_key] = sample[field]
-                    del sample[field]
-            
-            return sample
+            sizes = np.bincount(labels, minlength=num_rows)
+            for label in np.flatnonzero(sizes > 1)[:show_num]:
+                members = np.flatnonzero(labels == label)[:2]
+                dup_pairs[f"group_{label}"] = [
+                    dataset[int(i)] for i in members
+                ]
+
+        print(f"[dedup_and_save_deduplicator] Found {num_components} connected components")
+
+        # Unified processing of field filtering - Move the specified field
+        # to stats, column by column
+        def move_fields_to_stats(table):
+            fields = [f for f in self.fields_to_filter if f in table.column_names]
+            if not fields:
+                return table
+            names, arrays = [], []
+            if Fields.stats in table.column_names:
+                stats = table.column(Fields.stats).combine_chunks()
+                for i, field in enumerate(stats.type):
+                    names.append(field.name)
+                    arrays.append(stats.field(i))
+                table = table.drop([Fields.stats])
+            for field in fields:
+                # Obtain the corresponding StatsKeys constant based on the field name
+                stats_key = getattr(StatsKeys, field, field)
+                column = table.column(field).combine_chunks()
+                if stats_key in names:
+                    arrays[names.index(stats_key)] = column
+                else:
+                    names.append(stats_key)
+                    arrays.append(column)
+            table = table.drop(fields)
+            return table.append_column(
+                Fields.stats, pa.StructArray.from_arrays(arrays, names=names))
 
         # applicationFieldFiltering
-        final_dataset = filtered_dataset.map(move_fields_to_stats)
+        final_dataset = type(filtered_dataset)(filtered_dataset.with_format(
+            'arrow').map(move_fields_to_stats,
+                         batched=True,
+                         batch_size=self.batch_size,
+                         desc='move_fields_to_stats').with_format(None))
         print(f"[dedup_and_save_deduplicator] Filtered fields {self.fields_to_filter} to stats")
         
         # Generate detailed logging if enabled
@@ -131,7 +175,7 @@ class DedupAndSaveDeduplicator(Deduplicator):
             deduplicated_size = len(final_dataset)
             self._log_dedup_summary(original_size, deduplicated_size,
                                    original_size - deduplicated_size,
-                                   len(connected_components))
+                                   num_components)
         
         return final_dataset, dup_pairs
 
@@ -4,14 +4,48 @@
 
 import hashlib
 import string
-from collections import defaultdict
-from typing import Dict, Set
 
+import numpy as np
 import regex as re
 
 from data_engine.utils.constant import HashKeys
 
 from ..base_op import OPERATORS, Deduplicator, Sample, Param, DataType
+from ..common.helper_func import group_exact_duplicates
+
+
+def dedup_by_hash_columns(dataset, hash_keys, show_num=0, skip_empty=False):
+    """
+    Keep the first sample of each group of samples with the same values of
+    hash columns. The first samples are found with a sort over the columns,
+    and selected all at once, so no filter with shared state is needed.
+
+    :param dataset: input dataset
+    :param hash_keys: names of the hash columns
+    :param show_num: number of traced duplicate pairs
+    :param skip_empty: whether to keep all the samples with empty hashes
+    :return: deduplicated dataset, the sampled duplicate pairs, and the
+        number of samples of each group
+    """
+    hash_table = dataset.select_columns(hash_keys).with_format('arrow')[:]
+    group_ids, first_ids, group_sizes = group_exact_duplicates(
+        hash_table, skip_empty=skip_empty)
+
+    dup_pairs = {}
+    if show_num > 0:
+        # sample duplicate pairs from the largest groups
+        for group_id in np.argsort(-group_sizes,
+                                   kind='stable')[:show_num].tolist():
+            if group_sizes[group_id] <= 1:
+                break
+            sids = np.flatnonzero(group_ids == group_id)[:2].tolist()
+            samples = [dataset[sid] for sid in sids]
+            hash_val = tuple(samples[0][key] for key in hash_keys)
+            dup_pairs[hash_val[0] if len(hash_keys) == 1 else hash_val] = \
+                samples
+
+    keep_ids = np.concatenate([first_ids, np.flatnonzero(group_ids < 0)])
+    return dataset.select(np.sort(keep_ids)), dup_pairs, group_sizes
 
 
 @OPERATORS.register_module('document_deduplicator')
@@ -83,49 +117,19 @@ class DocumentDeduplicator(Deduplicator):
         # no need to deduplicate because too few samples
         if len(dataset) <= 1:
             if getattr(self, 'enable_detailed_logging', False):
-                self._log_dedup_summary(original_size, original_size, 0, {})
+                self._log_dedup_summary(original_size, original_size, 0,
+                                        np.ones(original_size, dtype=np.int64))
             return dataset, {}
 
-        dup_hashes = None
-        hash2ids: Dict[int, Set[int]] = defaultdict(set)
-        
-        # Build hash to sample IDs mapping
-        for sid, hash_val in enumerate(dataset[HashKeys.hash]):
-            hash2ids[hash_val].add(sid)
-        
-        if show_num > 0:
-            # sample duplicate pairs
-            dup_samples = sorted(list(hash2ids.items()),
-                                 key=lambda x: len(x[1]),
-                                 reverse=True)
-            dup_hashes = set([
-                item[0] for item in dup_samples if len(item[1]) > 1
-            ][:show_num])
-
-        def _filter_dup_helper(sample, hashes):
-            hash = sample[HashKeys.hash]
-            if show_num > 0 and hash in dup_hashes \
-                    and len(dup_pairs[hash]) < 2:
-                # tracer is open and not enough duplicate sample pairs
-                dup_pairs[hash].append(sample)
-            if hash in hashes:
-                return False
-            else:
-                hashes.add(hash)
-                return True
-
-        hashes = set()
-        dup_pairs = {hash_v: [] for hash_v in dup_hashes} if dup_hashes else {}
-        dataset = dataset.filter(
-            _filter_dup_helper,
-            fn_kwargs=dict(hashes=hashes),
-            load_from_cache_file=False if show_num > 0 else True)  # num_proc=1
-        
+        dataset, dup_pairs, group_sizes = dedup_by_hash_columns(
+            dataset, [HashKeys.hash], show_num)
+
         # Generate detailed logging if enabled
         if getattr(self, 'enable_detailed_logging', False):
             deduplicated_size = len(dataset)
             self._log_dedup_summary(original_size, deduplicated_size, 
-                                   original_size - deduplicated_size, hash2ids)
+                                   original_size - deduplicated_size,
+                                   group_sizes)
         
         return dataset, dup_pairs
 
@@ -162,25 +166,25 @@ class DocumentDeduplicator(Deduplicator):
             Param("ignore_non_character", DataType.BOOLEAN, None, False)
         ]
     
-    def _log_dedup_summary(self, total, kept, removed, hash2ids):
+    def _log_dedup_summary(self, total, kept, removed, group_sizes):
         """
         Generate and log summary statistics for deduplication.
         
         :param total: Total number of documents before deduplication
         :param kept: Number of unique documents kept
         :param removed: Number of duplicate documents removed
-        :param hash2ids: Mapping from hash values to document IDs
+        :param group_sizes: Number of documents of each hash value
         """
         try:
             from loguru import logger
             from data_server.log_tools.tools import insert_pipline_job_run_task_log_info
             
             # Calculate statistics
-            unique_hashes = len(hash2ids)
-            duplicate_groups = sum(1 for ids in hash2ids.values() if len(ids) > 1)
+            unique_hashes = len(group_sizes)
+            duplicate_groups = int(np.count_nonzero(group_sizes > 1))
             
             # Find largest duplicate group
-            max_dup_count = max((len(ids) for ids in hash2ids.values()), default=0)
+            max_dup_count = int(np.max(group_sizes, initial=0))
             
             # Output logs line by line for better display in UI
             self._log_line("="*60)
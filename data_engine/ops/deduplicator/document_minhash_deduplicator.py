@@ -2,22 +2,22 @@
 # https://github.com/bigcode-project/bigcode-dataset/blob/main/near_deduplication/minhash_deduplication.py
 # --------------------------------------------------------
 
-import hashlib
-import struct
-from collections import defaultdict
-
 import numpy as np
+import pyarrow.compute as pc
 import regex
+import xxhash
 from jsonargparse.typing import ClosedUnitInterval, PositiveInt
 from loguru import logger
 from tqdm import tqdm
 
 from data_engine.utils.availability_utils import AvailabilityChecking
 from data_engine.utils.constant import HashKeys
+from data_engine.utils.mm_utils import size_to_bytes
 from data_engine.utils.model_utils import prepare_sentencepiece_model
 
 from ..base_op import OPERATORS, Deduplicator, Sample, Param, DataType
-from ..common.helper_func import UnionFind, split_on_whitespace
+from ..common.helper_func import ArrayUnionFind, split_on_whitespace
+from ..common.lsh_bucket_store import LSHBucketStore, hash_band_values
 
 OP_NAME = 'document_minhash_deduplicator'
 
@@ -27,20 +27,22 @@ with AvailabilityChecking(['scipy'], OP_NAME):
 MERSENNE_PRIME = np.uint64((1 << 61) - 1)
 MAX_HASH = np.uint64((1 << 32) - 1)
 
+# max number of shingles permuted at once, bounding the temporary
+# (shingles x permutations) matrix
+PERMUTE_CHUNK_SIZE = 4096
 
-def sha1_hash32(data):
-    """
-    Directly taken from datasketch package to avoid dependency.
 
-    Parameters
-    ----------
-    data : bytes
+def hash_tokens32(tokens):
+    """
+    Hash a batch of byte strings to 32-bit values with xxhash, collected
+    into a NumPy array in one pass.
 
-    Returns
-    -------
-    int
+    :param tokens: list of bytes
+    :return: a uint64 NumPy array of 32-bit hash values
     """
-    return struct.unpack('<I', hashlib.sha1(data).digest()[:4])[0]
+    return np.fromiter(map(xxhash.xxh32_intdigest, tokens),
+                       dtype=np.uint64,
+                       count=len(tokens))
 
 
 def optimal_param(
@@ -104,6 +106,8 @@ class DocumentMinhashDeduplicator(Deduplicator):
     kept in the final dataset.
     """
 
+    _batched_op = True
+
     def __init__(
         self,
         tokenization: str = 'space',
@@ -115,6 +119,8 @@ class DocumentMinhashDeduplicator(Deduplicator):
         num_bands: PositiveInt = None,
         num_rows_per_band: PositiveInt = None,
         tokenizer_model: str = None,
+        memory_budget: str = '1GB',
+        spill_dir: str = None,
         *args,
         **kwargs,
     ):
@@ -148,6 +154,10 @@ class DocumentMinhashDeduplicator(Deduplicator):
             params computation algorithm
         :param tokenizer_model: path for the sentencepiece model, used for
             sentencepiece tokenization.
+        :param memory_budget: memory budget of the LSH buckets, e.g. '1GB'.
+            Buckets beyond it are spilled to sorted runs on disk.
+        :param spill_dir: directory to store the spilled LSH buckets. A
+            temporary directory is used if it's None.
         """
         super().__init__(*args, **kwargs)
         # about minhash computation
@@ -178,6 +188,8 @@ class DocumentMinhashDeduplicator(Deduplicator):
         self.jaccard_threshold = jaccard_threshold
         self.num_bands = num_bands
         self.num_rows_per_band = num_rows_per_band
+        self.memory_budget = size_to_bytes(str(memory_budget))
+        self.spill_dir = spill_dir
 
         # initialize deduplication parameters
         # check number of bands and rows
@@ -187,11 +199,10 @@ class DocumentMinhashDeduplicator(Deduplicator):
                 self.num_permutation,
             )
 
-        # compute hash ranges and create hash tables
+        # compute hash ranges of bands
         self.hash_ranges = [(i * self.num_rows_per_band,
                              (i + 1) * self.num_rows_per_band)
                             for i in range(self.num_bands)]
-        self.hash_tables = [defaultdict(set) for _ in range(self.num_bands)]
 
         # generate permutations
         gen = np.random.RandomState(seed=42)
@@ -206,26 +217,19 @@ class DocumentMinhashDeduplicator(Deduplicator):
         # Enable detailed logging for this deduplicator
         self.enable_detailed_logging = True
 
-    def compute_hash(self, sample):
+    def _get_tokens(self, text):
         """
-        Compute minhash values for the sample.
+        Get the set of shingles of a text.
 
-        :param sample: input sample
-        :return: sample with minhash value.
+        :param text: input text
+        :return: set of shingles in bytes
         """
-        # check if it's computed already
-        if HashKeys.minhash in sample:
-            return sample
-
-        text = sample[self.text_key]
-
         if self.lowercase:
             text = text.lower()
         if self.ignore_pattern:
             text = self.ignore_pattern.sub('', text)
 
         # get tokens for different tokenization method
-        tokens = set()
         if self.tokenization == 'character':
             tokens = {
                 str.encode(text[i:i + self.window_size])
@@ -252,23 +256,82 @@ class DocumentMinhashDeduplicator(Deduplicator):
         else:
             raise NotImplementedError(
                 f'Unimplemented tokenization method [{self.tokenization}]')
+        return tokens
+
+    def _get_minhash(self, hv):
+        """
+        Apply the permutations to the shingle hashes of a document and take
+        the min values. Permutations are broadcast over chunks of shingles
+        instead of tiling a full (num_tokens x num_perm) matrix.
+
+        :param hv: 32-bit hash values of the shingles
+        :return: minhash values of the document
+        """
+        hash_values = np.full(self.num_permutation, MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hv), PERMUTE_CHUNK_SIZE):
+            chunk = hv[start:start + PERMUTE_CHUNK_SIZE, np.newaxis]
+            phv = np.bitwise_and(
+                (chunk * self.perm_a + self.perm_b) % MERSENNE_PRIME,
+                MAX_HASH)
+            np.minimum(hash_values, phv.min(axis=0), out=hash_values)
+        return hash_values
+
+    def compute_hash(self, samples):
+        """
+        Compute minhash values for the samples.
 
-        # compute minhash value
-        hv = np.array([sha1_hash32(token) for token in tokens],
-                      dtype=np.uint64)
-        phv = np.bitwise_and(
-            ((hv * np.tile(self.perm_a,
-                           (len(hv), 1)).T).T + self.perm_b) % MERSENNE_PRIME,
-            MAX_HASH)
-        hash_values = np.vstack([
-            phv,
-            np.ones(self.num_permutation, dtype=np.uint64) * MAX_HASH
-        ]).min(axis=0)
-        sample[HashKeys.minhash] = [
-            bytes(hash_values[start:end].byteswap().data)
-            for start, end in self.hash_ranges
+        :param samples: input samples
+        :return: samples with minhash values.
+        """
+        # check if it's computed already
+        if HashKeys.minhash in samples:
+            return samples
+
+        tokens_list = [
+            list(self._get_tokens(text)) for text in samples[self.text_key]
         ]
-        return sample
+        # hash the shingles of the whole batch at once
+        hv = hash_tokens32(
+            [token for tokens in tokens_list for token in tokens])
+        ends = np.cumsum([len(tokens) for tokens in tokens_list],
+                         dtype=np.int64)
+        starts = ends - [len(tokens) for tokens in tokens_list]
+
+        minhashes = []
+        for doc_start, doc_end in zip(starts, ends):
+            # minhash values are 32-bit, so they are stored as 4 bytes
+            hash_values = self._get_minhash(
+                hv[doc_start:doc_end]).astype('>u4')
+            minhashes.append([
+                hash_values[start:end].tobytes()
+                for start, end in self.hash_ranges
+            ])
+        samples[HashKeys.minhash] = minhashes
+        return samples
+
+    def _get_band_values(self, minhashes, band_idx):
+        """
+        Get the minhash values of a band for a batch of samples from the
+        Arrow column, without converting the column to Python objects.
+
+        :param minhashes: the minhash column in Arrow
+        :param band_idx: index of the band
+        :return: an array of shape (num_samples, num_rows_per_band)
+        """
+        band_values = []
+        for chunk in minhashes.chunks:
+            if len(chunk) == 0:
+                continue
+            band = pc.list_element(chunk, band_idx)
+            offsets = np.frombuffer(band.buffers()[1],
+                                    dtype=np.int32,
+                                    count=len(band) + 1,
+                                    offset=band.offset * 4)
+            data = np.frombuffer(band.buffers()[2],
+                                 dtype=np.uint8)[offsets[0]:offsets[-1]]
+            band_values.append(
+                data.view('>u4').reshape(len(band), self.num_rows_per_band))
+        return np.concatenate(band_values)
 
     def process(self, dataset, show_num=0):
         """
@@ -288,44 +351,55 @@ class DocumentMinhashDeduplicator(Deduplicator):
                 self._log_dedup_summary(original_size, original_size, 0, 0)
             return dataset, {}
 
-        minhashes = dataset[HashKeys.minhash]
+        logger.info(f'Start clustering for {len(dataset)} samples...')
+        minhash_dataset = dataset.select_columns([HashKeys.minhash
+                                                  ]).with_format('arrow')
         # remove bytes minhash column otherwise unexpected error would occur
         # when exporting the processed dataset
         dataset = dataset.remove_columns([HashKeys.minhash])
 
-        # make clusters -- construct the minhash lookup tables of seg to ids
-        logger.info(f'Start clustering for {len(dataset)} samples...')
-        batch_size = 10000
-        for i in tqdm(range(0, len(minhashes), batch_size),
-                      dynamic_ncols=True,
-                      desc='Iterating MinHashes of samples...'):
-            batch = minhashes[i:i + batch_size]
-            for idx, hs in enumerate(batch):
-                for h, hashtable in zip(hs, self.hash_tables):
-                    hashtable[h].add(idx + i)
-
-        # using UnionFind set to union samples within the same clusters
-        union_find = UnionFind()
-        for table in tqdm(self.hash_tables,
-                          dynamic_ncols=True,
-                          desc='Clustering'):
-            for cluster in table.values():
-                if len(cluster) <= 1:
-                    continue
-                idx = min(cluster)
-                for x in cluster:
-                    union_find.union(x, idx)
-        
-        num_clusters = len(set(union_find.parent.values()))
+        bucket_store = LSHBucketStore(self.num_bands, self.memory_budget,
+                                      self.spill_dir)
+        union_find = ArrayUnionFind(len(dataset))
+        try:
+            # put the LSH buckets of all bands into the bucket store batch by
+            # batch, so that the minhash column is never fully loaded
+            row_offset = 0
+            batch_size = 10000
+            for table in tqdm(minhash_dataset.iter(batch_size=batch_size),
+                              total=(len(dataset) - 1) // batch_size + 1,
+                              dynamic_ncols=True,
+                              desc='Iterating MinHashes of samples...'):
+                minhashes = table.column(HashKeys.minhash)
+                rows = np.arange(row_offset, row_offset + len(table))
+                for band_idx in range(self.num_bands):
+                    band_values = self._get_band_values(minhashes, band_idx)
+                    bucket_store.add(band_idx, hash_band_values(band_values),
+                                     rows)
+                row_offset += len(table)
+
+            # make clusters -- samples in the same bucket of a band are
+            # unioned with the first (smallest) sample of the bucket
+            for band_idx in tqdm(range(self.num_bands),
+                                 dynamic_ncols=True,
+                                 desc='Clustering'):
+                for rows, firsts in bucket_store.iter_edges(band_idx):
+                    union_find.union(rows, firsts)
+        finally:
+            bucket_store.cleanup()
+
+        roots = union_find.find()
+        num_clusters = int(
+            np.count_nonzero(np.bincount(roots, minlength=len(roots)) > 1))
         logger.info(f'There are {num_clusters} '
                     f'clusters that includes multiple near-duplicate samples.')
 
         # record the duplicate sample pairs
         dup_pairs = {}
         if show_num > 0:
-            for i in range(len(dataset)):
-                cluster_idx = union_find.find(i)
-                if cluster_idx not in dup_pairs and cluster_idx != i:
+            for i in np.flatnonzero(roots != np.arange(len(roots))).tolist():
+                cluster_idx = int(roots[i])
+                if cluster_idx not in dup_pairs:
                     dup_pairs[cluster_idx] = [
                         dataset[cluster_idx],
                         dataset[i],
@@ -333,17 +407,12 @@ class DocumentMinhashDeduplicator(Deduplicator):
                 if len(dup_pairs) >= show_num:
                     break
 
-        # filtering -- only keep those samples whose parent index is itself,
+        # filtering -- only keep those samples whose root index is itself,
         # including:
         # 1. samples that form a cluster by themselves
         # 2. the first sample in a cluster that includes multiple samples
-        def _filter_minhash_dup_helper(sample, index):
-            return union_find.find(index) == index
-
-        dataset = dataset.filter(
-            _filter_minhash_dup_helper,
-            with_indices=True,
-        )
+        dataset = dataset.select(
+            np.flatnonzero(roots == np.arange(len(roots))))
         logger.info(f'Keep {len(dataset)} samples after MinHash dedup.')
         
         # Generate detailed logging if enabled
@@ -387,6 +456,8 @@ class DocumentMinhashDeduplicator(Deduplicator):
             Param("num_bands", DataType.PositiveFloat, None, None),
             Param("num_rows_per_band", DataType.PositiveFloat, None, None),
             Param("tokenizer_model", DataType.STRING, None, None),
+            Param("memory_budget", DataType.STRING, None, "1GB"),
+            Param("spill_dir", DataType.STRING, None, None),
         ]
     
     def _log_dedup_summary(self, total, kept, removed, num_clusters):
@@ -2,10 +2,9 @@
 # https://github.com/bigscience-workshop/data-preparation
 # --------------------------------------------------------
 
-from collections import defaultdict, deque
-from typing import Dict, Set
-
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import regex
 from jsonargparse.typing import PositiveInt
 from loguru import logger
@@ -14,7 +13,8 @@ from data_engine.utils.availability_utils import AvailabilityChecking
 from data_engine.utils.constant import HashKeys
 
 from ..base_op import OPERATORS, Deduplicator, Sample, Param, DataType
-from ..common.helper_func import split_on_whitespace
+from ..common.helper_func import ArrayUnionFind, split_on_whitespace
+from ..common.simhash_index import find_simhash_matches
 
 OP_NAME = 'document_simhash_deduplicator'
 
@@ -142,102 +142,58 @@ class DocumentSimhashDeduplicator(Deduplicator):
                 self._log_dedup_summary(original_size, original_size, 0, 0, 0)
             return dataset, {}
 
-        # find matches
-        logger.info(f'Start querying {len(dataset)} samples.')
-        matches = simhash.find_all(
-            np.uint64(dataset[HashKeys.simhash]),
-            self.num_blocks,
-            self.hamming_distance,
-        )
+        # read the fingerprints as a uint64 array, and cluster the distinct
+        # ones, since samples with the same fingerprint are duplicates
+        # anyway
+        hash_column = dataset.select_columns([HashKeys.simhash]).with_format(
+            'arrow')[:][HashKeys.simhash]
+        fingerprints = pc.cast(hash_column, pa.uint64()).to_numpy()
+        unique_fps, first_ids, inverse = np.unique(fingerprints,
+                                                   return_index=True,
+                                                   return_inverse=True)
+
+        logger.info(f'Start querying {len(unique_fps)} distinct hashes.')
+        matches = find_simhash_matches(unique_fps, self.num_blocks,
+                                       self.hamming_distance)
         logger.info(f'Querying done, found {len(matches)} matches.')
 
-        # compute hash diff distribution
-        graph = defaultdict(dict)
-        for x, y in matches:
-            x = str(x)
-            y = str(y)
-            graph[x][y] = graph[y][x] = True
-
-        hash2ids: Dict[str, Set[str]] = defaultdict(set)
-        hashes: Set[str] = set(dataset[HashKeys.simhash])
-        hash2cluster: Dict[str, int] = {}
-        visited: Set[str] = set()
-        cluster_id: int = 0
-
-        for sid, hash_val in enumerate(dataset[HashKeys.simhash]):
-            hash2ids[hash_val].add(str(sid))
-
-        # clustering
-        dup_pairs = {}  # store duplicate pairs when show_num > 0
-        while hashes:
-            hash_val = hashes.pop()
-            if hash_val in visited:
-                continue
-
-            # if this hash value is not in the matches list, it's regarded as a
-            # single cluster
-            if hash_val not in graph:
-                continue
-
-            # Otherwise, BFS to find the cluster
-            q = deque([hash_val])
-            visited.add(hash_val)
-            hash2cluster[hash_val] = cluster_id
-            if show_num > 0 and len(dup_pairs) < show_num:
-                dup_pairs[cluster_id] = []
-
-            while q:
-                curr = q.popleft()
-                for neighbor in graph[curr]:
-                    if neighbor in visited:
-                        continue
-                    visited.add(neighbor)
-                    q.append(neighbor)
-                    hash2cluster[neighbor] = cluster_id
-
-            cluster_id += 1
-        logger.info(f'Found {cluster_id} clusters and {len(graph)} hashes.')
+        # clustering -- samples are unioned with the first sample of their
+        # hash values, and matched hash values are unioned with each other
+        union_find = ArrayUnionFind(len(fingerprints))
+        union_find.union(np.arange(len(fingerprints)), first_ids[inverse])
+        union_find.union(first_ids[matches[:, 0]], first_ids[matches[:, 1]])
+        roots = union_find.find()
+        cluster_sizes = np.bincount(roots, minlength=len(roots))
+        num_clusters = int(np.count_nonzero(cluster_sizes > 1))
+        logger.info(f'Found {num_clusters} clusters and '
+                    f'{len(np.unique(matches))} hashes.')
+
+        # record the duplicate sample pairs
+        dup_pairs = {}
+        if show_num > 0:
+            for i in np.flatnonzero(roots != np.arange(len(roots))).tolist():
+                cluster_idx = int(roots[i])
+                if cluster_idx not in dup_pairs:
+                    dup_pairs[cluster_idx] = [
+                        dataset[cluster_idx],
+                        dataset[i],
+                    ]
+                if len(dup_pairs) >= show_num:
+                    break
 
         # filter duplicated samples
         # NOTICE: For now, we only keep the first sample in a cluster. Maybe
         # there are some better strategies later.
-        def _filter_simhash_dup_helper(sample, visited_clusters,
-                                       visited_hashes):
-            sample_hash_val = sample[HashKeys.simhash]
-            if sample_hash_val not in hash2cluster:
-                # single-sample cluster, we need to check hash value still.
-                if sample_hash_val in visited_hashes:
-                    return False
-                else:
-                    visited_hashes.add(sample_hash_val)
-                    return True
-            else:
-                cluster_num = hash2cluster[sample_hash_val]
-                if show_num > 0 and cluster_num in dup_pairs \
-                        and len(dup_pairs[cluster_num]) < 2:
-                    dup_pairs[cluster_num].append(sample)
-                # regular cluster, check cluster number.
-                if cluster_num in visited_clusters:
-                    return False
-                else:
-                    visited_clusters.add(cluster_num)
-                    return True
-
-        cluster_record = set()
-        hash_record = set()
-        dataset = dataset.filter(
-            _filter_simhash_dup_helper,
-            fn_kwargs=dict(visited_clusters=cluster_record,
-                           visited_hashes=hash_record),
-            load_from_cache_file=False if show_num > 0 else True)
+        keep_mask = roots == np.arange(len(roots))
+        dataset = dataset.select(np.flatnonzero(keep_mask))
         logger.info(f'Keep {len(dataset)} samples after SimHash dedup.')
-        
+
         # Generate detailed logging if enabled
         if getattr(self, 'enable_detailed_logging', False):
             deduplicated_size = len(dataset)
             self._log_dedup_summary(original_size, deduplicated_size,
                                    original_size - deduplicated_size,
-                                   cluster_id, len(matches))
+                                   num_clusters, len(matches))
 
         return dataset, dup_pairs
 
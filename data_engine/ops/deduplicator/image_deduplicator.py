@@ -1,6 +1,3 @@
-from collections import defaultdict
-from typing import Dict, Set, Tuple
-
 import numpy as np
 
 from data_engine.utils.availability_utils import AvailabilityChecking
@@ -9,7 +6,7 @@ from data_engine.utils.mm_utils import load_data_with_context, load_image
 
 from ..base_op import OPERATORS, Deduplicator
 from ..op_fusion import LOADED_IMAGES
-from .document_deduplicator import DocumentDeduplicator
+from .document_deduplicator import DocumentDeduplicator, dedup_by_hash_columns
 
 OP_NAME = 'image_deduplicator'
 
@@ -100,47 +97,11 @@ class ImageDeduplicator(Deduplicator):
         if len(dataset) <= 1:
             return dataset, {}
 
-        dup_hashes = None
-        if show_num > 0:
-            # sample duplicate pairs
-            if self.consider_text:
-                hash2ids: Dict[Tuple[int], Set[int]] = defaultdict(set)
-                hashes = zip(dataset[HashKeys.imagehash],
-                             dataset[HashKeys.hash])
-            else:
-                hash2ids: Dict[int, Set[int]] = defaultdict(set)
-                hashes = dataset[HashKeys.imagehash]
-            for sid, hash_val in enumerate(hashes):
-                if hash_val:
-                    hash2ids[hash_val].add(sid)
-            dup_samples = sorted(list(hash2ids.items()),
-                                 key=lambda x: len(x[1]),
-                                 reverse=True)
-            dup_hashes = set([
-                item[0] for item in dup_samples if len(item[1]) > 1
-            ][:show_num])
-
-        def _filter_dup_helper(sample, hashes):
-            if self.consider_text:
-                hash = (sample[HashKeys.imagehash], sample[HashKeys.hash])
-            else:
-                hash = sample[HashKeys.imagehash]
-            if not hash:
-                return True
-            if show_num > 0 and hash in dup_hashes \
-                    and len(dup_pairs[hash]) < 2:
-                # tracer is open and not enough duplicate sample pairs
-                dup_pairs[hash].append(sample)
-            if hash in hashes:
-                return False
-            else:
-                hashes.add(hash)
-                return True
-
-        hashes = set()
-        dup_pairs = {hash_v: [] for hash_v in dup_hashes} if dup_hashes else {}
-        dataset = dataset.filter(
-            _filter_dup_helper,
-            fn_kwargs=dict(hashes=hashes),
-            load_from_cache_file=False if show_num > 0 else True)  # num_proc=1
+        # samples without images are always kept, unless the text hashes
+        # are considered together
+        hash_keys = [HashKeys.imagehash]
+        if self.consider_text:
+            hash_keys.append(HashKeys.hash)
+        dataset, dup_pairs, _ = dedup_by_hash_columns(
+            dataset, hash_keys, show_num, skip_empty=not self.consider_text)
         return dataset, dup_pairs
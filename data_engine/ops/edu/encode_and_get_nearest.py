@@ -1,167 +1,190 @@
-from typing import List, Optional, Union, Dict, Any
+from typing import List, Optional
 
 import os
-import json
+import tempfile
 import numpy as np
-from typing import List, Optional, Union
-from pydantic import Field
-from datasets import Dataset
+from datasets.fingerprint import Hasher
 from loguru import logger
 
 from ..base_op import OPERATORS, Sample, Selector,Param,DataType
+from ..common.llm_client import create_headers, get_llm_engine
 from data_engine.utils.availability_utils import AvailabilityChecking
 
-with AvailabilityChecking(['openai', 'faiss-cpu'], 'encode_and_get_nearest_mapper'):
-    from openai import OpenAI
+with AvailabilityChecking(['faiss-cpu'], 'encode_and_get_nearest_mapper'):
     import faiss
 
 
 OP_NAME = 'encode_and_get_nearest_mapper'
-def get_embeddings_openai(texts: List[str], client, model_name: str, dimensions: int = 1024):
+
+
+def parse_embeddings(result, num_texts: int) -> List[List[float]]:
     """
-    Call OpenAI-compatible API service to get text embeddings
+    Parse the embeddings from the response of an embeddings request
 
     Args:
-        texts (List[str]): List of texts to encode
-        client: OpenAI client instance
-        model_name (str): Model name for embeddings
-        dimensions (int): Embedding dimensions
+        result: Json response, or the exception raised by the request
+        num_texts (int): Number of texts in the request
 
     Returns:
-        List[List[float]]: List of embedding vectors
+        List[List[float]]: Embeddings in the order of the input texts
 
     Raises:
-        RuntimeError: Raised when API call fails
+        RuntimeError: Raised when the request failed or the response is
+            malformed
     """
-    try:
-        embeddings = []
-        for text in texts:
-            response = client.embeddings.create(
-                model=model_name,
-                input=[text],
-                dimensions=dimensions,
-                encoding_format="float"
-            )
-            embeddings.append(response.data[0].embedding)
-        return embeddings
-    except Exception as e:
-        logger.error(f"Embedding API call failed: {str(e)}")
-        raise RuntimeError(f"Failed to obtain text embedding vectors: {str(e)}")
-
-def encode_texts(texts: List[str], client, model_name: str, dimensions: int = 1024) -> List[List[float]]:
+    if isinstance(result, Exception):
+        raise RuntimeError(f"Failed to obtain text embedding vectors: {str(result)}")
+    data = sorted(result['data'], key=lambda item: item['index'])
+    if len(data) != num_texts:
+        raise RuntimeError(f"Expected {num_texts} embeddings, got {len(data)}")
+    return [item['embedding'] for item in data]
+
+
+def encode_texts_to_memmap(texts, url: str, auth_token: str, model_name: str,
+                           dimensions: int, path: str, num_texts: int,
+                           batch_size: int = 10, num_requests: int = 64,
+                           engine=None) -> np.ndarray:
     """
-    Encode multiple texts into embedding vectors using OpenAI-compatible API
+    Encode texts into a memory-mapped float32 matrix using an
+    OpenAI-compatible embeddings API. Each request embeds a batch of texts,
+    and the requests are sent concurrently.
 
     Args:
-        texts (List[str]): List of texts to encode
-        client: OpenAI client instance
+        texts: Iterable of texts to encode
+        url (str): API base URL
+        auth_token (str): API authentication token
         model_name (str): Model name for embeddings
         dimensions (int): Embedding dimensions
+        path (str): Path of the .npy file of the matrix
+        num_texts (int): Number of texts
+        batch_size (int): Number of texts embedded by one request
+        num_requests (int): Number of requests sent together
+        engine: Engine to send the requests, the shared default one if
+            it's None
 
     Returns:
-        List[List[float]]: List of embedding vectors
+        np.ndarray: Memory-mapped matrix of shape (num_texts, dimensions)
+
+    Raises:
+        RuntimeError: Raised when API call fails
     """
-    return get_embeddings_openai(texts, client, model_name, dimensions)
+    engine = engine or get_llm_engine()
+    url = f'{url.rstrip("/")}/embeddings'
+    headers = create_headers(auth_token)
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                       shape=(num_texts, dimensions))
+
+    def flush(start, batches):
+        results = engine.post_batch(url, [{
+            'model': model_name,
+            'input': batch,
+            'dimensions': dimensions,
+            'encoding_format': 'float',
+        } for batch in batches], headers)
+        for batch, result in zip(batches, results):
+            embeddings = parse_embeddings(result, len(batch))
+            matrix[start:start + len(batch)] = np.asarray(embeddings,
+                                                          dtype=np.float32)
+            start += len(batch)
+        return start
+
+    start, batches, batch = 0, [], []
+    for text in texts:
+        batch.append(text)
+        if len(batch) == batch_size:
+            batches.append(batch)
+            batch = []
+        if len(batches) == num_requests:
+            start = flush(start, batches)
+            batches = []
+    if batch:
+        batches.append(batch)
+    if batches:
+        start = flush(start, batches)
+    if start != num_texts:
+        raise RuntimeError(f"Expected {num_texts} texts, got {start}")
+    matrix.flush()
+    return matrix
 
 
 class FaissNearestNeighbour:
-    device: Optional[Union[int, List[int]]] = Field(
-        default=None,
-        description="The CUDA device ID or a list of IDs to be used. If negative integer,"
-        " it will use all the available GPUs.",
-    )
-    string_factory: Optional[str] = Field(
-        default=None,
-        description="The name of the factory to be used to build the `faiss` index."
-        "Available string factories can be checked here: https://github.com/facebookresearch/faiss/wiki/Faiss-indexes.",
-    )
-    metric_type: Optional[int] = Field(
-        default=None,
-        description="The metric to be used to measure the distance between the points. It's"
-        " an integer and the recommend way to pass it is importing `faiss` and thenpassing"
-        " one of `faiss.METRIC_x` variables.",
-    )
-    k: Optional[int] = Field(
-        default=1,
-        description="The number of nearest neighbours to search for each input row.",
-    )
-    search_batch_size: Optional[int] = Field(
-        default=50,
-        description="The number of rows to include in a search batch. The value can be adjusted"
-        " to maximize the resources usage or to avoid OOM issues.",
-    )
-    train_size: Optional[int] = Field(
-        default=None,
-        description="If the index needs a training step, specifies how many vectors will be used to train the index.",
-    )
-    def _build_index(self, inputs: List[Dict[str, Any]]) -> Dataset:
-        """Builds a `faiss` index using `datasets` integration.
+    """Build a `faiss` index from an embedding matrix and search the top `k`
+    nearest neighbours of each row in it."""
 
-        Args:
-            inputs: a list of dictionaries.
-
-        Returns:
-            The build `datasets.Dataset` with its `faiss` index.
+    def __init__(self,
+                 string_factory: str = "Flat",
+                 metric_type: Optional[int] = None,
+                 k: int = 1,
+                 add_batch_size: int = 10000,
+                 search_batch_size: int = 50,
+                 train_size: Optional[int] = None):
         """
-        dataset = Dataset.from_pandas(inputs)
-
-        dataset.add_faiss_index(
-            column="embedding",
-            device=self.device,  # type: ignore
-            string_factory=self.string_factory,
-            metric_type=self.metric_type,
-            train_size=self.train_size,
-        )
-        return dataset
-
-    def _save_index(self, dataset: Dataset) -> None:
-        """Save the generated Faiss index as an artifact of the step.
-
         Args:
-            dataset: the dataset with the `faiss` index built.
+            string_factory (str): The name of the factory to be used to build
+                the `faiss` index. Available string factories can be checked
+                here: https://github.com/facebookresearch/faiss/wiki/Faiss-indexes.
+            metric_type (Optional[int]): The metric to be used to measure the
+                distance between the points, one of `faiss.METRIC_x`.
+            k (int): The number of nearest neighbours to search for each row.
+            add_batch_size (int): The number of rows added to the index at a
+                time.
+            search_batch_size (int): The number of rows to include in a
+                search batch. The value can be adjusted to maximize the
+                resources usage or to avoid OOM issues.
+            train_size (Optional[int]): If the index needs a training step,
+                specifies how many vectors will be used to train the index.
         """
-        self.save_artifact(
-            name="faiss_index",
-            write_function=lambda path: dataset.save_faiss_index(
-                index_name="embedding", file=path / "index.faiss"
-            ),
-            metadata={
-                "num_rows": len(dataset),
-                "embedding_dim": len(dataset[0]["embedding"]),
-            },
-        )
-
-    def _search(self, dataset: Dataset) -> Dataset:
-        """Search the top `k` nearest neighbours for each row in the dataset.
+        self.string_factory = string_factory
+        self.metric_type = faiss.METRIC_INNER_PRODUCT \
+            if metric_type is None else metric_type
+        self.k = k
+        self.add_batch_size = add_batch_size
+        self.search_batch_size = search_batch_size
+        self.train_size = train_size
+
+    def build_index(self, matrix: np.ndarray):
+        """Builds a `faiss` index from the matrix incrementally, so that only
+        a batch of rows is loaded from the memory-mapped matrix at a time.
 
         Args:
-            dataset: the dataset with the `faiss` index built.
+            matrix: the embedding matrix.
 
         Returns:
-            The updated dataset containing the top `k` nearest neighbours for each row,
-            as well as the score or distance.
+            The `faiss` index.
         """
+        index = faiss.index_factory(matrix.shape[1], self.string_factory,
+                                    self.metric_type)
+        if not index.is_trained:
+            train_size = min(self.train_size or len(matrix), len(matrix))
+            index.train(np.ascontiguousarray(matrix[:train_size]))
+        for start in range(0, len(matrix), self.add_batch_size):
+            index.add(
+                np.ascontiguousarray(matrix[start:start +
+                                            self.add_batch_size]))
+        return index
+
+    def search(self, index, matrix: np.ndarray):
+        """Search the top `k` nearest neighbours for each row in the matrix,
+        excluding the row itself.
 
-        def add_search_results(examples: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
-            queries = np.array(examples["embedding"])
-            results = dataset.search_batch(
-                index_name="embedding",
-                queries=queries,
-                k=self.k + 1,  # type: ignore
-            )
-            examples["nn_indices"] = [indices[1:] for indices in results.total_indices]
-            examples["nn_scores"] = [scores[1:] for scores in results.total_scores]
-            return examples
-
-        return dataset.map(
-            add_search_results, batched=True, batch_size=self.search_batch_size,desc="Searching nearest neighbours"
-        )
+        Args:
+            index: the `faiss` index built from the matrix.
+            matrix: the embedding matrix.
 
-    def process(self, inputs) -> "StepOutput":  # type: ignore
-        dataset = self._build_index(inputs)
-        dataset_with_search_results = self._search(dataset)
-        #self._save_index(dataset)
-        return dataset_with_search_results
+        Returns:
+            The indices and the scores of the nearest neighbours, each of
+            shape (num_rows, k).
+        """
+        k = min(self.k + 1, len(matrix))
+        nn_indices = np.empty((len(matrix), k - 1), dtype=np.int64)
+        nn_scores = np.empty((len(matrix), k - 1), dtype=np.float32)
+        for start in range(0, len(matrix), self.search_batch_size):
+            queries = np.ascontiguousarray(matrix[start:start +
+                                                  self.search_batch_size])
+            scores, indices = index.search(queries, k)
+            nn_indices[start:start + len(queries)] = indices[:, 1:]
+            nn_scores[start:start + len(queries)] = scores[:, 1:]
+        return nn_indices, nn_scores
 
 
 @OPERATORS.register_module(OP_NAME)
@@ -173,6 +196,10 @@ class EncodeAndGetNearestSelector(Selector):
                  model_url: str = "https://dashscope.aliyuncs.com/compatible-mode/v1",
                  model_name: str = "text-embedding-v4",
                  dimensions: int = 1024,
+                 embedding_batch_size: int = 10,
+                 max_concurrency: int = 16,
+                 k: int = 5,
+                 search_batch_size: int = 1000,
                  *args,
                  **kwargs):
         """
@@ -182,6 +209,10 @@ class EncodeAndGetNearestSelector(Selector):
         :param model_url: API base URL
         :param model_name: Model name for embeddings
         :param dimensions: Embedding dimensions
+        :param embedding_batch_size: Number of texts embedded by one request
+        :param max_concurrency: Max number of requests in flight
+        :param k: Number of nearest neighbours to search for each prompt
+        :param search_batch_size: Number of prompts searched at a time
         :param args: extra args
         :param kwargs: extra args
         """
@@ -191,7 +222,10 @@ class EncodeAndGetNearestSelector(Selector):
         self.model_url = model_url
         self.model_name = model_name
         self.dimensions = dimensions
-        self.client = None
+        self.embedding_batch_size = embedding_batch_size
+        self.k = k
+        self.search_batch_size = search_batch_size
+        self.engine = get_llm_engine(max_concurrency=max_concurrency)
         
         # Enable detailed logging
         self.enable_detailed_logging = True
@@ -199,19 +233,18 @@ class EncodeAndGetNearestSelector(Selector):
         self.encoded_samples = 0
         self.failed_samples = 0
 
-    def _get_client(self):
-        """Get or create OpenAI client instance"""
-        if self.client is None:
-            if not self.auth_token:
-                raise ValueError("auth_token cannot be empty")
-            if not self.model_url:
-                raise ValueError("model_url cannot be empty")
-            try:
-                self.client = OpenAI(api_key=self.auth_token, base_url=self.model_url)
-                logger.info("OpenAI client created successfully")
-            except Exception as e:
-                raise RuntimeError(f"OpenAI client creation failed: {str(e)}")
-        return self.client
+    def _check_config(self):
+        if not self.auth_token:
+            raise ValueError("auth_token cannot be empty")
+        if not self.model_url:
+            raise ValueError("model_url cannot be empty")
+
+    def _get_tmp_dir(self, dataset):
+        # keep the matrix next to the cache files of the dataset if there
+        # are any, which are usually on a larger disk than /tmp
+        if dataset.cache_files:
+            return os.path.dirname(dataset.cache_files[0]['filename'])
+        return None
 
     def process(self, dataset):
         logger.info(f"[encode_and_get_nearest_mapper] Input: {len(dataset)} samples")
@@ -222,26 +255,57 @@ class EncodeAndGetNearestSelector(Selector):
         if len(dataset) <= 0:
             logger.info(f"[encode_and_get_nearest_mapper] Output: Empty dataset, returning as-is")
             return dataset
-        dataset = dataset.to_pandas()
 
-        first_prompt_list = dataset["first_prompt"].tolist()
-        logger.info(f"[encode_and_get_nearest_mapper] Processing {len(first_prompt_list)} prompts for embedding")
+        logger.info(f"[encode_and_get_nearest_mapper] Processing {len(dataset)} prompts for embedding")
         
         try:
-            client = self._get_client()
-            embeddings = encode_texts(first_prompt_list, client, self.model_name, self.dimensions)
-            dataset['embedding'] = embeddings
-            logger.info(f"[encode_and_get_nearest_mapper] Generated embeddings with shape: {len(embeddings)}x{len(embeddings[0]) if embeddings else 0}")
-
-            nearest_neighbour = FaissNearestNeighbour()
-            nearest_neighbour.device = None
-            nearest_neighbour.metric_type = faiss.METRIC_INNER_PRODUCT
-            nearest_neighbour.k = 5
-            nearest_neighbour.string_factory = "Flat"
-            nearest_neighbour.train_size = None
-            nearest_neighbour.search_batch_size = 100
-
-            result = nearest_neighbour.process(dataset)
+            self._check_config()
+            prompts = (text for batch in dataset.select_columns(
+                ['first_prompt']).iter(batch_size=10000)
+                       for text in batch['first_prompt'])
+            with tempfile.TemporaryDirectory(
+                    dir=self._get_tmp_dir(dataset)) as tmp_dir:
+                # the embeddings are written into a memory-mapped matrix
+                # rather than kept as python lists, and the index is built
+                # and searched from it batch by batch
+                embeddings = encode_texts_to_memmap(
+                    prompts, self.model_url, self.auth_token,
+                    self.model_name, self.dimensions,
+                    os.path.join(tmp_dir, 'embeddings.npy'), len(dataset),
+                    batch_size=self.embedding_batch_size, engine=self.engine)
+                logger.info(f"[encode_and_get_nearest_mapper] Generated embeddings with shape: {embeddings.shape[0]}x{embeddings.shape[1]}")
+
+                nearest_neighbour = FaissNearestNeighbour(
+                    string_factory="Flat",
+                    metric_type=faiss.METRIC_INNER_PRODUCT,
+                    k=self.k,
+                    search_batch_size=self.search_batch_size)
+                index = nearest_neighbour.build_index(embeddings)
+                nn_indices, nn_scores = nearest_neighbour.search(
+                    index, embeddings)
+                del index
+
+                def add_search_results(batch, indices):
+                    return {
+                        'embedding': embeddings[indices],
+                        'nn_indices': nn_indices[indices],
+                        'nn_scores': nn_scores[indices],
+                    }
+
+                # the results are written into the cache file of the
+                # dataset batch by batch, and the fingerprint is given to
+                # avoid hashing the whole matrix
+                result = dataset.map(
+                    add_search_results,
+                    with_indices=True,
+                    batched=True,
+                    batch_size=self.search_batch_size,
+                    new_fingerprint=Hasher.hash([
+                        dataset._fingerprint, OP_NAME, self.model_url,
+                        self.model_name, self.dimensions, self.k
+                    ]),
+                    desc="Searching nearest neighbours")
+                del embeddings
             logger.info(f"[encode_and_get_nearest_mapper] Output: {len(result)} samples with nearest neighbor info")
             
             if getattr(self, 'enable_detailed_logging', False):
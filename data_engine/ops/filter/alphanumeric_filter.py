@@ -1,5 +1,6 @@
 import sys
 
+import numpy as np
 from jsonargparse.typing import PositiveFloat
 
 from data_engine.utils.availability_utils import AvailabilityChecking
@@ -7,7 +8,8 @@ from data_engine.utils.constant import Fields, StatsKeys
 from data_engine.utils.model_utils import get_model, prepare_model
 
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
-from ..common import get_words_from_document
+from ..common import (get_keep_and_reason, get_text_lengths,
+                      get_words_from_document)
 
 OP_NAME = 'alphanumeric_filter'
 
@@ -20,6 +22,8 @@ class AlphanumericFilter(Filter):
     """Filter to keep samples with alphabet/numeric ratio within a specific
     range."""
 
+    _batched_op = True
+
     def __init__(self,
                  tokenization: bool = False,
                  min_ratio: float = 0.25,
@@ -57,71 +61,64 @@ class AlphanumericFilter(Filter):
                 pretrained_model_name_or_path='EleutherAI/pythia-6.9b-deduped',
                 return_model=False)
 
-    def compute_stats(self, sample):
+    def compute_stats(self, samples):
+        samples_stats = samples[Fields.stats]
+        stats_key = StatsKeys.alpha_token_ratio if self.tokenization \
+            else StatsKeys.alnum_ratio
+        # check if it's computed already
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if stats_key not in stat
+        ]
+        if len(indices) == 0:
+            return samples
+
+        texts = [samples[self.text_key][idx] for idx in indices]
         if self.tokenization:
-            if StatsKeys.alpha_token_ratio in sample[Fields.stats]:
-                return sample
-            alpha_count = sum(
-                map(lambda char: 1
-                    if char.isalpha() else 0, sample[self.text_key]))
+            counts = [sum(map(str.isalpha, text)) for text in texts]
             tokenizer = get_model(self.model_key)
-            token_count = len(
-                get_words_from_document(
-                    sample[self.text_key],
-                    token_func=tokenizer.tokenize if tokenizer else None))
-            ratio = (alpha_count / token_count) if token_count != 0 else 0.0
-            sample[Fields.stats][StatsKeys.alpha_token_ratio] = ratio
-            
-            # Determine filter result and reason for detailed logging
-            if ratio < self.min_ratio:
-                keep = False
-                reason = 'below_min'
-            elif ratio > self.max_ratio:
-                keep = False
-                reason = 'above_max'
-            else:
-                keep = True
-                reason = 'kept'
-            
-            # Store detailed information for logging
-            sample[Fields.stats][f'{StatsKeys.alpha_token_ratio}_detail'] = {
-                'ratio': str(ratio),
-                'keep': keep,
-                'reason': reason,
-                'alpha_count': alpha_count,
-                'token_count': token_count
-            }
+            totals = [
+                len(
+                    get_words_from_document(
+                        text,
+                        token_func=tokenizer.tokenize if tokenizer else None))
+                for text in texts
+            ]
         else:
-            if StatsKeys.alnum_ratio in sample[Fields.stats]:
-                return sample
-            text = sample[self.text_key]
-            text_len = len(text)
-            alnum_count = sum(
-                map(lambda char: 1
-                    if char.isalnum() else 0, text))
-            ratio = (alnum_count / text_len) if text_len != 0 else 0.0
-            sample[Fields.stats][StatsKeys.alnum_ratio] = ratio
-            
-            # Determine filter result and reason for detailed logging
-            if ratio < self.min_ratio:
-                keep = False
-                reason = 'below_min'
-            elif ratio > self.max_ratio:
-                keep = False
-                reason = 'above_max'
-            else:
-                keep = True
-                reason = 'kept'
-            
+            counts = [sum(map(str.isalnum, text)) for text in texts]
+            totals = get_text_lengths(texts)
+        counts = np.asarray(counts, dtype=np.int64)
+        totals = np.asarray(totals, dtype=np.int64)
+        ratios = np.divide(counts,
+                           totals,
+                           out=np.zeros(len(texts), dtype=np.float64),
+                           where=totals != 0)
+
+        # Determine filter results and reasons for detailed logging
+        keeps, reasons = get_keep_and_reason(ratios, self.min_ratio,
+                                             self.max_ratio)
+        for idx, ratio, count, total, keep, reason in zip(
+                indices, ratios.tolist(), counts.tolist(), totals.tolist(),
+                keeps, reasons):
+            samples_stats[idx][stats_key] = ratio
             # Store detailed information for logging
-            sample[Fields.stats][f'{StatsKeys.alnum_ratio}_detail'] = {
-                'ratio': str(ratio),
-                'keep': keep,
-                'reason': reason,
-                'alnum_count': alnum_count,
-                'text_length': text_len
-            }
-        return sample
+            if self.tokenization:
+                samples_stats[idx][f'{stats_key}_detail'] = {
+                    'ratio': str(ratio),
+                    'keep': keep,
+                    'reason': reason,
+                    'alpha_count': count,
+                    'token_count': total
+                }
+            else:
+                samples_stats[idx][f'{stats_key}_detail'] = {
+                    'ratio': str(ratio),
+                    'keep': keep,
+                    'reason': reason,
+                    'alnum_count': count,
+                    'text_length': total
+                }
+        return samples
 
     def process(self, sample):
         ratio = sample[Fields.stats][
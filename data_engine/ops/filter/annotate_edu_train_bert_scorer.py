@@ -3,39 +3,67 @@ import os
 import numpy as np
 from jsonargparse.typing import NonNegativeInt
 from data_engine.utils.constant import Fields, StatsKeys
+from data_engine.utils.llm_cache_utils import LLMResponseCache
 from data_engine.utils.mm_utils import load_audio, load_data_with_context
 
 from ..base_op import OPERATORS, Mapper, Sample, Param, DataType
 from ..op_fusion import LOADED_AUDIOS
 from loguru import logger
 
-from data_engine.utils.availability_utils import AvailabilityChecking
-import json
+from ..common.llm_client import create_headers, get_llm_engine
 
 OP_NAME = 'annotate_edu_train_bert_scorer_mapper'
 
-with AvailabilityChecking(['openai', 'scikit-learn'], OP_NAME):
-    from openai import OpenAI
-    from sklearn.metrics.pairwise import cosine_similarity
-
 @OPERATORS.register_module(OP_NAME)
 @LOADED_AUDIOS.register_module(OP_NAME)
 class AnnotateEduTrainBertScorer(Mapper):
+    _batched_op = True
+    _default_batch_size = 64
+
     def __init__(self,
          auth_token: str = "",
          model_url: str = "https://dashscope.aliyuncs.com/compatible-mode/v1",
          model_name: str = "text-embedding-v4",
          dimensions: int = 1024,
          query_text: str = "What is Deep Learning?",
+         embedding_batch_size: int = 10,
+         max_concurrency: int = 16,
+         use_response_cache: bool = False,
+         response_cache_ttl: float = None,
          *args,
          **kwargs):
+        """
+        Initialization method.
+
+        :param auth_token: token for API access.
+        :param model_url: base URL of the OpenAI-compatible embedding API.
+        :param model_name: name of the embedding model.
+        :param dimensions: dimensions of the embeddings.
+        :param query_text: text to score the relevance to.
+        :param embedding_batch_size: max number of texts embedded by one
+            API request.
+        :param max_concurrency: max number of requests in flight.
+        :param use_response_cache: whether to cache the embeddings on disk,
+            so that the same texts are not embedded again when the recipe
+            is rerun.
+        :param response_cache_ttl: seconds for a cached embedding to live,
+            or None to keep it until it's evicted.
+        :param args: extra args
+        :param kwargs: extra args
+        """
         super().__init__(*args, **kwargs)
         self.auth_token = auth_token
         self.model_url = model_url
         self.model_name = model_name
         self.dimensions = dimensions
         self.query_text = query_text
-        self.client = None
+        self.embedding_batch_size = embedding_batch_size
+        self.engine = get_llm_engine(max_concurrency=max_concurrency)
+        # the query embedding is the same for the whole run, so it's
+        # computed once per worker
+        self._query_embedding = None
+        self.response_cache = LLMResponseCache(
+            ttl=response_cache_ttl) if use_response_cache else None
         
         # Enable detailed logging
         self.enable_detailed_logging = True
@@ -43,81 +71,162 @@ class AnnotateEduTrainBertScorer(Mapper):
         self.scored_samples = 0
         self.failed_samples = 0
 
-    def _get_client(self):
-        if self.client is None:
-            if not self.auth_token:
-                raise ValueError("auth_token_cannot_be_empty")
-            if not self.model_url:
-                raise ValueError("model_url_cannot_be_empty")
+    def _check_config(self):
+        if not self.auth_token:
+            raise ValueError("auth_token_cannot_be_empty")
+        if not self.model_url:
+            raise ValueError("model_url_cannot_be_empty")
+
+    def _get_request(self, text):
+        return {
+            'url': self.model_url,
+            'model': self.model_name,
+            'input': text,
+            'dimensions': self.dimensions,
+        }
+
+    def _parse_embeddings(self, result, num_texts):
+        if isinstance(result, Exception):
+            raise result
+        data = sorted(result['data'], key=lambda item: item['index'])
+        if len(data) != num_texts:
+            raise ValueError(f"expected {num_texts} embeddings, got {len(data)}")
+        return [item['embedding'] for item in data]
+
+    def get_embeddings(self, texts):
+        """
+        Embed texts in API-sized batches, which are sent concurrently.
+
+        :param texts: texts to embed.
+        :return: list of embeddings, None for the texts failed to embed.
+        """
+        self._check_config()
+        embeddings = [None] * len(texts)
+        missed = list(range(len(texts)))
+        if self.response_cache is not None:
+            cached = self.response_cache.get_many(
+                [self._get_request(text) for text in texts])
+            for idx, embedding in enumerate(cached):
+                embeddings[idx] = embedding
+            missed = [idx for idx in missed if embeddings[idx] is None]
+
+        url = f'{self.model_url.rstrip("/")}/embeddings'
+        headers = create_headers(self.auth_token)
+        chunks = [
+            missed[i:i + self.embedding_batch_size]
+            for i in range(0, len(missed), self.embedding_batch_size)
+        ]
+        results = self.engine.post_batch(url, [{
+            'model': self.model_name,
+            'input': [texts[idx] for idx in chunk],
+            'dimensions': self.dimensions,
+            'encoding_format': 'float',
+        } for chunk in chunks], headers)
+        failed = []
+        for chunk, result in zip(chunks, results):
             try:
-                self.client = OpenAI(api_key=self.auth_token, base_url=self.model_url)
-                logger.info("OpenAI client created successfully")
+                for idx, embedding in zip(
+                        chunk, self._parse_embeddings(result, len(chunk))):
+                    embeddings[idx] = embedding
             except Exception as e:
-                raise RuntimeError(f"the_creation_of_the_openai_client_failed: {str(e)}")
-        return self.client
+                logger.error(f"the_embedding_api_call_failed: {str(e)}")
+                # embed the texts of a failed request one by one, so that
+                # only the bad texts fail
+                if len(chunk) > 1:
+                    failed.extend(chunk)
+        if failed:
+            results = self.engine.post_batch(url, [{
+                'model': self.model_name,
+                'input': [texts[idx]],
+                'dimensions': self.dimensions,
+                'encoding_format': 'float',
+            } for idx in failed], headers)
+            for idx, result in zip(failed, results):
+                try:
+                    embeddings[idx] = self._parse_embeddings(result, 1)[0]
+                except Exception as e:
+                    logger.error(f"the_embedding_api_call_failed: {str(e)}")
 
-    def compute_stats(self, sample, context=False):
-        score_field = f"{self.text_key}_score"
-        content = sample[self.text_key]
-        sample[score_field] = 0
+        if self.response_cache is not None:
+            self.response_cache.set_many([
+                (self._get_request(texts[idx]), embeddings[idx])
+                for idx in missed if embeddings[idx] is not None
+            ])
+        return embeddings
 
-        score = self.get_score_from_model(self.query_text, content)
-        if score is not None:
-            sample[score_field] = score
-        return sample
+    def _get_query_embedding(self):
+        if self._query_embedding is None:
+            embedding = self.get_embeddings([self.query_text])[0]
+            if embedding is None:
+                raise RuntimeError("failed_to_obtain_the_text_embedding_vector")
+            self._query_embedding = np.asarray(embedding, dtype=np.float32)
+        return self._query_embedding
 
-    def get_score_from_model(self, query_text, content):
-        client = self._get_client()
-        
-        try:
-            query_response = client.embeddings.create(
-                model=self.model_name,
-                input=[query_text],
-                dimensions=self.dimensions,
-                encoding_format="float"
-            )
-            query_embedding = query_response.data[0].embedding
-
-            content_response = client.embeddings.create(
-                model=self.model_name,
-                input=[content],
-                dimensions=self.dimensions,
-                encoding_format="float"
-            )
-            content_embedding = content_response.data[0].embedding
-
-            similarity = cosine_similarity(
-                [query_embedding], 
-                [content_embedding]
-            )[0][0]
-            
-            # The similarity range is usually between 0.1 and 0.9, remapped to 0 to 5 points
-            if similarity < 0.3:  # lowCorrelation
-                score = similarity * 10 / 3  # 0-1points
-            elif similarity < 0.6:  # moderateCorrelation
-                score = 1 + (similarity - 0.3) * 6.67  # 1-3points
-            else:  # highCorrelation
-                score = 3 + (similarity - 0.6) * 5  # 3-5points
-            
-            return float(max(0, min(5, score)))
-            
-        except Exception as e:
-            logger.error(f"the_embedding_api_call_failed: {str(e)}")
-            raise RuntimeError(f"failed_to_obtain_the_text_embedding_vector: {str(e)}")
+    @staticmethod
+    def similarity_to_score(similarity):
+        """
+        Map cosine similarities to scores in [0, 5].
+
+        :param similarity: array of cosine similarities.
+        :return: array of scores.
+        """
+        # The similarity range is usually between 0.1 and 0.9, remapped to 0 to 5 points
+        score = np.where(
+            similarity < 0.3,
+            similarity * 10 / 3,  # lowCorrelation: 0-1points
+            np.where(
+                similarity < 0.6,
+                1 + (similarity - 0.3) * 6.67,  # moderateCorrelation: 1-3points
+                3 + (similarity - 0.6) * 5))  # highCorrelation: 3-5points
+        return np.clip(score, 0, 5)
 
-    def process(self, sample):
+    def get_scores(self, contents):
+        """
+        Score texts by their cosine similarities to the query text.
+
+        :param contents: texts to score.
+        :return: array of scores, and the mask of the texts scored
+            successfully.
+        """
+        scores = np.zeros(len(contents))
+        scored = np.zeros(len(contents), dtype=bool)
+
+        query_embedding = self._get_query_embedding()
+        embeddings = self.get_embeddings(contents)
+        indices = [idx for idx, emb in enumerate(embeddings) if emb is not None]
+        if indices:
+            matrix = np.asarray([embeddings[idx] for idx in indices],
+                                dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(
+                query_embedding)
+            similarity = matrix @ query_embedding / np.maximum(norms, 1e-12)
+            scores[indices] = self.similarity_to_score(similarity)
+            scored[indices] = True
+        return scores, scored
+
+    def compute_stats(self, samples, context=False):
+        scores, _ = self.get_scores(samples[self.text_key])
+        samples[f"{self.text_key}_score"] = scores.tolist()
+        return samples
+
+    def process(self, samples):
+        num_samples = len(samples[self.text_key])
         if getattr(self, 'enable_detailed_logging', False):
-            self.total_samples += 1
+            self.total_samples += num_samples
         
+        scores = [0.0] * num_samples
+        num_scored = 0
         try:
-            result = self.compute_stats(sample)
-            if getattr(self, 'enable_detailed_logging', False):
-                self.scored_samples += 1
-            return result
+            scores, scored = self.get_scores(samples[self.text_key])
+            scores = scores.tolist()
+            num_scored = int(scored.sum())
         except Exception as e:
-            if getattr(self, 'enable_detailed_logging', False):
-                self.failed_samples += 1
-            return sample
+            logger.error(f"failed_to_obtain_the_text_embedding_vector: {str(e)}")
+        samples[f"{self.text_key}_score"] = scores
+        if getattr(self, 'enable_detailed_logging', False):
+            self.scored_samples += num_scored
+            self.failed_samples += num_samples - num_scored
+        return samples
 
     @classmethod
     @property
@@ -146,6 +255,8 @@ class AnnotateEduTrainBertScorer(Mapper):
             self.total_samples = 0
             self.scored_samples = 0
             self.failed_samples = 0
+            if self.response_cache is not None:
+                self.response_cache.reset_counters()
         
         result = super().run(dataset, exporter=exporter, tracer=tracer)
         
@@ -175,6 +286,8 @@ class AnnotateEduTrainBertScorer(Mapper):
             self._log_line(f"Query text: {self.query_text}")
             self._log_line(f"Model: {self.model_name}")
             self._log_line(f"Embedding dimensions: {self.dimensions}")
+            if self.response_cache is not None:
+                self._log_line(self.response_cache.summary())
             self._log_line("="*60)
             
         except Exception as e:
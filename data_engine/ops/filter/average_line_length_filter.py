@@ -1,10 +1,12 @@
 import sys
 
+import numpy as np
 from jsonargparse.typing import PositiveInt
 
 from data_engine.utils.constant import Fields, InterVars, StatsKeys
 
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
+from ..common import get_keep_and_reason, get_text_lengths
 from ..op_fusion import INTER_LINES
 
 
@@ -14,6 +16,8 @@ class AverageLineLengthFilter(Filter):
     """Filter to keep samples with average line length within a specific
     range."""
 
+    _batched_op = True
+
     def __init__(self,
                  min_len: PositiveInt = 10,
                  max_len: PositiveInt = sys.maxsize,
@@ -38,42 +42,51 @@ class AverageLineLengthFilter(Filter):
         # Enable detailed logging for this filter
         self.enable_detailed_logging = True
 
-    def compute_stats(self, sample, context=False):
+    def compute_stats(self, samples, context=False):
+        samples_stats = samples[Fields.stats]
         # check if it's computed already
-        if StatsKeys.avg_line_length in sample[Fields.stats]:
-            return sample
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if StatsKeys.avg_line_length not in stat
+        ]
+        if len(indices) == 0:
+            return samples
 
         context_key = f'{InterVars.lines}'
-        if context and context_key in sample[Fields.context]:
-            lines = sample[Fields.context][context_key]
-        else:
-            lines = sample[self.text_key].splitlines()
-            if context:
-                sample[Fields.context][context_key] = lines
-        
-        avg_len = len(sample[self.text_key]) / len(lines) if len(lines) != 0 else 0.0
-        sample[Fields.stats][StatsKeys.avg_line_length] = avg_len
-        
-        # Determine filter result and reason for detailed logging
-        if avg_len < self.min_len:
-            keep = False
-            reason = 'below_min'
-        elif avg_len > self.max_len:
-            keep = False
-            reason = 'above_max'
-        else:
-            keep = True
-            reason = 'kept'
-        
-        # Store detailed information for logging
-        sample[Fields.stats][f'{StatsKeys.avg_line_length}_detail'] = {
-            'avg_line_length': avg_len,
-            'num_lines': len(lines),
-            'keep': keep,
-            'reason': reason
-        }
-        
-        return sample
+        texts = samples[self.text_key]
+        lines_list = []
+        for idx in indices:
+            if context and context_key in samples[Fields.context][idx]:
+                lines = samples[Fields.context][idx][context_key]
+            else:
+                lines = texts[idx].splitlines()
+                if context:
+                    samples[Fields.context][idx][context_key] = lines
+            lines_list.append(lines)
+        num_lines = np.array([len(lines) for lines in lines_list],
+                             dtype=np.int64)
+        text_lens = get_text_lengths([texts[idx] for idx in indices])
+        avg_lens = np.divide(text_lens,
+                             num_lines,
+                             out=np.zeros(len(indices), dtype=np.float64),
+                             where=num_lines != 0)
+
+        # Determine filter results and reasons for detailed logging
+        keeps, reasons = get_keep_and_reason(avg_lens, self.min_len,
+                                             self.max_len)
+        for idx, avg_len, num, keep, reason in zip(indices, avg_lens.tolist(),
+                                                 num_lines.tolist(), keeps,
+                                                 reasons):
+            samples_stats[idx][StatsKeys.avg_line_length] = avg_len
+            # Store detailed information for logging
+            samples_stats[idx][f'{StatsKeys.avg_line_length}_detail'] = {
+                'avg_line_length': avg_len,
+                'num_lines': num,
+                'keep': keep,
+                'reason': reason
+            }
+
+        return samples
 
     def process(self, sample):
         if self.min_len <= sample[Fields.stats][
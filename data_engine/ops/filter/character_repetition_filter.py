@@ -2,12 +2,15 @@
 # https://huggingface.co/spaces/huggingface/text-data-filtering
 # --------------------------------------------------------
 
+from collections import Counter
+
 import numpy as np
 from jsonargparse.typing import ClosedUnitInterval, PositiveInt
 
 from data_engine.utils.constant import Fields, StatsKeys
 
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
+from ..common import get_keep_and_reason, get_text_lengths
 
 
 @OPERATORS.register_module('character_repetition_filter')
@@ -15,6 +18,8 @@ class CharacterRepetitionFilter(Filter):
     """Filter to keep samples with char-level n-gram repetition ratio within a
     specific range."""
 
+    _batched_op = True
+
     def __init__(self,
                  rep_len: PositiveInt = 10,
                  min_ratio: ClosedUnitInterval = 0.0,
@@ -42,74 +47,61 @@ class CharacterRepetitionFilter(Filter):
         # Enable detailed logging for this filter
         self.enable_detailed_logging = True
 
-    def compute_stats(self, sample):
+    def _get_char_rep_ratio(self, text):
+        char_ngrams = (text[i:i + self.n]
+                       for i in range(len(text) - self.n + 1))
+        freq_char_ngrams = np.fromiter(Counter(char_ngrams).values(),
+                                       dtype=np.int64)
+        if len(freq_char_ngrams) == 0:
+            return 0.0
+        freq_char_ngrams = np.sort(freq_char_ngrams)[::-1]
+        num_no_rep_char_ngrams = int((freq_char_ngrams == 1).sum())
+        num_rep_char_ngrams = min(
+            int(np.sqrt(len(freq_char_ngrams))),
+            len(freq_char_ngrams) - num_no_rep_char_ngrams,
+        )
+        total = int(freq_char_ngrams.sum())
+        return (int(freq_char_ngrams[:num_rep_char_ngrams].sum()) / total) \
+            if total != 0 else 0.0
+
+    def compute_stats(self, samples):
+        samples_stats = samples[Fields.stats]
         # check if it's computed already
-        if StatsKeys.char_rep_ratio in sample[Fields.stats]:
-            return sample
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if StatsKeys.char_rep_ratio not in stat
+        ]
+        if len(indices) == 0:
+            return samples
 
-        text = sample[self.text_key]
-        text_len = len(text)
-        
-        # Handle empty or very short text
-        if text_len < self.n:
-            sample[Fields.stats][StatsKeys.char_rep_ratio] = 0.0
+        texts = [samples[self.text_key][idx] for idx in indices]
+        text_lens = get_text_lengths(texts)
+        char_rep_ratios = np.array([
+            self._get_char_rep_ratio(text) if text_len >= self.n else 0.0
+            for text, text_len in zip(texts, text_lens)
+        ], dtype=np.float64)
+
+        # Determine filter results and reasons for detailed logging
+        keeps, reasons = get_keep_and_reason(char_rep_ratios, self.min_ratio,
+                                             self.max_ratio)
+        for idx, char_rep_ratio, text_len, keep, reason in zip(
+                indices, char_rep_ratios.tolist(), text_lens.tolist(), keeps,
+                reasons):
+            samples_stats[idx][StatsKeys.char_rep_ratio] = char_rep_ratio
+            # Handle empty or very short text
+            if text_len < self.n:
+                keep = False
+                reason = 'empty_text'
             # Store detailed information for logging
-            sample[Fields.stats][f'{StatsKeys.char_rep_ratio}_detail'] = {
-                'ratio': '0.0',
-                'keep': False,
-                'reason': 'empty_text',
+            samples_stats[idx][f'{StatsKeys.char_rep_ratio}_detail'] = {
+                'ratio': str(char_rep_ratio),
+                'keep': keep,
+                'reason': reason,
                 'text_length': text_len,
                 'rep_len': self.n
             }
-            return sample
-
-        char_ngrams = [
-            text[i:i + self.n]
-            for i in range(text_len - self.n + 1)
-        ]
-        freq_char_ngrams = {}
-        for char_ngram in char_ngrams:
-            freq_char_ngrams[char_ngram] = (
-                freq_char_ngrams.get(char_ngram, 0) + 1)
 
-        if len(freq_char_ngrams) == 0:
-            char_rep_ratio = 0.0
-        else:
-            freq_char_ngrams = sorted(list(freq_char_ngrams.values()),
-                                      reverse=True)
-            num_no_rep_char_ngrams = len(
-                [el for el in freq_char_ngrams if el == 1])
-            num_rep_char_ngrams = min(
-                int(np.sqrt(len(freq_char_ngrams))),
-                len(freq_char_ngrams) - num_no_rep_char_ngrams,
-            )
-            char_rep_ratio = (sum(
-                freq_char_ngrams[:num_rep_char_ngrams]) / sum(freq_char_ngrams)) \
-                if sum(freq_char_ngrams) != 0 else 0.0
-        
-        sample[Fields.stats][StatsKeys.char_rep_ratio] = char_rep_ratio
-        
-        # Determine filter result and reason for detailed logging
-        if char_rep_ratio < self.min_ratio:
-            keep = False
-            reason = 'below_min'
-        elif char_rep_ratio > self.max_ratio:
-            keep = False
-            reason = 'above_max'
-        else:
-            keep = True
-            reason = 'kept'
-        
-        # Store detailed information for logging
-        sample[Fields.stats][f'{StatsKeys.char_rep_ratio}_detail'] = {
-            'ratio': str(char_rep_ratio),
-            'keep': keep,
-            'reason': reason,
-            'text_length': text_len,
-            'rep_len': self.n
-        }
-        
-        return sample
+        return samples
 
     def process(self, sample):
         if self.min_ratio <= sample[Fields.stats][StatsKeys.char_rep_ratio] \
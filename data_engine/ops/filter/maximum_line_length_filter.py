@@ -1,10 +1,12 @@
 import sys
 
+import numpy as np
 from jsonargparse.typing import PositiveInt
 
 from data_engine.utils.constant import Fields, InterVars, StatsKeys
 
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
+from ..common import get_keep_and_reason
 from ..op_fusion import INTER_LINES
 
 
@@ -14,6 +16,8 @@ class MaximumLineLengthFilter(Filter):
     """Filter to keep samples with maximum line length within a specific
     range."""
 
+    _batched_op = True
+
     def __init__(self,
                  min_len: PositiveInt = 10,
                  max_len: PositiveInt = sys.maxsize,
@@ -38,42 +42,49 @@ class MaximumLineLengthFilter(Filter):
         # Enable detailed logging for this filter
         self.enable_detailed_logging = True
 
-    def compute_stats(self, sample, context=False):
+    def compute_stats(self, samples, context=False):
+        samples_stats = samples[Fields.stats]
         # check if it's computed already
-        if StatsKeys.max_line_length in sample[Fields.stats]:
-            return sample
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if StatsKeys.max_line_length not in stat
+        ]
+        if len(indices) == 0:
+            return samples
 
         context_key = f'{InterVars.lines}'
-        if context and context_key in sample[Fields.context]:
-            lines = sample[Fields.context][context_key]
-        else:
-            lines = sample[self.text_key].splitlines()
-            if context:
-                sample[Fields.context][context_key] = lines
-        line_lengths = list(map(len, lines))
-        max_len = max(line_lengths) if line_lengths else 0
-        sample[Fields.stats][StatsKeys.max_line_length] = max_len
-        
-        # Determine filter result and reason for detailed logging
-        if max_len < self.min_len:
-            keep = False
-            reason = 'below_min'
-        elif max_len > self.max_len:
-            keep = False
-            reason = 'above_max'
-        else:
-            keep = True
-            reason = 'kept'
-        
-        # Store detailed information for logging
-        sample[Fields.stats][f'{StatsKeys.max_line_length}_detail'] = {
-            'max_line_length': max_len,
-            'num_lines': len(lines),
-            'keep': keep,
-            'reason': reason
-        }
-        
-        return sample
+        texts = samples[self.text_key]
+        lines_list = []
+        for idx in indices:
+            if context and context_key in samples[Fields.context][idx]:
+                lines = samples[Fields.context][idx][context_key]
+            else:
+                lines = texts[idx].splitlines()
+                if context:
+                    samples[Fields.context][idx][context_key] = lines
+            lines_list.append(lines)
+        num_lines = np.array([len(lines) for lines in lines_list],
+                             dtype=np.int64)
+        max_lens = np.array(
+            [max(map(len, lines), default=0) for lines in lines_list],
+            dtype=np.int64)
+
+        # Determine filter results and reasons for detailed logging
+        keeps, reasons = get_keep_and_reason(max_lens, self.min_len,
+                                             self.max_len)
+        for idx, max_len, num, keep, reason in zip(indices, max_lens.tolist(),
+                                                 num_lines.tolist(), keeps,
+                                                 reasons):
+            samples_stats[idx][StatsKeys.max_line_length] = max_len
+            # Store detailed information for logging
+            samples_stats[idx][f'{StatsKeys.max_line_length}_detail'] = {
+                'max_line_length': max_len,
+                'num_lines': num,
+                'keep': keep,
+                'reason': reason
+            }
+
+        return samples
 
     def process(self, sample):
         if self.min_len <= sample[Fields.stats][
@@ -7,12 +7,14 @@ import json
 
 from jsonargparse.typing import PositiveFloat
 from loguru import logger
-from openai import OpenAI
 
 from data_engine.utils.constant import Fields, StatsKeys
+from data_engine.utils.llm_cache_utils import LLMResponseCache
 from data_engine.utils.mm_utils import remove_special_tokens
 
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
+from ..common.llm_client import (create_headers, get_llm_engine,
+                                 parse_chat_response)
 
 OP_NAME = 'perplexity_filter'
 
@@ -42,12 +44,18 @@ class PerplexityFilter(Filter):
     value. Uses LLM API to evaluate text quality."""
 
     _accelerator = 'cpu'
+    _batched_op = True
 
     def __init__(self,
                  base_url: str = 'https://dashscope.aliyuncs.com/compatible-mode/v1',
                  model: str = 'qwen-max',
                  api_key: str = '',
                  max_ppl: PositiveFloat = 1500,
+                 max_concurrency: int = 16,
+                 requests_per_second: float = None,
+                 max_retries: int = 3,
+                 use_response_cache: bool = False,
+                 response_cache_ttl: float = None,
                  *args,
                  **kwargs):
         """
@@ -58,11 +66,24 @@ class PerplexityFilter(Filter):
         :param api_key: API key for authentication. Required.
         :param max_ppl: The max filter perplexity in this op, samples
             will be filtered if their perplexity exceeds this parameter.
+        :param max_concurrency: max number of requests in flight. The
+            samples of a batch are evaluated concurrently.
+        :param requests_per_second: max request rate, no limit if it's None.
+        :param max_retries: max number of retries of a failed request.
+        :param use_response_cache: whether to cache the API responses on
+            disk, so that the same requests are not sent again when the
+            recipe is rerun.
+        :param response_cache_ttl: seconds for a cached response to live,
+            or None to keep it until it's evicted.
         :param args: extra args
         :param kwargs: extra args
         """
         super().__init__(*args, **kwargs)
-        self.num_proc = 1
+        # the requests of a batch are already sent concurrently, and
+        # max_concurrency and requests_per_second limit each process, so
+        # it runs in a single process unless num_proc is set explicitly
+        if self.num_proc is None:
+            self.num_proc = 1
 
         self.base_url = base_url
         self.model = model
@@ -75,61 +96,81 @@ class PerplexityFilter(Filter):
         # Enable detailed logging for this filter
         self.enable_detailed_logging = True
 
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # requests are sent to the OpenAI-compatible chat completions API
+        self.engine = get_llm_engine(max_concurrency=max_concurrency,
+                                     requests_per_second=requests_per_second,
+                                     max_retries=max_retries)
+        self.response_cache = LLMResponseCache(
+            ttl=response_cache_ttl) if use_response_cache else None
 
-    def compute_stats(self, sample, context=False):
+    def compute_stats(self, samples, context=False):
+        samples_stats = samples[Fields.stats]
         # check if it's computed already
-        if StatsKeys.perplexity in sample[Fields.stats]:
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if StatsKeys.perplexity not in stat
+        ]
+        if len(indices) == 0:
             logger.debug(f'[{OP_NAME}] Perplexity already computed, skipping')
-            return sample
-
-        text = remove_special_tokens(sample[self.text_key])
-        logger.debug(f'[{OP_NAME}] Input text (first 100 chars): {text[:100]}...')
-
-        # Call LLM API to evaluate perplexity
-        ppl = self._evaluate_perplexity_with_llm(text)
-        sample[Fields.stats][StatsKeys.perplexity] = ppl
-        logger.debug(f'[{OP_NAME}] Computed perplexity: {ppl}')
-
-        # Determine filter result and reason for detailed logging
-        if ppl <= self.max_ppl:
-            keep = True
-            reason = 'kept'
-        else:
-            keep = False
-            reason = 'above_max'
-
-        # Store detailed information for logging
-        sample[Fields.stats][f'{StatsKeys.perplexity}_detail'] = {
-            'perplexity': str(ppl),
-            'keep': keep,
-            'reason': reason,
-            'num_chars': len(text)
-        }
-
-        return sample
-
-    def _evaluate_perplexity_with_llm(self, text: str) -> float:
+            return samples
+
+        texts = [
+            remove_special_tokens(samples[self.text_key][idx])
+            for idx in indices
+        ]
+
+        # Call LLM API to evaluate perplexity of the whole batch concurrently
+        ppls = self._evaluate_perplexity_with_llm(texts)
+        for idx, text, ppl in zip(indices, texts, ppls):
+            samples_stats[idx][StatsKeys.perplexity] = ppl
+            logger.debug(f'[{OP_NAME}] Computed perplexity: {ppl}')
+
+            # Determine filter result and reason for detailed logging
+            if ppl <= self.max_ppl:
+                keep = True
+                reason = 'kept'
+            else:
+                keep = False
+                reason = 'above_max'
+
+            # Store detailed information for logging
+            samples_stats[idx][f'{StatsKeys.perplexity}_detail'] = {
+                'perplexity': str(ppl),
+                'keep': keep,
+                'reason': reason,
+                'num_chars': len(text)
+            }
+
+        return samples
+
+    def _evaluate_perplexity_with_llm(self, texts):
         """
-        Use LLM to evaluate the perplexity score of text.
+        Use LLM to evaluate the perplexity scores of texts.
         Lower score means better quality.
 
-        :param text: Input text to evaluate.
-        :return: Perplexity score (lower is better).
+        :param texts: Input texts to evaluate.
+        :return: Perplexity scores (lower is better).
         """
+        logger.debug(f'[{OP_NAME}] Calling LLM API with model: {self.model}, '
+                     f'texts: {len(texts)}')
+        payloads = [{
+            'model': self.model,
+            'messages': [
+                {"role": "system", "content": DEFAULT_SYSTEM_PROMPT},
+                {"role": "user", "content": text},
+            ],
+            'stream': False
+        } for text in texts]
+        results = self.engine.post_batch(
+            f'{self.base_url.rstrip("/")}/chat/completions', payloads,
+            create_headers(self.api_key),
+            cache=self.response_cache)
+        return [self._parse_perplexity(result) for result in results]
+
+    def _parse_perplexity(self, result) -> float:
+        response_text = None
         try:
-            logger.debug(f'[{OP_NAME}] Calling LLM API with model: {self.model}')
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": DEFAULT_SYSTEM_PROMPT},
-                    {"role": "user", "content": text},
-                ],
-                stream=False
-            )
-
-            response_text = completion.choices[0].message.content.strip()
+            response_text = parse_chat_response(result).strip()
             logger.debug(f'[{OP_NAME}] LLM raw response: {response_text}')
 
             # Parse JSON response
@@ -145,6 +186,11 @@ class PerplexityFilter(Filter):
             logger.error(f'[{OP_NAME}] LLM API call failed: {e}')
             return 1500.0  # Return high perplexity on error (will be filtered)
 
+    def run(self, dataset, *, exporter=None, tracer=None):
+        if self.response_cache is not None:
+            self.response_cache.reset_counters()
+        return super().run(dataset, exporter=exporter, tracer=tracer)
+
     def process(self, sample):
         ppl = sample[Fields.stats][StatsKeys.perplexity]
         keep = ppl <= self.max_ppl
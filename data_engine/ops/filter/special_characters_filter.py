@@ -2,12 +2,14 @@
 # https://huggingface.co/spaces/huggingface/text-data-filtering
 # --------------------------------------------------------
 
+import numpy as np
 from jsonargparse.typing import ClosedUnitInterval
 
 from data_engine.utils.constant import Fields, StatsKeys
 
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
-from ..common import SPECIAL_CHARACTERS
+from ..common import (SPECIAL_CHARACTERS, count_chars_in_texts,
+                      get_keep_and_reason, get_text_lengths)
 
 
 @OPERATORS.register_module('special_characters_filter')
@@ -15,6 +17,8 @@ class SpecialCharactersFilter(Filter):
     """Filter to keep samples with special-char ratio within a specific
     range."""
 
+    _batched_op = True
+
     def __init__(self,
                  min_ratio: ClosedUnitInterval = 0.0,
                  max_ratio: ClosedUnitInterval = 0.25,
@@ -39,40 +43,42 @@ class SpecialCharactersFilter(Filter):
         # Enable detailed logging for this filter
         self.enable_detailed_logging = True
 
-    def compute_stats(self, sample):
+    def compute_stats(self, samples):
+        samples_stats = samples[Fields.stats]
         # check if it's computed already
-        if StatsKeys.special_char_ratio in sample[Fields.stats]:
-            return sample
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if StatsKeys.special_char_ratio not in stat
+        ]
+        if len(indices) == 0:
+            return samples
 
-        text = sample[self.text_key]
-        text_len = len(text)
-        special_char_count = len([c for c in text if c in SPECIAL_CHARACTERS])
-        ratio = (special_char_count / text_len) if text_len != 0 else 0.0
-        
+        texts = [samples[self.text_key][idx] for idx in indices]
+        text_lens = get_text_lengths(texts)
+        special_char_counts = count_chars_in_texts(texts, SPECIAL_CHARACTERS)
         # get ratio of special characters
-        sample[Fields.stats][StatsKeys.special_char_ratio] = ratio
-        
-        # Determine filter result and reason for detailed logging
-        if ratio < self.min_ratio:
-            keep = False
-            reason = 'below_min'
-        elif ratio > self.max_ratio:
-            keep = False
-            reason = 'above_max'
-        else:
-            keep = True
-            reason = 'kept'
-        
-        # Store detailed information for logging
-        sample[Fields.stats][f'{StatsKeys.special_char_ratio}_detail'] = {
-            'ratio': str(ratio),
-            'special_char_count': special_char_count,
-            'text_length': text_len,
-            'keep': keep,
-            'reason': reason
-        }
-        
-        return sample
+        ratios = np.divide(special_char_counts,
+                           text_lens,
+                           out=np.zeros(len(texts), dtype=np.float64),
+                           where=text_lens != 0)
+
+        # Determine filter results and reasons for detailed logging
+        keeps, reasons = get_keep_and_reason(ratios, self.min_ratio,
+                                             self.max_ratio)
+        for idx, ratio, special_char_count, text_len, keep, reason in zip(
+                indices, ratios.tolist(), special_char_counts.tolist(),
+                text_lens.tolist(), keeps, reasons):
+            samples_stats[idx][StatsKeys.special_char_ratio] = ratio
+            # Store detailed information for logging
+            samples_stats[idx][f'{StatsKeys.special_char_ratio}_detail'] = {
+                'ratio': str(ratio),
+                'special_char_count': special_char_count,
+                'text_length': text_len,
+                'keep': keep,
+                'reason': reason
+            }
+
+        return samples
 
     def process(self, sample):
         if self.min_ratio <= \
@@ -2,7 +2,7 @@ from typing import Callable
 
 from ...utils.constant import Fields, StatsKeys
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
-from pybloom_live import ScalableBloomFilter
+from ..common.shared_bloom_filter import SharedBloomFilter
 from text_dedup.utils.hashfunc import md5_digest
 from text_dedup.utils.hashfunc import sha256_digest
 from text_dedup.utils.hashfunc import xxh3_128_digest
@@ -14,6 +14,8 @@ OP_NAME = 'text_bloom_filter'
 class TextBloomFilter(Filter):
     """A filter class that uses a Bloom filter to detect and remove duplicate text samples."""
 
+    _batched_op = True
+
     def __init__(self,
                  error_rate: float = 1e-6,
                  hash_func: str = 'md5',
@@ -25,7 +27,10 @@ class TextBloomFilter(Filter):
 
         :param error_rate: The desired error rate for the bloom filter, default is 1e-6
         :param hash_func: The hash function to use, supported options are 'md5', 'sha256', 'xxh3', default is 'md5'
-        :param initial_capacity: The initial capacity of the bloom filter, default is 100
+        :param initial_capacity: The initial capacity of the bloom filter, default is 100.
+            It's enlarged to the number of samples when the op runs on a dataset,
+            and the filter scales when more samples are added, e.g. when the
+            stats are computed by a streaming pipeline or by Ray workers
         :param args: extra args
         :param kwargs: extra args
         """
@@ -39,49 +44,72 @@ class TextBloomFilter(Filter):
         # Enable detailed logging for this filter
         self.enable_detailed_logging = True
 
-        self.bf = ScalableBloomFilter(
-            initial_capacity=initial_capacity,
-            error_rate=error_rate,
-        )
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        # the filter is created lazily, since its size depends on the number
+        # of samples to process
+        self.bf = None
         self.flags = set()
 
-    def compute_stats(self, sample, context=False):
-        # check if it's computed already
-        if StatsKeys.bloom in sample[Fields.stats]:
-            return sample
-        text = sample[self.text_key]
-
-        # Calculate the hash value
-        text_bytes = text.encode('utf-8')
-        hash_value = self.hash_func(text_bytes)
+    def _get_bloom_filter(self, capacity=None):
+        if self.bf is None:
+            self.bf = SharedBloomFilter(
+                capacity=max(capacity or 0, self.initial_capacity),
+                error_rate=self.error_rate,
+            )
+        return self.bf
 
-        # Check if it already exists (using the in operator)
-        is_duplicate = hash_value in self.bf
+    def compute_stats(self, samples, context=False):
+        samples_stats = samples[Fields.stats]
+        # check if it's computed already
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if StatsKeys.bloom not in stat
+        ]
+        if len(indices) == 0:
+            return samples
 
-        # Add to Bloom Filter (the add method returns whether it already exists)
-        self.bf.add(hash_value)
+        # Calculate the hash values
+        hash_values = [
+            self.hash_func(samples[self.text_key][idx].encode('utf-8'))
+            for idx in indices
+        ]
 
-        # Record whether it is a duplicate
-        sample[Fields.stats][StatsKeys.bloom] = is_duplicate
-        self.flags.add(is_duplicate)
-        
-        # Determine filter result and reason for detailed logging
-        keep = not is_duplicate
-        reason = 'duplicate' if is_duplicate else 'kept'
-        
-        # Store detailed information for logging
-        # Convert hash_value (bytes) to hex string for JSON serialization
-        hash_hex = hash_value.hex() if isinstance(hash_value, bytes) else str(hash_value)
-        hash_display = hash_hex[:32] if len(hash_hex) > 32 else hash_hex  # Truncate for readability
-        
-        sample[Fields.stats][f'{StatsKeys.bloom}_detail'] = {
-            'is_duplicate': is_duplicate,
-            'keep': keep,
-            'reason': reason,
-            'hash_value': hash_display
-        }
-        
-        return sample
+        # Test and add them to the Bloom Filter shared by all the workers
+        is_duplicates = self._get_bloom_filter().add_many(
+            hash_values).tolist()
+
+        for idx, hash_value, is_duplicate in zip(indices, hash_values,
+                                                 is_duplicates):
+            # Record whether it is a duplicate
+            samples_stats[idx][StatsKeys.bloom] = is_duplicate
+            self.flags.add(is_duplicate)
+
+            # Determine filter result and reason for detailed logging
+            keep = not is_duplicate
+            reason = 'duplicate' if is_duplicate else 'kept'
+
+            # Store detailed information for logging
+            # Convert hash_value (bytes) to hex string for JSON serialization
+            hash_hex = hash_value.hex() if isinstance(
+                hash_value, bytes) else str(hash_value)
+            hash_display = hash_hex[:32] if len(
+                hash_hex) > 32 else hash_hex  # Truncate for readability
+
+            samples_stats[idx][f'{StatsKeys.bloom}_detail'] = {
+                'is_duplicate': is_duplicate,
+                'keep': keep,
+                'reason': reason,
+                'hash_value': hash_display
+            }
+
+        return samples
+
+    def run(self, dataset, *, exporter=None, tracer=None):
+        # size the filter for the whole dataset before the workers are
+        # forked, so that all of them share the same one
+        self._get_bloom_filter(len(dataset))
+        return super().run(dataset, exporter=exporter, tracer=tracer)
 
     def process(self, sample):
         return not sample[Fields.stats][StatsKeys.bloom]
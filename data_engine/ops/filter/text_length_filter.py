@@ -5,6 +5,7 @@ from jsonargparse.typing import PositiveInt
 from data_engine.utils.constant import Fields, StatsKeys
 
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
+from ..common import get_keep_and_reason, get_text_lengths
 
 
 @OPERATORS.register_module('text_length_filter')
@@ -12,6 +13,8 @@ class TextLengthFilter(Filter):
     """Filter to keep samples with total text length within a specific
     range."""
 
+    _batched_op = True
+
     def __init__(self,
                  min_len: PositiveInt = 10,
                  max_len: PositiveInt = sys.maxsize,
@@ -36,33 +39,33 @@ class TextLengthFilter(Filter):
         # Enable detailed logging for this filter
         self.enable_detailed_logging = True
 
-    def compute_stats(self, sample):
+    def compute_stats(self, samples):
+        samples_stats = samples[Fields.stats]
         # check if it's computed already
-        if StatsKeys.text_len in sample[Fields.stats]:
-            return sample
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if StatsKeys.text_len not in stat
+        ]
+        if len(indices) == 0:
+            return samples
 
-        text_len = len(sample[self.text_key])
-        sample[Fields.stats][StatsKeys.text_len] = text_len
-        
-        # Determine filter result and reason for detailed logging
-        if text_len < self.min_len:
-            keep = False
-            reason = 'below_min'
-        elif text_len > self.max_len:
-            keep = False
-            reason = 'above_max'
-        else:
-            keep = True
-            reason = 'kept'
-        
-        # Store detailed information for logging
-        sample[Fields.stats][f'{StatsKeys.text_len}_detail'] = {
-            'length': str(text_len),
-            'keep': keep,
-            'reason': reason
-        }
-        
-        return sample
+        texts = samples[self.text_key]
+        text_lens = get_text_lengths([texts[idx] for idx in indices]).tolist()
+
+        # Determine filter results and reasons for detailed logging
+        keeps, reasons = get_keep_and_reason(text_lens, self.min_len,
+                                             self.max_len)
+        for idx, text_len, keep, reason in zip(indices, text_lens, keeps,
+                                               reasons):
+            samples_stats[idx][StatsKeys.text_len] = text_len
+            # Store detailed information for logging
+            samples_stats[idx][f'{StatsKeys.text_len}_detail'] = {
+                'length': str(text_len),
+                'keep': keep,
+                'reason': reason
+            }
+
+        return samples
 
     def process(self, sample):
         if self.min_len <= sample[Fields.stats][
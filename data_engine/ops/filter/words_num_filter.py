@@ -7,8 +7,8 @@ from data_engine.utils.constant import Fields, InterVars, StatsKeys
 from data_engine.utils.model_utils import get_model, prepare_model
 
 from ..base_op import OPERATORS, Filter, Sample, Param, DataType
-from ..common import (SPECIAL_CHARACTERS, get_words_from_document,
-                      words_refinement)
+from ..common import (SPECIAL_CHARACTERS, get_keep_and_reason,
+                      get_words_from_document, words_refinement)
 from ..op_fusion import INTER_WORDS
 
 OP_NAME = 'words_num_filter'
@@ -23,6 +23,8 @@ class WordsNumFilter(Filter):
     """Filter to keep samples with total words number within a specific
     range."""
 
+    _batched_op = True
+
     def __init__(self,
                  lang: str = 'en',
                  tokenization: bool = False,
@@ -57,44 +59,46 @@ class WordsNumFilter(Filter):
             self.model_key = prepare_model(model_type='sentencepiece',
                                            lang=lang)
 
-    def compute_stats(self, sample, context=False):
+    def compute_stats(self, samples, context=False):
+        samples_stats = samples[Fields.stats]
         # check if it's computed already
-        if StatsKeys.num_words in sample[Fields.stats]:
-            return sample
+        indices = [
+            idx for idx, stat in enumerate(samples_stats)
+            if StatsKeys.num_words not in stat
+        ]
+        if len(indices) == 0:
+            return samples
 
         words_key = f'{InterVars.words}-{self.model_key}'
-        if context and words_key in sample[Fields.context]:
-            words = sample[Fields.context][words_key]
-        else:
-            tokenizer = get_model(self.model_key)
-            words = get_words_from_document(
-                sample[self.text_key],
-                token_func=tokenizer.encode_as_pieces if tokenizer else None)
-            if context:
-                sample[Fields.context][words_key] = words
-        words = words_refinement(words, strip_chars=SPECIAL_CHARACTERS)
-        num_words = len(words)
-        sample[Fields.stats][StatsKeys.num_words] = num_words
-        
-        # Determine filter result and reason for detailed logging
-        if num_words < self.min_num:
-            keep = False
-            reason = 'below_min'
-        elif num_words > self.max_num:
-            keep = False
-            reason = 'above_max'
-        else:
-            keep = True
-            reason = 'kept'
-        
-        # Store detailed information for logging
-        sample[Fields.stats][f'{StatsKeys.num_words}_detail'] = {
-            'num_words': num_words,
-            'keep': keep,
-            'reason': reason
-        }
-        
-        return sample
+        tokenizer = get_model(self.model_key)
+        nums_words = []
+        for idx in indices:
+            if context and words_key in samples[Fields.context][idx]:
+                words = samples[Fields.context][idx][words_key]
+            else:
+                words = get_words_from_document(
+                    samples[self.text_key][idx],
+                    token_func=tokenizer.encode_as_pieces
+                    if tokenizer else None)
+                if context:
+                    samples[Fields.context][idx][words_key] = words
+            words = words_refinement(words, strip_chars=SPECIAL_CHARACTERS)
+            nums_words.append(len(words))
+
+        # Determine filter results and reasons for detailed logging
+        keeps, reasons = get_keep_and_reason(nums_words, self.min_num,
+                                             self.max_num)
+        for idx, num_words, keep, reason in zip(indices, nums_words, keeps,
+                                                reasons):
+            samples_stats[idx][StatsKeys.num_words] = num_words
+            # Store detailed information for logging
+            samples_stats[idx][f'{StatsKeys.num_words}_detail'] = {
+                'num_words': num_words,
+                'keep': keep,
+                'reason': reason
+            }
+
+        return samples
 
     def process(self, sample):
         if self.min_num <= sample[Fields.stats][
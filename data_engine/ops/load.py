@@ -5,13 +5,13 @@ from loguru import logger
 from data_engine.utils.availability_utils import UNAVAILABLE_OPERATORS
 
 from .base_op import OPERATORS
-from .op_fusion import fuse_operators
+from .op_fusion import fuse_operators, stream_operators
 from data_server.log_tools.tools import (insert_pipline_job_run_task_log_error,
                                            set_pipline_job_operator_status,
                                            OperatorStatusEnum)
 
 
-def load_ops(process_list, op_fusion=False,job_uid=""):
+def load_ops(process_list, op_fusion=False,job_uid="", op_streaming=False):
     """
     Load op list according to the process list from config file.
 
@@ -20,6 +20,8 @@ def load_ops(process_list, op_fusion=False,job_uid=""):
     :param op_fusion: whether to fuse ops that share the same intermediate
         variables.
     :param job_uid: pipline job uid
+    :param op_streaming: whether to chain consecutive mappers and filters
+        into streaming pipelines.
     :return: The op instance list.
     """
     ops = []
@@ -49,6 +51,10 @@ def load_ops(process_list, op_fusion=False,job_uid=""):
         if op_fusion:
             new_process_list, ops = fuse_operators(new_process_list, ops,job_uid=job_uid)
 
+        # chain consecutive mappers and filters
+        if op_streaming:
+            new_process_list, ops = stream_operators(new_process_list, ops, job_uid=job_uid)
+
         for op_cfg, op in zip(new_process_list, ops):
             op._op_cfg = op_cfg
 
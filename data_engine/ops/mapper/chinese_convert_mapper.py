@@ -27,6 +27,8 @@ class ChineseConvertMapper(Mapper):
     """Mapper to convert Chinese between Traditional Chinese, Simplified Chinese
     and Japanese Kanji."""
 
+    _detailed_logging_run = True
+
     def __init__(self, mode: str = 's2t', *args, **kwargs):
         """
         Initialization method.
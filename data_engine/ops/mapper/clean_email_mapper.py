@@ -7,6 +7,8 @@ from ..base_op import OPERATORS, Mapper, Sample, Param, DataType
 class CleanEmailMapper(Mapper):
     """Mapper to clean email in text samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, pattern: str = None, repl: str = '', *args, **kwargs):
         """
         Initialization method.
@@ -16,6 +16,8 @@ with AvailabilityChecking(['selectolax'], OP_NAME):
 class CleanHtmlMapper(Mapper):
     """Mapper to clean html code in text samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, *args, **kwargs):
         """
         Initialization method.
@@ -7,6 +7,8 @@ from ..base_op import OPERATORS, Mapper, Sample, Param, DataType
 class CleanIpMapper(Mapper):
     """Mapper to clean ipv4 and ipv6 address in text samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, pattern: str = None, repl: str = '', *args, **kwargs):
         """
         Initialization method.
@@ -10,6 +10,8 @@ from ..base_op import OPERATORS, Mapper, Sample, Param, DataType
 class CleanLinksMapper(Mapper):
     """Mapper to clean links like http/https/ftp in text samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, pattern: str = None, repl: str = '', *args, **kwargs):
         """
         Initialization method.
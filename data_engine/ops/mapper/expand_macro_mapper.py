@@ -12,6 +12,8 @@ class ExpandMacroMapper(Mapper):
     """Mapper to expand macro definitions in the document body of Latex
     samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, *args, **kwargs):
         """
         Initialization method.
@@ -1,10 +1,13 @@
 import json
 import re
-import requests
+
+import httpx
 
 from loguru import logger
 
 from data_engine.ops.base_op import OPERATORS, Mapper, Sample, Param, DataType
+from data_engine.ops.common.llm_client import create_headers, get_llm_engine
+from data_engine.utils.llm_cache_utils import LLMResponseCache
 
 OP_NAME = 'extract_qa_mapper'
 
@@ -41,6 +44,10 @@ class ExtractQAMapper(Mapper):
     """
 
     _accelerator = 'cpu'
+    _batched_op = True
+    # samples of a batch are sent concurrently, so a batch should hold
+    # a few times max_concurrency requests
+    _default_batch_size = 64
 
     def __init__(self,
                  model_url: str = 'https://api.deepseek.com/v1',
@@ -48,10 +55,46 @@ class ExtractQAMapper(Mapper):
                  auth_token: str = '',
                  pattern: str = None,
                  qa_format: str = 'chatml',
+                 max_concurrency: int = 16,
+                 requests_per_second: float = None,
+                 max_retries: int = 3,
+                 use_response_cache: bool = False,
+                 response_cache_ttl: float = None,
                  *args,
                  **kwargs):
+        """
+        Initialization method.
+
+        :param model_url: URL of the chat completions API.
+        :param model_name: name of the model to call.
+        :param auth_token: token for API access.
+        :param pattern: regular expression to extract the QA pairs from
+            the model output.
+        :param qa_format: output format of the QA pairs.
+        :param max_concurrency: max number of requests in flight. The
+            samples of a batch are sent concurrently.
+        :param requests_per_second: max request rate, no limit if it's None.
+        :param max_retries: max number of retries of a failed request.
+        :param use_response_cache: whether to cache the API responses on
+            disk, so that the same requests are not sent again when the
+            recipe is rerun.
+        :param response_cache_ttl: seconds for a cached response to live,
+            or None to keep it until it's evicted.
+        :param args: extra args
+        :param kwargs: extra args
+        """
         super().__init__(*args, **kwargs)
-        self.num_proc = 1
+        # the requests of a batch are already sent concurrently, and
+        # max_concurrency and requests_per_second limit each process, so
+        # it runs in a single process unless num_proc is set explicitly
+        if self.num_proc is None:
+            self.num_proc = 1
+        self.engine = get_llm_engine(max_concurrency=max_concurrency,
+                                     requests_per_second=requests_per_second,
+                                     max_retries=max_retries,
+                                     timeout=60)
+        self.response_cache = LLMResponseCache(
+            ttl=response_cache_ttl) if use_response_cache else None
 
         self.model_url = model_url
         self.model_name = model_name
@@ -88,45 +131,10 @@ class ExtractQAMapper(Mapper):
 
         return qa_list
 
-    def process(self, sample, rank=None):
-        if getattr(self, 'enable_detailed_logging', False):
-            self.total_samples += 1
-        original_text = sample[self.text_key]
-        
+    def _update_text(self, sample, result):
         try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": DEFAULT_SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": sample[self.text_key]
-                }
-            ]
-
-            headers = {
-                'Authorization': f'Bearer {self.auth_token}',
-                'Content-Type': 'application/json'
-            }
-
-            data = {
-                "model": self.model_name,
-                "messages": messages,
-                "stream": False
-            }
-
-            logger.info(f'Calling API: {self.model_url}, Model: {self.model_name}')
-
-            response = requests.post(
-                url=self.model_url,
-                headers=headers,
-                json=data,
-                timeout=60
-            )
-            response.raise_for_status()
-
-            result = response.json()
+            if isinstance(result, Exception):
+                raise result
             output = result['choices'][0]['message']['content']
 
             qa_list = self._extract_qa(output)
@@ -160,7 +168,7 @@ class ExtractQAMapper(Mapper):
             if getattr(self, 'enable_detailed_logging', False):
                 self.modified_samples += 1
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f'HTTP request error: {e}')
             logger.warning(f'API call failed, keeping original text')
             if getattr(self, 'enable_detailed_logging', False):
@@ -178,6 +186,41 @@ class ExtractQAMapper(Mapper):
 
         return sample
 
+    def process(self, samples, rank=None):
+        texts = samples[self.text_key]
+        if getattr(self, 'enable_detailed_logging', False):
+            self.total_samples += len(texts)
+
+        payloads = [{
+            "model": self.model_name,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": DEFAULT_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": text
+                }
+            ],
+            "stream": False
+        } for text in texts]
+
+        logger.info(f'Calling API: {self.model_url}, Model: {self.model_name}, '
+                    f'Samples: {len(payloads)}')
+
+        # the whole batch is sent concurrently, and each sample keeps its
+        # original text on failure
+        results = self.engine.post_batch(self.model_url, payloads,
+                                         create_headers(self.auth_token),
+                                         cache=self.response_cache)
+        new_texts = []
+        for text, result in zip(texts, results):
+            sample = self._update_text({self.text_key: text}, result)
+            new_texts.append(sample[self.text_key])
+        samples[self.text_key] = new_texts
+        return samples
+
     @classmethod
     @property
     def description(cls):
@@ -214,6 +257,8 @@ class ExtractQAMapper(Mapper):
             self.total_samples = 0
             self.modified_samples = 0
             self.unmodified_samples = 0
+            if self.response_cache is not None:
+                self.response_cache.reset_counters()
         result = super().run(dataset, exporter=exporter, tracer=tracer)
         if getattr(self, 'enable_detailed_logging', False):
             self._log_mapper_summary()
@@ -238,6 +283,8 @@ class ExtractQAMapper(Mapper):
             self._log_line(f"[{self._name}] Extract QA Summary")
             self._log_line("="*60)
             self._log_line(f"Total: {total}, Extracted: {modified} ({modified/total*100:.2f}%), Failed: {unmodified} ({unmodified/total*100:.2f}%)")
+            if self.response_cache is not None:
+                self._log_line(self.response_cache.summary())
             self._log_line("="*60)
         except: pass
     
@@ -12,6 +12,8 @@ with AvailabilityChecking(['ftfy'], OP_NAME):
 class FixUnicodeMapper(Mapper):
     """Mapper to fix unicode errors in text samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, normalization: str = None, *args, **kwargs):
         """
         Initialization method.
@@ -1,10 +1,13 @@
 import json
-import requests
 from typing import Dict
 
+import httpx
 from loguru import logger
 
 from ..base_op import OPERATORS, Mapper, Sample, Param, DataType
+from data_engine.utils.llm_cache_utils import LLMResponseCache
+
+from ..common.llm_client import create_headers, get_llm_engine
 
 DEFAULT_PROMPT_TEMPLATE = """
 为了输出下面代码片段，请生成对应prompt内容，该prompt应该用中文详细描述需求， 比如使用python实现什么功能。请回复：prompt=？
@@ -24,6 +27,8 @@ class GenerateCodeQAPairMapper(Mapper):
     Supports OpenAI-compatible API formats including Qwen, DeepSeek, GPT, etc.
     """
     _accelerator = 'cpu'
+    _batched_op = True
+    _default_batch_size = 64
 
     def __init__(self,
                  model_url: str = 'https://api.deepseek.com/chat/completions',
@@ -31,6 +36,11 @@ class GenerateCodeQAPairMapper(Mapper):
                  auth_token: str = '',
                  system_prompt: str = None,
                  sampling_params: Dict = None,
+                 max_concurrency: int = 16,
+                 requests_per_second: float = None,
+                 max_retries: int = 3,
+                 use_response_cache: bool = False,
+                 response_cache_ttl: float = None,
                  *args,
                  **kwargs):
         """
@@ -42,11 +52,30 @@ class GenerateCodeQAPairMapper(Mapper):
         :param system_prompt: System prompt for the model.
         :param sampling_params: Sampling parameters for text generation.
             e.g {'temperature': 0.9, 'top_p': 0.95}
+        :param max_concurrency: max number of requests in flight. The
+            samples of a batch are sent concurrently.
+        :param requests_per_second: max request rate, no limit if it's None.
+        :param max_retries: max number of retries of a failed request.
+        :param use_response_cache: whether to cache the API responses on
+            disk, so that the same requests are not sent again when the
+            recipe is rerun.
+        :param response_cache_ttl: seconds for a cached response to live,
+            or None to keep it until it's evicted.
         :param args: extra args
         :param kwargs: extra args
         """
         super().__init__(*args, **kwargs)
-        self.num_proc = 1
+        # the requests of a batch are already sent concurrently, and
+        # max_concurrency and requests_per_second limit each process, so
+        # it runs in a single process unless num_proc is set explicitly
+        if self.num_proc is None:
+            self.num_proc = 1
+        self.engine = get_llm_engine(max_concurrency=max_concurrency,
+                                     requests_per_second=requests_per_second,
+                                     max_retries=max_retries,
+                                     timeout=120)
+        self.response_cache = LLMResponseCache(
+            ttl=response_cache_ttl) if use_response_cache else None
 
         self.model_url = model_url
         self.model_name = model_name
@@ -74,57 +103,41 @@ class GenerateCodeQAPairMapper(Mapper):
     def build_prompt(self, code_snippet):
         return DEFAULT_PROMPT_TEMPLATE.format(input_data=code_snippet)
 
-    def process(self, sample=None, rank=None):
-        if getattr(self, 'enable_detailed_logging', False):
-            self.total_samples += 1
-        
-        try:
-            data = sample[self.text_key]
-            input_prompt = self.build_prompt(data)
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": self.system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": input_prompt
-                }
-            ]
-
-            headers = {
-                'Authorization': f'Bearer {self.auth_token}',
-                'Content-Type': 'application/json'
-            }
+    def _build_request_data(self, data):
+        input_prompt = self.build_prompt(data)
+        logger.debug(f'input_prompt is: {input_prompt}')
 
-            request_data = {
-                "model": self.model_name,
-                "messages": messages,
-                "stream": False,
+        messages = [
+            {
+                "role": "system",
+                "content": self.system_prompt
+            },
+            {
+                "role": "user",
+                "content": input_prompt
             }
-            # Merge sampling_params
-            if self.sampling_params:
-                request_data.update(self.sampling_params)
-
-            logger.info(f'Calling API: {self.model_url}, Model: {self.model_name}')
-            logger.debug(f'input_prompt is: {input_prompt}')
-
-            response = requests.post(
-                url=self.model_url,
-                headers=headers,
-                json=request_data,
-                timeout=120
-            )
-            response.raise_for_status()
-
-            result = response.json()
-            
+        ]
+
+        request_data = {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": False,
+        }
+        # Merge sampling_params
+        if self.sampling_params:
+            request_data.update(self.sampling_params)
+        return request_data
+
+    def _generate_qa_pair(self, data, result):
+        try:
+            if isinstance(result, Exception):
+                raise result
+
             if 'choices' not in result:
                 logger.error(f'API response missing "choices" field: {result}')
                 if getattr(self, 'enable_detailed_logging', False):
                     self.failed_samples += 1
-                return sample
+                return data
                 
             response_str = result['choices'][0]['message']['content']
 
@@ -133,19 +146,15 @@ class GenerateCodeQAPairMapper(Mapper):
             # Extract content after "prompt="
             generated_prompt = response_str.replace('prompt=', '').strip()
 
-            message_list = {
-                self.text_key: {
-                    'input': generated_prompt,
-                    'response': data
-                }
-            }
-            
             if getattr(self, 'enable_detailed_logging', False):
                 self.generated_samples += 1
 
-            return message_list
+            return {
+                'input': generated_prompt,
+                'response': data
+            }
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f'HTTP request error: {e}')
             logger.warning(f'API call failed, returning original sample')
             if getattr(self, 'enable_detailed_logging', False):
@@ -162,7 +171,27 @@ class GenerateCodeQAPairMapper(Mapper):
                 self.failed_samples += 1
 
         # Return original sample on failure
-        return sample
+        return data
+
+    def process(self, samples=None, rank=None):
+        texts = samples[self.text_key]
+        if getattr(self, 'enable_detailed_logging', False):
+            self.total_samples += len(texts)
+
+        logger.info(f'Calling API: {self.model_url}, Model: {self.model_name}, '
+                    f'Samples: {len(texts)}')
+
+        # the whole batch is sent concurrently
+        results = self.engine.post_batch(
+            self.model_url,
+            [self._build_request_data(data) for data in texts],
+            create_headers(self.auth_token),
+                                         cache=self.response_cache)
+        samples[self.text_key] = [
+            self._generate_qa_pair(data, result)
+            for data, result in zip(texts, results)
+        ]
+        return samples
 
     @classmethod
     @property
@@ -202,6 +231,8 @@ class GenerateCodeQAPairMapper(Mapper):
             self.total_samples = 0
             self.generated_samples = 0
             self.failed_samples = 0
+            if self.response_cache is not None:
+                self.response_cache.reset_counters()
         result = super().run(dataset, exporter=exporter, tracer=tracer)
         if getattr(self, 'enable_detailed_logging', False):
             self._log_mapper_summary()
@@ -216,6 +247,8 @@ class GenerateCodeQAPairMapper(Mapper):
             self._log_line(f"[{self._name}] Code QA Generation Summary")
             self._log_line("="*60)
             self._log_line(f"Total: {total}, Generated: {generated} ({generated/total*100:.2f}%), Failed: {failed} ({failed/total*100:.2f}%)")
+            if self.response_cache is not None:
+                self._log_line(self.response_cache.summary())
             self._log_line("="*60)
         except: pass
     
@@ -20,6 +20,7 @@ class NlpaugEnMapper(Mapper):
     """Mapper to simply augment samples in English based on nlpaug library."""
 
     _batched_op = True
+    _detailed_logging_run = True
 
     def __init__(self,
                  sequential: bool = False,
@@ -18,6 +18,7 @@ class NlpcdaZhMapper(Mapper):
     """Mapper to simply augment samples in Chinese based on nlpcda library."""
 
     _batched_op = True
+    _detailed_logging_run = True
 
     def __init__(self,
                  sequential: bool = False,
@@ -1,9 +1,11 @@
-import requests
 import json
 
+import httpx
 from loguru import logger
 
 from data_engine.ops.base_op import OPERATORS, Mapper, Sample, Param, DataType
+from data_engine.ops.common.llm_client import create_headers, get_llm_engine
+from data_engine.utils.llm_cache_utils import LLMResponseCache
 
 DEFAULT_SYSTEM_PROMPT = '''你是一个专业的指令优化助手，你的唯一任务是将用户输入的简单问题或指令扩展为更详细、更具体、更全面的指令版本。
 
@@ -29,15 +31,50 @@ OP_NAME = 'optimize_instruction_mapper'
 @OPERATORS.register_module(OP_NAME)
 class OptimizeInstructionMapper(Mapper):
     _accelerator = 'cpu'
+    _batched_op = True
+    _default_batch_size = 64
 
     def __init__(self,
                  model_url: str = 'https://api.deepseek.com/chat/completions',
                  model_name: str = 'deepseek-chat',
                  auth_token: str = '',
+                 max_concurrency: int = 16,
+                 requests_per_second: float = None,
+                 max_retries: int = 3,
+                 use_response_cache: bool = False,
+                 response_cache_ttl: float = None,
                  *args,
                  **kwargs):
+        """
+        Initialization method.
+
+        :param model_url: URL of the chat completions API.
+        :param model_name: name of the model to call.
+        :param auth_token: token for API access.
+        :param max_concurrency: max number of requests in flight. The
+            samples of a batch are sent concurrently.
+        :param requests_per_second: max request rate, no limit if it's None.
+        :param max_retries: max number of retries of a failed request.
+        :param use_response_cache: whether to cache the API responses on
+            disk, so that the same requests are not sent again when the
+            recipe is rerun.
+        :param response_cache_ttl: seconds for a cached response to live,
+            or None to keep it until it's evicted.
+        :param args: extra args
+        :param kwargs: extra args
+        """
         super().__init__(*args, **kwargs)
-        self.num_proc = 1
+        # the requests of a batch are already sent concurrently, and
+        # max_concurrency and requests_per_second limit each process, so
+        # it runs in a single process unless num_proc is set explicitly
+        if self.num_proc is None:
+            self.num_proc = 1
+        self.engine = get_llm_engine(max_concurrency=max_concurrency,
+                                     requests_per_second=requests_per_second,
+                                     max_retries=max_retries,
+                                     timeout=60)
+        self.response_cache = LLMResponseCache(
+            ttl=response_cache_ttl) if use_response_cache else None
 
         self.model_url = model_url
         self.model_name = model_name
@@ -54,45 +91,12 @@ class OptimizeInstructionMapper(Mapper):
         self.optimized_samples = 0
         self.failed_samples = 0
 
-    def process(self, sample=None, rank=None):
-        if getattr(self, 'enable_detailed_logging', False):
-            self.total_samples += 1
+    def _update_text(self, sample, result):
         original_text = sample[self.text_key]
         
         try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": DEFAULT_SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": sample[self.text_key]
-                }
-            ]
-            
-            headers = {
-                'Authorization': f'Bearer {self.auth_token}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                "model": self.model_name,
-                "messages": messages,
-                "stream": False
-            }
-            
-            logger.info(f'Calling API: {self.model_url}, Model: {self.model_name}')
-            
-            response = requests.post(
-                url=self.model_url,
-                headers=headers,
-                json=data,
-                timeout=60
-            )
-            response.raise_for_status()
-            
-            result = response.json()
+            if isinstance(result, Exception):
+                raise result
             optimized_text = result['choices'][0]['message']['content']
             
             sample[self.text_key] = optimized_text
@@ -105,7 +109,7 @@ class OptimizeInstructionMapper(Mapper):
                 else:
                     self.failed_samples += 1
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f'HTTP request error: {e}')
             logger.warning(f'API call failed, keeping original text')
             if getattr(self, 'enable_detailed_logging', False):
@@ -123,6 +127,40 @@ class OptimizeInstructionMapper(Mapper):
         
         return sample
 
+    def process(self, samples=None, rank=None):
+        texts = samples[self.text_key]
+        if getattr(self, 'enable_detailed_logging', False):
+            self.total_samples += len(texts)
+
+        payloads = [{
+            "model": self.model_name,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": DEFAULT_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": text
+                }
+            ],
+            "stream": False
+        } for text in texts]
+
+        logger.info(f'Calling API: {self.model_url}, Model: {self.model_name}, '
+                    f'Samples: {len(payloads)}')
+
+        # the whole batch is sent concurrently, and each sample keeps its
+        # original text on failure
+        results = self.engine.post_batch(self.model_url, payloads,
+                                         create_headers(self.auth_token),
+                                         cache=self.response_cache)
+        samples[self.text_key] = [
+            self._update_text({self.text_key: text}, result)[self.text_key]
+            for text, result in zip(texts, results)
+        ]
+        return samples
+
     @classmethod
     @property
     def description(cls):
@@ -164,6 +202,8 @@ class OptimizeInstructionMapper(Mapper):
             self.total_samples = 0
             self.optimized_samples = 0
             self.failed_samples = 0
+            if self.response_cache is not None:
+                self.response_cache.reset_counters()
         result = super().run(dataset, exporter=exporter, tracer=tracer)
         if getattr(self, 'enable_detailed_logging', False):
             self._log_mapper_summary()
@@ -178,6 +218,8 @@ class OptimizeInstructionMapper(Mapper):
             self._log_line(f"[{self._name}] Instruction Optimization Summary")
             self._log_line("="*60)
             self._log_line(f"Total: {total}, Optimized: {optimized} ({optimized/total*100:.2f}%), Failed: {failed} ({failed/total*100:.2f}%)")
+            if self.response_cache is not None:
+                self._log_line(self.response_cache.summary())
             self._log_line("="*60)
         except: pass
     
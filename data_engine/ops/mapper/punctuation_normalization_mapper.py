@@ -10,6 +10,8 @@ class PunctuationNormalizationMapper(Mapper):
     """Mapper to normalize unicode punctuations to English punctuations in text
     samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, *args, **kwargs):
         """
         Initialization method.
@@ -12,6 +12,8 @@ class RemoveBibliographyMapper(Mapper):
     """Mapper to remove bibliography at the end of documents in Latex
     samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, *args, **kwargs):
         """
         Initialization method.
@@ -17,6 +17,8 @@ class RemoveCommentsMapper(Mapper):
     Only support 'tex' for now.
     """
 
+    _detailed_logging_run = True
+
     def __init__(self,
                  doc_type: Union[str, List[str]] = 'tex',
                  inline: bool = True,
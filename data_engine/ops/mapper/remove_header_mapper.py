@@ -12,6 +12,8 @@ class RemoveHeaderMapper(Mapper):
     """Mapper to remove headers at the beginning of documents in Latex
     samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self, drop_no_head: bool = True, *args, **kwargs):
         """
         Initialization method.
@@ -15,6 +15,8 @@ from ..common import (SPECIAL_CHARACTERS, merge_on_whitespace_tab_newline,
 class RemoveLongWordsMapper(Mapper):
     """Mapper to remove long words within a specific range."""
 
+    _detailed_logging_run = True
+
     def __init__(self,
                  min_len: PositiveInt = 1,
                  max_len: PositiveInt = sys.maxsize,
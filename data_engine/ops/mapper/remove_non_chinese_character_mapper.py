@@ -7,6 +7,8 @@ from ..base_op import OPERATORS, Mapper, Sample, Param, DataType
 class RemoveNonChineseCharacterlMapper(Mapper):
     """Mapper to remove non chinese Character in text samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self,
                  keep_alphabet: bool = True,
                  keep_number: bool = True,
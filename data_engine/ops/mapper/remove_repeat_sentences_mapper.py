@@ -15,6 +15,8 @@ def split_sentence(text):
 class RemoveRepeatSentencesMapper(Mapper):
     """Mapper to remove repeat sentences in text samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self,
                  lowercase: bool = False,
                  ignore_special_character: bool = True,
@@ -9,6 +9,8 @@ from ..base_op import OPERATORS, Mapper, Sample, Param, DataType
 class RemoveSpecificCharsMapper(Mapper):
     """Mapper to clean specific chars in text samples."""
 
+    _detailed_logging_run = True
+
     def __init__(self,
                  chars_to_remove: Union[str, List[str]] = '◆●■►▼▲▴∆▻▷❖♡□',
                  *args,
@@ -16,6 +16,8 @@ class RemoveTableTextMapper(Mapper):
     number of tables.
     """
 
+    _detailed_logging_run = True
+
     def __init__(self,
                  min_col: from_2_to_20 = 2,
                  max_col: from_2_to_20 = 20,
@@ -18,6 +18,8 @@ with AvailabilityChecking(['sentencepiece'], OP_NAME):
 class RemoveWordsWithIncorrectSubstringsMapper(Mapper):
     """Mapper to remove words with incorrect substrings."""
 
+    _detailed_logging_run = True
+
     def __init__(self,
                  lang: str = 'en',
                  tokenization: bool = False,
@@ -11,6 +11,8 @@ class ReplaceContentMapper(Mapper):
     a specific regular expression pattern with a designated
     replacement string."""
 
+    _detailed_logging_run = True
+
     def __init__(self,
                  pattern: Union[str, List[str]] = None,
                  repl: Union[str, List[str]] = '',
@@ -14,6 +14,8 @@ with AvailabilityChecking(['nltk'], OP_NAME):
 class SentenceSplitMapper(Mapper):
     """Mapper to split text samples to sentences."""
 
+    _detailed_logging_run = True
+
     def __init__(self, lang: str = 'en', *args, **kwargs):
         """
         Initialization method.
@@ -3,7 +3,7 @@
 # --------------------------------------------------------
 
 from ..base_op import OPERATORS, Mapper, Sample,Param,DataType
-from ..common import chat_with_model
+from ..common import chat_with_model_batch
 
 OP_NAME = 'make_cosmopedia_mapper'
 
@@ -11,7 +11,8 @@ OP_NAME = 'make_cosmopedia_mapper'
 class MakeCosmopediaMapper(Mapper):
     """Mapper to generate synthetic tutorial data from seed text samples."""
 
-    # _batched_op = False
+    _batched_op = True
+    _default_batch_size = 64
 
     def __init__(self, *args, **kwargs):
         """
@@ -38,17 +39,10 @@ class MakeCosmopediaMapper(Mapper):
         self.generated_samples = 0
         self.failed_samples = 0
 
-    def process(self, sample):
-        if getattr(self, 'enable_detailed_logging', False):
-            self.total_samples += 1
-        
-        if 'content' in sample and 'text' not in sample:
-            sample['text'] = sample.pop('content')
-        if 'md' in sample and 'text' not in sample:
-            sample['text'] = sample.pop('md')
+    def _build_messages(self, sample):
         web_text = sample.get('title', '') + '\n' + sample['text']
         web_text = web_text[:self.web_text_max_len] + "......" if len(web_text) > self.web_text_max_len else web_text
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": "你是一个乐于助人的助手"
@@ -58,20 +52,37 @@ class MakeCosmopediaMapper(Mapper):
                 "content": self.content.format(web_text=web_text),
             }
         ]
-        
-        try:
-            sample['data'] = chat_with_model(self.model_url, self.auth_token, self.model, messages=messages)
-            if getattr(self, 'enable_detailed_logging', False):
-                if sample.get('data'):
-                    self.generated_samples += 1
-                else:
+
+    def process(self, samples):
+        if 'content' in samples and 'text' not in samples:
+            samples['text'] = samples.pop('content')
+        if 'md' in samples and 'text' not in samples:
+            samples['text'] = samples.pop('md')
+        num_samples = len(samples['text'])
+        if getattr(self, 'enable_detailed_logging', False):
+            self.total_samples += num_samples
+
+        messages_list = [
+            self._build_messages({
+                'title': samples['title'][idx] if 'title' in samples else '',
+                'text': samples['text'][idx]
+            }) for idx in range(num_samples)
+        ]
+        # the whole batch is sent concurrently
+        results = chat_with_model_batch(self.model_url, self.auth_token,
+                                        self.model, messages_list)
+        samples['data'] = []
+        for result in results:
+            if isinstance(result, Exception) or not result:
+                if getattr(self, 'enable_detailed_logging', False):
                     self.failed_samples += 1
-        except Exception as e:
-            if getattr(self, 'enable_detailed_logging', False):
-                self.failed_samples += 1
-            sample['data'] = ""
-        
-        return sample
+                samples['data'].append("")
+            else:
+                if getattr(self, 'enable_detailed_logging', False):
+                    self.generated_samples += 1
+                samples['data'].append(result)
+
+        return samples
 
     @classmethod
     @property
@@ -16,6 +16,8 @@ class WhitespaceNormalizationMapper(Mapper):
     https://en.wikipedia.org/wiki/Whitespace_character
     """
 
+    _detailed_logging_run = True
+
     def __init__(self, *args, **kwargs):
         """
         Initialization method.
@@ -1,11 +1,17 @@
+import traceback
 from typing import List
 
 from loguru import logger
 
 from data_engine.utils.constant import Fields, InterVars
 from data_engine.utils.registry import Registry
-from data_server.log_tools.tools import insert_pipline_job_run_task_log_info
-from .base_op import Filter
+from data_server.log_tools.tools import (OperatorStatusEnum,
+                                         insert_pipline_job_run_task_log_error,
+                                         insert_pipline_job_run_task_log_info,
+                                         set_pipline_job_operator_status)
+from .base_op import (UNFORKABLE, Filter, Mapper,
+                      convert_dict_list_to_list_dict,
+                      convert_list_dict_to_dict_list)
 
 # Type of intermediate vars
 # text
@@ -128,6 +134,85 @@ def fuse_filter_group(original_filter_group,job_uid=""):
     return fused_group_def, fused_group
 
 
+def stream_operators(process_list, ops, job_uid=""):
+    """
+    Chain consecutive Mappers and Filters into streaming pipelines and
+    return the new ops list. Each batch flows through all ops of a pipeline
+    in memory, and only the surviving samples are materialized once at the
+    end of the pipeline.
+
+    :param process_list: the list of original process definition, including op
+        names and args.
+    :param ops: the corresponding list of op objects.
+    :param job_uid: pipline job uid
+    :return: a list of streamed op definitions and objects.
+    """
+    stream_op_def = []
+    stream_ops = []
+    stream_group = []
+
+    def flush_stream_group():
+        if len(stream_group) > 1:
+            defs, group_ops = zip(*stream_group)
+            stream_def = {
+                'OpStreaming:(%s)' % ','.join([
+                    list(process.items())[0][0] for process in defs
+                ]):
+                list(defs)
+            }
+            logger.info(f'Ops are streamed into one op '
+                        f'{list(stream_def.keys())[0]}.')
+            insert_pipline_job_run_task_log_info(job_uid, f'Ops are streamed into one op '
+                                                          f'{list(stream_def.keys())[0]}.')
+            stream_op_def.append(stream_def)
+            stream_ops.append(StreamingPipeline(list(group_ops)))
+        else:
+            for process, op in stream_group:
+                stream_op_def.append(process)
+                stream_ops.append(op)
+        stream_group.clear()
+
+    for process, op in zip(process_list, ops):
+        if is_streamable(op):
+            stream_group.append((process, op))
+        else:
+            # non-streamable ops break the chain and run on their own
+            flush_stream_group()
+            stream_op_def.append(process)
+            stream_ops.append(op)
+    flush_stream_group()
+    return stream_op_def, stream_ops
+
+
+def is_streamable(op):
+    """
+    Check whether the op can be run inside a streaming pipeline. Ops that
+    need cuda or an unforkable start method, filters that export or log the
+    details of their stats, mappers that must fail the task on exceptions
+    and ops that override `run` with more than detailed logging keep running
+    on their own, since the pipeline only calls their process methods.
+
+    :param op: the op object to check.
+    :return: True if the op can be streamed.
+    """
+    if not isinstance(op, (Mapper, Filter)):
+        return False
+    if type(op).run not in (Mapper.run, Filter.run) and not getattr(
+            op, '_detailed_logging_run', False):
+        return False
+    if op.use_cuda() or getattr(op, '_name', None) in UNFORKABLE.modules:
+        return False
+    if getattr(op, 'stats_export_path', None) is not None:
+        return False
+    if getattr(op, '_raise_on_exception', False):
+        return False
+    if isinstance(op, Filter) and getattr(op, 'enable_detailed_logging',
+                                          False):
+        # the details are collected from the stats of all the input samples
+        return False
+    return True
+
+
 class FusedFilter(Filter):
     """A fused operator for filters."""
 
@@ -153,7 +238,18 @@ class FusedFilter(Filter):
         sample[Fields.context] = {}
         for op in self.fused_filters:
             # open the context for these fused ops
-            if op.accelerator == 'cuda':
+            if op.is_batched_op():
+                # batched filters work on a batch of one sample here
+                samples = {key: [value] for key, value in sample.items()}
+                if op.accelerator == 'cuda':
+                    samples = op._compute_stats(samples,
+                                                rank=rank,
+                                                context=True)
+                else:
+                    samples = op._compute_stats(samples, context=True)
+                for key, values in samples.items():
+                    sample[key] = values[0]
+            elif op.accelerator == 'cuda':
                 sample = op.compute_stats(sample, rank=rank, context=True)
             else:
                 sample = op.compute_stats(sample, context=True)
@@ -173,3 +269,143 @@ class FusedFilter(Filter):
             if not op.process(sample):
                 return False
         return True
+
+
+class StreamingPipeline(Mapper):
+    """A streaming pipeline of consecutive mappers and filters. All ops are
+    applied to a batch in memory within a single map pass, so the dataset is
+    scanned and written only once for the whole pipeline."""
+
+    _batched_op = True
+
+    def __init__(self, stream_ops: List, batch_size: int = 1000):
+        """
+        Initialization method.
+
+        :param stream_ops: a list of mappers and filters to be streamed.
+        :param batch_size: number of samples flowing through the pipeline
+            together.
+        """
+        super().__init__()
+        self.stream_ops = stream_ops
+        self.batch_size = batch_size
+        self._name = 'OpStreaming:(%s)' % ','.join(
+            [getattr(op, '_name', type(op).__name__) for op in stream_ops])
+        self.job_uid = stream_ops[0].job_uid
+        self.pipline_index = stream_ops[0].pipline_index
+        self.has_filter = any(isinstance(op, Filter) for op in stream_ops)
+
+    def runtime_np(self):
+        # the pipeline is bounded by its most resource-hungry op
+        return min(op.runtime_np() for op in self.stream_ops)
+
+    def process(self, samples):
+        keys = list(samples.keys())
+        if len(keys) == 0:
+            return samples
+        columns = {key: samples[key] for key in keys}
+        if self.has_filter and Fields.stats not in columns:
+            columns[Fields.stats] = [{} for _ in columns[keys[0]]]
+            keys.append(Fields.stats)
+        batch = convert_dict_list_to_list_dict(columns)
+        for op in self.stream_ops:
+            if len(batch) == 0:
+                break
+            if isinstance(op, Filter):
+                batch = self._filter_batch(op, batch)
+            else:
+                batch = self._map_batch(op, batch)
+        if len(batch) == 0:
+            return {key: [] for key in keys}
+        return convert_list_dict_to_dict_list(batch)
+
+    @staticmethod
+    def _split_batch(op, batch):
+        # batched ops get chunks of their own batch size, so that an op
+        # loading models or media per batch isn't given the whole batch, and
+        # a failed chunk only drops its own samples
+        size = max(int(op.batch_size or 1), 1)
+        for start in range(0, len(batch), size):
+            yield convert_list_dict_to_dict_list(batch[start:start + size])
+
+    def _map_batch(self, op, batch):
+        if op.is_batched_op():
+            return [
+                res_sample for samples in self._split_batch(op, batch)
+                for res_sample in self._to_list_dict(op.process(samples))
+            ]
+        res_batch = []
+        for sample in batch:
+            res_sample = self._run_single(op._process, sample)
+            if res_sample is not None:
+                res_batch.append(res_sample)
+        return res_batch
+
+    def _filter_batch(self, op, batch):
+        if op.is_batched_op():
+            batch = [
+                res_sample for samples in self._split_batch(op, batch)
+                for res_sample in self._to_list_dict(
+                    op.compute_stats(samples))
+            ]
+        else:
+            batch = [
+                res_sample for res_sample in (
+                    self._run_single(op._compute_stats, sample)
+                    for sample in batch) if res_sample is not None
+            ]
+        return [sample for sample in batch if op.process(sample)]
+
+    @staticmethod
+    def _to_list_dict(samples):
+        if not samples or len(next(iter(samples.values()))) == 0:
+            return []
+        return convert_dict_list_to_list_dict(samples)
+
+    @staticmethod
+    def _run_single(method, sample):
+        """Sample-level fault tolerance, same as catch_map_single_exception:
+        a sample that raises is dropped from the pipeline."""
+        from data_engine.core.data import nested_obj_factory
+        try:
+            return method(nested_obj_factory(sample))
+        except Exception as e:
+            logger.error(
+                f'An error occurred in mapper operation when processing '
+                f'sample {sample}, {type(e)}: {e}')
+            traceback.print_exc()
+            return None
+
+    def _set_status(self, status):
+        for op in self.stream_ops:
+            set_pipline_job_operator_status(op.job_uid, status, op._name,
+                                            op.pipline_index)
+
+    def run(self, dataset, *, exporter=None, tracer=None):
+        insert_pipline_job_run_task_log_info(self.job_uid, f"starting streaming job", operator_name=self._name,
+                                             operator_index=self.pipline_index)
+        self._set_status(OperatorStatusEnum.Processing)
+        try:
+            new_dataset = dataset.map(self.process,
+                                      num_proc=self.runtime_np(),
+                                      batch_size=self.batch_size,
+                                      desc=self._name + '_process')
+            if tracer:
+                logger.info(f'Skip tracing for [{self._name}] since the '
+                            f'intermediate results of streamed ops are not '
+                            f'materialized.')
+            for op in self.stream_ops:
+                if getattr(op, 'enable_detailed_logging', False) and hasattr(
+                        op, '_log_mapper_summary'):
+                    op._log_mapper_summary()
+            self._set_status(OperatorStatusEnum.SUCCESS)
+            return new_dataset
+        except Exception as e:
+            self._set_status(OperatorStatusEnum.ERROR)
+            insert_pipline_job_run_task_log_error(self.job_uid,
+                                                  f"An error occurred during data streaming: {e}",
+                                                  operator_name=self._name, operator_index=self.pipline_index)
+            raise
+        finally:
+            insert_pipline_job_run_task_log_info(self.job_uid, "ending streaming job", operator_name=self._name,
+                                                 operator_index=self.pipline_index)
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import xxhash
+from loguru import logger
+
+from data_engine.utils.cache_utils import DATA_JUICER_CACHE_HOME
+from data_engine.utils.constant import HashKeys
+
+DEFAULT_INCREMENTAL_DIR = os.path.join(DATA_JUICER_CACHE_HOME, 'incremental')
+INCREMENTAL_MANIFEST_FILE = 'manifest.json'
+
+# hash fields of exact deduplicators that are kept in the processed
+# results, which form the index to dedup new rows against prior results
+INDEXED_HASH_KEYS = [HashKeys.hash, HashKeys.imagehash, HashKeys.videohash]
+
+
+def get_file_hashes(src_path, chunk_size=1 << 20):
+    """
+    Compute the content hash of each file under a directory.
+
+    :param src_path: directory of the source files
+    :param chunk_size: number of bytes to read at a time
+    :return: a dict from the relative path of each file to its sha256
+    """
+    file_hashes = {}
+    for root, dirs, files in os.walk(src_path):
+        # skip the hidden dirs such as .git and .cache of the hub
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            file_path = os.path.join(root, name)
+            sha256 = hashlib.sha256()
+            with open(file_path, 'rb') as fin:
+                for chunk in iter(lambda: fin.read(chunk_size), b''):
+                    sha256.update(chunk)
+            rel_path = os.path.relpath(file_path, src_path)
+            file_hashes[rel_path] = sha256.hexdigest()
+    return file_hashes
+
+
+class IncrementalManager:
+    """
+    This class is used to process only the added or changed files of a
+    dataset revision, and merge the results with the prior ones, a bit like
+    checkpoint management.
+
+    The processed results of each run are saved as a segment with the
+    content hashes of its source files. A segment is reused as long as all
+    its files are unchanged, otherwise all its files that still exist are
+    processed again. New rows are deduplicated against the hashes kept in
+    the reused segments, which are computed by the exact deduplicators.
+
+    Selectors need the whole dataset, so recipes with selectors are always
+    processed from scratch.
+    """
+
+    def __init__(self, state_dir, process_list, num_proc=1):
+        """
+        Initialization method.
+
+        :param state_dir: path to save the segments and manifest of the
+            dataset, which is recipe specific.
+        :param process_list: process list in config
+        :param num_proc: number of process workers when saving dataset
+        """
+        self.state_dir = state_dir
+        self.process_list = process_list
+        self.num_proc = num_proc
+        self.manifest_file = os.path.join(state_dir, INCREMENTAL_MANIFEST_FILE)
+        self.segments_dir = os.path.join(state_dir, 'segments')
+        os.makedirs(self.segments_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self.reused_segments = []
+
+    @staticmethod
+    def get_state_dir(root_dir, source_id, branch, process_list):
+        """
+        Get the state dir of a dataset branch processed by a recipe.
+
+        :param root_dir: root dir of all the states. In default, it's
+            `incremental` under `DATA_JUICER_CACHE_HOME`.
+        :param source_id: repo id or path of the source dataset
+        :param branch: branch of the source dataset
+        :param process_list: process list in config
+        :return: the state dir
+        """
+        recipe_hash = xxhash.xxh64(
+            json.dumps(process_list, sort_keys=True,
+                       default=str).encode('utf-8')).hexdigest()
+        source_hash = xxhash.xxh64(
+            f'{source_id}@{branch}'.encode('utf-8')).hexdigest()
+        return os.path.join(root_dir or DEFAULT_INCREMENTAL_DIR, source_hash,
+                            recipe_hash)
+
+    def _load_manifest(self):
+        if os.path.isfile(self.manifest_file):
+            with open(self.manifest_file, 'r') as fin:
+                return json.load(fin)
+        return {'segments': {}}
+
+    def _save_manifest(self):
+        tmp_file = f'{self.manifest_file}.{uuid.uuid4().hex}'
+        with open(tmp_file, 'w') as fout:
+            json.dump(self.manifest, fout)
+        os.replace(tmp_file, self.manifest_file)
+
+    def get_files_to_process(self, file_hashes):
+        """
+        Get the files to process, and the prior segments to reuse.
+
+        :param file_hashes: content hashes of the current source files
+        :return: list of relative paths of files to process
+        """
+        self.reused_segments = []
+        reused_files = set()
+        for seg_id, segment in self.manifest['segments'].items():
+            if all(file_hashes.get(path) == file_hash
+                   for path, file_hash in segment['files'].items()):
+                self.reused_segments.append(seg_id)
+                reused_files.update(segment['files'].keys())
+        files_to_process = sorted(set(file_hashes.keys()) - reused_files)
+        logger.info(f'Reuse {len(self.reused_segments)} processed segments '
+                    f'of {len(reused_files)} unchanged files, and process '
+                    f'{len(files_to_process)} added or changed files.')
+        return files_to_process
+
+    @staticmethod
+    def link_files(src_path, rel_paths, dst_path):
+        """
+        Link the files to process into a directory to load them.
+
+        :param src_path: directory of the source files
+        :param rel_paths: relative paths of the files to link
+        :param dst_path: directory to link the files into
+        :return: dst_path
+        """
+        if os.path.exists(dst_path):
+            shutil.rmtree(dst_path)
+        for rel_path in rel_paths:
+            dst_file = os.path.join(dst_path, rel_path)
+            os.makedirs(os.path.dirname(dst_file), exist_ok=True)
+            os.symlink(os.path.abspath(os.path.join(src_path, rel_path)),
+                       dst_file)
+        os.makedirs(dst_path, exist_ok=True)
+        return dst_path
+
+    def _load_segment(self, seg_id):
+        from data_engine.core.data import NestedDataset
+        return NestedDataset.load_from_disk(
+            os.path.join(self.segments_dir, seg_id))
+
+    def _get_seen_hashes(self, reused_datasets):
+        seen_hashes = {}
+        for key in INDEXED_HASH_KEYS:
+            hashes = set()
+            for ds in reused_datasets:
+                if key in ds.features:
+                    hashes.update(ds.unique(key))
+            if hashes:
+                seen_hashes[key] = hashes
+        return seen_hashes
+
+    def merge(self, dataset, file_hashes, files_processed):
+        """
+        Deduplicate the newly processed rows against the reused segments,
+        save them as a new segment, and merge them with the reused ones.
+
+        :param dataset: processed dataset of the added or changed files,
+            None if there are no such files
+        :param file_hashes: content hashes of the current source files
+        :param files_processed: relative paths of the processed files
+        :return: the merged dataset
+        """
+        reused_datasets = [
+            self._load_segment(seg_id) for seg_id in self.reused_segments
+        ]
+        if dataset is not None and len(dataset) > 0:
+            seen_hashes = self._get_seen_hashes(reused_datasets)
+            keys = [key for key in seen_hashes if key in dataset.features]
+            if keys:
+                num_rows = len(dataset)
+                dataset = dataset.filter(
+                    lambda sample: all(sample[key] not in seen_hashes[key]
+                                       for key in keys),
+                    num_proc=self.num_proc,
+                    desc='incremental_dedup')
+                logger.info(f'Remove {num_rows - len(dataset)} new rows '
+                            f'duplicated with prior results.')
+
+        # update the segments
+        segments = {
+            seg_id: self.manifest['segments'][seg_id]
+            for seg_id in self.reused_segments
+        }
+        new_datasets = []
+        if dataset is not None and files_processed:
+            seg_id = uuid.uuid4().hex
+            dataset.save_to_disk(os.path.join(self.segments_dir, seg_id),
+                                 num_proc=self.num_proc)
+            segments[seg_id] = {
+                'files': {path: file_hashes[path]
+                          for path in files_processed},
+                'num_rows': len(dataset),
+            }
+            new_datasets.append(self._load_segment(seg_id))
+        stale_segments = set(self.manifest['segments']) - set(segments)
+        self.manifest['segments'] = segments
+        self._save_manifest()
+        for seg_id in stale_segments:
+            shutil.rmtree(os.path.join(self.segments_dir, seg_id),
+                          ignore_errors=True)
+
+        all_datasets = reused_datasets + new_datasets
+        if len(all_datasets) == 0:
+            return dataset
+        if len(all_datasets) == 1:
+            return all_datasets[0]
+        from datasets import concatenate_datasets
+
+        from data_engine.core.data import NestedDataset
+        return NestedDataset(concatenate_datasets(all_datasets))
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from loguru import logger
+
+from data_engine.utils.cache_utils import DATA_JUICER_CACHE_HOME
+from data_engine.utils.mm_utils import size_to_bytes
+
+DEFAULT_LLM_CACHE_FILE = os.path.join(DATA_JUICER_CACHE_HOME,
+                                      'llm_responses.sqlite')
+
+# number of writes between two evictions, since summing the sizes of all
+# entries scans the whole table
+EVICT_INTERVAL = 1000
+
+
+class LLMResponseCache:
+    """
+    This class is used to cache the responses of LLM and embedding API
+    calls in a SQLite file, so that rerunning a recipe with the same
+    requests doesn't pay for them again.
+
+    Each response is addressed by the hash of the request, i.e. the
+    endpoint, the model, the messages or inputs and the sampling params.
+    Auth tokens are not part of the key. Responses older than the TTL are
+    ignored, and the least recently used ones are evicted when the total
+    size exceeds the limit. The file can be shared by multiple processes
+    and jobs.
+    """
+
+    def __init__(self, cache_file=None, ttl=None, max_size='10GB'):
+        """
+        Initialization method.
+
+        :param cache_file: path of the SQLite file. In default, it's
+            `llm_responses.sqlite` under `DATA_JUICER_CACHE_HOME`.
+        :param ttl: seconds for a response to live, or None to keep it
+            until it's evicted.
+        :param max_size: max total size of the cached responses. It could be
+            a number of bytes or a string like "10GB".
+        """
+        self.cache_file = cache_file or DEFAULT_LLM_CACHE_FILE
+        self.ttl = ttl
+        self.max_size = max_size if isinstance(
+            max_size, (int, float)) else size_to_bytes(max_size)
+        self.hits = 0
+        self.misses = 0
+        self._num_writes = 0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # connections can't be shared across processes
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_pid'] = None
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(request):
+        """
+        Get the key of a request.
+
+        :param request: a json serializable request, e.g. a dict of the
+            endpoint and the request body
+        :return: key of the request
+        """
+        return hashlib.sha256(
+            json.dumps(request, sort_keys=True, ensure_ascii=False,
+                       default=str).encode('utf-8')).hexdigest()
+
+    def _get_conn(self):
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)),
+                        exist_ok=True)
+            conn = sqlite3.connect(self.cache_file,
+                                   timeout=60,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         'key TEXT PRIMARY KEY, response TEXT NOT NULL, '
+                         'size INTEGER NOT NULL, created_at REAL NOT NULL, '
+                         'accessed_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at '
+                         'ON responses (accessed_at)')
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get_many(self, requests):
+        """
+        Get the cached responses of requests.
+
+        :param requests: list of requests
+        :return: list of cached responses, None for the missed ones
+        """
+        keys = [self.get_key(request) for request in requests]
+        now = time.time()
+        found = {}
+        with self._lock:
+            conn = self._get_conn()
+            # sqlite limits the number of variables of a statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = conn.execute(
+                    f'SELECT key, response, created_at FROM responses '
+                    f'WHERE key IN ({",".join("?" * len(chunk))})',
+                    chunk).fetchall()
+                for key, response, created_at in rows:
+                    if self.ttl is None or now - created_at <= self.ttl:
+                        found[key] = response
+            if found:
+                conn.executemany(
+                    'UPDATE responses SET accessed_at = ? WHERE key = ?',
+                    [(now, key) for key in found])
+        results = []
+        for key in keys:
+            if key in found:
+                self.hits += 1
+                results.append(json.loads(found[key]))
+            else:
+                self.misses += 1
+                results.append(None)
+        return results
+
+    def get(self, request):
+        """
+        Get the cached response of a request.
+
+        :param request: the request
+        :return: the cached response, or None if it's missed
+        """
+        return self.get_many([request])[0]
+
+    def set_many(self, items):
+        """
+        Cache the responses of requests.
+
+        :param items: list of (request, response) pairs. The responses
+            should be json serializable.
+        """
+        if len(items) == 0:
+            return
+        now = time.time()
+        rows = []
+        for request, response in items:
+            response = json.dumps(response, ensure_ascii=False)
+            rows.append((self.get_key(request), response,
+                         len(response.encode('utf-8')), now, now))
+        with self._lock:
+            self._get_conn().executemany(
+                'INSERT OR REPLACE INTO responses '
+                '(key, response, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+            self._num_writes += len(rows)
+            if self._num_writes >= EVICT_INTERVAL:
+                self._num_writes = 0
+                self._evict()
+
+    def set(self, request, response):
+        """
+        Cache the response of a request.
+
+        :param request: the request
+        :param response: the json serializable response
+        """
+        self.set_many([(request, response)])
+
+    def _evict(self):
+        conn = self._get_conn()
+        if self.ttl is not None:
+            conn.execute('DELETE FROM responses WHERE created_at < ?',
+                         (time.time() - self.ttl, ))
+        total_size = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        to_free = total_size - self.max_size
+        rows = conn.execute(
+            'SELECT key, size FROM responses ORDER BY accessed_at')
+        keys = []
+        for key, size in rows:
+            if to_free <= 0:
+                break
+            keys.append((key, ))
+            to_free -= size
+        conn.executemany('DELETE FROM responses WHERE key = ?', keys)
+        logger.info(f'Evict {len(keys)} cached LLM responses.')
+
+    def evict(self):
+        """
+        Remove the expired responses, and evict the least recently used
+        ones until the total size is within the limit.
+        """
+        with self._lock:
+            self._evict()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def summary(self):
+        """
+        Get the hit/miss summary of the cache.
+
+        :return: summary string
+        """
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0
+        return (f'Response cache: {self.hits} hits, {self.misses} misses '
+                f'({hit_rate:.2f}% hit rate)')
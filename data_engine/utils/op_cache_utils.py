@@ -0,0 +1,305 @@
+import inspect
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import xxhash
+from loguru import logger
+
+from data_engine.utils.cache_utils import DATA_JUICER_CACHE_HOME
+from data_engine.utils.mm_utils import size_to_bytes
+
+DEFAULT_OP_CACHE_DIR = os.path.join(DATA_JUICER_CACHE_HOME, 'op_results')
+OP_CACHE_META_FILE = 'op_cache_meta.json'
+# op params holding credentials, which are neither hashed nor saved
+SECRET_PARAM_PATTERN = re.compile(
+    r'token|api_?key|password|secret|access_?key|credential', re.IGNORECASE)
+
+
+def _get_dir_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if os.path.isfile(file_path):
+                size += os.path.getsize(file_path)
+    return size
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def strip_secret_params(cfg):
+    """
+    Remove the params holding credentials, e.g. `auth_token` of the API ops,
+    from an op config, so they don't leak into the shared cache or change
+    the keys when they are rotated.
+
+    :param cfg: op config
+    :return: a copy of the config without secret params
+    """
+    if isinstance(cfg, dict):
+        return {
+            key: strip_secret_params(value)
+            for key, value in cfg.items()
+            if not SECRET_PARAM_PATTERN.search(str(key))
+        }
+    if isinstance(cfg, (list, tuple)):
+        return [strip_secret_params(value) for value in cfg]
+    return cfg
+
+
+def _get_source_modules(module):
+    """Get the modules of data_engine the code of a module depends on,
+    following its imports, except the packages that import all their
+    submodules."""
+    modules = {}
+    pending = [module]
+    while pending:
+        cur = pending.pop()
+        if cur.__name__ in modules:
+            continue
+        modules[cur.__name__] = cur
+        for value in list(vars(cur).values()):
+            if inspect.ismodule(value):
+                dep = value
+            else:
+                dep = sys.modules.get(getattr(value, '__module__', None) or '')
+            if dep is None or not dep.__name__.startswith('data_engine'):
+                continue
+            if hasattr(dep, '__path__') or dep.__name__ in modules:
+                continue
+            pending.append(dep)
+    return modules.values()
+
+
+def get_op_version(op):
+    """
+    Get the version of the implementation of an op, i.e. the hash of the
+    package version and the source files of the classes of the op and the
+    ops it's composed of, together with the modules of data_engine they
+    import, e.g. base_op and the common helpers. So cached results are not
+    reused after the code of the op changes.
+
+    :param op: op instance
+    :return: version string
+    """
+    from data_engine import __version__
+
+    ops = [op]
+    source_files = set()
+    while ops:
+        cur = ops.pop()
+        for module in _get_source_modules(sys.modules[type(cur).__module__]):
+            source_file = getattr(module, '__file__', None)
+            if source_file and source_file.endswith('.py'):
+                source_files.add(source_file)
+        ops.extend(getattr(cur, 'fused_filters', None) or [])
+        ops.extend(getattr(cur, 'stream_ops', None) or [])
+    hasher = xxhash.xxh64()
+    hasher.update(__version__.encode('utf-8'))
+    for source_file in sorted(source_files):
+        with open(source_file, 'rb') as fin:
+            hasher.update(fin.read())
+    return hasher.hexdigest()
+
+
+class OpCacheManager:
+    """
+    This class is used to cache the result dataset of each op on a shared
+    disk, so that it can be reused across jobs and users, a bit like
+    checkpoint management.
+
+    Each result is addressed by the fingerprint of the input contents and
+    the configs of all ops applied on them so far, which doesn't depend on
+    the work dir or the cache file names of each job. When the total size
+    exceeds the limit, the least recently used results are evicted.
+
+    A loaded result is linked into the work dir of the job first, so the
+    cache files written by the following ops stay out of the shared cache,
+    and an eviction by another job doesn't remove files in use.
+    """
+
+    def __init__(self,
+                 cache_dir=None,
+                 max_size='100GB',
+                 num_proc=1,
+                 work_dir=None):
+        """
+        Initialization method.
+
+        :param cache_dir: path to store the cached results. In default, it's
+            `op_results` under `DATA_JUICER_CACHE_HOME`.
+        :param max_size: max total size of the cached results. It could be
+            a number of bytes or a string like "100GB".
+        :param num_proc: number of process workers when saving dataset
+        :param work_dir: dir of the job to link the loaded results into. In
+            default, it's a temp dir.
+        """
+        self.cache_dir = cache_dir or DEFAULT_OP_CACHE_DIR
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='op_cache_')
+        self.max_size = max_size if isinstance(
+            max_size, (int, float)) else size_to_bytes(max_size)
+        self.num_proc = num_proc
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(dataset, batch_size=10000):
+        """
+        Compute the fingerprint of the contents of a dataset.
+
+        The batches are serialized in the arrow IPC format before hashing,
+        so the result only depends on the schema and the values, rather
+        than the files the dataset is loaded from.
+
+        :param dataset: input dataset
+        :param batch_size: number of samples to serialize at a time
+        :return: fingerprint string
+        """
+        hasher = xxhash.xxh64()
+        hasher.update(str(dataset.features).encode('utf-8'))
+        for table in dataset.with_format('arrow').iter(batch_size=batch_size):
+            # the same contents might be in different chunks or slices of
+            # larger buffers, which are serialized differently, so they are
+            # copied into compact buffers first
+            table = table.take(np.arange(
+                table.num_rows)).replace_schema_metadata(None)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            hasher.update(memoryview(sink.getvalue()))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def get_key(input_key, op_cfg, op_version=''):
+        """
+        Get the key of the result of an op applied on an input.
+
+        :param input_key: fingerprint of the input dataset, or the key of
+            the result of the last op
+        :param op_cfg: config of the op
+        :param op_version: version of the implementation of the op
+        :return: key of the result
+        """
+        hasher = xxhash.xxh64()
+        hasher.update(input_key.encode('utf-8'))
+        hasher.update(
+            json.dumps(strip_secret_params(op_cfg),
+                       sort_keys=True,
+                       default=str).encode('utf-8'))
+        hasher.update(op_version.encode('utf-8'))
+        return hasher.hexdigest()
+
+    def _get_entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """
+        Load a cached result.
+
+        :param key: key of the result
+        :return: the cached dataset, or None if it's not cached.
+        """
+        entry_dir = self._get_entry_dir(key)
+        meta_file = os.path.join(entry_dir, OP_CACHE_META_FILE)
+        if not os.path.isfile(meta_file):
+            return None
+        from data_engine.core.data import NestedDataset
+        local_dir = os.path.join(self.work_dir, key)
+        tmp_dir = f'{local_dir}.tmp_{uuid.uuid4().hex}'
+        try:
+            if not os.path.isdir(local_dir):
+                shutil.copytree(entry_dir,
+                                tmp_dir,
+                                copy_function=_link_or_copy)
+                os.rename(tmp_dir, local_dir)
+            ds = NestedDataset.load_from_disk(local_dir)
+        except Exception as e:
+            # e.g. evicted by another job while linking
+            logger.warning(f'Failed to load cached op result [{key}]: {e}')
+            return None
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        # update the access time for LRU eviction
+        now = time.time()
+        os.utime(meta_file, (now, now))
+        return ds
+
+    def save(self, key, ds, op_cfg=None):
+        """
+        Save the result of an op into the cache, and evict the least
+        recently used results if the cache is too large.
+
+        :param key: key of the result
+        :param ds: result dataset to save
+        :param op_cfg: config of the op, which is recorded for reference
+        """
+        entry_dir = self._get_entry_dir(key)
+        if os.path.isfile(os.path.join(entry_dir, OP_CACHE_META_FILE)):
+            return
+        # write into a temp dir first, so that other jobs never load a
+        # partially written result
+        tmp_dir = os.path.join(self.cache_dir,
+                               f'.tmp_{key}_{uuid.uuid4().hex}')
+        try:
+            ds.save_to_disk(tmp_dir, num_proc=self.num_proc)
+            with open(os.path.join(tmp_dir, OP_CACHE_META_FILE), 'w') as fout:
+                json.dump(
+                    {
+                        'op_cfg': strip_secret_params(op_cfg),
+                        'num_rows': len(ds),
+                        'size': _get_dir_size(tmp_dir),
+                        'created_at': time.time(),
+                    },
+                    fout,
+                    default=str)
+            os.rename(tmp_dir, entry_dir)
+        except OSError as e:
+            # another job has saved the same result
+            logger.debug(f'Skip saving op result [{key}]: {e}')
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict(keep_keys={key})
+
+    def evict(self, keep_keys=None):
+        """
+        Evict the least recently used results until the total size is
+        within the limit.
+
+        :param keep_keys: keys of results that shouldn't be evicted
+        """
+        keep_keys = keep_keys or set()
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta_file = os.path.join(self._get_entry_dir(key),
+                                     OP_CACHE_META_FILE)
+            if key.startswith('.') or not os.path.isfile(meta_file):
+                continue
+            try:
+                entries.append((os.path.getmtime(meta_file), key,
+                                _get_dir_size(self._get_entry_dir(key))))
+            except OSError:
+                # evicted by another job
+                continue
+        total_size = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if key in keep_keys:
+                continue
+            logger.info(f'Evict cached op result [{key}] of {size} bytes.')
+            shutil.rmtree(self._get_entry_dir(key), ignore_errors=True)
+            total_size -= size
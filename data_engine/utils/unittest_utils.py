@@ -71,7 +71,7 @@ class DataJuicerTestCaseBase(unittest.TestCase):
             return NestedDataset.from_list(data)
         elif current_tag.startswith('ray'):
             dataset = rd.from_items(data)
-            return RayDataset(dataset)
+            return RayDataset(dataset=dataset)
         else:
             raise ValueError('Unsupported type')
 
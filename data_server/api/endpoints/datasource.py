@@ -12,6 +12,7 @@ from data_server.datasource.schemas import (
     DataSourceCreate, DataSourceUpdate, DataSourceBase
 )
 from data_server.datasource.services.datasource import get_datasource_connector
+from data_server.datasource.services.connectors.pool import get_pool_stats
 from data_server.database.session import get_sync_session
 
 from data_server.datasource.DatasourceManager import (
@@ -191,6 +192,11 @@ def _enrich_collection_subtask_for_list(task_id: int, subtask: dict) -> dict:
     return subtask
 
 
+@router.get("/datasource/connection_pools", response_model=dict)
+async def get_datasource_connection_pools():
+    return response_success(data=get_pool_stats())
+
+
 @router.get("/datasource/get_data_source_type_list", response_model=dict)
 async def get_data_source_type_list():
 
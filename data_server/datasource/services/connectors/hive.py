@@ -1,6 +1,23 @@
 from pyhive import hive
 from TCLIService.ttypes import TOperationState
 from data_server.datasource.schemas import DataSourceBase
+from data_server.datasource.services.connectors.pool import ConnectionPool, get_connection_pool
+from data_server.datasource.services.connectors.record_batches import iter_cursor_batches, limit_record_batches
+
+
+def _select_one(conn):
+    cursor = conn.cursor()
+    try:
+        # Use simple SELECT 1 query to avoid potential issues with SHOW TABLES
+        cursor.execute("SELECT 1")
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def _check_connection(conn):
+    if not _select_one(conn):
+        raise ConnectionError("Hive connection check returned empty result")
 
 
 class HiveConnector:
@@ -44,15 +61,13 @@ class HiveConnector:
         )
         return conn
 
+    def _get_pool(self) -> ConnectionPool:
+        return get_connection_pool(self.datasource, self.get_connection, check=_check_connection)
+
     def test_connection(self):
-        conn = None
-        cursor = None
         try:
-            conn = self.get_connection(timeout=30)
-            cursor = conn.cursor()
-            # Use simple SELECT 1 query to avoid potential issues with SHOW TABLES
-            cursor.execute("SELECT 1")
-            result = cursor.fetchone()
+            with self._get_pool().connection() as conn:
+                result = _select_one(conn)
             # Verify result
             if result and len(result) > 0:
                 return {"success": True, "message": "Connection successful"}
@@ -60,42 +75,29 @@ class HiveConnector:
                 return {"success": False, "message": "Connection test returned empty result"}
         except Exception as e:
             return {"success": False, "message": str(e)}
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except:
-                    pass
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
 
     def execute_query(self, query):
-        conn = self.get_connection(timeout=60)
-        cursor = conn.cursor()
-        try:
-            cursor.execute(query)
-            if query.lower().strip().startswith("select"):
-                results = cursor.fetchall()
-                return results
-            else:
-                return {"status": "Query executed"}
-        finally:
-            cursor.close()
-            conn.close()
+        with self._get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query)
+                if query.lower().strip().startswith("select"):
+                    results = cursor.fetchall()
+                    return results
+                else:
+                    return {"status": "Query executed"}
+            finally:
+                cursor.close()
 
     def get_tables(self):
-        conn = self.get_connection(timeout=60)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SHOW TABLES")
-            results = cursor.fetchall()
-            return [row[0] for row in results]
-        finally:
-            cursor.close()
-            conn.close()
+        with self._get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SHOW TABLES")
+                results = cursor.fetchall()
+                return [row[0] for row in results]
+            finally:
+                cursor.close()
 
     def get_tables_and_columns(self):
         """
@@ -103,28 +105,27 @@ class HiveConnector:
         Returns:
         list: A list containing table and field information, where each element is a dictionary including the table name and a list of fields.
         """
-        conn = self.get_connection(timeout=60)
-        cursor = conn.cursor()
-        try:
-            cursor.execute('SHOW TABLES')
-            results = cursor.fetchall()
-            tables_list = []
-            for row in results:
-                table_name = row[0]
-                cursor.execute(f'DESCRIBE {table_name}')
-                table_columns_results = cursor.fetchall()
-                column_list = []
-                for column in table_columns_results:
-                    column_list.append(column[0])
-                table_info = {
-                    'table_name': table_name,
-                    'columns': column_list
-                }
-                tables_list.append(table_info)
-            return tables_list
-        finally:
-            cursor.close()
-            conn.close()
+        with self._get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SHOW TABLES')
+                results = cursor.fetchall()
+                tables_list = []
+                for row in results:
+                    table_name = row[0]
+                    cursor.execute(f'DESCRIBE {table_name}')
+                    table_columns_results = cursor.fetchall()
+                    column_list = []
+                    for column in table_columns_results:
+                        column_list.append(column[0])
+                    table_info = {
+                        'table_name': table_name,
+                        'columns': column_list
+                    }
+                    tables_list.append(table_info)
+                return tables_list
+            finally:
+                cursor.close()
 
     def get_table_columns(self, table_name: str):
         """
@@ -134,16 +135,15 @@ class HiveConnector:
         Returns:
         list: A list containing field names
         """
-        conn = self.get_connection(timeout=60)
-        cursor = conn.cursor()
-        try:
-            query = f'DESCRIBE {table_name}'
-            cursor.execute(query)
-            results = cursor.fetchall()
-            return [row[0] for row in results]
-        finally:
-            cursor.close()
-            conn.close()
+        with self._get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                query = f'DESCRIBE {table_name}'
+                cursor.execute(query)
+                results = cursor.fetchall()
+                return [row[0] for row in results]
+            finally:
+                cursor.close()
 
     def get_table_total_count_hive(self, table_name):
         """
@@ -153,22 +153,21 @@ class HiveConnector:
         Returns:
             int: Total number of rows in the table
         """
-        conn = self.get_connection(timeout=60)
-        cursor = conn.cursor()
-        try:
-            query = f"""
-            SELECT COUNT(*) AS total_count
-            FROM {table_name}
-            """
-            cursor.execute(query)
-            result = cursor.fetchone()
-            if result:
-                return result[0]
-            else:
-                return 0
-        finally:
-            cursor.close()
-            conn.close()
+        with self._get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                query = f"""
+                SELECT COUNT(*) AS total_count
+                FROM {table_name}
+                """
+                cursor.execute(query)
+                result = cursor.fetchone()
+                if result:
+                    return result[0]
+                else:
+                    return 0
+            finally:
+                cursor.close()
 
     def query_table_hive(self, table_name: str, columns: list, offset: int, limit: int) -> list:
         """
@@ -181,21 +180,20 @@ class HiveConnector:
         Returns:
             list: List of query results, where each element is a tuple containing the specified column names and their values
         """
-        conn = self.get_connection(timeout=60)
-        cursor = conn.cursor()
-        try:
-            column_names = ', '.join(columns)
-            query = f"""
-            SELECT {column_names}
-            FROM {table_name}
-            LIMIT {limit} OFFSET {offset}
-            """
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            return rows
-        finally:
-            cursor.close()
-            conn.close()
+        with self._get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                column_names = ', '.join(columns)
+                query = f"""
+                SELECT {column_names}
+                FROM {table_name}
+                LIMIT {limit} OFFSET {offset}
+                """
+                cursor.execute(query)
+                rows = cursor.fetchall()
+                return rows
+            finally:
+                cursor.close()
 
     def execute_custom_query_hive(self, query: str) -> list:
         """
@@ -205,12 +203,32 @@ class HiveConnector:
         Returns:
             list: List of query results, where each element is a tuple containing column names and values
         """
-        conn = self.get_connection(timeout=60)
-        cursor = conn.cursor()
-        try:
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            return rows
-        finally:
-            cursor.close()
-            conn.close()
+        with self._get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query)
+                rows = cursor.fetchall()
+                return rows
+            finally:
+                cursor.close()
+
+    def iter_custom_query_batches_hive(self, query: str, batch_size: int = 10000, max_rows: int = None,
+                                       max_bytes: int = None):
+        """
+        Execute a custom HiveQL query and stream the results as Arrow record batches,
+        fetched from the server batch by batch.
+        Args:
+            query (str): The HiveQL query string to be executed
+            batch_size (int): Number of rows of each batch
+            max_rows (int): Max number of rows to read, or None for all of them
+            max_bytes (int): Max number of bytes to read, or None for no limit
+        Returns:
+            Iterator of pyarrow.RecordBatch with the columns of the result set
+        """
+        with self._get_pool().connection() as conn:
+            cursor = conn.cursor(arraysize=batch_size)
+            try:
+                cursor.execute(query)
+                yield from limit_record_batches(iter_cursor_batches(cursor, batch_size), max_rows, max_bytes)
+            finally:
+                cursor.close()
@@ -1,6 +1,7 @@
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from data_server.datasource.schemas import DataSourceBase
+from data_server.datasource.services.connectors.pool import ConnectionPool, get_connection_pool
 
 class MongoDBConnector:
     def __init__(self, datasource: DataSourceBase):
@@ -9,17 +10,9 @@ class MongoDBConnector:
         self.timeout_ms = 5000  # 5s
 
     def test_connection(self):
-        client = None
         try:
-            host = self.datasource.host
-            uri = host
-            client = MongoClient(
-                uri,
-                serverSelectionTimeoutMS=self.timeout_ms,
-                connectTimeoutMS=self.timeout_ms,
-                socketTimeoutMS=self.timeout_ms
-            )
-            client.server_info()
+            with self._get_pool().connection() as client:
+                client.server_info()
             return {"success": True, "message": "Connection successful"}
         except ServerSelectionTimeoutError as e:
             return {"error": False, "message": f"连接超时: {str(e)}"}
@@ -27,9 +20,6 @@ class MongoDBConnector:
             return {"error": False, "message": f"连接失败: {str(e)}"}
         except Exception as e:
             return {"error": False, "message": f"未知错误: {str(e)}"}
-        finally:
-            if client:
-                client.close()
 
     def _get_client(self):
         host = self.datasource.host
@@ -41,10 +31,18 @@ class MongoDBConnector:
             socketTimeoutMS=self.timeout_ms
         )
 
+    def _get_pool(self) -> ConnectionPool:
+        # a client keeps its own sockets, so the pool mainly saves the
+        # server discovery and handshakes of new clients
+        return get_connection_pool(
+            self.datasource,
+            self._get_client,
+            check=lambda client: client.admin.command("ping"),
+        )
+
     def execute_query(self, query):
-        client = self._get_client()
-        db = client[self.datasource.database]
-        try:
+        with self._get_pool().connection() as client:
+            db = client[self.datasource.database]
             collection = db[query['collection']]
             operation = query['operation']
 
@@ -57,20 +55,14 @@ class MongoDBConnector:
                 return list(collection.aggregate(pipeline))
             else:
                 return {"error": f"Unsupported operation: {operation}"}
-        finally:
-            client.close()
 
     def get_tables(self):
-        client = self._get_client()
-        try:
+        with self._get_pool().connection() as client:
             db = client[self.datasource.database]
             return db.list_collection_names()
-        finally:
-            client.close()
 
     def get_tables_and_columns(self):
-        client = self._get_client()
-        try:
+        with self._get_pool().connection() as client:
             db = client[self.datasource.database]
             collections = db.list_collection_names()
             result = []
@@ -85,8 +77,6 @@ class MongoDBConnector:
                     'columns': columns
                 })
             return result
-        finally:
-            client.close()
 
     def get_collection_document_count(self, collection_name):
         """
@@ -94,42 +84,76 @@ class MongoDBConnector:
         :param collection_name: Name of the collection
         :return: Number of documents
         """
-        client = self._get_client()
-        try:
+        with self._get_pool().connection() as client:
             db = client[self.datasource.database]
             collection = db[collection_name]
             count = collection.count_documents({})
             return count
-        except Exception as e:
-            raise e
-        finally:
-            client.close()
 
-    def query_collection(self, collection_name: str, offset: int, limit: int) -> list:
+    def get_id_boundaries(self, collection_name: str, partition_size: int) -> list:
         """
-        Query data in the collection with pagination support.
+        Split a collection into ranges of about `partition_size` documents by `_id`.
 
         Args:
             collection_name (str): Name of the collection
-            offset (int): Starting offset for the query
-            limit (int): Maximum number of documents to return
+            partition_size (int): Number of documents of each range
 
         Returns:
-            list: List of query results, where each element is a dictionary containing all fields and values of the documents in the collection
+            list: The sorted `_id` values starting each range but the first one. It's
+            empty if the collection is small, or its `_id` values are of several types,
+            which can't be compared by range queries.
         """
-        client = self._get_client()
-        try:
-            db = client[self.datasource.database]
-            collection = db[collection_name]
+        with self._get_pool().connection() as client:
+            collection = client[self.datasource.database][collection_name]
+            first = collection.find_one({}, {"_id": 1}, sort=[("_id", 1)])
+            last = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+            if first is None or type(first["_id"]) is not type(last["_id"]):
+                return []
+            boundaries = []
+            previous = first["_id"]
+            while True:
+                # walks the _id index from the previous boundary only
+                docs = list(
+                    collection.find({"_id": {"$gt": previous}}, {"_id": 1})
+                    .sort("_id", 1)
+                    .skip(partition_size - 1)
+                    .limit(1)
+                )
+                if not docs:
+                    return boundaries
+                previous = docs[0]["_id"]
+                boundaries.append(previous)
 
-            results = list(collection.find().skip(offset).limit(limit))
+    def iter_collection_batches(self, collection_name: str, id_range=None, batch_size: int = 10000):
+        """
+        Stream the documents of a collection in batches by a single cursor.
 
-            return results
-        except ServerSelectionTimeoutError as e:
-            raise ConnectionError(f"MongoDB连接超时: {str(e)}")
-        except ConnectionFailure as e:
-            raise ConnectionError(f"Failed to connect to MongoDB: {str(e)}")
-        except Exception as e:
-            raise e
-        finally:
-            client.close()
+        Args:
+            collection_name (str): Name of the collection
+            id_range (tuple): Optional [low, high) range of `_id` to read, where None means unbounded
+            batch_size (int): Number of documents of each batch
+
+        Returns:
+            Iterator of lists of documents
+        """
+        query = {}
+        if id_range is not None:
+            low, high = id_range
+            if low is not None:
+                query["$gte"] = low
+            if high is not None:
+                query["$lt"] = high
+        with self._get_pool().connection() as client:
+            collection = client[self.datasource.database][collection_name]
+            cursor = collection.find({"_id": query} if query else {}, batch_size=batch_size)
+            try:
+                batch = []
+                for doc in cursor:
+                    batch.append(doc)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+            finally:
+                cursor.close()
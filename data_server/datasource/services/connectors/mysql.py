@@ -1,38 +1,54 @@
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.cursors import Cursor, DictCursor, SSCursor
 from data_server.datasource.schemas import DataSourceBase
+from data_server.datasource.services.connectors.pool import ConnectionPool, get_connection_pool
+from data_server.datasource.services.connectors.record_batches import (
+    iter_cursor_batches,
+    limit_record_batches,
+    rows_to_record_batch,
+)
+
+
+def quote_identifier(name: str) -> str:
+    return "`" + str(name).replace("`", "``") + "`"
+
 
 class MySQLConnector:
     def __init__(self, datasource: DataSourceBase):
         self.datasource = datasource
 
-    def test_connection(self):
-        try:
-            conn = pymysql.connect(
-                host=self.datasource.host,
-                port=self.datasource.port,
-                user=self.datasource.username,
-                password=self.datasource.password,
-                database=self.datasource.database,
-                cursorclass=DictCursor
-            )
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT 1")
-                result = cursor.fetchone()
-            return {"success": True, "message": "Connection successful"}
-        except Exception as e:
-            return {"success": False, "message": str(e)}
-
-    def execute_query(self, query):
-        conn = pymysql.connect(
+    def _connect(self, cursorclass=DictCursor):
+        return pymysql.connect(
             host=self.datasource.host,
             port=self.datasource.port,
             user=self.datasource.username,
             password=self.datasource.password,
             database=self.datasource.database,
-            cursorclass=DictCursor
+            cursorclass=cursorclass
         )
+
+    def _get_pool(self) -> ConnectionPool:
+        return get_connection_pool(
+            self.datasource,
+            self._connect,
+            check=lambda conn: conn.ping(reconnect=False),
+            # end the transaction of a connection, so the next user doesn't
+            # read the snapshot of the previous one
+            reset=lambda conn: conn.rollback(),
+        )
+
+    def test_connection(self):
         try:
+            with self._get_pool().connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    result = cursor.fetchone()
+            return {"success": True, "message": "Connection successful"}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    def execute_query(self, query):
+        with self._get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query)
                 if query.lower().startswith("select"):
@@ -40,35 +56,15 @@ class MySQLConnector:
                 else:
                     conn.commit()
                     return {"affected_rows": cursor.rowcount}
-        finally:
-            conn.close()
 
     def get_tables(self):
-        conn = pymysql.connect(
-            host=self.datasource.host,
-            port=self.datasource.port,
-            user=self.datasource.username,
-            password=self.datasource.password,
-            database=self.datasource.database,
-            cursorclass=DictCursor
-        )
-        try:
+        with self._get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SHOW TABLES")
                 return [row[f"Tables_in_{self.datasource.database}"] for row in cursor.fetchall()]
-        finally:
-            conn.close()
 
     def get_tables_and_columns(self):
-        conn = pymysql.connect(
-            host=self.datasource.host,
-            port=self.datasource.port,
-            user=self.datasource.username,
-            password=self.datasource.password,
-            database=self.datasource.database,
-            cursorclass=DictCursor
-        )
-        try:
+        with self._get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 query = """
                 SELECT TABLE_NAME, COLUMN_NAME 
@@ -88,8 +84,6 @@ class MySQLConnector:
                     tables_dict[table_name].append({'column_name': column_name})
 
                 return [{'table_name': table, 'columns': columns} for table, columns in tables_dict.items()]
-        finally:
-            conn.close()
 
     def get_table_columns(self, table_name: str):
         """
@@ -99,15 +93,7 @@ class MySQLConnector:
         Returns:
         list: A list containing field information, where each element is a dictionary including the field name.
         """
-        conn = pymysql.connect(
-            host=self.datasource.host,
-            port=self.datasource.port,
-            user=self.datasource.username,
-            password=self.datasource.password,
-            database=self.datasource.database,
-            cursorclass=DictCursor
-        )
-        try:
+        with self._get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 query = """
                 SELECT COLUMN_NAME 
@@ -118,94 +104,160 @@ class MySQLConnector:
                 results = cursor.fetchall()
 
                 return [{'column_name': row['COLUMN_NAME']} for row in results]
-        finally:
-            conn.close()
 
     def get_table_total_count(self, table_name):
-        conn = pymysql.connect(
-            host=self.datasource.host,
-            port=self.datasource.port,
-            user=self.datasource.username,
-            password=self.datasource.password,
-            database=self.datasource.database,
-            cursorclass=DictCursor
-        )
-        try:
+        with self._get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 query = f'SELECT COUNT(*) AS total_count FROM {table_name}'
                 cursor.execute(query)
                 result = cursor.fetchone()
                 return result['total_count']
-        finally:
-            conn.close()
 
-    def query_table(self, table_name: str, columns: list, offset: int, limit: int) -> list:
+    def execute_custom_query(self, query: str) -> list:
         """
-        Query data in the table with support for column filtering and pagination.
+        Execute a custom SQL query and return the query results.
         Args:
-        table_name (str): Name of the table
-        columns (list): List of column names to query
-        offset (int): Starting offset for the query
-        limit (int): Maximum number of rows to return
+        query (str): The SQL query string to be executed
         Returns:
-        list: List of query results, where each element is a dictionary containing the specified column names and their values
+        list: List of query results, where each element is a dictionary containing column names and their values
         """
-        conn = pymysql.connect(
-            host=self.datasource.host,
-            port=self.datasource.port,
-            user=self.datasource.username,
-            password=self.datasource.password,
-            database=self.datasource.database,
-            cursorclass=DictCursor
-        )
-        try:
+        with self._get_pool().connection() as conn:
             with conn.cursor() as cursor:
 
-                column_names = ', '.join(columns)
-
-                query = f"""
-                SELECT {column_names}
-                FROM {table_name}
-                LIMIT %s OFFSET %s
-                """
-
-                cursor.execute(query, (limit, offset))
+                cursor.execute(query)
 
                 rows = cursor.fetchall()
 
                 return rows
-        except Exception as e:
-            raise e
-        finally:
-            conn.close()
 
-    def execute_custom_query(self, query: str) -> list:
+    def iter_custom_query_batches(self, query: str, batch_size: int = 10000, max_rows: int = None,
+                                  max_bytes: int = None):
         """
-        Execute a custom SQL query and return the query results.
+        Execute a custom SQL query and stream the results as Arrow record batches
+        from an unbuffered server-side cursor, so only one batch is held at a time.
         Args:
         query (str): The SQL query string to be executed
+        batch_size (int): Number of rows of each batch
+        max_rows (int): Max number of rows to read, or None for all of them
+        max_bytes (int): Max number of bytes to read, or None for no limit
         Returns:
-        list: List of query results, where each element is a dictionary containing column names and their values
+        Iterator of pyarrow.RecordBatch with the columns of the result set
         """
-        conn = pymysql.connect(
-            host=self.datasource.host,
-            port=self.datasource.port,
-            user=self.datasource.username,
-            password=self.datasource.password,
-            database=self.datasource.database,
-            cursorclass=DictCursor
-        )
+        conn = self._connect(cursorclass=SSCursor)
         try:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            yield from limit_record_batches(iter_cursor_batches(cursor, batch_size), max_rows, max_bytes)
+        finally:
+            # closing the connection drops the unread rows, while closing the
+            # cursor would read them all
+            conn.close()
+
+    def get_primary_key(self, table_name: str) -> list:
+        """
+        Get the primary key columns of a table in order.
+        Args:
+        table_name (str): Name of the table
+        Returns:
+        list: Names of the primary key columns, empty if the table has no primary key
+        """
+        with self._get_pool().connection() as conn:
             with conn.cursor() as cursor:
+                query = """
+                SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'
+                ORDER BY ORDINAL_POSITION
+                """
+                cursor.execute(query, (self.datasource.database, table_name))
+                return [row['COLUMN_NAME'] for row in cursor.fetchall()]
 
-                cursor.execute(query)
+    def get_key_range(self, table_name: str, key: str):
+        """
+        Get the min and max values of a column, e.g. the primary key.
+        Args:
+        table_name (str): Name of the table
+        key (str): Name of the column
+        Returns:
+        tuple: The min and max values, both None if the table is empty
+        """
+        key_sql = quote_identifier(key)
+        with self._get_pool().connection() as conn:
+            with conn.cursor(Cursor) as cursor:
+                cursor.execute(f"SELECT MIN({key_sql}), MAX({key_sql}) FROM {quote_identifier(table_name)}")
+                return cursor.fetchone()
 
-                rows = cursor.fetchall()
+    def iter_table_batches(self, table_name: str, columns: list, batch_size: int = 10000, key_range=None):
+        """
+        Stream the rows of a table as Arrow record batches, so that memory
+        stays flat however large the table is.
 
-                return rows
-        except Exception as e:
+        Tables with a single-column primary key are read by keyset pagination
+        on the key, i.e. each page starts after the last key of the previous
+        one, which costs the same for deep pages as for the first one. Other
+        tables are streamed by an unbuffered server-side cursor.
+        Args:
+        table_name (str): Name of the table
+        columns (list): List of column names to query
+        batch_size (int): Number of rows of each batch
+        key_range (tuple): Optional [low, high) range of the primary key to read,
+            where None means unbounded. Only for tables with a single-column primary key.
+        Returns:
+        Iterator of pyarrow.RecordBatch with the specified columns
+        """
+        primary_key = self.get_primary_key(table_name)
+        if len(primary_key) == 1:
+            yield from self._iter_batches_by_keyset(table_name, columns, primary_key[0], batch_size, key_range)
+        elif key_range is not None:
+            raise ValueError(f"Table {table_name} has no single-column primary key to read by range")
+        else:
+            yield from self._iter_batches_by_cursor(table_name, columns, batch_size)
 
-            raise e
-        finally:
+    def _iter_batches_by_keyset(self, table_name, columns, key, batch_size, key_range=None):
+        select_columns = list(columns) if key in columns else list(columns) + [key]
+        key_idx = select_columns.index(key)
+        column_sql = ', '.join(quote_identifier(column) for column in select_columns)
+        table_sql = quote_identifier(table_name)
+        key_sql = quote_identifier(key)
+        low, high = key_range if key_range is not None else (None, None)
+        last_key = None
+        while True:
+            conditions, params = [], []
+            if last_key is not None:
+                conditions.append(f"{key_sql} > %s")
+                params.append(last_key)
+            elif low is not None:
+                conditions.append(f"{key_sql} >= %s")
+                params.append(low)
+            if high is not None:
+                conditions.append(f"{key_sql} < %s")
+                params.append(high)
+            where_sql = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+            # the connection is only borrowed for a page, so long reads
+            # running in parallel don't hold the pool
+            with self._get_pool().connection() as conn:
+                with conn.cursor(Cursor) as cursor:
+                    cursor.execute(
+                        f"SELECT {column_sql} FROM {table_sql} {where_sql}ORDER BY {key_sql} LIMIT %s",
+                        params + [batch_size])
+                    rows = cursor.fetchall()
+            if not rows:
+                return
+            last_key = rows[-1][key_idx]
+            batch = rows_to_record_batch(rows, select_columns)
+            if key not in columns:
+                batch = batch.select(list(columns))
+            yield batch
+            if len(rows) < batch_size:
+                return
 
-            conn.close()
\ No newline at end of file
+    def _iter_batches_by_cursor(self, table_name, columns, batch_size):
+        column_sql = ', '.join(quote_identifier(column) for column in columns)
+        conn = self._connect(cursorclass=SSCursor)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {column_sql} FROM {quote_identifier(table_name)}")
+            yield from iter_cursor_batches(cursor, batch_size)
+        finally:
+            # a server-side cursor left unread can't be reused, so it's never pooled
+            conn.close()
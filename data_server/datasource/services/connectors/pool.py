@@ -0,0 +1,285 @@
+"""
+Connection pools shared by the datasource connectors.
+
+Connectors are created per request or per task, so the connections are kept
+in module-level pools keyed by the datasource config instead. A pool holds at
+most `max_size` connections, closes the ones that have been idle for longer
+than `idle_timeout`, and checks the health of an idle connection before it is
+handed out again.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+from loguru import logger
+
+POOL_MAX_SIZE = 8
+# seconds a connection may stay idle in the pool before it's closed
+POOL_IDLE_TIMEOUT = 300
+# seconds after which an idle connection is checked before it's reused
+POOL_HEALTH_CHECK_INTERVAL = 30
+# seconds to wait for a free connection when the pool is full
+POOL_ACQUIRE_TIMEOUT = 60
+
+
+class ConnectionPool:
+    """A bounded pool of connections of one datasource."""
+
+    def __init__(
+        self,
+        name: str,
+        create: Callable[[], Any],
+        close: Callable[[Any], None] = None,
+        check: Callable[[Any], None] = None,
+        reset: Callable[[Any], None] = None,
+        max_size: int = POOL_MAX_SIZE,
+        idle_timeout: float = POOL_IDLE_TIMEOUT,
+        health_check_interval: float = POOL_HEALTH_CHECK_INTERVAL,
+        acquire_timeout: float = POOL_ACQUIRE_TIMEOUT,
+    ):
+        """
+        :param name: name of the pool in the metrics, which should not contain the password
+        :param create: function to open a new connection
+        :param close: function to close a connection, conn.close() in default
+        :param check: function raising an exception if a connection is broken
+        :param reset: function to run on a connection before it's put back, e.g. a rollback
+        """
+        self.name = name
+        self._create = create
+        self._close = close or (lambda conn: conn.close())
+        self._check = check
+        self._reset = reset
+        self.max_size = max(int(max_size), 1)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        # idle connections as (conn, time put back, time last checked), the
+        # most recently used one at the right
+        self._idle = deque()
+        self._num_in_use = 0
+        self._closed = False
+        self._metrics = {
+            "created": 0,
+            "reused": 0,
+            "closed": 0,
+            "evicted": 0,
+            "health_check_failures": 0,
+            "waits": 0,
+            "acquire_timeouts": 0,
+        }
+
+    def _close_quietly(self, conn):
+        try:
+            self._close(conn)
+        except Exception as e:
+            logger.warning(f"Failed to close connection of pool {self.name}: {e}")
+
+    def _pop_expired(self, now: float) -> list:
+        """Take out the connections idle for too long. Called with the lock held."""
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        self._metrics["evicted"] += len(expired)
+        self._metrics["closed"] += len(expired)
+        return expired
+
+    def evict_idle(self):
+        """Close the connections that have been idle for longer than idle_timeout."""
+        with self._cond:
+            expired = self._pop_expired(time.monotonic())
+        for conn in expired:
+            self._close_quietly(conn)
+
+    def acquire(self):
+        """
+        Get a connection of the pool, which must be given back by release().
+
+        :return: an idle connection that passes the health check, or a new one
+        :raise TimeoutError: if no connection is released within acquire_timeout
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            expired = self._pop_expired(time.monotonic())
+            waited = False
+            while not self._idle and self._num_in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if not waited:
+                    self._metrics["waits"] += 1
+                    waited = True
+                if remaining <= 0:
+                    self._metrics["acquire_timeouts"] += 1
+                    raise TimeoutError(f"No free connection in pool {self.name} "
+                                       f"after {self.acquire_timeout}s")
+                self._cond.wait(remaining)
+            entry = self._idle.pop() if self._idle else None
+            # the slot is taken before the connection is checked or opened
+            self._num_in_use += 1
+        for conn in expired:
+            self._close_quietly(conn)
+
+        try:
+            if entry is not None:
+                conn, _, checked_at = entry
+                if self._check is None or time.monotonic() - checked_at <= self.health_check_interval:
+                    with self._cond:
+                        self._metrics["reused"] += 1
+                    return conn
+                try:
+                    self._check(conn)
+                    with self._cond:
+                        self._metrics["reused"] += 1
+                    return conn
+                except Exception as e:
+                    logger.info(f"Drop broken connection of pool {self.name}: {e}")
+                    self._close_quietly(conn)
+                    with self._cond:
+                        self._metrics["health_check_failures"] += 1
+                        self._metrics["closed"] += 1
+            conn = self._create()
+            with self._cond:
+                self._metrics["created"] += 1
+            return conn
+        except BaseException:
+            with self._cond:
+                self._num_in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard: bool = False):
+        """
+        Give a connection back to the pool.
+
+        :param conn: the connection got by acquire()
+        :param discard: whether to close the connection instead of reusing it,
+            e.g. after an error left it in an unknown state
+        """
+        discard = discard or self._closed
+        if not discard and self._reset is not None:
+            try:
+                self._reset(conn)
+            except Exception:
+                discard = True
+        if discard:
+            self._close_quietly(conn)
+        now = time.monotonic()
+        with self._cond:
+            self._num_in_use -= 1
+            if discard:
+                self._metrics["closed"] += 1
+            else:
+                # a connection in use was as good as checked just now
+                self._idle.append((conn, now, now))
+            expired = self._pop_expired(now)
+            self._cond.notify()
+        for expired_conn in expired:
+            self._close_quietly(expired_conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for a with block. It's dropped if the block raises."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def close(self):
+        """Close all idle connections. Connections in use are closed when they are released."""
+        with self._cond:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            self._idle.clear()
+            self._metrics["closed"] += len(idle)
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> dict:
+        """Metrics of the pool."""
+        with self._cond:
+            return {
+                "name": self.name,
+                "max_size": self.max_size,
+                "in_use": self._num_in_use,
+                "idle": len(self._idle),
+                **self._metrics,
+            }
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool_key(datasource) -> tuple:
+    """Key of the pool of a datasource, built from the fields used to connect."""
+    password_hash = hashlib.sha256((datasource.password or "").encode("utf-8")).hexdigest()
+    return (
+        datasource.source_type,
+        datasource.host,
+        datasource.port,
+        datasource.username,
+        password_hash,
+        datasource.database,
+        datasource.auth_type,
+    )
+
+
+def get_pool_name(datasource) -> str:
+    return f"{datasource.username or ''}@{datasource.host}:{datasource.port or ''}/{datasource.database}"
+
+
+def get_connection_pool(datasource, create: Callable[[], Any], **kwargs) -> ConnectionPool:
+    """
+    Get the pool of a datasource, which is created on the first call.
+
+    :param datasource: config of the datasource
+    :param create: function to open a new connection of the datasource
+    :param kwargs: other arguments of ConnectionPool, only used when the pool is created
+    :return: the pool shared by all connectors of the same datasource config
+    """
+    key = get_pool_key(datasource)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(get_pool_name(datasource), create, **kwargs)
+            _pools[key] = pool
+    return pool
+
+
+def get_pool_stats() -> list:
+    """Metrics of all connection pools, after closing their expired idle connections."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    stats = []
+    for pool in pools:
+        pool.evict_idle()
+        stats.append(pool.stats())
+    return stats
+
+
+def _forget_pools_in_child():
+    # connections opened by the parent process share its sockets, so the
+    # child starts with empty pools, and must not close the parent's ones
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    _pools.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pools_in_child)
+
+
+def close_all_pools():
+    """Close the idle connections of all pools and forget the pools."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
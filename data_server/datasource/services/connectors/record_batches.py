@@ -0,0 +1,59 @@
+"""Arrow record batch helpers shared by the datasource connectors."""
+from typing import Iterable, Iterator
+
+import pyarrow as pa
+
+
+def rows_to_record_batch(rows, columns) -> pa.RecordBatch:
+    """Convert tuple rows of a cursor to an Arrow record batch."""
+    if not rows:
+        return pa.RecordBatch.from_arrays([pa.array([]) for _ in columns], names=list(columns))
+    return pa.RecordBatch.from_arrays([pa.array(values) for values in zip(*rows)], names=list(columns))
+
+
+def iter_cursor_batches(cursor, batch_size: int = 10000) -> Iterator[pa.RecordBatch]:
+    """
+    Read the result set of an executed cursor as record batches of `batch_size` rows.
+    Only one batch of rows is held at a time if the cursor is unbuffered.
+    """
+    columns = [column[0] for column in cursor.description or []]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows_to_record_batch(rows, columns)
+
+
+def limit_record_batches(
+    batches: Iterable[pa.RecordBatch],
+    max_rows: int = None,
+    max_bytes: int = None,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Stop a stream of record batches at a budget of rows and bytes, e.g. for a
+    preview. The batch crossing the budget is cut, and the source is not read
+    any further.
+
+    :param batches: record batches to limit
+    :param max_rows: max number of rows in total, or None for no limit
+    :param max_bytes: max number of Arrow buffer bytes in total, estimated by
+        the average row size of each batch, or None for no limit
+    """
+    num_rows = 0
+    num_bytes = 0
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        row_bytes = max(batch.nbytes / batch.num_rows, 1)
+        keep = batch.num_rows
+        if max_rows is not None:
+            keep = min(keep, max_rows - num_rows)
+        if max_bytes is not None:
+            keep = min(keep, int((max_bytes - num_bytes) // row_bytes))
+        if keep <= 0:
+            return
+        num_rows += keep
+        num_bytes += keep * row_bytes
+        yield batch.slice(0, keep) if keep < batch.num_rows else batch
+        if (max_rows is not None and num_rows >= max_rows) or (max_bytes is not None and num_bytes >= max_bytes):
+            return
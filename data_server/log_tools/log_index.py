@@ -0,0 +1,181 @@
+"""
+Sidecar index of JSONL task log files.
+
+Each task log file `<uid>.jsonl` gets an SQLite index `<uid>.jsonl.idx`, which
+keeps the byte offset and length of every line together with the fields that
+logs are filtered and sorted by. The index is caught up with the lines appended
+since the last read, so a page of logs only costs the bytes of its own lines
+instead of a scan of the whole file.
+"""
+import json
+import os
+import sqlite3
+from typing import List, Optional, Tuple
+
+# number of bytes of new lines to index at a time
+INDEX_CHUNK_SIZE = 8 * 1024 * 1024
+
+# events of format conversion logs, which are counted for the progress
+CONVERT_SUCCEED_EVENT = "convert_succeed"
+CONVERT_ERROR_EVENT = "convert_error"
+
+
+def _get_event(log: dict) -> Optional[str]:
+    content = (log.get("content") or "").lower()
+    if "convert file" not in content:
+        return None
+    if log.get("level") == "info" and "succeed" in content:
+        return CONVERT_SUCCEED_EVENT
+    if log.get("level") == "error" and "error" in content:
+        return CONVERT_ERROR_EVENT
+    return None
+
+
+class TaskLogIndex:
+    """Offset index of a JSONL task log file, stored in an SQLite sidecar."""
+
+    def __init__(self, log_path: str):
+        self.log_path = log_path
+        self.index_path = f"{log_path}.idx"
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.index_path, timeout=60, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS logs ("
+            "id INTEGER PRIMARY KEY, offset INTEGER NOT NULL, "
+            "length INTEGER NOT NULL, level TEXT, operator_name TEXT, "
+            "create_at INTEGER, event TEXT)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        conn.execute("CREATE INDEX IF NOT EXISTS logs_time ON logs (create_at, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS logs_level ON logs (level, create_at, id)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS logs_operator "
+            "ON logs (operator_name, level, create_at, id)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS logs_event ON logs (event)")
+        return conn
+
+    def _refresh(self, conn: sqlite3.Connection):
+        """Index the lines appended since the last refresh."""
+        file_size = os.path.getsize(self.log_path)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'offset'").fetchone()
+            offset = row[0] if row else 0
+            if offset > file_size:
+                # the log file was rewritten
+                conn.execute("DELETE FROM logs")
+                offset = 0
+            with open(self.log_path, "rb") as f:
+                f.seek(offset)
+                while offset < file_size:
+                    chunk = f.read(min(INDEX_CHUNK_SIZE, file_size - offset))
+                    end = chunk.rfind(b"\n") + 1
+                    if end == 0:
+                        if len(chunk) < INDEX_CHUNK_SIZE:
+                            # the last line is still being written
+                            break
+                        # a line longer than a chunk
+                        chunk += f.readline()
+                        end = len(chunk) if chunk.endswith(b"\n") else 0
+                        if end == 0:
+                            break
+                    rows = []
+                    start = 0
+                    for line in chunk[:end].splitlines(keepends=True):
+                        length = len(line)
+                        try:
+                            log = json.loads(line)
+                        except ValueError:
+                            log = None
+                        if isinstance(log, dict):
+                            rows.append((
+                                offset + start,
+                                length,
+                                log.get("level"),
+                                log.get("operator_name"),
+                                log.get("create_at", 0),
+                                _get_event(log),
+                            ))
+                        start += length
+                    conn.executemany(
+                        "INSERT INTO logs (offset, length, level, operator_name, create_at, event) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    offset += end
+                    f.seek(offset)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('offset', ?)", (offset,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _read_logs(self, entries: List[Tuple[int, int]]) -> List[dict]:
+        logs = []
+        with open(self.log_path, "rb") as f:
+            for offset, length in entries:
+                f.seek(offset)
+                logs.append(json.loads(f.read(length)))
+        return logs
+
+    def query(
+        self,
+        level: str = None,
+        operator_name: str = None,
+        skip: int = 0,
+        limit: int = None,
+        descending: bool = False,
+    ) -> Tuple[List[dict], int]:
+        """
+        Get the logs of a page, sorted by their creation time.
+
+        :param level: only return the logs of this level if it's set
+        :param operator_name: only return the logs of this operator if it's set
+        :param skip: number of logs to skip
+        :param limit: max number of logs to return, or None for all of them
+        :param descending: whether to return the latest logs first
+        :return: the logs and the total number of logs matching the filters
+        """
+        if not os.path.exists(self.log_path):
+            return [], 0
+        conditions, params = [], []
+        if level:
+            conditions.append("level = ?")
+            params.append(level)
+        if operator_name:
+            conditions.append("operator_name = ?")
+            params.append(operator_name)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if descending else "ASC"
+
+        conn = self._connect()
+        try:
+            self._refresh(conn)
+            total = conn.execute(f"SELECT COUNT(*) FROM logs {where}", params).fetchone()[0]
+            entries = conn.execute(
+                f"SELECT offset, length FROM logs {where} "
+                f"ORDER BY create_at {order}, id {order} LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, skip],
+            ).fetchall()
+        finally:
+            conn.close()
+        return self._read_logs(entries), total
+
+    def count_events(self, event: str) -> int:
+        """
+        Count the logs of an event, e.g. CONVERT_SUCCEED_EVENT.
+
+        :param event: name of the event
+        :return: number of the logs
+        """
+        if not os.path.exists(self.log_path):
+            return 0
+        conn = self._connect()
+        try:
+            self._refresh(conn)
+            return conn.execute("SELECT COUNT(*) FROM logs WHERE event = ?", (event,)).fetchone()[0]
+        finally:
+            conn.close()
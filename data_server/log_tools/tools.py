@@ -2,12 +2,21 @@
 File logging tools module.
 Keep the public function signatures compatible with the old mongo/pg helpers.
 """
+import atexit
+import functools
+import importlib
 import json
 import os
 import re
+import threading
 from enum import Enum
 from typing import List, Optional
 
+from data_server.log_tools.log_index import (
+    CONVERT_ERROR_EVENT,
+    CONVERT_SUCCEED_EVENT,
+    TaskLogIndex,
+)
 from data_server.utils.project_paths import get_project_root, get_timestamp
 from data_server.logic.models import OperatorIdentifierItem
 
@@ -26,12 +35,24 @@ class OperatorStatusEnum(Enum):
     ERROR = "error"
 
 
+# buffered log lines are flushed by a background thread when they exceed
+# this size, or at least once per interval
+LOG_FLUSH_INTERVAL = 1.0
+LOG_FLUSH_SIZE = 64 * 1024
+
+
+@functools.lru_cache(maxsize=None)
 def _get_log_root() -> str:
     return os.path.join(str(get_project_root()), "runtime_logs")
 
 
+@functools.lru_cache(maxsize=1024)
+def _ensure_dir(dir_path: str):
+    os.makedirs(dir_path, exist_ok=True)
+
+
 def _ensure_parent(path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _ensure_dir(os.path.dirname(path))
 
 
 def _get_task_log_path(task_type: str, task_uid: str) -> str:
@@ -40,32 +61,144 @@ def _get_task_log_path(task_type: str, task_uid: str) -> str:
 
 
 def _get_operator_status_path(job_uid: str) -> str:
+    return os.path.join(_get_log_root(), "pipeline", f"{job_uid}.operator_status.jsonl")
+
+
+def _get_legacy_operator_status_path(job_uid: str) -> str:
+    # one json list of records per job, written before the status events
     return os.path.join(_get_log_root(), "pipeline", f"{job_uid}.operator_status.json")
 
 
-def _append_json_line(path: str, data: dict):
+def _append_lines(path: str, lines: List[str]):
+    """Append lines to a file with a single O_APPEND write, so that lines
+    written by different processes never interleave."""
     _ensure_parent(path)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    data = "".join(lines).encode("utf-8")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        # the dir was removed after it was cached as created, e.g. by a
+        # cleanup of old logs
+        _ensure_dir.cache_clear()
+        _ensure_parent(path)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+class _BufferedLogWriter:
+    """
+    Per-process buffer of task log lines, which are appended to their files
+    by a background thread. Error and warning lines are flushed at once,
+    and the buffer is flushed when the process exits.
+    """
+
+    def __init__(self, flush_interval=LOG_FLUSH_INTERVAL, flush_size=LOG_FLUSH_SIZE):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._reset()
+
+    def _reset(self):
+        # called again in forked children, since the locks may be held by
+        # other threads and the lines buffered by the parent are not theirs
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffers = {}
+        self._size = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def write(self, path: str, line: str, flush: bool = False):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._buffers.setdefault(path, []).append(line)
+            self._size += len(line)
+            full = self._size >= self.flush_size
+        if flush:
+            self.flush()
+        elif full:
+            self._wakeup.set()
+
+    def flush(self):
+        # flushes are serialized to keep the order of lines of each file
+        with self._flush_lock:
+            with self._lock:
+                buffers, self._buffers, self._size = self._buffers, {}, 0
+            for path, lines in buffers.items():
+                try:
+                    _append_lines(path, lines)
+                except Exception as e:
+                    print(f"file flush logs to {path} failed, error: {e}")
+
+
+_log_writer = _BufferedLogWriter()
+atexit.register(_log_writer.flush)
+os.register_at_fork(after_in_child=_log_writer._reset)
+
+
+def _flush_at_process_exit(util):
+    def register(writer):
+        util.Finalize(None, writer.flush, exitpriority=100)
+    return register
+
+
+# workers of process pools exit without running atexit hooks, but run the
+# finalizers of multiprocessing, which are registered after they start
+for _module_name in ("multiprocessing.util", "multiprocess.util"):
+    try:
+        _util = importlib.import_module(_module_name)
+    except ImportError:
+        continue
+    _util.register_after_fork(_log_writer, _flush_at_process_exit(_util))
 
 
-def _read_json_lines(path: str) -> list[dict]:
+def flush_task_logs():
+    """Write the buffered task logs of this process to their files."""
+    _log_writer.flush()
+
+
+def _read_operator_statuses(path: str) -> list[dict]:
+    """Compact the status events of a job into one record per operator."""
     if not os.path.exists(path):
         return []
-    records = []
+    statuses = {}
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
-            line = line.strip()
-            if not line:
-                continue
             try:
-                records.append(json.loads(line))
+                event = json.loads(line)
             except json.JSONDecodeError:
                 continue
-    return records
-
-
-def _read_operator_statuses(path: str) -> list[dict]:
+            key = (event.get("operator_name"), int(event.get("operator_index", 0)))
+            existing = statuses.get(key)
+            if existing:
+                existing["status"] = event.get("status")
+                existing["end_time"] = event.get("time")
+            else:
+                statuses[key] = {
+                    "_id": f"{event.get('job_uid')}-{key[0]}-{key[1]}",
+                    "job_uid": event.get("job_uid"),
+                    "operator_name": key[0],
+                    "operator_index": key[1],
+                    "status": event.get("status"),
+                    "start_time": event.get("time"),
+                    "end_time": None,
+                }
+    return list(statuses.values())
+
+
+def _read_legacy_operator_statuses(path: str) -> list[dict]:
     if not os.path.exists(path):
         return []
     try:
@@ -75,12 +208,6 @@ def _read_operator_statuses(path: str) -> list[dict]:
         return []
 
 
-def _write_operator_statuses(path: str, data: list[dict]):
-    _ensure_parent(path)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-
 def _safe_insert_log(
     task_uid: str,
     task_type: str,
@@ -93,17 +220,22 @@ def _safe_insert_log(
     if not task_uid:
         return
     try:
+        timestamp = get_timestamp()
         log = {
-            "_id": f"{task_uid}-{get_timestamp()}",
+            "_id": f"{task_uid}-{timestamp}",
             "task_uid": task_uid,
             "task_type": task_type,
             "level": level,
             "operator_name": operator_name or "",
             "operator_index": operator_index or 0,
             "content": content,
-            "create_at": get_timestamp(),
+            "create_at": timestamp,
         }
-        _append_json_line(_get_task_log_path(task_type, task_uid), log)
+        _log_writer.write(
+            _get_task_log_path(task_type, task_uid),
+            json.dumps(log, ensure_ascii=False) + "\n",
+            flush=level in (LogLevelEnum.ERROR.value, LogLevelEnum.WARNING.value),
+        )
     except Exception as e:
         print(f"file insert {task_type} log failed, error: {e}")
 
@@ -199,14 +331,12 @@ def get_log_List(
         raise ValueError("param task_uid is not exist")
 
     task_type = "formatify" if type == "formatity" else type
-    logs = _read_json_lines(_get_task_log_path(task_type, task_uid))
-    if level:
-        logs = [log for log in logs if log.get("level") == level]
-    logs.sort(key=lambda item: item.get("create_at", 0))
-
-    total_count = len(logs)
-    skip_count = (page - 1) * page_size
-    logs = logs[skip_count: skip_count + page_size]
+    flush_task_logs()
+    logs, total_count = TaskLogIndex(_get_task_log_path(task_type, task_uid)).query(
+        level=level,
+        skip=max(page - 1, 0) * page_size,
+        limit=max(page_size, 0),
+    )
     result = [
         {
             "_id": str(log.get("_id", "")),
@@ -235,16 +365,13 @@ def get_pipline_job_log_List(
     if task_uid is None:
         raise ValueError("param task_uid is not exist")
 
-    logs = _read_json_lines(_get_task_log_path("pipeline", task_uid))
-    if level and len(level) > 0:
-        logs = [log for log in logs if log.get("level") == level]
-    if ops_name and len(ops_name) > 0:
-        logs = [log for log in logs if log.get("operator_name") == ops_name]
-    logs.sort(key=lambda item: item.get("create_at", 0))
-
-    total_count = len(logs)
-    skip_count = (page - 1) * page_size
-    logs = logs[skip_count: skip_count + page_size]
+    flush_task_logs()
+    logs, total_count = TaskLogIndex(_get_task_log_path("pipeline", task_uid)).query(
+        level=level,
+        operator_name=ops_name,
+        skip=max(page - 1, 0) * page_size,
+        limit=max(page_size, 0),
+    )
     result = [
         {
             "_id": str(log.get("_id", "")),
@@ -274,36 +401,38 @@ def set_pipline_job_operator_status(
     if not job_uid or len(job_uid) == 0:
         return
     try:
-        path = _get_operator_status_path(job_uid)
-        statuses = _read_operator_statuses(path)
-        existing = None
-        for item in statuses:
-            if (
-                item.get("job_uid") == job_uid
-                and item.get("operator_name") == operator_name
-                and int(item.get("operator_index", 0)) == operator_index
-            ):
-                existing = item
-                break
-
-        if existing:
-            existing["status"] = status.value
-            existing["end_time"] = get_timestamp()
-        else:
-            statuses.append({
-                "_id": f"{job_uid}-{operator_name}-{operator_index}",
-                "job_uid": job_uid,
-                "operator_name": operator_name,
-                "operator_index": operator_index,
-                "status": status.value,
-                "start_time": get_timestamp(),
-                "end_time": None,
-            })
-        _write_operator_statuses(path, statuses)
+        # status transitions are appended as events, which are compacted
+        # when they are read, so concurrent processes never lose updates
+        event = {
+            "job_uid": job_uid,
+            "operator_name": operator_name,
+            "operator_index": operator_index,
+            "status": status.value,
+            "time": get_timestamp(),
+        }
+        _append_lines(
+            _get_operator_status_path(job_uid),
+            [json.dumps(event, ensure_ascii=False) + "\n"],
+        )
     except Exception as e:
         print(f"file set operator status failed, error: {e}")
 
 
+def get_pipline_job_operator_status_records(job_uid: str) -> List[dict]:
+    """Get the latest status, start and end time of each operator of a job."""
+    if not job_uid or len(job_uid) == 0:
+        return []
+    try:
+        path = _get_operator_status_path(job_uid)
+        if not os.path.exists(path):
+            # jobs run before the statuses were recorded as events
+            return _read_legacy_operator_statuses(_get_legacy_operator_status_path(job_uid))
+        return _read_operator_statuses(path)
+    except Exception as e:
+        print(f"file get operator status failed, error: {e}")
+        return []
+
+
 def get_pipline_job_operators_status(
     job_uid: str, operators: List[OperatorIdentifierItem]
 ) -> List[dict]:
@@ -325,9 +454,9 @@ def get_progress_from_formatify_logs(task_uid: str) -> Optional[dict]:
         return None
 
     try:
-        logs = [log for log in _read_json_lines(_get_task_log_path("formatify", task_uid)) if log.get("level") == "info"]
-        logs.sort(key=lambda item: item.get("create_at", 0), reverse=True)
-        logs = logs[:100]
+        flush_task_logs()
+        log_index = TaskLogIndex(_get_task_log_path("formatify", task_uid))
+        logs, _ = log_index.query(level="info", limit=100, descending=True)
 
         progress_patterns = [
             r"\(total:\s*(\d+),\s*success:\s*(\d+),\s*failure:\s*(\d+)\)",
@@ -361,21 +490,8 @@ def get_progress_from_formatify_logs(task_uid: str) -> Optional[dict]:
                 break
 
         if total_count is not None:
-            all_logs = _read_json_lines(_get_task_log_path("formatify", task_uid))
-            success_count = sum(
-                1 for log in all_logs
-                if log.get("level") == "info"
-                and log.get("content")
-                and "convert file" in log["content"].lower()
-                and "succeed" in log["content"].lower()
-            )
-            failure_count = sum(
-                1 for log in all_logs
-                if log.get("level") == "error"
-                and log.get("content")
-                and "convert file" in log["content"].lower()
-                and "error" in log["content"].lower()
-            )
+            success_count = log_index.count_events(CONVERT_SUCCEED_EVENT)
+            failure_count = log_index.count_events(CONVERT_ERROR_EVENT)
             processed = success_count + failure_count
             progress = round(processed / max(total_count, 1) * 100, 2) if total_count > 0 else 0
             return {
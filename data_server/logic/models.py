@@ -150,9 +150,15 @@ class Recipe(BaseModelExtended):
     use_cache: bool = False
     ds_cache_dir: Optional[str] = None
     use_checkpoint: bool = False
+    use_op_cache: bool = False
+    op_cache_dir: Optional[str] = None
+    op_cache_max_size: str = "100GB"
+    incremental: bool = False
+    incremental_dir: Optional[str] = None
     temp_dir: Optional[str] = None
     op_list_to_trace: list = []
     op_fusion: bool = False
+    op_streaming: bool = False
     cache_compress: Optional[Union[Literal["gzip"],
                                    Literal["zstd"], Literal["lz4"]]] = "gzip"
     keep_stats_in_res_ds: bool = False
@@ -2,6 +2,7 @@ import os
 import json
 import shutil
 import tempfile
+from functools import partial
 from types import SimpleNamespace
 
 from loguru import logger
@@ -19,20 +20,31 @@ from data_server.logic.utils import exclude_fields_config, strip_recipe_schedule
 from data_engine.config import init_configs
 from data_engine.core import ToolExecutor, ToolExecutorRay
 from data_engine.core.tracer import Tracer
+from data_engine.utils.op_cache_utils import OpCacheManager
 from data_engine.ops import OPERATORS
 from data_server.pod.trace_sync_client import sync_output_trace
+from data_server.datasource.services.connectors.pool import POOL_MAX_SIZE, get_pool_key
 from data_server.pod.datasource_helpers import (
-    convert_mongo_document,
-    hive_get_table_dataset,
     hive_get_table_dataset_by_sql,
-    mysql_get_table_dataset,
     mysql_get_table_dataset_by_sql,
 )
+from data_server.pod.datasource_harvester import (
+    HARVEST_MAX_CONCURRENCY,
+    HARVEST_PARTITION_ROWS,
+    harvest_tables,
+    hive_partition_reader,
+    mongo_partition_planner,
+    mongo_partition_reader,
+    mysql_partition_planner,
+    mysql_partition_reader,
+    whole_table_planner,
+)
 from data_server.pod.job_progress import (
     build_operator_run_progress,
     normalize_tool_run_progress,
 )
 from data_server.pod.pod_logger import log_task_error, log_task_info
+from data_server.pod.format_conversion import convert_files, link_or_copy
 from data_server.pod.formatify_helpers import (
     convert_excel_to_csv,
     convert_excel_to_json,
@@ -476,7 +488,8 @@ def run_operator_execute(task_params: dict):
         cfg.add_suffix,
     )
     dataset = formatter.load_dataset(cfg.np, cfg)
-    ops = load_ops(cfg.process, cfg.op_fusion, job_uid=str(task_params.get("job_id") or ""))
+    ops = load_ops(cfg.process, cfg.op_fusion, job_uid=str(task_params.get("job_id") or ""),
+                   op_streaming=cfg.op_streaming)
     exporter = load_exporter(
         recipe.export_path,
         cfg.export_shard_size,
@@ -495,7 +508,11 @@ def run_operator_execute(task_params: dict):
         op_list_to_trace = getattr(cfg, "op_list_to_trace", None) or []
         if not op_list_to_trace:
             op_list_to_trace = list(OPERATORS.modules.keys())
-    dataset = dataset.process(ops, exporter=exporter, tracer=tracer)
+    op_cache = None
+    if getattr(cfg, "use_op_cache", False):
+        op_cache = OpCacheManager(cfg.op_cache_dir, cfg.op_cache_max_size, cfg.np,
+                                  work_dir=os.path.join(get_flow_base_dir(flow_id), "op_cache"))
+    dataset = dataset.process(ops, exporter=exporter, tracer=tracer, op_cache=op_cache)
     result = exporter.export(dataset)
     operator_name = task_params.get("operator_name") or (
         recipe.process[0].name if recipe.process else None
@@ -563,6 +580,10 @@ def run_data_harvesting(task_params: dict):
     elif not test_result:
         raise RuntimeError("Datasource connection failed")
 
+    harvest_cfg = {
+        "max_concurrency": extra_config.get("harvest_concurrency", HARVEST_MAX_CONCURRENCY),
+        "partition_rows": extra_config.get("harvest_partition_rows", HARVEST_PARTITION_ROWS),
+    }
     if datasource.source_type == DataSourceTypeEnum.MYSQL.value:
         mysql_cfg = extra_config.get("mysql", {})
         _run_sql_or_tables(
@@ -573,6 +594,7 @@ def run_data_harvesting(task_params: dict):
             collection_task=collection_task,
             stage_dir=stage_dir,
             max_line=extra_config.get("max_line_json", 10000),
+            harvest_cfg=harvest_cfg,
         )
     elif datasource.source_type == DataSourceTypeEnum.HIVE.value:
         hive_cfg = extra_config.get("hive", {})
@@ -584,6 +606,7 @@ def run_data_harvesting(task_params: dict):
             collection_task=collection_task,
             stage_dir=stage_dir,
             max_line=extra_config.get("max_line_json", 10000),
+            harvest_cfg=harvest_cfg,
         )
     elif datasource.source_type == DataSourceTypeEnum.MONGODB.value:
         mongo_cfg = extra_config.get("mongo", {})
@@ -594,6 +617,7 @@ def run_data_harvesting(task_params: dict):
             collection_task=collection_task,
             stage_dir=stage_dir,
             max_line=extra_config.get("max_line_json", 10000),
+            harvest_cfg=harvest_cfg,
         )
     elif datasource.source_type == DataSourceTypeEnum.FILE.value:
         source_path = _resolve_file_source_path(datasource, extra_config)
@@ -633,28 +657,35 @@ def run_data_harvesting(task_params: dict):
     }
 
 
-def _run_sql_or_tables(source_type: str, connector, config: dict, task_uid: str, collection_task, stage_dir: str, max_line: int):
+def _run_sql_or_tables(source_type: str, connector, config: dict, task_uid: str, collection_task, stage_dir: str, max_line: int,
+                       harvest_cfg: dict):
     use_type = config.get("type", "")
     use_sql = config.get("sql", "")
     if use_type == "sql":
         if not use_sql:
             raise ValueError(f"{source_type} datasource sql is empty")
+        sql_options = {
+            "max_line": max_line,
+            "file_format": config.get("output_format", "parquet"),
+            "max_rows": config.get("max_rows"),
+            "max_bytes": config.get("max_bytes"),
+        }
         if source_type == "mysql":
-            mysql_get_table_dataset_by_sql(connector, task_uid, use_sql, collection_task, stage_dir, max_line=max_line)
+            mysql_get_table_dataset_by_sql(connector, task_uid, use_sql, collection_task, stage_dir, **sql_options)
         else:
-            hive_get_table_dataset_by_sql(connector, task_uid, use_sql, collection_task, stage_dir, max_line=max_line)
+            hive_get_table_dataset_by_sql(connector, task_uid, use_sql, collection_task, stage_dir, **sql_options)
         return
 
     source_tables = config.get("source")
     if not source_tables:
         raise ValueError(f"{source_type} datasource source config is empty")
-    total_count = 0
-    if source_type == "mysql":
-        for table_name in source_tables.keys():
-            total_count += connector.get_table_total_count(table_name)
-    else:
-        for table_name in source_tables.keys():
-            total_count += connector.get_table_total_count_hive(table_name)
+    table_counts = {}
+    for table_name in source_tables.keys():
+        if source_type == "mysql":
+            table_counts[table_name] = connector.get_table_total_count(table_name)
+        else:
+            table_counts[table_name] = connector.get_table_total_count_hive(table_name)
+    total_count = sum(table_counts.values())
     collection_task.total_count = total_count
     collection_task.records_count = 0
 
@@ -665,48 +696,57 @@ def _run_sql_or_tables(source_type: str, connector, config: dict, task_uid: str,
         total_count,
         stage_dir,
     )
+    tables = {}
     for table_name, config_columns in source_tables.items():
+        columns = connector.get_table_columns(table_name)
         if source_type == "mysql":
-            mysql_get_table_dataset(connector, task_uid, collection_task, table_name, config_columns, stage_dir, max_line=max_line)
-        else:
-            hive_get_table_dataset(connector, task_uid, collection_task, table_name, config_columns, stage_dir, max_line=max_line)
+            columns = [item["column_name"] for item in columns]
+        real_get_columns = [column for column in (config_columns or []) if column in columns]
+        if not real_get_columns:
+            log_task_error(task_uid, f"Task with UID {task_uid} Table {table_name} has no valid columns.")
+            continue
+        tables[table_name] = real_get_columns
+    if source_type == "mysql":
+        plan_partitions = mysql_partition_planner(connector, table_counts, harvest_cfg["partition_rows"])
+        read_partition = mysql_partition_reader(connector)
+    else:
+        # Hive tables are not split, but read in parallel with each other
+        plan_partitions = whole_table_planner
+        read_partition = hive_partition_reader(connector)
+    harvest_tables(
+        tables,
+        plan_partitions,
+        read_partition,
+        task_uid,
+        collection_task,
+        stage_dir,
+        source_key=get_pool_key(connector.datasource),
+        max_line=max_line,
+        max_concurrency=harvest_cfg["max_concurrency"],
+    )
 
 
-def _run_mongo_collection(connector, mongo_cfg: dict, task_uid: str, collection_task, stage_dir: str, max_line: int):
-    total_count = 0
+def _run_mongo_collection(connector, mongo_cfg: dict, task_uid: str, collection_task, stage_dir: str, max_line: int,
+                          harvest_cfg: dict):
+    table_counts = {}
     for collection_name in mongo_cfg:
-        total_count += connector.get_collection_document_count(collection_name)
-    collection_task.total_count = total_count
+        table_counts[collection_name] = connector.get_collection_document_count(collection_name)
+    collection_task.total_count = sum(table_counts.values())
     collection_task.records_count = 0
 
-    import pandas as pd
-    for collection_name in mongo_cfg:
-        table_dir = os.path.join(stage_dir, collection_name)
-        os.makedirs(table_dir, exist_ok=True)
-        page_size = 10000
-        page = 1
-        file_index = 1
-        rows_buffer = []
-        records_count = collection_task.records_count or 0
-        while True:
-            rows = connector.query_collection(collection_name, offset=(page - 1) * page_size, limit=page_size)
-            if not rows:
-                break
-            converted_rows = [convert_mongo_document(row) for row in (rows if isinstance(rows, list) else list(rows))]
-            rows_buffer.extend(converted_rows)
-            if len(rows_buffer) >= max_line:
-                file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-                pd.DataFrame(rows_buffer).to_parquet(file_path, index=False)
-                records_count += len(rows_buffer)
-                collection_task.records_count = records_count
-                rows_buffer = []
-                file_index += 1
-            page += 1
-        if rows_buffer:
-            file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-            pd.DataFrame(rows_buffer).to_parquet(file_path, index=False)
-            records_count += len(rows_buffer)
-            collection_task.records_count = records_count
+    harvest_tables(
+        {collection_name: None for collection_name in mongo_cfg},
+        mongo_partition_planner(connector, table_counts, harvest_cfg["partition_rows"]),
+        mongo_partition_reader(connector),
+        task_uid,
+        collection_task,
+        stage_dir,
+        source_key=get_pool_key(connector.datasource),
+        max_line=max_line,
+        # a partition holds a pooled client until it's read, so more of them
+        # would wait for a client and time out
+        max_concurrency=min(int(harvest_cfg["max_concurrency"]), POOL_MAX_SIZE),
+    )
 
 
 def run_format_conversion(task_params: dict):
@@ -718,7 +758,9 @@ def run_format_conversion(task_params: dict):
     os.makedirs(stage_dir, exist_ok=True)
     if os.path.exists(raw_dir):
         shutil.rmtree(raw_dir)
-    shutil.copytree(input_dir, raw_dir)
+    # converters write next to the source files and remove them, so they run
+    # on a tree of hard links rather than on the input itself
+    shutil.copytree(input_dir, raw_dir, copy_function=link_or_copy)
 
     found, found_files = search_files(raw_dir, [task_params.get("from_data_type")])
     if not found:
@@ -735,25 +777,51 @@ def run_format_conversion(task_params: dict):
     meta_enabled = bool(task_params.get("skip_meta"))
     meta_entries = []
     used_names = {}
-    for root, _, files in os.walk(raw_dir):
-        for file in files:
-            file_path_full = os.path.join(root, file)
-            result = _run_convert_func(convert_func, file_path_full, str(task_params.get("task_uid") or formatify_id), task_params)
-            if not isinstance(result, dict):
-                continue
-            from_file = result.get("from") or file_path_full
-            to_file = result.get("to")
-            to_files = result.get("to_files")  # Support for multiple output files
-            status = result.get("status")
-            try:
-                from_rel_path = str(os.path.relpath(from_file, raw_dir)).replace("\\", "/")
-            except Exception:
-                from_rel_path = os.path.basename(from_file)
-
-            # Handle multiple output files (e.g., from multi-sheet Excel)
-            if status == "success" and to_files:
-                # Process multiple files
-                for src_path in to_files:
+    # files are converted in parallel, and their outputs are collected in the
+    # order of paths, so names of the outputs don't depend on timing
+    source_files = sorted(found_files)
+    task_uid = str(task_params.get("task_uid") or task_params.get("formatify_id") or "")
+    convert = partial(_run_convert_func, convert_func, task_params=task_params)
+    results = convert_files(convert, source_files, task_uid, task_params)
+    for file_path_full, result in zip(source_files, results):
+        if not isinstance(result, dict):
+            continue
+        from_file = result.get("from") or file_path_full
+        to_file = result.get("to")
+        to_files = result.get("to_files")  # Support for multiple output files
+        status = result.get("status")
+        try:
+            from_rel_path = str(os.path.relpath(from_file, raw_dir)).replace("\\", "/")
+        except Exception:
+            from_rel_path = os.path.basename(from_file)
+
+        # Handle multiple output files (e.g., from multi-sheet Excel)
+        if status == "success" and to_files:
+            # Process multiple files
+            for src_path in to_files:
+                if os.path.exists(src_path):
+                    file_name = os.path.basename(src_path)
+                    if file_name in used_names:
+                        name_part, ext_part = os.path.splitext(file_name)
+                        counter = used_names[file_name]
+                        file_name = f"{name_part}_{counter}{ext_part}"
+                        used_names[os.path.basename(src_path)] += 1
+                    else:
+                        used_names[file_name] = 1
+                    dst_path = os.path.join(output_dir, file_name)
+                    shutil.copy2(src_path, dst_path)
+                    success_count += 1
+                    if meta_enabled:
+                        meta_entries.append({
+                            "from": from_rel_path,
+                            "to": file_name.replace("\\", "/"),
+                            "status": "success",
+                        })
+        elif status == "success" and to_file:
+            # Handle single file (backward compatible)
+            if isinstance(to_file, list):
+                # If to_file is a list, process all files
+                for src_path in to_file:
                     if os.path.exists(src_path):
                         file_name = os.path.basename(src_path)
                         if file_name in used_names:
@@ -772,60 +840,37 @@ def run_format_conversion(task_params: dict):
                                 "to": file_name.replace("\\", "/"),
                                 "status": "success",
                             })
-            elif status == "success" and to_file:
-                # Handle single file (backward compatible)
-                if isinstance(to_file, list):
-                    # If to_file is a list, process all files
-                    for src_path in to_file:
-                        if os.path.exists(src_path):
-                            file_name = os.path.basename(src_path)
-                            if file_name in used_names:
-                                name_part, ext_part = os.path.splitext(file_name)
-                                counter = used_names[file_name]
-                                file_name = f"{name_part}_{counter}{ext_part}"
-                                used_names[os.path.basename(src_path)] += 1
-                            else:
-                                used_names[file_name] = 1
-                            dst_path = os.path.join(output_dir, file_name)
-                            shutil.copy2(src_path, dst_path)
-                            success_count += 1
-                            if meta_enabled:
-                                meta_entries.append({
-                                    "from": from_rel_path,
-                                    "to": file_name.replace("\\", "/"),
-                                    "status": "success",
-                                })
-                elif os.path.exists(to_file):
-                    # Single file (original behavior)
-                    src_path = to_file
-                    file_name = os.path.basename(src_path)
-                    if file_name in used_names:
-                        name_part, ext_part = os.path.splitext(file_name)
-                        counter = used_names[file_name]
-                        file_name = f"{name_part}_{counter}{ext_part}"
-                        used_names[os.path.basename(src_path)] += 1
-                    else:
-                        used_names[file_name] = 1
-                    dst_path = os.path.join(output_dir, file_name)
-                    shutil.copy2(src_path, dst_path)
-                    success_count += 1
-                    if meta_enabled:
-                        meta_entries.append({
-                            "from": from_rel_path,
-                            "to": file_name.replace("\\", "/"),
-                            "status": "success",
-                        })
-            else:
-                failure_count += 1
+            elif os.path.exists(to_file):
+                # Single file (original behavior)
+                src_path = to_file
+                file_name = os.path.basename(src_path)
+                if file_name in used_names:
+                    name_part, ext_part = os.path.splitext(file_name)
+                    counter = used_names[file_name]
+                    file_name = f"{name_part}_{counter}{ext_part}"
+                    used_names[os.path.basename(src_path)] += 1
+                else:
+                    used_names[file_name] = 1
+                dst_path = os.path.join(output_dir, file_name)
+                shutil.copy2(src_path, dst_path)
+                success_count += 1
                 if meta_enabled:
-                    entry = {
+                    meta_entries.append({
                         "from": from_rel_path,
-                        "to": None,
-                        "status": "failure",
-                    }
-                    if result.get("error"):
-                        entry["error"] = result["error"]
-                    meta_entries.append(entry)
+                        "to": file_name.replace("\\", "/"),
+                        "status": "success",
+                    })
+        else:
+            failure_count += 1
+            if meta_enabled:
+                entry = {
+                    "from": from_rel_path,
+                    "to": None,
+                    "status": "failure",
+                }
+                if result.get("error"):
+                    entry["error"] = result["error"]
+                meta_entries.append(entry)
 
     if meta_enabled:
         _write_format_meta_log(
@@ -0,0 +1,311 @@
+"""
+Parallel harvesting of datasource tables.
+
+Each table (or MongoDB collection) is split into partitions, i.e. ranges of its
+primary key or `_id` for large tables, or the whole table otherwise. Partitions
+of all tables are read by a thread pool, whose size is also capped per
+datasource across the harvesting tasks of the process, and each of them is
+written to its own parquet files under the table dir.
+
+The plan and the finished partitions are kept in a state file next to the
+stage dir, so a rerun of a failed task only reads the partitions that didn't
+finish.
+"""
+import glob
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pyarrow as pa
+from loguru import logger
+
+from data_server.datasource.services.connectors.record_batches import rows_to_record_batch
+from data_server.pod.datasource_helpers import (
+    BSON_AVAILABLE,
+    ObjectId,
+    ParquetBatchWriter,
+    convert_mongo_document,
+)
+from data_server.pod.pod_logger import log_task_error, log_task_info
+
+HARVEST_MAX_CONCURRENCY = 4
+# tables with more rows than this are split into key ranges of about this size
+HARVEST_PARTITION_ROWS = 1000000
+HARVEST_BATCH_SIZE = 10000
+HARVEST_STATE_SUFFIX = ".harvest_state.json"
+
+PARTITION_PENDING = "pending"
+PARTITION_DONE = "done"
+PARTITION_FAILED = "failed"
+
+_source_semaphores: Dict[tuple, threading.BoundedSemaphore] = {}
+_source_semaphores_lock = threading.Lock()
+
+
+def get_source_semaphore(source_key: tuple, max_concurrency: int) -> threading.BoundedSemaphore:
+    """Semaphore capping the partitions read at the same time from a datasource, created on the first call."""
+    with _source_semaphores_lock:
+        semaphore = _source_semaphores.get(source_key)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(max(int(max_concurrency), 1))
+            _source_semaphores[source_key] = semaphore
+    return semaphore
+
+
+def _encode_key(value):
+    if BSON_AVAILABLE and isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_key(value):
+    if isinstance(value, dict) and "$oid" in value and BSON_AVAILABLE:
+        return ObjectId(value["$oid"])
+    return value
+
+
+def split_key_range(low: int, high: int, total_rows: int, partition_rows: int) -> List[Optional[list]]:
+    """
+    Split the integer keys [low, high] into ranges of about `partition_rows` rows,
+    assuming the keys are evenly spread.
+
+    :return: [low, high) ranges where the first low and the last high are None,
+        or [None] if the table fits in one partition
+    """
+    if low is None or high is None or total_rows <= partition_rows:
+        return [None]
+    num_partitions = math.ceil(total_rows / partition_rows)
+    step = max(math.ceil((high - low + 1) / num_partitions), 1)
+    bounds = list(range(low + step, high + 1, step))
+    return [[start, end] for start, end in zip([None] + bounds, bounds + [None])]
+
+
+def split_id_boundaries(boundaries: list) -> List[Optional[list]]:
+    """Turn sorted range starts, e.g. of MongoDB `_id`, into [low, high) ranges."""
+    if not boundaries:
+        return [None]
+    return [[start, end] for start, end in zip([None] + boundaries, boundaries + [None])]
+
+
+class HarvestState:
+    """Plan and progress of the partitions of a harvesting task, saved as JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.tables = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.tables = json.load(f).get("tables", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignore broken harvest state {path}: {e}")
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"tables": self.tables}, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.path)
+
+    def get_partitions(self, table_name: str, columns: Optional[list]) -> Optional[list]:
+        """Partitions planned for the table before, or None if there's no plan for the same columns."""
+        table = self.tables.get(table_name)
+        if table is None or table.get("columns") != columns:
+            return None
+        return table["partitions"]
+
+    def set_partitions(self, table_name: str, columns: Optional[list], key_ranges: list) -> list:
+        partitions = []
+        for index, key_range in enumerate(key_ranges):
+            partitions.append({
+                "index": index,
+                "range": None if key_range is None else [_encode_key(value) for value in key_range],
+                "prefix": "data" if len(key_ranges) == 1 else f"data_part{index:04d}",
+                "status": PARTITION_PENDING,
+                "rows": 0,
+                "seconds": 0,
+            })
+        self.tables[table_name] = {"columns": columns, "partitions": partitions}
+        return partitions
+
+
+def harvest_tables(
+    tables: Dict[str, Optional[list]],
+    plan_partitions: Callable[[str], List[Optional[list]]],
+    read_partition: Callable[[str, Optional[list], Optional[list]], Iterator[pa.RecordBatch]],
+    task_uid: str,
+    collection_task,
+    stage_dir: str,
+    source_key: tuple,
+    max_line: int = 10000,
+    max_concurrency: int = HARVEST_MAX_CONCURRENCY,
+):
+    """
+    Read tables into parquet files under `<stage_dir>/<table_name>`, partitions in parallel.
+
+    :param tables: columns to read of each table, or None for all fields of a collection
+    :param plan_partitions: function getting the key ranges of a table, [None] for the whole table
+    :param read_partition: function reading record batches of a table, its columns and a key range
+    :param task_uid: uid of the collection task for logs
+    :param collection_task: context whose records_count is updated with the progress
+    :param stage_dir: dir to write tables to
+    :param source_key: key of the datasource, whose concurrent reads are capped across tasks
+    :param max_line: max number of rows of each parquet file
+    :param max_concurrency: max number of partitions read at the same time
+    :raise RuntimeError: if any partition failed, after the others finished
+    """
+    state = HarvestState(stage_dir.rstrip(os.sep) + HARVEST_STATE_SUFFIX)
+    jobs = []
+    for table_name, columns in tables.items():
+        table_dir = os.path.join(stage_dir, table_name)
+        partitions = state.get_partitions(table_name, columns)
+        if partitions is None:
+            key_ranges = plan_partitions(table_name)
+            partitions = state.set_partitions(table_name, columns, key_ranges)
+            # files of an older plan can't be matched to the new partitions
+            for file_path in glob.glob(os.path.join(table_dir, "*.parquet")):
+                os.remove(file_path)
+            log_task_info(task_uid, f"Task with UID {task_uid} Table {table_name} is split into {len(partitions)} partitions")
+        for partition in partitions:
+            if partition["status"] != PARTITION_DONE:
+                jobs.append((table_name, columns, partition))
+    state.save()
+
+    progress_lock = threading.Lock()
+    # rows of the partitions finished by an earlier run
+    collection_task.records_count = sum(
+        partition["rows"]
+        for table_name in tables
+        for partition in state.tables[table_name]["partitions"]
+        if partition["status"] == PARTITION_DONE
+    )
+    semaphore = get_source_semaphore(source_key, max_concurrency)
+
+    def run_partition(table_name, columns, partition):
+        table_dir = os.path.join(stage_dir, table_name)
+        name = f"{table_name}#{partition['index']}"
+        with semaphore:
+            # files of an unfinished run of the partition are read again
+            for file_path in glob.glob(os.path.join(table_dir, f"{partition['prefix']}_*.parquet")):
+                os.remove(file_path)
+            key_range = partition["range"]
+            if key_range is not None:
+                key_range = [_decode_key(value) for value in key_range]
+            start = time.monotonic()
+            num_rows = 0
+            try:
+                with ParquetBatchWriter(table_dir, max_line, prefix=partition["prefix"]) as writer:
+                    for batch in read_partition(table_name, columns, key_range):
+                        writer.write(batch)
+                        num_rows += batch.num_rows
+                        with progress_lock:
+                            collection_task.records_count += batch.num_rows
+            except Exception as e:
+                # the rows are read again by the next run
+                with progress_lock:
+                    collection_task.records_count -= num_rows
+                partition["status"] = PARTITION_FAILED
+                state.save()
+                log_task_error(task_uid, f"Task with UID {task_uid} Partition {name} failed: {e}")
+                return False
+            seconds = time.monotonic() - start
+            partition.update(status=PARTITION_DONE, rows=writer.num_rows, seconds=round(seconds, 3))
+            state.save()
+            log_task_info(
+                task_uid,
+                f"Task with UID {task_uid} Partition {name} got {writer.num_rows} rows in {seconds:.1f}s "
+                f"({writer.num_rows / max(seconds, 1e-6):.0f} rows/s), "
+                f"get data count {collection_task.records_count}...",
+            )
+            return True
+
+    if jobs:
+        with ThreadPoolExecutor(max_workers=max(min(int(max_concurrency), len(jobs)), 1)) as executor:
+            results = list(executor.map(lambda job: run_partition(*job), jobs))
+    else:
+        results = []
+    num_failed = results.count(False)
+    if num_failed:
+        raise RuntimeError(
+            f"{num_failed} of {len(results)} partitions failed to be harvested, "
+            "rerun the task to read them again"
+        )
+
+
+def documents_to_record_batch(docs: list) -> pa.RecordBatch:
+    """Convert MongoDB documents to a record batch with the union of their fields."""
+    docs = [convert_mongo_document(doc) for doc in docs]
+    fields = {}
+    for doc in docs:
+        for key in doc:
+            fields.setdefault(key, None)
+    return pa.RecordBatch.from_arrays(
+        [pa.array([doc.get(key) for doc in docs]) for key in fields], names=list(fields)
+    )
+
+
+def whole_table_planner(table_name: str) -> List[Optional[list]]:
+    return [None]
+
+
+def mysql_partition_planner(connector, table_counts: Dict[str, int], partition_rows: int = HARVEST_PARTITION_ROWS):
+    """Split MySQL tables with an integer single-column primary key into key ranges."""
+
+    def plan_partitions(table_name):
+        total_rows = table_counts.get(table_name, 0)
+        if total_rows <= partition_rows:
+            return [None]
+        primary_key = connector.get_primary_key(table_name)
+        if len(primary_key) != 1:
+            return [None]
+        low, high = connector.get_key_range(table_name, primary_key[0])
+        if not isinstance(low, int) or not isinstance(high, int):
+            return [None]
+        return split_key_range(low, high, total_rows, partition_rows)
+
+    return plan_partitions
+
+
+def mysql_partition_reader(connector, batch_size: int = HARVEST_BATCH_SIZE):
+    def read_partition(table_name, columns, key_range):
+        return connector.iter_table_batches(table_name, columns, batch_size=batch_size, key_range=key_range)
+
+    return read_partition
+
+
+def hive_partition_reader(connector, batch_size: int = HARVEST_BATCH_SIZE):
+    # Hive tables are read whole, by pages of LIMIT/OFFSET
+    def read_partition(table_name, columns, key_range):
+        offset = 0
+        while True:
+            rows = connector.query_table_hive(table_name, columns, offset=offset, limit=batch_size)
+            if not rows:
+                return
+            yield rows_to_record_batch(rows, columns)
+            offset += len(rows)
+
+    return read_partition
+
+
+def mongo_partition_planner(connector, table_counts: Dict[str, int], partition_rows: int = HARVEST_PARTITION_ROWS):
+    """Split large MongoDB collections into `_id` ranges."""
+
+    def plan_partitions(collection_name):
+        if table_counts.get(collection_name, 0) <= partition_rows:
+            return [None]
+        return split_id_boundaries(connector.get_id_boundaries(collection_name, partition_rows))
+
+    return plan_partitions
+
+
+def mongo_partition_reader(connector, batch_size: int = HARVEST_BATCH_SIZE):
+    def read_partition(collection_name, columns, id_range):
+        for docs in connector.iter_collection_batches(collection_name, id_range, batch_size=batch_size):
+            yield documents_to_record_batch(docs)
+
+    return read_partition
@@ -1,9 +1,9 @@
+import json
 import os
-import traceback
 from datetime import date, datetime
 
-import pandas as pd
-from loguru import logger
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from data_server.pod.pod_logger import log_task_error, log_task_info
 
@@ -28,78 +28,130 @@ def convert_mongo_document(doc):
     return doc
 
 
-def mysql_get_table_dataset(
-    connector,
+class ParquetBatchWriter:
+    """
+    Write Arrow record batches into parquet files of at most `max_line` rows
+    each, named `data_0001.parquet`, `data_0002.parquet`... under a directory,
+    or `<prefix>_0001.parquet`... if a prefix is given.
+    Batches are appended to the current file by a ParquetWriter, so only one
+    batch is held in memory at a time.
+    """
+
+    def __init__(self, table_dir: str, max_line: int = 10000, file_index: int = 1, prefix: str = "data"):
+        self.table_dir = table_dir
+        self.prefix = prefix
+        self.max_line = max(int(max_line), 1)
+        self.file_index = file_index
+        self.num_rows = 0
+        self._writer = None
+        self._file_rows = 0
+        os.makedirs(table_dir, exist_ok=True)
+
+    def _open(self, schema):
+        file_path = os.path.join(self.table_dir, f"{self.prefix}_{self.file_index:04d}.parquet")
+        self._writer = pq.ParquetWriter(file_path, schema)
+        self._file_rows = 0
+        self.file_index += 1
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def write(self, batch):
+        """Append a record batch, rolling over to a new file when the current one is full."""
+        offset = 0
+        while offset < batch.num_rows:
+            if self._writer is not None and self._file_rows >= self.max_line:
+                self._close()
+            room = self.max_line - self._file_rows if self._writer is not None else self.max_line
+            piece = batch.slice(offset, room)
+            if self._writer is not None and not piece.schema.equals(self._writer.schema):
+                try:
+                    piece = pa.Table.from_batches([piece]).cast(self._writer.schema)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError):
+                    # e.g. a column of the file is all null so far, start a
+                    # new file with the schema of this batch
+                    self._close()
+            if self._writer is None:
+                self._open(piece.schema)
+            if isinstance(piece, pa.RecordBatch):
+                piece = pa.Table.from_batches([piece])
+            self._writer.write_table(piece)
+            offset += piece.num_rows
+            self._file_rows += piece.num_rows
+            self.num_rows += piece.num_rows
+
+    def close(self):
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonlBatchWriter(ParquetBatchWriter):
+    """Same as ParquetBatchWriter, but writes JSON lines files `data_0001.jsonl`..."""
+
+    def _open(self, schema):
+        file_path = os.path.join(self.table_dir, f"{self.prefix}_{self.file_index:04d}.jsonl")
+        self._writer = open(file_path, "w", encoding="utf-8")
+        self._file_rows = 0
+        self.file_index += 1
+
+    def write(self, batch):
+        """Append a record batch, rolling over to a new file when the current one is full."""
+        offset = 0
+        while offset < batch.num_rows:
+            if self._writer is not None and self._file_rows >= self.max_line:
+                self._close()
+            if self._writer is None:
+                self._open(batch.schema)
+            piece = batch.slice(offset, self.max_line - self._file_rows)
+            self._writer.write("".join(
+                json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in piece.to_pylist()
+            ))
+            offset += piece.num_rows
+            self._file_rows += piece.num_rows
+            self.num_rows += piece.num_rows
+
+
+BATCH_WRITERS = {
+    "parquet": ParquetBatchWriter,
+    "jsonl": JsonlBatchWriter,
+}
+
+
+def write_query_batches(
+    batches,
     task_uid: str,
     collection_task,
-    table_name: str,
-    config_columns: list,
-    base_dir: str,
+    table_dir: str,
     max_line: int = 10000,
-) -> None:
-    try:
-        real_get_columns = []
-        columns = connector.get_table_columns(table_name)
-        if config_columns:
-            for column in config_columns:
-                columns_name_list = [item["column_name"] for item in columns]
-                if column in columns_name_list:
-                    real_get_columns.append(column)
-        if len(real_get_columns) == 0:
-            log_task_error(
-                task_uid,
-                f"Task with UID {task_uid} Table {table_name} has no valid columns.",
-            )
-            return
+    file_format: str = "parquet",
+) -> int:
+    """
+    Write the record batches of a query into files of `max_line` rows as they
+    arrive, updating the progress of the collection task.
 
-        table_dir = os.path.join(base_dir, table_name)
-        os.makedirs(table_dir, exist_ok=True)
-        page_size = 10000
-        page = 1
-        records_count = collection_task.records_count or 0
-        file_index = 1
-        rows_buffer = []
-        while True:
-            rows = connector.query_table(
-                table_name,
-                real_get_columns,
-                offset=(page - 1) * page_size,
-                limit=page_size,
-            )
-            if not rows:
-                break
-            rows_buffer.extend(rows)
-            if len(rows_buffer) >= max_line:
-                file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-                pd.DataFrame(rows_buffer).to_parquet(file_path, index=False)
-                records_count += len(rows_buffer)
-                collection_task.records_count = records_count
+    :return: number of rows written
+    """
+    if file_format not in BATCH_WRITERS:
+        raise ValueError(f"Unsupported output format: {file_format}")
+    collection_task.records_count = 0
+    with BATCH_WRITERS[file_format](table_dir, max_line) as writer:
+        for batch in batches:
+            file_index = writer.file_index
+            writer.write(batch)
+            collection_task.records_count = writer.num_rows
+            if writer.file_index != file_index:
                 log_task_info(
                     task_uid,
-                    f"Task with UID {task_uid} get data count {records_count}...",
+                    f"Task with UID {task_uid} get data count {collection_task.records_count}...",
                 )
-                rows_buffer = []
-                file_index += 1
-            page += 1
-        if rows_buffer:
-            file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-            pd.DataFrame(rows_buffer).to_parquet(file_path, index=False)
-            records_count += len(rows_buffer)
-            collection_task.records_count = records_count
-            log_task_info(
-                task_uid,
-                f"Task with UID {task_uid} get data count {records_count}...",
-            )
-        log_task_info(
-            task_uid,
-            f"Task with UID {task_uid} get data count {collection_task.records_count}...",
-        )
-    except Exception as e:
-        log_task_error(
-            task_uid,
-            f"Task with UID {task_uid} Error occurred while getting table dataset: {e}",
-        )
-        traceback.print_exc()
+    return writer.num_rows
 
 
 def mysql_get_table_dataset_by_sql(
@@ -109,119 +161,30 @@ def mysql_get_table_dataset_by_sql(
     collection_task,
     base_dir: str,
     max_line: int = 10000,
+    file_format: str = "parquet",
+    max_rows: int = None,
+    max_bytes: int = None,
 ):
     try:
         table_dir = os.path.join(base_dir, "run_sql")
-        os.makedirs(table_dir, exist_ok=True)
-        rows = connector.execute_custom_query(run_sql)
-        if not rows:
-            log_task_error(
-                task_uid,
-                f"Task with UID {task_uid} No results returned from SQL query.",
-            )
-            return
-        file_index = 1
-        current_file_row_count = 0
-        rows_list = []
-        for row in rows:
-            if current_file_row_count >= max_line:
-                file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-                pd.DataFrame(rows_list[:max_line]).to_parquet(file_path, index=False)
-                file_index += 1
-                current_file_row_count = 0
-                rows_list = []
-            rows_list.append(row)
-            current_file_row_count += 1
-            current_file_row_count += 1
-            if current_file_row_count % 10000 == 0:
-                collection_task.records_count = current_file_row_count
-                log_task_info(
-                    task_uid,
-                    f"Task with UID {task_uid} get data count {current_file_row_count}...",
-                )
-        if len(rows_list) > 0:
-            file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-            pd.DataFrame(rows_list).to_parquet(file_path, index=False)
-        collection_task.total_count = len(rows)
-        collection_task.records_count = len(rows)
-        log_task_info(
-            task_uid,
-            f"Task with UID {task_uid} get data count {collection_task.records_count}...",
+        # the result set is streamed, so only one batch of rows is held at a time
+        batches = connector.iter_custom_query_batches(
+            run_sql, batch_size=10000, max_rows=max_rows, max_bytes=max_bytes
         )
-    except Exception as e:
-        log_task_error(
-            task_uid,
-            f"Task with UID {task_uid} Error occurred while getting table dataset: {e}",
-        )
-
-
-def hive_get_table_dataset(
-    connector,
-    task_uid: str,
-    collection_task,
-    table_name: str,
-    config_columns: list,
-    base_dir: str,
-    max_line: int = 10000,
-) -> None:
-    try:
-        real_get_columns = []
-        columns = connector.get_table_columns(table_name)
-        logger.info(f"Columns: {columns}")
-        if config_columns:
-            for column in config_columns:
-                if column in columns:
-                    real_get_columns.append(column)
-        if len(real_get_columns) == 0:
+        num_rows = write_query_batches(batches, task_uid, collection_task, table_dir, max_line, file_format)
+        if num_rows == 0:
             log_task_error(
                 task_uid,
-                f"Task with UID {task_uid} Table {table_name} has no valid columns.",
+                f"Task with UID {task_uid} No results returned from SQL query.",
             )
             return
-        table_dir = os.path.join(base_dir, table_name)
-        os.makedirs(table_dir, exist_ok=True)
-        page_size = 10000
-        page = 1
-        records_count = collection_task.records_count or 0
-        file_index = 1
-        rows_buffer = []
-        while True:
-            rows = connector.query_table_hive(
-                table_name,
-                real_get_columns,
-                offset=(page - 1) * page_size,
-                limit=page_size,
-            )
-            if not rows:
-                break
-            rows_buffer.extend(rows)
-            if len(rows_buffer) >= max_line:
-                file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-                pd.DataFrame(rows_buffer).to_parquet(file_path, index=False)
-                records_count += len(rows_buffer)
-                collection_task.records_count = records_count
-                log_task_info(
-                    task_uid,
-                    f"Task with UID {task_uid} get data count {records_count}...",
-                )
-                rows_buffer = []
-                file_index += 1
-            page += 1
-        if rows_buffer:
-            file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-            pd.DataFrame(rows_buffer).to_parquet(file_path, index=False)
-            records_count += len(rows_buffer)
-            collection_task.records_count = records_count
-            log_task_info(
-                task_uid,
-                f"Task with UID {task_uid} get data count {records_count}...",
-            )
+        collection_task.total_count = num_rows
+        collection_task.records_count = num_rows
         log_task_info(
             task_uid,
             f"Task with UID {task_uid} get data count {collection_task.records_count}...",
         )
     except Exception as e:
-        traceback.print_exc()
         log_task_error(
             task_uid,
             f"Task with UID {task_uid} Error occurred while getting table dataset: {e}",
@@ -235,41 +198,25 @@ def hive_get_table_dataset_by_sql(
     collection_task,
     base_dir: str,
     max_line: int = 10000,
+    file_format: str = "parquet",
+    max_rows: int = None,
+    max_bytes: int = None,
 ):
     try:
         table_dir = os.path.join(base_dir, "run_sql")
-        os.makedirs(table_dir, exist_ok=True)
-        rows = connector.execute_custom_query_hive(run_sql)
-        if not rows:
+        # the result set is streamed, so only one batch of rows is held at a time
+        batches = connector.iter_custom_query_batches_hive(
+            run_sql, batch_size=10000, max_rows=max_rows, max_bytes=max_bytes
+        )
+        num_rows = write_query_batches(batches, task_uid, collection_task, table_dir, max_line, file_format)
+        if num_rows == 0:
             log_task_error(
                 task_uid,
                 f"Task with UID {task_uid} No results returned from SQL query.",
             )
             return
-        file_index = 1
-        current_file_row_count = 0
-        rows_list = []
-        for row in rows:
-            if current_file_row_count >= max_line:
-                file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-                pd.DataFrame(rows_list[:max_line]).to_parquet(file_path, index=False)
-                file_index += 1
-                current_file_row_count = 0
-                rows_list = []
-            rows_list.append(row)
-            current_file_row_count += 1
-            current_file_row_count += 1
-            if current_file_row_count % 10000 == 0:
-                collection_task.records_count = current_file_row_count
-                log_task_info(
-                    task_uid,
-                    f"Task with UID {task_uid} get data count {current_file_row_count}...",
-                )
-        if len(rows_list) > 0:
-            file_path = os.path.join(table_dir, f"data_{file_index:04d}.parquet")
-            pd.DataFrame(rows_list).to_parquet(file_path, index=False)
-        collection_task.total_count = len(rows)
-        collection_task.records_count = len(rows)
+        collection_task.total_count = num_rows
+        collection_task.records_count = num_rows
         log_task_info(
             task_uid,
             f"Task with UID {task_uid} get data count {collection_task.records_count}...",
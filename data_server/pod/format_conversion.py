@@ -0,0 +1,165 @@
+"""
+Parallel format conversion of the files of a formatify task.
+
+Files are converted by a pool of forked worker processes, from the largest to
+the smallest, so that a large file doesn't start last and hold up the task.
+Each file has a timeout, and each worker an optional address space limit. The
+results are returned in the order of the input paths, so the names of the
+outputs don't depend on which file finishes first.
+"""
+import multiprocessing
+import os
+import shutil
+import signal
+import time
+from multiprocessing import Pool
+from typing import Callable, Optional
+
+from data_server.pod.pod_logger import log_task_error, log_task_info
+
+# max number of processes converting files, and the seconds each file may take
+FORMAT_CONVERT_MAX_WORKERS = min(os.cpu_count() or 1, 8)
+FORMAT_CONVERT_TIMEOUT = 1800
+# extra seconds to wait for a worker after the timeout of its files
+FORMAT_CONVERT_GRACE_PERIOD = 60
+FORMAT_CONVERT_PROGRESS_INTERVAL = 10
+
+# converter and task of the format conversion in a worker process
+_convert_context = None
+
+
+def link_or_copy(src: str, dst: str):
+    """Hard link a file, or copy it if it can't be linked, e.g. across devices."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _init_convert_worker(convert: Callable, task_uid: str, memory_limit_mb: Optional[int]):
+    global _convert_context
+    _convert_context = (convert, task_uid)
+    if memory_limit_mb:
+        import resource
+
+        limit = int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _on_convert_timeout(signum, frame):
+    raise TimeoutError("conversion timed out")
+
+
+def _stash_convert_outputs(result: dict, stash_dir: str) -> dict:
+    """Move the outputs of a conversion into a dir of their own, keeping their names."""
+    os.makedirs(stash_dir, exist_ok=True)
+    result = dict(result)
+    for key in ("to", "to_files"):
+        paths = result.get(key)
+        if isinstance(paths, str):
+            result[key] = shutil.move(paths, os.path.join(stash_dir, os.path.basename(paths)))
+        elif isinstance(paths, list):
+            result[key] = [shutil.move(path, os.path.join(stash_dir, os.path.basename(path))) for path in paths]
+    return result
+
+
+def _convert_group_in_worker(args):
+    """
+    Convert a group of files sharing the same output name, e.g. a.doc and a.docx,
+    one by one, so they don't write the same file at the same time.
+    """
+    group, timeout = args
+    convert, task_uid = _convert_context
+    results = []
+    for index, file_path in group:
+        signal.signal(signal.SIGALRM, _on_convert_timeout)
+        signal.alarm(timeout)
+        try:
+            result = convert(file_path, task_uid)
+            signal.alarm(0)
+            if len(group) > 1 and isinstance(result, dict) and result.get("status") == "success":
+                stash_dir = os.path.join(os.path.dirname(file_path), f"_convert_output_{index}")
+                result = _stash_convert_outputs(result, stash_dir)
+        except Exception as e:
+            # e.g. a timeout outside the error handling of a converter
+            log_task_error(task_uid, f"convert file {file_path} error: {e}")
+            result = {"from": file_path, "to": None, "status": "failure", "error": str(e)}
+        finally:
+            signal.alarm(0)
+        results.append((index, result))
+    return results
+
+
+def _log_progress(task_uid: str, state: str, total: int, num_done: int, num_failed: int):
+    # in the form parsed by get_progress_from_formatify_logs
+    log_task_info(
+        task_uid,
+        f"Format conversion {state} (total: {total}, success: {num_done - num_failed}, failure: {num_failed})",
+    )
+
+
+def convert_files(convert: Callable, file_paths: list, task_uid: str, task_params: dict) -> list:
+    """
+    Convert files by a process pool.
+
+    :param convert: function converting a file, called with the file path and
+        the task uid, and returning a result dict with its status and outputs
+    :param file_paths: paths of the files to convert
+    :param task_uid: uid of the formatify task for logs
+    :param task_params: params of the task, where convert_workers is the number
+        of processes, convert_timeout the seconds each file may take (0 for no
+        limit), and convert_memory_limit_mb the address space limit of each
+        process
+    :return: results of the conversions, in the order of file_paths. Files
+        whose worker died or got stuck get a failure result.
+    """
+    if not file_paths:
+        return []
+    timeout = int(task_params.get("convert_timeout", FORMAT_CONVERT_TIMEOUT) or 0)
+    memory_limit_mb = task_params.get("convert_memory_limit_mb")
+    num_workers = int(task_params.get("convert_workers") or FORMAT_CONVERT_MAX_WORKERS)
+
+    groups = {}
+    for index, file_path in enumerate(file_paths):
+        groups.setdefault(os.path.splitext(file_path)[0], []).append((index, file_path))
+    sizes = {group_key: sum(os.path.getsize(path) for _, path in group) for group_key, group in groups.items()}
+    tasks = [(groups[group_key], timeout) for group_key in sorted(groups, key=lambda key: (-sizes[key], key))]
+    num_workers = max(1, min(num_workers, len(tasks)))
+
+    results = [None] * len(file_paths)
+    done = [False] * len(file_paths)
+    num_done = num_failed = 0
+    # a worker killed, e.g. by the memory limit, or stuck in native code never
+    # returns its files, so the wait is bounded even without a file timeout
+    max_group_size = max(len(group) for group, _ in tasks)
+    wait_timeout = (timeout or FORMAT_CONVERT_TIMEOUT) * max_group_size + FORMAT_CONVERT_GRACE_PERIOD
+    last_report = time.monotonic()
+    pool = Pool(num_workers, initializer=_init_convert_worker, initargs=(convert, task_uid, memory_limit_mb))
+    try:
+        iterator = pool.imap_unordered(_convert_group_in_worker, tasks)
+        for _ in tasks:
+            try:
+                group_results = iterator.next(timeout=wait_timeout)
+            except multiprocessing.TimeoutError:
+                break
+            for index, result in group_results:
+                results[index] = result
+                done[index] = True
+                num_done += 1
+                if not (isinstance(result, dict) and result.get("status") == "success"):
+                    num_failed += 1
+            if time.monotonic() - last_report >= FORMAT_CONVERT_PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                _log_progress(task_uid, "progress", len(file_paths), num_done, num_failed)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    for index, file_path in enumerate(file_paths):
+        if not done[index]:
+            log_task_error(task_uid, f"convert file {file_path} error: conversion timed out")
+            results[index] = {"from": file_path, "to": None, "status": "failure", "error": "conversion timed out"}
+            num_done += 1
+            num_failed += 1
+    _log_progress(task_uid, "finished", len(file_paths), num_done, num_failed)
+    return results
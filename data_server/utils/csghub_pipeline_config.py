@@ -13,9 +13,15 @@ OPERATOR_RUNTIME_KEYS = (
     "executor_type",
     "ray_address",
     "op_fusion",
+    "op_streaming",
     "use_cache",
     "ds_cache_dir",
     "use_checkpoint",
+    "use_op_cache",
+    "op_cache_dir",
+    "op_cache_max_size",
+    "incremental",
+    "incremental_dir",
     "temp_dir",
     "export_shard_size",
     "export_in_parallel",
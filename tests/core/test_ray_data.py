@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from data_engine.ops.load import load_ops
+from data_engine.utils.constant import Fields
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase, TEST_TAG
+
+
+class RayDataTest(DataJuicerTestCaseBase):
+
+    process_list = [{
+        'clean_email_mapper': {}
+    }, {
+        'whitespace_normalization_mapper': {}
+    }, {
+        'text_length_filter': {
+            'min_len': 10,
+            'max_len': 50,
+            'batch_size': 2
+        }
+    }, {
+        'alphanumeric_filter': {
+            'min_ratio': 0.5,
+            'batch_size': 3
+        }
+    }]
+
+    ds_list = [{
+        'text': 'contact me: abc@example.com today'
+    }, {
+        'text': 'short'
+    }, {
+        'text': 'Today is Sunday and it\'s a happy day!'
+    }, {
+        'text': '，。、„”“«»１」「《》´∶：？！（）；–—．～’…━〈〉'
+    }, {
+        'text': 'a very very very very very long text which will be cut off'
+    }, {
+        'text': 'see https://example.com/a/b  now'
+    }]
+
+    tgt_list = [{
+        'text': 'contact me:  today'
+    }, {
+        'text': 'Today is Sunday and it\'s a happy day!'
+    }, {
+        'text': 'see https://example.com/a/b  now'
+    }]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    @TEST_TAG('standalone', 'ray')
+    def test_multiple_ops(self):
+        dataset = self.generate_dataset(self.ds_list)
+        ops = load_ops(self.process_list)
+        result = self.run_single_op(dataset, ops, ['text'])
+        self.assertDatasetEqual(result, self.tgt_list)
+
+    @TEST_TAG('ray')
+    def test_write_shards(self):
+        if getattr(self, 'current_tag', 'standalone') != 'ray':
+            self.skipTest('only for ray datasets')
+        dataset = self.generate_dataset(self.ds_list)
+        dataset.process(load_ops(self.process_list))
+        dataset.write(self.tmp_dir,
+                      suffix='jsonl',
+                      basename='res',
+                      columns_to_remove={Fields.stats})
+        result = []
+        for filename in sorted(os.listdir(self.tmp_dir)):
+            self.assertTrue(filename.startswith('res-'))
+            self.assertTrue(filename.endswith('.jsonl'))
+            with open(os.path.join(self.tmp_dir, filename)) as f:
+                content = f.read()
+                self.assertNotIn('\\/', content)
+                result.extend(
+                    json.loads(line) for line in content.splitlines())
+        self.assertDatasetEqual(result, self.tgt_list)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from data_server.datasource.schemas import DataSourceBase
+from data_server.datasource.services.connectors.pool import (
+    ConnectionPool,
+    close_all_pools,
+    get_connection_pool,
+    get_pool_stats,
+)
+
+
+class SQLiteConnector:
+    """Stand-in connector that keeps its connections in the shared pools."""
+
+    def __init__(self, datasource: DataSourceBase):
+        self.datasource = datasource
+
+    def _connect(self):
+        return sqlite3.connect(self.datasource.database, check_same_thread=False)
+
+    def _get_pool(self) -> ConnectionPool:
+        return get_connection_pool(
+            self.datasource,
+            self._connect,
+            check=lambda conn: conn.execute("SELECT 1"),
+            reset=lambda conn: conn.rollback(),
+        )
+
+    def get_tables(self):
+        with self._get_pool().connection() as conn:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+            return [row[0] for row in rows]
+
+
+@pytest.fixture
+def datasource(tmp_path):
+    path = str(tmp_path / "test.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+    close_all_pools()
+    yield DataSourceBase(name="test", des="test", source_type=1, host="localhost", database=path)
+    close_all_pools()
+
+
+def test_reuse_connections_across_connectors(datasource):
+    for _ in range(5):
+        assert SQLiteConnector(datasource).get_tables() == ["users"]
+    other = datasource.model_copy(update={"password": "other"})
+    assert SQLiteConnector(other).get_tables() == ["users"]
+
+    stats = get_pool_stats()
+    assert len(stats) == 2
+    assert stats[0]["created"] == 1 and stats[0]["reused"] == 4
+    assert stats[0]["idle"] == 1 and stats[0]["in_use"] == 0
+
+
+def test_bounded_size():
+    pool = ConnectionPool("test", lambda: sqlite3.connect(":memory:"), max_size=2, acquire_timeout=0.1)
+    conns = [pool.acquire(), pool.acquire()]
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+    # a waiting thread gets the connection released by another one
+    got = []
+    thread = threading.Thread(target=lambda: got.append(pool.acquire()))
+    pool.acquire_timeout = 5
+    thread.start()
+    pool.release(conns[0])
+    thread.join()
+    assert got == [conns[0]]
+    assert pool.stats()["acquire_timeouts"] == 1
+    assert pool.stats()["created"] == 2
+
+
+def test_idle_eviction_and_health_check():
+    pool = ConnectionPool(
+        "test",
+        lambda: sqlite3.connect(":memory:"),
+        check=lambda conn: conn.execute("SELECT 1"),
+        idle_timeout=0.05,
+        health_check_interval=0,
+    )
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.1)
+    pool.evict_idle()
+    assert pool.stats()["evicted"] == 1 and pool.stats()["idle"] == 0
+
+    # a broken idle connection is replaced by a new one
+    pool.idle_timeout = 60
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()
+    new_conn = pool.acquire()
+    assert new_conn is not conn
+    assert pool.stats()["health_check_failures"] == 1
+
+    # connections are dropped when the with block fails
+    pool.release(new_conn)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError()
+    assert pool.stats()["idle"] == 0
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pyarrow.parquet as pq
+import pytest
+
+from data_server.datasource.services.connectors.record_batches import rows_to_record_batch
+from data_server.pod.datasource_harvester import harvest_tables, split_key_range
+from data_server.pod.datasource_helpers import ParquetBatchWriter
+
+
+class SQLiteSource:
+    """Stand-in datasource whose tables have an integer primary key `id`."""
+
+    def __init__(self, path):
+        self.path = path
+        self.read_ranges = []
+        self.fail_ranges = set()
+
+    def plan_partitions(self, table_name):
+        with sqlite3.connect(self.path) as conn:
+            low, high, total = conn.execute(f"SELECT MIN(id), MAX(id), COUNT(*) FROM {table_name}").fetchone()
+        return split_key_range(low, high, total, partition_rows=30)
+
+    def read_partition(self, table_name, columns, key_range):
+        self.read_ranges.append((table_name, tuple(key_range or ())))
+        low, high = key_range or (None, None)
+        query = f"SELECT {', '.join(columns)} FROM {table_name} WHERE id >= ? AND id < ? ORDER BY id"
+        with sqlite3.connect(self.path) as conn:
+            rows = conn.execute(query, (-1 if low is None else low, 1 << 62 if high is None else high)).fetchall()
+        for start in range(0, len(rows), 10):
+            yield rows_to_record_batch(rows[start:start + 10], columns)
+            if (table_name, tuple(key_range or ())) in self.fail_ranges:
+                raise ConnectionError("lost connection")
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / "source.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE big (id INTEGER PRIMARY KEY, text TEXT)")
+        conn.executemany("INSERT INTO big VALUES (?, ?)", [(i, f"text {i}") for i in range(100)])
+        conn.execute("CREATE TABLE small (id INTEGER PRIMARY KEY, text TEXT)")
+        conn.executemany("INSERT INTO small VALUES (?, ?)", [(i, f"small {i}") for i in range(5)])
+    return SQLiteSource(path)
+
+
+def _harvest(source, stage_dir, context):
+    harvest_tables(
+        {"big": ["id", "text"], "small": ["text"]},
+        source.plan_partitions,
+        source.read_partition,
+        "task",
+        context,
+        stage_dir,
+        source_key=("sqlite", source.path),
+        max_line=20,
+        max_concurrency=3,
+    )
+
+
+def test_harvest_and_resume(source, tmp_path):
+    stage_dir = str(tmp_path / "stage")
+    context = type("Context", (), {"records_count": 0})()
+    source.fail_ranges.add(("big", (50, 75)))
+    with pytest.raises(RuntimeError):
+        _harvest(source, stage_dir, context)
+    assert len(source.read_ranges) == 5
+    assert context.records_count == 80
+
+    # only the failed partition is read again
+    source.fail_ranges.clear()
+    source.read_ranges.clear()
+    _harvest(source, stage_dir, context)
+    assert source.read_ranges == [("big", (50, 75))]
+    assert context.records_count == 105
+
+    big = pq.read_table(f"{stage_dir}/big")
+    assert sorted(big.column("id").to_pylist()) == list(range(100))
+    assert pq.read_table(f"{stage_dir}/small").column_names == ["text"]
+
+
+def test_split_key_range():
+    assert split_key_range(0, 99, 100, 100) == [None]
+    assert split_key_range(0, 99, 100, 30) == [[None, 25], [25, 50], [50, 75], [75, None]]
+
+
+def test_writer_prefix(tmp_path):
+    with ParquetBatchWriter(str(tmp_path), max_line=10, prefix="data_part0001") as writer:
+        writer.write(rows_to_record_batch([(1,)], ["id"]))
+    assert (tmp_path / "data_part0001_0001.parquet").exists()
@@ -0,0 +1,21 @@
+import os
+
+import pyarrow.parquet as pq
+
+from data_server.datasource.services.connectors.record_batches import rows_to_record_batch
+from data_server.pod.datasource_helpers import ParquetBatchWriter
+
+
+def test_write_batches_into_files(tmp_path):
+    columns = ["id", "name"]
+    with ParquetBatchWriter(str(tmp_path), max_line=7) as writer:
+        for start in range(0, 20, 4):
+            rows = [(i, f"name {i}") for i in range(start, start + 4)]
+            writer.write(rows_to_record_batch(rows, columns))
+
+    file_names = sorted(os.listdir(tmp_path))
+    assert file_names == ["data_0001.parquet", "data_0002.parquet", "data_0003.parquet"]
+    assert [pq.read_metadata(tmp_path / name).num_rows for name in file_names] == [7, 7, 6]
+    assert writer.num_rows == 20
+    table = pq.read_table(str(tmp_path))
+    assert table.column("id").to_pylist() == list(range(20))
@@ -0,0 +1,64 @@
+import json
+import sqlite3
+from types import SimpleNamespace
+
+from data_server.datasource.services.connectors.record_batches import (
+    iter_cursor_batches,
+    limit_record_batches,
+    rows_to_record_batch,
+)
+from data_server.pod.datasource_helpers import mysql_get_table_dataset_by_sql, write_query_batches
+
+
+def _query(sql):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER, text TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"text {i}") for i in range(25)])
+    cursor = conn.cursor()
+    cursor.execute(sql)
+    return cursor
+
+
+def test_iter_cursor_batches():
+    batches = list(iter_cursor_batches(_query("SELECT id, text AS content FROM t"), batch_size=10))
+    assert [batch.num_rows for batch in batches] == [10, 10, 5]
+    assert batches[0].schema.names == ["id", "content"]
+
+
+def test_limit_record_batches():
+    def batches():
+        for start in range(0, 100, 10):
+            yield rows_to_record_batch([(i,) for i in range(start, start + 10)], ["id"])
+            read.append(start)
+
+    read = []
+    limited = list(limit_record_batches(batches(), max_rows=25))
+    assert [batch.num_rows for batch in limited] == [10, 10, 5]
+    # the source is not read after the budget is used up
+    assert read == [0, 10]
+
+    read = []
+    limited = list(limit_record_batches(batches(), max_bytes=8 * 15))
+    assert sum(batch.num_rows for batch in limited) == 15
+    assert sum(batch.num_rows for batch in limit_record_batches(batches())) == 100
+
+
+def test_write_query_batches_jsonl(tmp_path):
+    context = SimpleNamespace(records_count=0)
+    batches = iter_cursor_batches(_query("SELECT id, text FROM t"), batch_size=10)
+    num_rows = write_query_batches(batches, "task", context, str(tmp_path), max_line=20, file_format="jsonl")
+    assert num_rows == 25 and context.records_count == 25
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["data_0001.jsonl", "data_0002.jsonl"]
+    lines = (tmp_path / "data_0002.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines][0] == {"id": 20, "text": "text 20"}
+
+
+def test_get_table_dataset_by_sql_budget(tmp_path):
+    class Connector:
+        def iter_custom_query_batches(self, query, batch_size=10000, max_rows=None, max_bytes=None):
+            batches = iter_cursor_batches(_query(query), batch_size=5)
+            return limit_record_batches(batches, max_rows, max_bytes)
+
+    context = SimpleNamespace(records_count=0, total_count=0)
+    mysql_get_table_dataset_by_sql(Connector(), "task", "SELECT id FROM t", context, str(tmp_path), max_bytes=8 * 12)
+    assert context.records_count == 12
@@ -0,0 +1,99 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from data_engine.core.data import NestedDataset as Dataset
+from data_engine.exporter import base_exporter
+from data_engine.exporter.base_exporter import Exporter
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+
+class ExporterTest(DataJuicerTestCaseBase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.rows = [{
+            'text': f'http://a/b 你好 {i}',
+            'meta': {
+                'score': i / 2,
+                'tags': ['x'] * (i % 3)
+            }
+        } for i in range(25)]
+        self.dataset = Dataset.from_list(self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_to_jsonl(self):
+        for num_proc in [1, 3]:
+            export_path = os.path.join(self.tmp_dir, f'{num_proc}.jsonl')
+            with mock.patch.object(base_exporter, 'EXPORT_BATCH_SIZE', 4):
+                Exporter.to_jsonl(self.dataset, export_path, num_proc=num_proc)
+            with open(export_path, encoding='utf-8') as fin:
+                content = fin.read()
+            # slashes and non-ascii chars are not escaped
+            self.assertIn('http://a/b 你好 0', content)
+            self.assertEqual([json.loads(line) for line in content.splitlines()],
+                             self.rows)
+
+    def test_to_json(self):
+        export_path = os.path.join(self.tmp_dir, 'res.json')
+        with mock.patch.object(base_exporter, 'EXPORT_BATCH_SIZE', 4):
+            Exporter.to_json(self.dataset.select(range(3, 15)), export_path,
+                             num_proc=2)
+        with open(export_path, encoding='utf-8') as fin:
+            self.assertEqual(json.load(fin), self.rows[3:15])
+
+        Exporter.to_json(self.dataset.select([]), export_path)
+        with open(export_path, encoding='utf-8') as fin:
+            self.assertEqual(json.load(fin), [])
+
+
+    def test_same_output_without_orjson(self):
+        if base_exporter.orjson is None:
+            self.skipTest('orjson is not installed')
+        rows = [{
+            'text': 'a/b',
+            'time': datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+            'date': datetime.date(2024, 1, 2),
+            'meta': {
+                'score': 0.5,
+                'tags': ['x', 'y']
+            }
+        }]
+        dataset = Dataset.from_list(rows)
+        export_path = os.path.join(self.tmp_dir, 'orjson.jsonl')
+        Exporter.to_jsonl(dataset, export_path)
+        with open(export_path, 'rb') as fin:
+            content = fin.read()
+        self.assertIn(b'"time":"2024-01-02T03:04:05.000006"', content)
+
+        export_path = os.path.join(self.tmp_dir, 'json.jsonl')
+        with mock.patch.object(base_exporter, 'orjson', None):
+            Exporter.to_jsonl(dataset, export_path)
+        with open(export_path, 'rb') as fin:
+            self.assertEqual(fin.read(), content)
+
+    def test_export_shards(self):
+        export_path = os.path.join(self.tmp_dir, 'out', 'res.jsonl')
+        exporter = Exporter(export_path,
+                            export_shard_size=1,
+                            num_proc=2,
+                            export_stats=False)
+        exporter.export(self.dataset.select(range(4)))
+        data_dir = os.path.join(self.tmp_dir, 'out', '_data')
+        rows = []
+        for filename in sorted(os.listdir(data_dir)):
+            with open(os.path.join(data_dir, filename),
+                      encoding='utf-8') as fin:
+                rows.extend(json.loads(line) for line in fin)
+        self.assertEqual(len(os.listdir(data_dir)), 4)
+        self.assertEqual(rows, self.rows[:4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import signal
+import time
+
+import pytest
+
+from data_server.pod import format_conversion
+from data_server.pod.format_conversion import convert_files
+
+
+def convert_to_markdown(file_path, task_uid):
+    name = os.path.basename(file_path)
+    if name.startswith("slow"):
+        time.sleep(30)
+    if name.startswith("crash"):
+        os.kill(os.getpid(), signal.SIGKILL)
+    if name.startswith("bad"):
+        return {"from": file_path, "to": None, "status": "failure", "error": "bad file"}
+    output_path = os.path.splitext(file_path)[0] + ".md"
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(name)
+    return {"from": file_path, "to": output_path, "status": "success"}
+
+
+def _make_files(tmp_path, sizes):
+    paths = []
+    for name, size in sizes.items():
+        path = tmp_path / name
+        path.write_text("x" * size)
+        paths.append(str(path))
+    return sorted(paths)
+
+
+@pytest.fixture
+def logs(monkeypatch):
+    lines = []
+    monkeypatch.setattr(format_conversion, "log_task_info", lambda task_uid, message: lines.append(message))
+    return lines
+
+
+def test_results_in_path_order(tmp_path, logs):
+    # the largest files finish first, but the results follow the paths
+    file_paths = _make_files(tmp_path, {"a.doc": 1, "b.doc": 300, "bad.doc": 1, "c.doc": 200})
+    results = convert_files(convert_to_markdown, file_paths, "task", {"convert_workers": 2})
+    assert [result["from"] for result in results] == file_paths
+    assert [result["status"] for result in results] == ["success", "success", "failure", "success"]
+    assert logs[-1] == "Format conversion finished (total: 4, success: 3, failure: 1)"
+
+
+def test_same_stem_converted_in_turn(tmp_path, logs):
+    file_paths = _make_files(tmp_path, {"a.doc": 1, "a.docx": 1, "b.doc": 1})
+    results = convert_files(convert_to_markdown, file_paths, "task", {"convert_workers": 3})
+    # both outputs are named a.md, so they are kept in dirs of their own
+    assert results[0]["to"] == str(tmp_path / "_convert_output_0" / "a.md")
+    assert results[1]["to"] == str(tmp_path / "_convert_output_1" / "a.md")
+    assert results[2]["to"] == str(tmp_path / "b.md")
+    assert [open(result["to"]).read() for result in results] == ["a.doc", "a.docx", "b.doc"]
+
+
+def test_file_timeout(tmp_path, logs):
+    file_paths = _make_files(tmp_path, {"a.doc": 1, "slow.doc": 1})
+    start = time.monotonic()
+    results = convert_files(convert_to_markdown, file_paths, "task", {"convert_timeout": 1})
+    assert time.monotonic() - start < 10
+    assert results[0]["status"] == "success"
+    assert results[1] == {
+        "from": file_paths[1], "to": None, "status": "failure", "error": "conversion timed out",
+    }
+
+
+@pytest.mark.parametrize("convert_timeout", [1, 0])
+def test_give_up_on_dead_worker(tmp_path, logs, monkeypatch, convert_timeout):
+    # without a file timeout, the wait is bounded by the default one
+    monkeypatch.setattr(format_conversion, "FORMAT_CONVERT_TIMEOUT", 1)
+    monkeypatch.setattr(format_conversion, "FORMAT_CONVERT_GRACE_PERIOD", 1)
+    file_paths = _make_files(tmp_path, {"a.doc": 1, "crash.doc": 1})
+    task_params = {"convert_timeout": convert_timeout, "convert_workers": 2}
+    results = convert_files(convert_to_markdown, file_paths, "task", task_params)
+    assert results[0]["status"] == "success"
+    assert results[1]["status"] == "failure"
+    assert logs[-1] == "Format conversion finished (total: 2, success: 1, failure: 1)"
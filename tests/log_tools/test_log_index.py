@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from data_server.log_tools import tools
+from data_server.log_tools.log_index import TaskLogIndex
+
+
+class TaskLogIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, "task.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _append(self, logs, partial=""):
+        with open(self.log_path, "a") as f:
+            for log in logs:
+                f.write(json.dumps(log) + "\n")
+            f.write(partial)
+
+    def test_query(self):
+        self._append([
+            {"level": "info", "operator_name": "a", "content": "0", "create_at": 2},
+            {"level": "error", "operator_name": "b", "content": "1", "create_at": 1},
+            {"level": "info", "operator_name": "b", "content": "2", "create_at": 2},
+        ], partial='{"level": "info", "content": "3"')
+        index = TaskLogIndex(self.log_path)
+        logs, total = index.query(skip=1, limit=1)
+        self.assertEqual(([log["content"] for log in logs], total), (["0"], 3))
+        logs, total = index.query(level="info", descending=True)
+        self.assertEqual(([log["content"] for log in logs], total), (["2", "0"], 2))
+        logs, total = index.query(level="info", operator_name="b")
+        self.assertEqual(([log["content"] for log in logs], total), (["2"], 1))
+
+        # only the appended lines are indexed, including the finished one
+        self._append([], partial=', "create_at": 3}\n')
+        self._append([{"level": "info", "content": "4", "create_at": 0}])
+        logs, total = index.query(level="info")
+        self.assertEqual([log["content"] for log in logs], ["4", "0", "2", "3"])
+
+        # the index is rebuilt if the log file is rewritten
+        os.remove(self.log_path)
+        self._append([{"level": "info", "content": "5", "create_at": 0}])
+        self.assertEqual(index.query()[1], 1)
+
+    def test_formatify_progress(self):
+        with mock.patch.object(tools, "_get_log_root", return_value=self.tmp_dir):
+            tools.insert_formatity_task_log_info("task", "Found 4 files to convert")
+            tools.insert_formatity_task_log_info("task", "convert file a.docx succeed")
+            tools.insert_formatity_task_log_info("task", "convert file b.docx succeed")
+            tools.insert_formatity_task_log_error("task", "convert file c.docx error")
+            progress = tools.get_progress_from_formatify_logs("task")
+            self.assertEqual(progress, {"total": 4, "success": 2, "failure": 1, "progress": 75.0})
+            res = tools.get_log_List("task", page=2, page_size=3, type="formatity")
+            self.assertEqual((res["total"], res["total_pages"]), (4, 2))
+            self.assertEqual([log["content"] for log in res["data"]], ["convert file c.docx error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
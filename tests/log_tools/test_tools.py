@@ -0,0 +1,105 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from data_server.log_tools import tools
+
+
+def _write_logs(job_uid, num_logs):
+    for i in range(num_logs):
+        tools.insert_pipline_job_run_task_log_info(job_uid, f"log {i}", "op", 1)
+
+
+def _run_operator(job_uid, operator_name, operator_index):
+    for status in [tools.OperatorStatusEnum.Processing, tools.OperatorStatusEnum.SUCCESS]:
+        tools.set_pipline_job_operator_status(job_uid, status, operator_name, operator_index)
+
+
+class TaskLogWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(tools, "_get_log_root", return_value=self.tmp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        tools.flush_task_logs()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _read_lines(self, job_uid):
+        with open(os.path.join(self.tmp_dir, "pipeline", f"{job_uid}.jsonl")) as f:
+            return [json.loads(line) for line in f]
+
+    def test_buffered_logs(self):
+        _write_logs("job1", 3)
+        tools.insert_pipline_job_run_task_log_error("job1", "boom", "op", 1)
+        # error logs are flushed at once together with the buffered ones
+        self.assertEqual(
+            [log["content"] for log in self._read_lines("job1")],
+            ["log 0", "log 1", "log 2", "boom"],
+        )
+        _write_logs("job1", 2)
+        res = tools.get_pipline_job_log_List("job1", page=1, page_size=10)
+        self.assertEqual(res["total"], 6)
+
+    def test_logs_after_dir_removed(self):
+        tools.insert_pipline_job_run_task_log_error("job5", "boom 0", "op", 0)
+        shutil.rmtree(os.path.join(self.tmp_dir, "pipeline"))
+        tools.insert_pipline_job_run_task_log_error("job5", "boom 1", "op", 0)
+        self.assertEqual([log["content"] for log in self._read_lines("job5")], ["boom 1"])
+
+    def test_logs_of_forked_workers(self):
+        _write_logs("job2", 10)
+        ctx = multiprocessing.get_context("fork")
+        workers = [ctx.Process(target=_write_logs, args=("job2", 500)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        tools.flush_task_logs()
+        # lines buffered before forking are not written by the workers again
+        logs = self._read_lines("job2")
+        self.assertEqual(len(logs), 2010)
+
+    def test_operator_status(self):
+        ctx = multiprocessing.get_context("fork")
+        workers = [
+            ctx.Process(target=_run_operator, args=("job3", f"op{i}", i))
+            for i in range(8)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        tools.set_pipline_job_operator_status("job3", tools.OperatorStatusEnum.ERROR, "op0", 0)
+
+        records = tools.get_pipline_job_operator_status_records("job3")
+        self.assertEqual(
+            sorted((r["operator_index"], r["status"]) for r in records),
+            [(0, "error")] + [(i, "success") for i in range(1, 8)],
+        )
+        self.assertTrue(all(r["end_time"] is not None for r in records))
+
+    def test_legacy_operator_status(self):
+        records = [{
+            "_id": "job4-op0-0",
+            "job_uid": "job4",
+            "operator_name": "op0",
+            "operator_index": 0,
+            "status": "success",
+            "start_time": "2024-01-01 00:00:00",
+            "end_time": "2024-01-01 00:01:00",
+        }]
+        os.makedirs(os.path.join(self.tmp_dir, "pipeline"))
+        with open(os.path.join(self.tmp_dir, "pipeline", "job4.operator_status.json"), "w") as f:
+            json.dump(records, f)
+        self.assertEqual(tools.get_pipline_job_operator_status_records("job4"), records)
+
+
+if __name__ == "__main__":
+    unittest.main()
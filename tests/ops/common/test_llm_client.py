@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from data_engine.ops.common.llm_client import (LLMRequestEngine,
+                                               chat_with_model,
+                                               chat_with_model_batch)
+from data_engine.utils.llm_cache_utils import LLMResponseCache
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        content = body['messages'][-1]['content']
+        with server.lock:
+            server.num_requests += 1
+            # rate limit the first request of each content
+            limited = content not in server.seen
+            server.seen.add(content)
+        if content == 'fail':
+            self._reply(400, {'error': 'bad request'})
+        elif limited:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self._reply(200, {
+                'choices': [{
+                    'message': {
+                        'content': content.upper()
+                    }
+                }]
+            })
+
+    def _reply(self, status, data):
+        payload = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class LLMRequestEngineTest(DataJuicerTestCaseBase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _ChatHandler)
+        self.server.lock = threading.Lock()
+        self.server.seen = set()
+        self.server.num_requests = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/chat'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_batch_with_retries(self):
+        engine = LLMRequestEngine(max_concurrency=4, backoff_factor=0)
+        texts = [f'text {i}' for i in range(10)] + ['fail']
+        results = chat_with_model_batch(
+            self.url, 'token', 'model',
+            [[{'role': 'user', 'content': text}] for text in texts],
+            engine=engine)
+        self.assertEqual(results[:-1], [text.upper() for text in texts[:-1]])
+        self.assertIsInstance(results[-1], Exception)
+        # each rate limited request is retried once, and the bad request is
+        # not retried
+        self.assertEqual(self.server.num_requests, 21)
+
+    def test_batch_with_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        cache = LLMResponseCache(os.path.join(tmp_dir, 'responses.sqlite'))
+        engine = LLMRequestEngine(backoff_factor=0)
+        self.server.seen.update(['a', 'b'])
+        messages_list = [[{'role': 'user', 'content': text}]
+                         for text in ['a', 'b', 'fail']]
+        for _ in range(2):
+            results = chat_with_model_batch(self.url,
+                                            'token',
+                                            'model',
+                                            messages_list,
+                                            engine=engine,
+                                            cache=cache)
+            self.assertEqual(results[:2], ['A', 'B'])
+            self.assertIsInstance(results[2], Exception)
+        # only the failed request is sent again
+        self.assertEqual(self.server.num_requests, 4)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+        # requests with other sampling params are not cached
+        chat_with_model_batch(self.url,
+                              'token',
+                              'model',
+                              messages_list[:1],
+                              engine=engine,
+                              cache=cache,
+                              temperature=0)
+        self.assertEqual(self.server.num_requests, 5)
+
+    def test_chat_with_model(self):
+        with self.assertRaises(Exception):
+            chat_with_model(self.url, 'token', 'model',
+                            [{'role': 'user', 'content': 'fail'}])
+        self.server.seen.add('hello')
+        self.assertEqual(
+            chat_with_model(self.url, 'token', 'model',
+                            [{'role': 'user', 'content': 'hello'}]), 'HELLO')
+
+
+if __name__ == '__main__':
+    unittest.main()
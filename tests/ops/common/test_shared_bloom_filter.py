@@ -0,0 +1,67 @@
+import hashlib
+import os
+import unittest
+from multiprocessing import get_context
+
+from data_engine.ops.common.shared_bloom_filter import SharedBloomFilter
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+
+def _digest(text):
+    return hashlib.md5(text.encode('utf-8')).digest()
+
+
+def _add_texts(bloom_filter, texts):
+    return bloom_filter.add_many([_digest(text) for text in texts]).tolist()
+
+
+class SharedBloomFilterTest(DataJuicerTestCaseBase):
+
+    def test_add(self):
+        bloom_filter = SharedBloomFilter(capacity=100)
+        self.addCleanup(bloom_filter.close)
+        self.assertEqual(_add_texts(bloom_filter, ['a', 'b', 'a']),
+                         [False, False, True])
+        self.assertEqual(_add_texts(bloom_filter, ['b', 'c']), [True, False])
+        self.assertIn(_digest('c'), bloom_filter)
+        self.assertNotIn(_digest('d'), bloom_filter)
+
+    def test_shared_by_processes(self):
+        bloom_filter = SharedBloomFilter(capacity=1000)
+        self.addCleanup(bloom_filter.close)
+        texts = [f'text {i % 300}' for i in range(1200)]
+        chunks = [(bloom_filter, texts[i::4]) for i in range(4)]
+        with get_context('fork').Pool(4) as pool:
+            results = pool.starmap(_add_texts, chunks)
+        # each text is only regarded as new by one of the processes
+        self.assertEqual(sum(not dup for res in results for dup in res),
+                         300)
+        self.assertTrue(all(_add_texts(bloom_filter, texts)))
+
+    def test_scale_beyond_capacity(self):
+        bloom_filter = SharedBloomFilter(capacity=10, error_rate=1e-4)
+        self.addCleanup(bloom_filter.close)
+        texts = [f'text {i % 1000}' for i in range(4000)]
+        chunks = [(bloom_filter, texts[i::4]) for i in range(4)]
+        with get_context('fork').Pool(4) as pool:
+            results = pool.starmap(_add_texts, chunks)
+        # the slices added by a process are found by the others
+        self.assertEqual(sum(not dup for res in results for dup in res),
+                         1000)
+        self.assertTrue(all(_add_texts(bloom_filter, texts)))
+        self.assertFalse(
+            any(_add_texts(bloom_filter, [f'new {i}' for i in range(1000)])))
+
+    def test_close(self):
+        bloom_filter = SharedBloomFilter(capacity=10)
+        _add_texts(bloom_filter, [f'text {i}' for i in range(100)])
+        paths = [bloom_filter.path] + [
+            f'{bloom_filter.path}.{i}' for i in range(4)
+        ]
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+        bloom_filter.close()
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from itertools import combinations
+
+import numpy as np
+
+from data_engine.ops.common.simhash_index import (find_simhash_matches,
+                                                  popcount64)
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+
+class SimhashIndexTest(DataJuicerTestCaseBase):
+
+    def test_popcount64(self):
+        values = np.array([0, 1, 0b1011, 2**64 - 1, 2**63], dtype=np.uint64)
+        self.assertEqual(popcount64(values).tolist(), [0, 1, 3, 64, 1])
+
+    def test_find_matches(self):
+        rng = np.random.default_rng(42)
+        bases = rng.integers(0, 2**63, size=20, dtype=np.uint64) * np.uint64(2)
+        # flip a few random bits of the bases to get near duplicates
+        fingerprints = [int(base) for base in bases]
+        for base in bases[:10]:
+            for num_flips in range(1, 5):
+                bits = rng.choice(64, size=num_flips, replace=False)
+                fingerprints.append(int(base) ^ sum(1 << int(b) for b in bits))
+        fingerprints = np.unique(np.array(fingerprints, dtype=np.uint64))
+
+        expected = [[i, j]
+                    for i, j in combinations(range(len(fingerprints)), 2)
+                    if bin(int(fingerprints[i] ^ fingerprints[j])).count('1')
+                    <= 3]
+        matches = find_simhash_matches(fingerprints, 6, 3)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(matches.tolist(), expected)
+
+    def test_invalid_params(self):
+        with self.assertRaises(ValueError):
+            find_simhash_matches(np.zeros(2, dtype=np.uint64), 4, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@ import unittest
 from data_engine.core.data import NestedDataset as Dataset
 from data_engine.ops.deduplicator.dedup_and_save_deduplicator import \
     DedupAndSaveDeduplicator
+from data_engine.utils.constant import Fields
 from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
 
 
@@ -13,8 +14,10 @@ class DedupAndSaveDeduplicatorTest(DataJuicerTestCaseBase):
         dataset = dataset.map(op.compute_hash)
         dataset, _ = op.process(dataset)
         print("after data:", [row for row in dataset])
-        dataset = dataset.select_columns(column_names=['text'])
-        res_list = dataset.to_list()
+        # the text field is moved to stats in default
+        res_list = [{
+            'text': stats['text']
+        } for stats in dataset[Fields.stats]]
         self.assertEqual(res_list, target_list)
 
     def test_transitive_deduplication(self):
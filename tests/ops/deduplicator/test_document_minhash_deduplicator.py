@@ -1,10 +1,12 @@
+import os
+import tempfile
 import unittest
 
 from data_engine.core.data import NestedDataset as Dataset
 
 from data_engine.ops.deduplicator.document_minhash_deduplicator import \
     DocumentMinhashDeduplicator
-from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase, TEST_TAG
 
 
 class DocumentMinhashDeduplicatorTest(DataJuicerTestCaseBase):
@@ -958,6 +960,84 @@ class DocumentMinhashDeduplicatorTest(DataJuicerTestCaseBase):
                                          ignore_pattern=r'\p{P}')
         self._run_minhash_dedup(dataset, tgt_list, op)
 
+    def test_batched_compute_hash(self):
+        ds_list = [{
+            'text': 'Today is Sunday and it\'s a happy day!'
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }, {
+            'text': 'Today is sunday and it\'s a happy day!'
+        }, {
+            'text': ''
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }]
+        tgt_list = [{
+            'text': 'Today is Sunday and it\'s a happy day!'
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }, {
+            'text': ''
+        }]
+        dataset = Dataset.from_list(ds_list)
+        op = DocumentMinhashDeduplicator(window_size=2)
+        single_res = dataset.map(op.compute_hash)
+        batched_res = dataset.map(op.compute_hash, batch_size=3)
+        self.assertEqual(single_res.to_list(), batched_res.to_list())
+        dataset, dup_pairs = op.process(batched_res, show_num=2)
+        dataset = dataset.select_columns(column_names=['text'])
+        self.assertEqual(dataset.to_list(), tgt_list)
+        self.assertEqual(len(dup_pairs), 2)
+
+    def test_spill_buckets_to_disk(self):
+        ds_list = [{
+            'text': 'Today is Sunday and it\'s a happy day!'
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }, {
+            'text': 'Today is sunday and it\'s a happy day!'
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }]
+        tgt_list = [{
+            'text': 'Today is Sunday and it\'s a happy day!'
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }]
+        dataset = Dataset.from_list(ds_list)
+        with tempfile.TemporaryDirectory() as spill_dir:
+            op = DocumentMinhashDeduplicator(window_size=2,
+                                             memory_budget='1KB',
+                                             spill_dir=spill_dir)
+            self._run_minhash_dedup(dataset, tgt_list, op)
+            # spilled runs are removed after clustering
+            self.assertEqual(os.listdir(spill_dir), [])
+
+    @TEST_TAG("standalone", "ray")
+    def test_keep_first_of_clusters(self):
+        ds_list = [{
+            'text': 'Today is Sunday and it\'s a happy day!'
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }, {
+            'text': 'Today is sunday and it\'s a happy day!'
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }, {
+            'text': 'What a nice day! Let us go outside.'
+        }]
+        tgt_list = [{
+            'text': 'Today is Sunday and it\'s a happy day!'
+        }, {
+            'text': 'Do you need a cup of coffee?'
+        }, {
+            'text': 'What a nice day! Let us go outside.'
+        }]
+        dataset = self.generate_dataset(ds_list)
+        op = DocumentMinhashDeduplicator(window_size=2)
+        result = self.run_single_op(dataset, op, ['text'])
+        self.assertDatasetEqual(result, tgt_list)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -4,6 +4,7 @@ from data_engine.core.data import NestedDataset as Dataset
 
 from data_engine.ops.deduplicator.document_simhash_deduplicator import \
     DocumentSimhashDeduplicator
+from data_engine.utils.constant import HashKeys
 from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
 
 
@@ -958,6 +959,20 @@ class DocumentSimhashDeduplicatorTest(DataJuicerTestCaseBase):
                                          ignore_pattern=r'\p{P}')
         self._run_simhash_dedup(dataset, tgt_list, op)
 
+    def test_cluster_precomputed_hashes(self):
+        # 0b0111 and 0b1110 are linked by 0b0110 within a distance of 1,
+        # and 0b11110000 is far from all of them
+        hashes = [0b0111, 0b11110000, 0b0110, 0b1110, 0b0111, 0b11110000]
+        dataset = Dataset.from_list([{
+            'text': str(i),
+            HashKeys.simhash: str(hash_val)
+        } for i, hash_val in enumerate(hashes)])
+        op = DocumentSimhashDeduplicator(num_blocks=4, hamming_distance=1)
+        dataset, dup_pairs = op.process(dataset, show_num=2)
+        self.assertEqual(dataset['text'], ['0', '1'])
+        self.assertEqual(sorted(dup_pairs), [0, 1])
+        self.assertEqual(dup_pairs[1][1]['text'], '5')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -4,6 +4,7 @@ import unittest
 from data_engine.core.data import NestedDataset as Dataset
 
 from data_engine.ops.deduplicator.video_deduplicator import VideoDeduplicator
+from data_engine.utils.constant import HashKeys
 from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
 
 
@@ -314,5 +315,30 @@ class VideoDeduplicatorTest(DataJuicerTestCaseBase):
         self._run_video_deduplicator(dataset, tgt_list, op)
 
 
+    def test_precomputed_hashes(self):
+        ds_list = [{
+            'text': str(i),
+            HashKeys.videohash: video_hash,
+            HashKeys.hash: text_hash,
+        } for i, (video_hash, text_hash) in enumerate([
+            ('a', 'x'), ('', 'x'), ('b', 'x'), ('a', 'y'), ('', 'x'),
+            ('a', 'x'), ('b', 'x')
+        ])]
+        dataset = Dataset.from_list(ds_list)
+
+        # samples without videos are always kept
+        op = VideoDeduplicator()
+        res, dup_pairs = op.process(dataset, show_num=1)
+        self.assertEqual(res['text'], ['0', '1', '2', '4'])
+        self.assertEqual(list(dup_pairs), ['a'])
+        self.assertEqual([s['text'] for s in dup_pairs['a']], ['0', '3'])
+
+        op = VideoDeduplicator(consider_text=True)
+        res, dup_pairs = op.process(dataset, show_num=5)
+        self.assertEqual(res['text'], ['0', '1', '2', '3'])
+        self.assertEqual(sorted(dup_pairs), [('', 'x'), ('a', 'x'),
+                                             ('b', 'x')])
+
+
 if __name__ == '__main__':
     unittest.main()
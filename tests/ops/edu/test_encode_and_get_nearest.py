@@ -1,4 +1,8 @@
+import json
+import math
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from datasets import Dataset
 
@@ -6,6 +10,28 @@ from data_engine.ops.edu.encode_and_get_nearest import EncodeAndGetNearestSelect
 from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
 
 
+class _EmbeddingHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.batch_sizes.append(len(body['input']))
+        # unit vectors whose angles are proportional to the text lengths
+        data = [{
+            'index': idx,
+            'embedding': [math.cos(len(text) / 4),
+                          math.sin(len(text) / 4)]
+        } for idx, text in enumerate(body['input'])]
+        payload = json.dumps({'data': data[::-1]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
 class EncodeAndGetNearestSelectTest(DataJuicerTestCaseBase):
 
     def _run_encode_and_get_nearest_selector(self, dataset: Dataset, op):
@@ -24,6 +50,28 @@ class EncodeAndGetNearestSelectTest(DataJuicerTestCaseBase):
         op = EncodeAndGetNearestSelector()
         self._run_encode_and_get_nearest_selector(dataset, op)
 
+    def test_batched_embedding_requests(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _EmbeddingHandler)
+        server.batch_sizes = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        texts = ['a', 'bb', 'cccc', 'ddddd', 'eeeeeeeee']
+        dataset = Dataset.from_list([{'first_prompt': t} for t in texts])
+        op = EncodeAndGetNearestSelector(
+            auth_token='token',
+            model_url=f'http://127.0.0.1:{server.server_port}',
+            dimensions=2,
+            embedding_batch_size=2,
+            k=2)
+        result = op.process(dataset)
+        self.assertEqual(sorted(server.batch_sizes), [1, 2, 2])
+        self.assertAlmostEqual(result['embedding'][2][0], math.cos(1), 5)
+        self.assertEqual(result['nn_indices'], [[1, 2], [0, 2], [3, 1],
+                                                [2, 1], [3, 2]])
+        self.assertAlmostEqual(result['nn_scores'][0][0], math.cos(0.25), 5)
+
 
 if __name__ == '__main__':
     unittest.main()
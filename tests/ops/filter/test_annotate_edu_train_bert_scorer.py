@@ -1,89 +1,92 @@
-import sys
+import unittest
 
-import librosa
 import numpy as np
-from jsonargparse.typing import NonNegativeInt
-from data_engine.ops.base_op import OPERATORS, Filter, Sample
-from data_engine.utils.constant import Fields, StatsKeys
-from data_engine.utils.mm_utils import load_audio, load_data_with_context
-
-from ..base_op import OPERATORS, Filter,Param,DataType
-from ..op_fusion import LOADED_AUDIOS
-
-import requests
-import json
-import re
-
-OP_NAME = 'annotate_edu_train_bert_scorer'
-
-@OPERATORS.register_module(OP_NAME)
-@LOADED_AUDIOS.register_module(OP_NAME)
-class AnnotateEduTrainBertScorer(Filter):
-    def __init__(self,
-         auth_token: DataType.STRING = "",
-         *args,
-         **kwargs):
-        super().__init__(*args, **kwargs)
-        self.auth_token = auth_token
-
-
-    def compute_stats(self, sample, context=False):
-        score_field = f"{self.text_key}_score"
-        content = sample[self.text_key]
-        sample[score_field] = 0
-
-        url = "https://esupw2o6m6f4.space.opencsg.com/rerank"
-        # auth_token = "9acc3ea387b5479607bdeb5386af6e3483fbf070"
-        data = {
-            "query": "What is Deep Learning?",
-            "raw_scores": False,
-            "return_text": False,
-            "texts": [
-                content
-            ],
-            "truncate": False,
-            "truncation_direction": "right"
-        }
-        score = self.get_score_from_model(url,self.auth_token, data)
-        if score is not None:
-            sample[score_field] = score
-        return sample
-
-    def get_score_from_model(self,url, auth_token, data):
-
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {auth_token}'
-        }
-
-        response = requests.post(url, json=data, headers=headers)
-
-        if response.status_code == 200:
-            try:
-                response_data = response.json()
-                if len(response_data) > 0:
-                    return response_data[0].get('score')
-            except ValueError:
-                return None
-        else:
-            print(f"请求失败: {response.status_code} - {response.reason}")
-        return None
-    def process(self, sample):
-        return sample
-
-    @classmethod
-    @property
-    def sample(cls):
-        return Sample('Here is a more concise translation of the provided sentence:"Score a field and add a _score field for the result."', "")
-
-    @classmethod
-    @property
-    def description(cls):
-        return """ Annotate Edu Train BERT Scorer"""
-
-    @classmethod
-    @property
-    def init_params(cls):
-        return [
-            Param("auth_token", DataType.STRING, {}, ""),
-        ]
\ No newline at end of file
+
+from data_engine.core.data import NestedDataset as Dataset
+from data_engine.ops.filter.annotate_edu_train_bert_scorer import \
+    AnnotateEduTrainBertScorer
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+# embedding of each text, the query text is the same as 'deep'
+EMBEDDINGS = {
+    'What is Deep Learning?': [1.0, 0.0],
+    'deep': [1.0, 0.0],
+    'close': [0.8, 0.6],
+    'far': [0.0, 1.0],
+}
+
+
+class StubEngine:
+    """Engine answering embedding requests without sending them, and
+    failing the requests containing the text 'bad'."""
+
+    def __init__(self):
+        self.requests = []
+
+    def post_batch(self, url, payloads, headers=None, cache=None):
+        results = []
+        for payload in payloads:
+            self.requests.append(payload['input'])
+            if 'bad' in payload['input']:
+                results.append(ValueError('bad input'))
+                continue
+            results.append({
+                'data': [{
+                    'index': idx,
+                    'embedding': EMBEDDINGS[text]
+                } for idx, text in reversed(list(enumerate(
+                    payload['input'])))]
+            })
+        return results
+
+
+class AnnotateEduTrainBertScorerTest(DataJuicerTestCaseBase):
+
+    def _get_op(self, **kwargs):
+        op = AnnotateEduTrainBertScorer(auth_token='token', **kwargs)
+        op.engine = StubEngine()
+        return op
+
+    def test_default_batch_size(self):
+        self.assertEqual(self._get_op().batch_size, 64)
+
+    def test_embed_in_chunks(self):
+        op = self._get_op(embedding_batch_size=2)
+        samples = op.process({'text': ['deep', 'close', 'far', 'deep', 'far']})
+        np.testing.assert_allclose(samples['text_score'],
+                                   [5.0, 4.0, 0.0, 5.0, 0.0])
+        self.assertEqual(op.engine.requests, [
+            ['What is Deep Learning?'],
+            ['deep', 'close'],
+            ['far', 'deep'],
+            ['far'],
+        ])
+
+    def test_embed_failed_chunk_one_by_one(self):
+        op = self._get_op(embedding_batch_size=3)
+        samples = op.process({'text': ['deep', 'bad', 'close', 'far']})
+        # only the bad text fails
+        np.testing.assert_allclose(samples['text_score'],
+                                   [5.0, 0.0, 4.0, 0.0])
+        self.assertEqual(op.engine.requests[1:], [
+            ['deep', 'bad', 'close'],
+            ['far'],
+            ['deep'],
+            ['bad'],
+            ['close'],
+        ])
+        self.assertEqual(op.scored_samples, 3)
+        self.assertEqual(op.failed_samples, 1)
+
+    def test_reuse_query_embedding(self):
+        op = self._get_op()
+        ds = Dataset.from_list([{'text': 'deep'}, {'text': 'far'}] * 3)
+        ds = ds.map(op.process, batched=True, batch_size=2)
+        np.testing.assert_allclose(ds['text_score'], [5.0, 0.0] * 3)
+        self.assertEqual(
+            op.engine.requests.count(['What is Deep Learning?']), 1)
+        self.assertEqual(len(op.engine.requests), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
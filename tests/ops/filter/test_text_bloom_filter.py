@@ -55,6 +55,28 @@ class TextBloomFilterTest(DataJuicerTestCaseBase):
         op = TextBloomFilter()
         self._run_text_bloom_filter(dataset, tgt_list, op, ['text'])
 
+    def test_run(self):
+        ds_list = [{'text': f'text {i % 50}'} for i in range(400)]
+        dataset = Dataset.from_list(ds_list)
+        op = TextBloomFilter(batch_size=10)
+        dataset = op.run(dataset)
+        self.assertEqual(dataset['text'], [f'text {i}' for i in range(50)])
+        # the filter is sized for the whole dataset
+        self.assertEqual(op.bf.capacity, 400)
+
+    def test_compute_stats_beyond_initial_capacity(self):
+        # without run, e.g. in a streaming pipeline, the filter starts from
+        # the initial capacity and scales
+        ds_list = [{'text': f'text {i % 500}'} for i in range(1000)]
+        dataset = Dataset.from_list(ds_list)
+        op = TextBloomFilter(initial_capacity=10)
+        dataset = dataset.add_column(name=Fields.stats,
+                                     column=[{}] * dataset.num_rows)
+        dataset = dataset.map(op.compute_stats, batched=True, batch_size=50)
+        dataset = dataset.filter(op.process)
+        self.assertEqual(dataset['text'], [f'text {i}' for i in range(500)])
+        self.assertEqual(op.bf.capacity, 10)
+
 
 if __name__ == '__main__':
     unittest.main()
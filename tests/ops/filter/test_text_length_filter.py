@@ -47,6 +47,32 @@ class TextLengthFilterTest(DataJuicerTestCaseBase):
         op = TextLengthFilter(min_len=10, max_len=50)
         self._run_text_length_filter(dataset, tgt_list, op)
 
+    def test_fallback_to_single_sample(self):
+        ds_list = [{
+            'text': 'Today is'
+        }, {
+            'text': None
+        }, {
+            'text': 'a v s e c s f e f g a a a  '
+        }, {
+            'text': '中文也是一个字算一个长度'
+        }]
+        tgt_list = [{
+            'text': 'a v s e c s f e f g a a a  '
+        }, {
+            'text': '中文也是一个字算一个长度'
+        }]
+        dataset = Dataset.from_list(ds_list)
+        dataset = dataset.add_column(name=Fields.stats,
+                                     column=[{}] * dataset.num_rows)
+        op = TextLengthFilter(min_len=10, max_len=50)
+        # only the sample that raises is dropped from the failed batch
+        dataset = dataset.map(op.compute_stats, batch_size=4)
+        self.assertEqual(len(dataset), 3)
+        dataset = dataset.filter(op.process)
+        dataset = dataset.select_columns(column_names=['text'])
+        self.assertEqual(dataset.to_list(), tgt_list)
+
 
 if __name__ == '__main__':
     unittest.main()
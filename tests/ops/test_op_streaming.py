@@ -0,0 +1,134 @@
+import unittest
+
+from data_engine.core.data import NestedDataset as Dataset
+from data_engine.ops.base_op import Mapper
+from data_engine.ops.load import load_ops
+from data_engine.ops.op_fusion import StreamingPipeline, is_streamable
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+
+class BatchRecordingMapper(Mapper):
+
+    _batched_op = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_sizes = []
+
+    def process(self, samples):
+        self.batch_sizes.append(len(samples['text']))
+        return samples
+
+
+class RunOverridingMapper(Mapper):
+
+    def process(self, sample):
+        return sample
+
+    def run(self, dataset, *, exporter=None, tracer=None):
+        return super().run(dataset, exporter=exporter, tracer=tracer)
+
+
+class OpStreamingTest(DataJuicerTestCaseBase):
+
+    process_list = [{
+        'clean_email_mapper': {
+            'text_key': 'text'
+        }
+    }, {
+        'whitespace_normalization_mapper': {
+            'text_key': 'text'
+        }
+    }, {
+        'text_length_filter': {
+            'min_len': 10,
+            'max_len': 50,
+            'text_key': 'text'
+        }
+    }, {
+        'alphanumeric_filter': {
+            'min_ratio': 0.5,
+            'max_ratio': 1.0,
+            'text_key': 'text'
+        }
+    }, {
+        'document_deduplicator': {
+            'text_key': 'text'
+        }
+    }, {
+        'remove_long_words_mapper': {
+            'max_len': 10,
+            'text_key': 'text'
+        }
+    }]
+
+    ds_list = [{
+        'text': 'contact me: abc@example.com today'
+    }, {
+        'text': 'short'
+    }, {
+        'text': 'Today is Sunday and it\'s a happy day!'
+    }, {
+        'text': '，。、„”“«»１」「《》´∶：？！（）；–—．～’…━〈〉'
+    }, {
+        'text': 'a very very very very very long text which will be cut off'
+    }, {
+        'text': 'Do you need a cup of coffee?'
+    }, {
+        'text': 'Do  you need a cup of coffee?'
+    }, {
+        'text': 'emoji表情测试下😊，😸31231\n'
+    }]
+
+    def test_stream_operators(self):
+        ops = load_ops(self.process_list, op_streaming=True)
+        self.assertEqual(len(ops), 5)
+        self.assertIsInstance(ops[0], StreamingPipeline)
+        self.assertEqual(
+            ops[0]._op_cfg, {
+                'OpStreaming:(clean_email_mapper,'
+                'whitespace_normalization_mapper)':
+                self.process_list[:2]
+            })
+        # filters logging the details of their stats run on their own, and a
+        # single streamable op is kept as it is
+        for op, process in zip(ops[1:], self.process_list[2:]):
+            self.assertNotIsInstance(op, StreamingPipeline)
+            self.assertEqual(op._op_cfg, process)
+
+    def test_same_results_as_sequential_run(self):
+        dataset = Dataset.from_list(self.ds_list)
+        seq_res = dataset.process(load_ops(self.process_list))
+        stream_res = dataset.process(
+            load_ops(self.process_list, op_streaming=True))
+        self.assertDatasetEqual(
+            seq_res.select_columns(column_names=['text']).to_list(),
+            stream_res.select_columns(column_names=['text']).to_list())
+
+    def test_all_samples_filtered(self):
+        dataset = Dataset.from_list(self.ds_list)
+        ops = load_ops([{
+            'whitespace_normalization_mapper': {}
+        }, {
+            'text_length_filter': {
+                'min_len': 1000
+            }
+        }],
+                       op_streaming=True)
+        res = dataset.process(ops)
+        self.assertEqual(len(res), 0)
+
+    def test_ops_overriding_run_not_streamed(self):
+        self.assertTrue(is_streamable(BatchRecordingMapper()))
+        self.assertFalse(is_streamable(RunOverridingMapper()))
+
+    def test_batched_ops_get_their_batch_size(self):
+        op = BatchRecordingMapper(batch_size=3)
+        pipeline = StreamingPipeline([op], batch_size=1000)
+        res = pipeline.process({'text': [str(i) for i in range(8)]})
+        self.assertEqual(op.batch_sizes, [3, 3, 2])
+        self.assertEqual(res['text'], [str(i) for i in range(8)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from data_engine.format.load import load_formatter
+from data_engine.ops.load import load_ops
+from data_engine.utils.incremental_utils import (IncrementalManager,
+                                                 get_file_hashes)
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+
+class IncrementalManagerTest(DataJuicerTestCaseBase):
+
+    process_list = [{
+        'document_deduplicator': {}
+    }, {
+        'text_length_filter': {
+            'min_len': 6
+        }
+    }]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.tmp_dir, 'src')
+        self.state_dir = os.path.join(self.tmp_dir, 'state')
+        os.makedirs(self.src_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write_file(self, name, texts):
+        with open(os.path.join(self.src_path, name), 'w') as fout:
+            for text in texts:
+                fout.write(json.dumps({'text': text}) + '\n')
+
+    def _run(self):
+        manager = IncrementalManager(self.state_dir, self.process_list)
+        file_hashes = get_file_hashes(self.src_path)
+        files = manager.get_files_to_process(file_hashes)
+        dataset = None
+        if files:
+            format_path = IncrementalManager.link_files(
+                self.src_path, files, os.path.join(self.tmp_dir, 'inc_src'))
+            dataset = load_formatter(format_path).load_dataset()
+            dataset = dataset.process(load_ops(self.process_list))
+        return files, manager.merge(dataset, file_hashes, files)
+
+    def test_process_added_and_changed_files(self):
+        self._write_file('a.jsonl', ['hello world', 'short', 'hello world'])
+        self._write_file('b.jsonl', ['good morning'])
+        files, res = self._run()
+        self.assertEqual(files, ['a.jsonl', 'b.jsonl'])
+        self.assertEqual(sorted(res['text']), ['good morning', 'hello world'])
+
+        # only the added file is processed, and its rows are deduplicated
+        # against the prior results
+        self._write_file('c.jsonl', ['hello world', 'good night'])
+        files, res = self._run()
+        self.assertEqual(files, ['c.jsonl'])
+        self.assertEqual(sorted(res['text']),
+                         ['good morning', 'good night', 'hello world'])
+
+        # nothing changed
+        files, res = self._run()
+        self.assertEqual(files, [])
+        self.assertEqual(len(res), 3)
+
+        # the segment of a changed file is processed again
+        self._write_file('b.jsonl', ['good evening'])
+        os.remove(os.path.join(self.src_path, 'c.jsonl'))
+        files, res = self._run()
+        self.assertEqual(files, ['a.jsonl', 'b.jsonl'])
+        self.assertEqual(sorted(res['text']), ['good evening', 'hello world'])
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.state_dir, 'segments'))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from data_engine.utils import llm_cache_utils
+from data_engine.utils.llm_cache_utils import LLMResponseCache
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+
+class LLMResponseCacheTest(DataJuicerTestCaseBase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp_dir, 'responses.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _request(self, content, temperature=0.2):
+        return {
+            'url': 'http://localhost/chat/completions',
+            'payload': {
+                'model': 'model',
+                'messages': [{
+                    'role': 'user',
+                    'content': content
+                }],
+                'temperature': temperature
+            }
+        }
+
+    def test_get_and_set(self):
+        cache = LLMResponseCache(self.cache_file)
+        self.assertIsNone(cache.get(self._request('a')))
+        cache.set(self._request('a'), {'content': 'A'})
+
+        # responses are shared by the caches of the same file
+        new_cache = LLMResponseCache(self.cache_file)
+        self.assertEqual(
+            new_cache.get_many([
+                self._request('a'),
+                self._request('a', temperature=0.9),
+                self._request('b')
+            ]), [{
+                'content': 'A'
+            }, None, None])
+        self.assertEqual((new_cache.hits, new_cache.misses), (1, 2))
+        self.assertIn('1 hits, 2 misses', new_cache.summary())
+
+    def test_ttl(self):
+        cache = LLMResponseCache(self.cache_file, ttl=10)
+        cache.set(self._request('a'), 'A')
+        self.assertEqual(cache.get(self._request('a')), 'A')
+        with mock.patch('time.time', return_value=time.time() + 20):
+            self.assertIsNone(cache.get(self._request('a')))
+
+    def test_evict_least_recently_used(self):
+        cache = LLMResponseCache(self.cache_file, max_size=25)
+        for content in ['a', 'b', 'c']:
+            cache.set(self._request(content), content * 10)
+        cache.get(self._request('a'))
+        with mock.patch.object(llm_cache_utils, 'EVICT_INTERVAL', 1):
+            cache.set(self._request('d'), 'd' * 10)
+        self.assertEqual(
+            cache.get_many([self._request(c) for c in 'abcd']),
+            ['a' * 10, None, None, 'd' * 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
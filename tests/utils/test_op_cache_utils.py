@@ -0,0 +1,172 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from data_engine.core.data import NestedDataset as Dataset
+from data_engine.ops.load import load_ops
+from data_engine.utils.op_cache_utils import OpCacheManager, get_op_version
+from data_engine.utils.unittest_utils import DataJuicerTestCaseBase
+
+
+class OpCacheManagerTest(DataJuicerTestCaseBase):
+
+    process_list = [{
+        'whitespace_normalization_mapper': {}
+    }, {
+        'text_length_filter': {
+            'min_len': 10
+        }
+    }]
+
+    ds_list = [{
+        'text': 'Today is Sunday and it\'s a happy day!'
+    }, {
+        'text': 'short'
+    }, {
+        'text': 'Do you need a cup of coffee?'
+    }]
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_fingerprint_by_contents(self):
+        ds1 = Dataset.from_list(self.ds_list)
+        ds2 = Dataset.from_list(self.ds_list + [{'text': 'extra'}])
+        self.assertEqual(OpCacheManager.fingerprint(ds1),
+                         OpCacheManager.fingerprint(Dataset.from_list(
+                             self.ds_list)))
+        self.assertEqual(OpCacheManager.fingerprint(ds1),
+                         OpCacheManager.fingerprint(ds2.select([0, 1, 2])))
+        self.assertNotEqual(OpCacheManager.fingerprint(ds1),
+                            OpCacheManager.fingerprint(ds2))
+
+    def test_skip_cached_ops(self):
+        op_cache = OpCacheManager(self.cache_dir, work_dir=self.work_dir)
+        res = Dataset.from_list(self.ds_list).process(
+            load_ops(self.process_list), op_cache=op_cache)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        # a new job on the same contents only runs the changed op
+        process_list = self.process_list[:1] + [{
+            'text_length_filter': {
+                'min_len': 30
+            }
+        }]
+        ops = load_ops(process_list)
+        with mock.patch.object(ops[0], 'run') as mapper_run:
+            new_res = Dataset.from_list(self.ds_list).process(
+                ops, op_cache=op_cache)
+            mapper_run.assert_not_called()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+        self.assertEqual(res['text'], [
+            'Today is Sunday and it\'s a happy day!',
+            'Do you need a cup of coffee?'
+        ])
+        self.assertEqual(new_res['text'],
+                         ['Today is Sunday and it\'s a happy day!'])
+
+    def test_load_into_work_dir(self):
+        op_cache = OpCacheManager(self.cache_dir, work_dir=self.work_dir)
+        op_cache.save('a', Dataset.from_list(self.ds_list))
+        entry_files = sorted(os.listdir(os.path.join(self.cache_dir, 'a')))
+        ds = op_cache.load('a')
+        for cache_file in ds.cache_files:
+            self.assertTrue(cache_file['filename'].startswith(self.work_dir))
+
+        # the following ops write their cache files out of the shared cache,
+        # and the loaded files stay readable after an eviction
+        ds.map(lambda sample: {'text': sample['text'].upper()})
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.cache_dir, 'a'))),
+            entry_files)
+        op_cache.max_size = 0
+        op_cache.evict()
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'a')))
+        self.assertEqual(ds['text'], [d['text'] for d in self.ds_list])
+
+    def test_key_by_op_version(self):
+        ops = load_ops(self.process_list)
+        self.assertEqual(get_op_version(ops[0]),
+                         get_op_version(load_ops(self.process_list)[0]))
+        self.assertNotEqual(get_op_version(ops[0]), get_op_version(ops[1]))
+        self.assertNotEqual(
+            OpCacheManager.get_key('input', {}, get_op_version(ops[0])),
+            OpCacheManager.get_key('input', {}, get_op_version(ops[1])))
+
+    def test_op_version_by_shared_code(self):
+        op = load_ops(self.process_list)[0]
+        version = get_op_version(op)
+        with mock.patch('data_engine.__version__', '0.0.0'):
+            self.assertNotEqual(get_op_version(op), version)
+
+        # a change of the modules shared by the ops, e.g. base_op, also
+        # changes the version
+        import data_engine.ops.base_op as base_op
+        source = open(base_op.__file__, 'rb').read()
+        real_open = open
+
+        def open_with_changed_base_op(file, *args, **kwargs):
+            if file == base_op.__file__:
+                return mock.mock_open(read_data=source + b'\n')()
+            return real_open(file, *args, **kwargs)
+
+        with mock.patch('builtins.open', open_with_changed_base_op):
+            self.assertNotEqual(get_op_version(op), version)
+
+    def test_strip_secret_params(self):
+        op_cfg = {
+            'extract_qa_mapper': {
+                'api_url': 'http://localhost',
+                'auth_token': 'token1',
+                'params': {
+                    'api_key': 'key1'
+                },
+            }
+        }
+        rotated_cfg = {
+            'extract_qa_mapper': {
+                'api_url': 'http://localhost',
+                'auth_token': 'token2',
+                'params': {
+                    'api_key': 'key2'
+                },
+            }
+        }
+        self.assertEqual(OpCacheManager.get_key('input', op_cfg),
+                         OpCacheManager.get_key('input', rotated_cfg))
+
+        op_cache = OpCacheManager(self.cache_dir, work_dir=self.work_dir)
+        op_cache.save('a', Dataset.from_list(self.ds_list), op_cfg)
+        with open(os.path.join(self.cache_dir, 'a',
+                               'op_cache_meta.json')) as fin:
+            meta = fin.read()
+        self.assertIn('http://localhost', meta)
+        self.assertNotIn('token1', meta)
+        self.assertNotIn('key1', meta)
+
+    def test_evict_least_recently_used(self):
+        op_cache = OpCacheManager(self.cache_dir, work_dir=self.work_dir)
+        ds = Dataset.from_list(self.ds_list)
+        op_cache.save('a', ds)
+        op_cache.save('b', ds)
+        op_cache.load('a')
+        entry_size = sum(
+            os.path.getsize(os.path.join(self.cache_dir, 'a', f))
+            for f in os.listdir(os.path.join(self.cache_dir, 'a')))
+
+        op_cache.max_size = entry_size * 2 + entry_size // 2
+        op_cache.save('c', ds)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['a', 'c'])
+        self.assertEqual(op_cache.load('a')['text'], ds['text'])
+        self.assertIsNone(op_cache.load('b'))
+
+
+if __name__ == '__main__':
+    unittest.main()